@@ -8,16 +8,16 @@ import io
 import os
 import time
 import threading
-from datetime import datetime
 from pathlib import Path
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
-from calculator_core import StorageCalculator, UnitConverter
+from calculator_core import StorageCalculator, UnitConverter, IncrementalCalculator, GoalSeeker
+from data_store import DataStore
 
 # 数据文件路径
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_FILE = os.path.join(SCRIPT_DIR, "calc_data.xlsx")
-BACKUP_DIR = os.path.join(SCRIPT_DIR, "backups")
+STORE_DIR = os.path.join(SCRIPT_DIR, "calc_store")
 FORMULA_DIR = os.path.join(SCRIPT_DIR, "formulas")
 
 
@@ -213,41 +213,48 @@ def reload_calculator():
     return get_calculator()
 
 
+@st.cache_resource
+def get_data_store():
+    """获取数据存储实例（缓存，多个会话共享）"""
+    return DataStore(STORE_DIR)
+
+
 def load_data_from_file(file_path=DATA_FILE):
-    """从文件加载数据"""
-    if os.path.exists(file_path):
-        try:
+    """从数据存储加载数据，存储为空时从旧的 Excel 数据文件迁移"""
+    try:
+        df = get_data_store().load()
+        if df is not None:
+            return df
+        if os.path.exists(file_path):
             df = pd.read_excel(file_path)
             # 将所有列转为字符串类型，便于编辑
             for col in df.columns:
                 df[col] = df[col].astype(str).replace('nan', '')
             return df
-        except Exception as e:
-            st.error(f"加载数据文件失败: {str(e)}")
+    except Exception as e:
+        st.error(f"加载数据文件失败: {str(e)}")
     return None
 
 
-def save_data_to_file(df, file_path=DATA_FILE, create_backup=True):
-    """保存数据到文件"""
+def save_data_to_file(df):
+    """保存数据：只追加变化的单元格，不再重写整个工作簿"""
     try:
-        # 创建备份
-        if create_backup and os.path.exists(file_path):
-            if not os.path.exists(BACKUP_DIR):
-                os.makedirs(BACKUP_DIR)
-            backup_name = f"calc_data_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            backup_path = os.path.join(BACKUP_DIR, backup_name)
-            # 复制当前文件作为备份
-            import shutil
-            shutil.copy2(file_path, backup_path)
-        
-        # 保存数据
-        df.to_excel(file_path, index=False, sheet_name='计算数据')
+        get_data_store().save(df)
         return True
     except Exception as e:
         st.error(f"保存数据失败: {str(e)}")
         return False
 
 
+def export_data_to_excel(file_path=DATA_FILE):
+    """把最后一次保存的数据导出为 Excel 文件"""
+    try:
+        return get_data_store().export_excel(file_path)
+    except Exception as e:
+        st.error(f"导出失败: {str(e)}")
+        return None
+
+
 def render_sidebar(calculator):
     """渲染侧边栏配置面板"""
     st.sidebar.markdown("## ⚙️ 全局配置")
@@ -281,7 +288,13 @@ def render_sidebar(calculator):
             modified_defaults[var_name] = 0
     
     st.sidebar.markdown("---")
-    
+
+    # 配置加载时发现的依赖问题
+    for cycle in calculator.formula_cycles:
+        st.sidebar.warning(f"公式存在循环依赖: {' → '.join(cycle)}")
+    if calculator.unreachable_outputs:
+        st.sidebar.warning(f"以下公式缺少可输入的依赖，无法求解: {', '.join(calculator.unreachable_outputs)}")
+
     # 公式信息
     with st.sidebar.expander("📐 公式列表", expanded=False):
         for name, formula_data in calculator.get_output_formulas().items():
@@ -403,29 +416,149 @@ def render_column_rename(current_columns):
     return None
 
 
-def calculate_row(calculator, row_data, modified_defaults, row_index=None):
-    """计算单行数据
+def get_incremental_calculator(calculator):
+    """获取当前会话的增量计算引擎，计算器实例变化（重新加载）时重建"""
+    engine = st.session_state.get('incremental_calculator')
+    if engine is None or engine.calculator is not calculator:
+        engine = IncrementalCalculator(calculator)
+        st.session_state.incremental_calculator = engine
+    return engine
+
+
+def get_editor_changes(base_df):
+    """data_editor 记录的单元格编辑，转换为 (行标签, 列名) 列表
+
+    只有编辑器的底表就是上一次计算的结果时，编辑记录才是相对于增量计算缓存的全部改动；
+    否则（导入、清空、同步等替换过底表）返回 None，由增量计算逐列对比。
+    """
+    if st.session_state.get('calculated_df') is not base_df:
+        return None
+    state = st.session_state.get('data_editor') or {}
+    return [
+        (base_df.index[int(position)], col)
+        for position, cells in state.get('edited_rows', {}).items()
+        if int(position) < len(base_df)
+        for col in cells
+    ]
+
+
+def calculate_dataframe(calculator, df, modified_defaults, changed=None):
+    """增量计算整张表并回填输出列
+
+    只重算输入发生变化的行中受影响的公式，其余单元格沿用上一次的结果。
 
     Args:
         calculator: 计算器实例
-        row_data: 行数据
+        df: data_editor 中的数据
         modified_defaults: 修改后的默认值
-        row_index: data_editor中的行索引（用于日志记录）
+        changed: 编辑器报告的改动单元格（见 get_editor_changes），None 表示逐列对比
 
     Returns:
-        tuple: (results, unsolved_outputs)
-        - results: 计算结果字典
-        - unsolved_outputs: 无法求解的输出公式列表
+        DataFrame: 输出列已更新的数据，无法求解的输出单元格置空
     """
-    # 合并默认值和行数据
-    input_data = modified_defaults.copy()
-    for key, value in row_data.items():
-        if pd.notna(value) and value != '' and value != 'nan':
-            input_data[key] = value
+    engine = get_incremental_calculator(calculator)
+    return engine.apply(df, defaults=modified_defaults, changed=changed)
+
 
-    # 使用新的列名感知计算方法
-    results, unsolved_outputs = calculator.calculate_with_columns(input_data, row_index=row_index)
-    return results, unsolved_outputs
+def render_calculation_trace(calculator, df, modified_defaults):
+    """按需展示单行的计算过程
+
+    表格计算走批量路径，不记录逐行过程；只有用户在这里选择某一行时，
+    才对该行单独计算一次并渲染 CalculationTrace。
+    """
+    with st.expander("🔍 计算过程", expanded=False):
+        if len(df) == 0:
+            st.info("暂无数据")
+            return
+
+        row_index = st.number_input(
+            "行号", min_value=0, max_value=len(df) - 1, value=0, step=1,
+            key="trace_row_index"
+        )
+        if not st.button("显示计算过程", key="btn_show_trace"):
+            return
+
+        row_data = df.iloc[int(row_index)].to_dict()
+        # 侧边栏的默认值作为表格中没有的变量的输入
+        var_to_col = calculator.get_variable_to_column_map()
+        for var_name, value in modified_defaults.items():
+            if var_to_col.get(var_name, var_name) not in row_data:
+                row_data[var_name] = value
+
+        results, unsolved = calculator.calculate_with_columns(
+            row_data, row_index=int(row_index), trace=True
+        )
+        if calculator.last_trace is None or results is None:
+            st.warning("该行没有有效的已知值")
+            return
+        if unsolved:
+            st.warning(f"无法求解: {', '.join(unsolved)}")
+        st.code(str(calculator.last_trace), language=None)
+
+
+def get_goal_seeker(calculator):
+    """获取当前会话的反向求解器，计算器实例变化（重新加载）时重建"""
+    seeker = st.session_state.get('goal_seeker')
+    if seeker is None or seeker.calculator is not calculator:
+        seeker = GoalSeeker(calculator)
+        st.session_state.goal_seeker = seeker
+    return seeker
+
+
+def render_goal_seek(calculator, modified_defaults):
+    """反向求解：给定输出的目标值，求某个输入变量的取值
+
+    其他输入使用侧边栏的默认值。求解器按会话保存，重复的查询命中缓存，
+    修改目标值后从上一次的解附近开始搜索。
+    """
+    with st.expander("🎯 反向求解", expanded=False):
+        var_to_col = calculator.get_variable_to_column_map()
+        outputs = list(calculator.get_output_formulas())
+        inputs = list(calculator.get_input_variables())
+        if not outputs or not inputs:
+            st.info("没有可用的公式")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            target = st.selectbox("目标输出", outputs, format_func=lambda name: var_to_col.get(name, name),
+                                  key="goal_target")
+        with col2:
+            goal = st.text_input("目标值", placeholder="如 2PiB", key="goal_value")
+        with col3:
+            variable = st.selectbox("求解的输入", inputs, format_func=lambda name: var_to_col.get(name, name),
+                                    key="goal_variable")
+        integer = st.checkbox("取整数（至少需要的数量）", key="goal_integer")
+
+        if not st.button("求解", key="btn_goal_seek") or not goal:
+            return
+
+        fixed = {name: value for name, value in modified_defaults.items() if name != variable}
+        try:
+            report = get_goal_seeker(calculator).seek(target, goal, variable, fixed=fixed, integer=integer)
+        except ValueError as e:
+            st.error(str(e))
+            return
+
+        if report['value'] is None:
+            st.warning(f"无法求解: {report['message']}")
+            return
+
+        unit = calculator.variables.get(variable, {}).get('unit', '')
+        value = report['value']
+        if unit:
+            value_text = calculator.unit_converter.format_value(value, unit, 'i' in unit.lower())
+        else:
+            value_text = f"{value:g}"
+        st.success(
+            f"{var_to_col.get(variable, variable)} = {value_text}，"
+            f"此时 {var_to_col.get(target, target)} = {calculator.format_result(target, report['achieved'])}"
+        )
+        st.caption(
+            f"{report['message']}，残差 {report['residual']:.3g}，求值 {report['evaluations']} 点"
+            + ("，命中缓存" if report['cached'] else "")
+            + ("，从上一次的解开始搜索" if report['warm_start'] else "")
+        )
 
 
 def create_default_dataframe(calculator, modified_defaults):
@@ -481,13 +614,13 @@ def main():
         loaded_df = load_data_from_file()
         if loaded_df is not None:
             st.session_state.df = loaded_df
-            st.info(f"已从 {DATA_FILE} 加载 {len(loaded_df)} 行数据")
+            st.info(f"已加载 {len(loaded_df)} 行数据")
         else:
             st.session_state.df = create_default_dataframe(calculator, modified_defaults)
     
     # 数据持久化控制
     st.markdown("### 💾 数据持久化")
-    col1, col2, col3, col4 = st.columns([1, 1, 1, 2])
+    col1, col2, col3, col4, col5 = st.columns([1, 1, 1, 1, 2])
     
     with col1:
         if st.button("💾 保存到服务器", type="primary", width='stretch'):
@@ -520,7 +653,14 @@ def main():
                 st.warning("calc.xlsx 文件不存在")
     
     with col4:
-        st.caption(f"数据文件: {DATA_FILE}")
+        if st.button("📤 导出Excel", width='stretch'):
+            if save_data_to_file(st.session_state.df):
+                rows = export_data_to_excel()
+                if rows is not None:
+                    st.success(f"已导出 {rows} 行到 {os.path.basename(DATA_FILE)}")
+    
+    with col5:
+        st.caption(f"数据目录: {STORE_DIR}（导出文件: {DATA_FILE}）")
     
     st.markdown("---")
     
@@ -687,31 +827,11 @@ def main():
         </style>
         """, unsafe_allow_html=True)
         
-        var_to_col = calculator.get_variable_to_column_map()
         # 使用编辑器中的最新数据进行计算
-        result_df = edited_df.copy()
-
-        for idx, row in result_df.iterrows():
-            row_data = row.to_dict()
-            results, unsolved_outputs = calculate_row(calculator, row_data, modified_defaults, row_index=idx)
-
-            if results:
-                # 更新结果列
-                for var_name, value in results.items():
-                    col_name = var_to_col.get(var_name, var_name)
-                    if col_name in result_df.columns:
-                        # 检查是否是输出公式
-                        if var_name in calculator.formulas:
-                            formatted = calculator.format_result(var_name, value)
-                            result_df.at[idx, col_name] = formatted
-
-            # 将无法求解的输出列置空
-            for var_name in unsolved_outputs:
-                col_name = var_to_col.get(var_name, var_name)
-                if col_name in result_df.columns:
-                    result_df.at[idx, col_name] = ''
-        
+        changed = get_editor_changes(st.session_state.df)
+        result_df = calculate_dataframe(calculator, edited_df.copy(), modified_defaults, changed)
         st.session_state.df = result_df
+        st.session_state.calculated_df = result_df
         
         # 清除模态遮罩
         modal_placeholder.empty()
@@ -719,6 +839,9 @@ def main():
         if calc_button:
             st.rerun()
     
+    render_calculation_trace(calculator, st.session_state.df, modified_defaults)
+    render_goal_seek(calculator, modified_defaults)
+    
     st.markdown("---")
     
     # 数据导入导出区域
@@ -0,0 +1,351 @@
+"""
+计算器性能基准
+
+用随附的 formulas/*.yaml 生成 100 / 10k / 1M 行的合成数据表，测量：
+
+- 逐行计算：calculate_with_columns（静默模式）每行耗时
+- 批量计算：calculate_frame 每秒行数，增量计算改动一行的耗时
+- 配置重新加载：load_config 延迟（公式缓存命中）与不使用缓存的冷启动
+- 单位解析：parse_value / parse_array 每秒解析数
+- Excel 处理：ExcelHandler 对内存工作簿（memory_workbook）的全量/增量处理
+
+结果输出为 JSON，可保存为基线；与基线比较时，任何指标退化超过阈值返回非零退出码：
+
+    python benchmark.py --output benchmark_result.json
+    python benchmark.py --quick --save-baseline benchmark_baseline.json
+    python benchmark.py --quick --baseline benchmark_baseline.json --tolerance 0.5
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from calculator_core import StorageCalculator, UnitConverter, IncrementalCalculator
+
+logger = logging.getLogger('StorageCalculator')
+
+BENCHMARK_VERSION = 1
+DEFAULT_SIZES = (100, 10000, 1000000)
+QUICK_SIZES = (100, 10000)
+# 逐行计算只取前若干行，每行耗时与表格大小无关
+ROW_SAMPLE = 1000
+# 内存工作簿按单元格保存，过大的表格只测到这个行数
+EXCEL_MAX_ROWS = 10000
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+
+
+def generate_sheet(calculator, n_rows, seed=0):
+    """按公式配置中的可输入变量生成合成数据表
+
+    列名为显示名，取值按变量单位生成带单位的字符串（如 '12TB'、'95%'），
+    输出列为空。
+
+    Returns:
+        DataFrame: dtype 为 object 的数据表
+    """
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for var_name, var_info in calculator.get_input_variables().items():
+        unit = (var_info.get('unit') or '').strip()
+        if unit == '%':
+            vocabulary = [f"{v}%" for v in range(50, 100)]
+        elif unit in ('TB', 'KiB', 'MiB/s'):
+            vocabulary = [f"{v}{unit}" for v in range(1, 32)]
+        elif unit == 'B':
+            vocabulary = [f"{v}KiB" for v in range(1, 1024)]
+        else:
+            vocabulary = [str(v) for v in range(1, 16)]
+        # 从取值表中抽样，百万行的表格也只引用少量字符串对象
+        vocabulary = np.array(vocabulary, dtype=object)
+        columns[var_info.get('display_name', var_name)] = vocabulary[rng.integers(0, len(vocabulary), n_rows)]
+    for name, formula_data in calculator.formulas.items():
+        display_name = formula_data.get('display_name', name)
+        if display_name not in columns:
+            columns[display_name] = np.full(n_rows, None, dtype=object)
+    return pd.DataFrame(columns)
+
+
+def best_time(func, repeat):
+    """执行 repeat 次，返回最短耗时（秒）"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+class BenchmarkResults:
+    """收集指标：名称 -> 数值、单位、是否越大越好"""
+
+    def __init__(self, sizes):
+        self.sizes = list(sizes)
+        self.metrics = {}
+
+    def add(self, name, value, unit, higher_is_better):
+        self.metrics[name] = {'value': float(value), 'unit': unit, 'higher_is_better': higher_is_better}
+        print(f"  {name}: {value:.6g} {unit}", file=sys.stderr)
+
+    def to_dict(self):
+        return {
+            'version': BENCHMARK_VERSION,
+            'meta': {
+                'python': platform.python_version(),
+                'numpy': np.__version__,
+                'pandas': pd.__version__,
+                'platform': platform.platform(),
+                'sizes': self.sizes,
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            },
+            'metrics': self.metrics,
+        }
+
+
+def bench_rows(results, calculator, sheet, repeat):
+    """逐行计算（静默模式）每行耗时"""
+    rows = sheet.head(ROW_SAMPLE).to_dict('records')
+    calculator.trace = False
+
+    def run():
+        for i, row in enumerate(rows):
+            calculator.calculate_with_columns(row, row_index=i)
+
+    seconds = best_time(run, repeat)
+    results.add('row.calculate_with_columns', seconds / len(rows) * 1e6, 'us/row', False)
+
+
+# 增量计算改动一个单元格至少比整表计算快这么多倍（只检查不少于 SPEEDUP_MIN_ROWS 行的表格）
+MIN_INCREMENTAL_SPEEDUP = 10
+SPEEDUP_MIN_ROWS = 10000
+
+
+def bench_frame(results, calculator, sheet, repeat):
+    """批量计算与增量计算
+
+    增量计算分两种：调用方给出改动的单元格（Web 表格编辑器），以及逐列对比找出改动。
+    """
+    n_rows = len(sheet)
+    defaults = calculator.get_defaults()
+    full_seconds = best_time(lambda: calculator.calculate_frame(sheet, defaults=defaults), repeat)
+    results.add(f'frame.calculate@{n_rows}', n_rows / full_seconds, 'rows/s', True)
+
+    engine = IncrementalCalculator(calculator)
+    engine.update(sheet, defaults=defaults)
+    column = sheet.columns[0]
+    edited = sheet.copy()
+    changed = [(edited.index[n_rows // 2], column)]
+
+    def edit_one_cell():
+        edited.iat[n_rows // 2, 0] = '7' if edited.iat[n_rows // 2, 0] != '7' else '8'
+
+    def update_one_row():
+        edit_one_cell()
+        engine.update(edited, defaults=defaults, changed=changed)
+
+    seconds = best_time(update_one_row, repeat)
+    assert engine.last_stats['rows'] == 1, f"增量计算应只重算一行（修改列 {column}）"
+    results.add(f'incremental.update_one_row@{n_rows}', seconds * 1e3, 'ms', False)
+    speedup = full_seconds / seconds
+    results.add(f'incremental.speedup@{n_rows}', speedup, 'x', True)
+    if n_rows >= SPEEDUP_MIN_ROWS:
+        assert speedup >= MIN_INCREMENTAL_SPEEDUP, (
+            f"{n_rows} 行时改动一个单元格的增量计算只比整表计算快 {speedup:.1f} 倍"
+        )
+
+    def diff_one_row():
+        edit_one_cell()
+        engine.update(edited, defaults=defaults)
+
+    seconds = best_time(diff_one_row, repeat)
+    assert engine.last_stats['rows'] == 1, f"增量计算应只重算一行（修改列 {column}）"
+    results.add(f'incremental.diff_one_row@{n_rows}', seconds * 1e3, 'ms', False)
+
+
+def bench_parse_value(results, repeat):
+    """逐个解析带单位的值（每次清空解析缓存）"""
+    units = ['TB', 'TiB', 'GB', 'MiB/s', 'KiB', '%', '']
+    values = [f"{i % 977}.{i % 10}{units[i % len(units)]}" for i in range(20000)]
+
+    def parse_each():
+        UnitConverter._parse_string.cache_clear()
+        for value in values:
+            UnitConverter.parse_value(value)
+
+    seconds = best_time(parse_each, repeat)
+    results.add('units.parse_value', len(values) / seconds, 'values/s', True)
+
+
+def bench_parse_array(results, sheet, repeat):
+    """整列解析"""
+    column = sheet[sheet.columns[0]]
+    seconds = best_time(lambda: UnitConverter.parse_array(column), repeat)
+    results.add(f'units.parse_array@{len(column)}', len(column) / seconds, 'values/s', True)
+
+
+def bench_reload(results, formula_dir, cache_dir, repeat):
+    """配置重新加载延迟"""
+    calculator = StorageCalculator(formula_dir=formula_dir, cache_dir=cache_dir, trace=False)
+
+    def reload():
+        # 强制重新解析：清空上一次的配置，使 load_config 认为配置已变化
+        calculator._last_config = None
+        calculator.load_config()
+
+    seconds = best_time(reload, repeat)
+    results.add('reload.load_config', seconds * 1e3, 'ms', False)
+
+    seconds = best_time(lambda: StorageCalculator(formula_dir=formula_dir, cache_dir=False, trace=False), repeat)
+    results.add('reload.cold_start', seconds * 1e3, 'ms', False)
+
+
+def bench_excel(results, sheet, repeat):
+    """ExcelHandler 处理内存工作簿：全量处理与改动一个单元格后的增量处理"""
+    from memory_workbook import MemoryWorkbook
+    from storage_calculator import ExcelHandler
+
+    n_rows = len(sheet)
+    rows = [list(sheet.columns)] + sheet.where(pd.notna(sheet), None).values.tolist()
+    temp_dir = tempfile.mkdtemp(prefix='calc_bench_')
+    try:
+        excel_path = os.path.join(temp_dir, 'bench.xlsx')
+        open(excel_path, 'w').close()
+
+        def full():
+            handler = ExcelHandler(excel_path, workbook=MemoryWorkbook(rows))
+            handler.process_excel()
+            return handler
+
+        seconds = best_time(full, repeat)
+        results.add(f'excel.process_excel@{n_rows}', n_rows / seconds, 'rows/s', True)
+
+        handler = full()
+        sheet_ = handler.wb.sheets.active
+
+        def incremental():
+            value = sheet_.cells.get((2 + n_rows // 2, 1))
+            sheet_.set_cell(2 + n_rows // 2, 1, '7' if value != '7' else '8')
+            handler.process_excel()
+
+        seconds = best_time(incremental, repeat)
+        results.add(f'excel.process_excel_incremental@{n_rows}', seconds * 1e3, 'ms', False)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, formula_dir='formulas', repeat=3, excel=True):
+    """执行全部基准
+
+    Args:
+        sizes: 合成数据表的行数
+        formula_dir: 配置目录
+        repeat: 每项重复次数（取最短耗时），超过 10 万行的表格只执行一次
+        excel: 是否测量 Excel 处理（需要 watchdog 等 storage_calculator 的依赖）
+
+    Returns:
+        BenchmarkResults
+    """
+    if excel:
+        # 导入时会按 config.yaml 配置日志，先导入再统一调高日志级别
+        import storage_calculator  # noqa: F401
+    # 计算过程中的日志会严重影响计时
+    level = logger.level
+    logger.setLevel(logging.WARNING)
+
+    results = BenchmarkResults(sizes)
+    cache_dir = tempfile.mkdtemp(prefix='calc_bench_cache_')
+    try:
+        calculator = StorageCalculator(formula_dir=formula_dir, cache_dir=cache_dir, trace=False)
+        formula_dir = calculator.formula_dir
+
+        bench_reload(results, formula_dir, cache_dir, repeat)
+        bench_parse_value(results, repeat)
+        bench_rows(results, calculator, generate_sheet(calculator, ROW_SAMPLE), repeat)
+        for n_rows in sizes:
+            sheet = generate_sheet(calculator, n_rows)
+            size_repeat = repeat if n_rows <= 100000 else 1
+            bench_frame(results, calculator, sheet, size_repeat)
+            bench_parse_array(results, sheet, size_repeat)
+            if excel and n_rows <= EXCEL_MAX_ROWS:
+                bench_excel(results, sheet, size_repeat)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        logger.setLevel(level)
+    return results
+
+
+def compare(current, baseline, tolerance=0.5):
+    """与基线比较
+
+    Args:
+        current: 本次结果（to_dict() 的格式）
+        baseline: 基线结果
+        tolerance: 允许的相对退化，0.5 表示比基线差 50% 以内视为正常（计时本身有波动）
+
+    Returns:
+        list: 退化的指标 [(名称, 基线值, 当前值, 相对退化)]，只比较两边都有的指标
+    """
+    regressions = []
+    for name, base in baseline.get('metrics', {}).items():
+        metric = current.get('metrics', {}).get(name)
+        if metric is None or base['value'] <= 0:
+            continue
+        if base['higher_is_better']:
+            change = (base['value'] - metric['value']) / base['value']
+        else:
+            change = (metric['value'] - base['value']) / base['value']
+        if change > tolerance:
+            regressions.append((name, base['value'], metric['value'], change))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='存储计算器性能基准')
+    parser.add_argument('--sizes', type=int, nargs='+', help=f'合成数据表的行数，默认 {list(DEFAULT_SIZES)}')
+    parser.add_argument('--quick', action='store_true', help=f'只测 {list(QUICK_SIZES)} 行')
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最短耗时')
+    parser.add_argument('--formula-dir', default='formulas', help='配置目录')
+    parser.add_argument('--no-excel', action='store_true', help='不测量 Excel 处理')
+    parser.add_argument('--output', help='结果 JSON 文件，默认输出到标准输出')
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help='与基线比较，退化超过阈值时返回 1（不带路径时使用 benchmark_baseline.json）')
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE, help='把结果保存为基线')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='允许的相对退化，默认 0.5')
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else DEFAULT_SIZES)
+    results = run_benchmarks(sizes, args.formula_dir, args.repeat, excel=not args.no_excel).to_dict()
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"基线已保存到: {args.save_baseline}", file=sys.stderr)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for name, base, value, change in regressions:
+            print(f"性能退化: {name} 基线 {base:.6g}，当前 {value:.6g}（差 {change:.0%}）", file=sys.stderr)
+        if regressions:
+            return 1
+        print(f"与基线比较通过（阈值 {args.tolerance:.0%}）", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
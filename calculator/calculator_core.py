@@ -4,12 +4,20 @@
 import time
 import os
 import logging
+import math
 import re
+import hashlib
+import json
+import tempfile
+from collections import OrderedDict
+from functools import lru_cache
 from pathlib import Path
 
 import yaml
 import numpy as np
-from sympy import symbols, Eq, solve, Symbol, pretty_print, sympify
+import pandas as pd
+import sympy
+from sympy import symbols, Eq, solve, Symbol, pretty_print, sympify, lambdify
 from sympy.parsing.sympy_parser import parse_expr
 
 # 设置日志
@@ -29,6 +37,60 @@ def setup_logging(name='StorageCalculator', level=logging.INFO):
 logger = setup_logging(level=logging.INFO)
 
 
+def strongly_connected_components(graph):
+    """Tarjan 算法求有向图的强连通分量（迭代实现，避免长依赖链触发递归上限）
+
+    Args:
+        graph: 邻接表 {节点: 后继节点列表}，不在 graph 中的后继会被忽略
+
+    Returns:
+        list: 强连通分量列表，任一分量的后继所在分量都排在它之前
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in graph:
+                    continue
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph[successor])))
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+
+    return components
+
+
 class UnitConverter:
     """单位转换工具类"""
 
@@ -56,73 +118,68 @@ class UnitConverter:
         '个': {'base': 1, 'format': lambda x: f"{x:.0f}个"},
     }
 
+    # 单位前缀表：小写单位 -> (规范写法, 倍数, 是否二进制)，类加载时编译一次
+    BINARY_PREFIXES = {'kib': 1024**1, 'mib': 1024**2, 'gib': 1024**3, 'tib': 1024**4, 'pib': 1024**5}
+    DECIMAL_PREFIXES = {
+        'k': 1000**1, 'kb': 1000**1,
+        'm': 1000**2, 'mb': 1000**2,
+        'g': 1000**3, 'gb': 1000**3,
+        't': 1000**4, 'tb': 1000**4,
+        'p': 1000**5, 'pb': 1000**5,
+    }
+    UNIT_TABLE = {}
+    for _suffix in ('', '/s'):
+        for _unit, _factor in BINARY_PREFIXES.items():
+            UNIT_TABLE[_unit + _suffix] = (f"{_unit[0].upper()}{_unit[1]}B{_suffix}", _factor, True)
+        for _unit, _factor in DECIMAL_PREFIXES.items():
+            # 统一格式化为带B的形式
+            UNIT_TABLE[_unit + _suffix] = (f"{_unit[0].upper()}B{_suffix}", _factor, False)
+        for _unit in ('b', 'bytes'):
+            UNIT_TABLE[_unit + _suffix] = (f"B{_suffix}", 1, True)
+    del _suffix, _unit, _factor
+
+    # 数值（可带科学计数法指数）+ 单位
+    VALUE_PATTERN = re.compile(r'^([-+]?\d*\.?\d+(?:e[-+]?\d+)?)\s*(.*)$', re.I)
+
+    # 重复出现的原始字符串（如 "4KiB"、"10GB/s"）的解析结果缓存上限
+    PARSE_CACHE_SIZE = 4096
+
     @classmethod
+    @lru_cache(maxsize=256)
     def _parse_unit_prefix(cls, unit):
-        """解析单位前缀"""
+        """解析单位前缀，返回 (规范写法, 倍数, 是否二进制)，无法识别时规范写法为 None"""
         unit = unit.strip().lower()
-        if unit.endswith('/s'):
-            base_unit = unit[:-2]
-            suffix = '/s'
-        else:
-            base_unit = unit
-            suffix = ''
+        unit_info = cls.UNIT_TABLE.get(unit)
+        if unit_info is not None:
+            return unit_info
 
+        base_unit = unit[:-2] if unit.endswith('/s') else unit
         if '/' in base_unit:
             return unit, 1, False
-
-        # 二进制单位 (1024倍数)
-        binary_units = {
-            'kib': 1024**1, 'mib': 1024**2,
-            'gib': 1024**3, 'tib': 1024**4,
-            'pib': 1024**5
-        }
-        if base_unit in binary_units:
-            formatted = f"{base_unit[0].upper()}{base_unit[1]}B{suffix}"
-            return formatted, binary_units[base_unit], True
-
-        # 十进制单位 (1000倍数) - 支持简写如 K, M, G, T, P
-        decimal_units = {
-            'k': 1000**1, 'kb': 1000**1,
-            'm': 1000**2, 'mb': 1000**2,
-            'g': 1000**3, 'gb': 1000**3,
-            't': 1000**4, 'tb': 1000**4,
-            'p': 1000**5, 'pb': 1000**5
-        }
-        if base_unit in decimal_units:
-            # 统一格式化为带B的形式
-            unit_letter = base_unit[0].upper()
-            formatted = f"{unit_letter}B{suffix}"
-            return formatted, decimal_units[base_unit], False
-
-        if base_unit in ['b', 'bytes']:
-            return f"B{suffix}", 1, True
-
         return None, 1, False
 
     @classmethod
     def parse_value(cls, value):
         """解析带单位的值"""
-        try:
-            if isinstance(value, str) and 'e' in value.lower():
-                match = re.match(r'^([\d\.e+-]+)\s*([a-z%]*)$', value, re.I)
-                if match:
-                    number_part, unit_part = match.groups()
-                    return float(number_part) * cls._parse_unit_prefix(unit_part)[1]
+        if value is None:
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        return cls._parse_string(value if isinstance(value, str) else str(value))
 
-            if isinstance(value, str) and '%' in value:
+    @classmethod
+    @lru_cache(maxsize=PARSE_CACHE_SIZE)
+    def _parse_string(cls, value):
+        """解析字符串形式的值（结果按原始字符串缓存）"""
+        try:
+            if '%' in value:
                 return float(value.replace('%', '')) * 0.01
 
-            if value is None:
-                return None
-
-            if isinstance(value, (int, float)):
-                return float(value)
-
-            value_str = str(value).strip()
+            value_str = value.strip()
             if not value_str:
                 return None
 
-            match = re.match(r'^([-+]?\d*\.?\d+)\s*(.*)$', value_str)
+            match = cls.VALUE_PATTERN.match(value_str)
             if not match:
                 return float(value_str) if value_str.replace('.','',1).isdigit() else None
 
@@ -137,9 +194,6 @@ class UnitConverter:
             if unit_info is None:
                 return number
 
-            if unit_info in cls.SPECIAL_UNITS:
-                return number * cls.SPECIAL_UNITS[unit_info]['base']
-
             return number * factor
 
         except (ValueError, TypeError):
@@ -148,6 +202,32 @@ class UnitConverter:
             logger.error(f"解析错误: {value} -> {str(e)}")
             return None
 
+    @classmethod
+    def parse_array(cls, values):
+        """批量解析一列带单位的值
+
+        纯数字整列向量化转换；其余取值去重后先整体尝试数值转换，
+        剩下的再逐个调用 parse_value，结果与逐个解析一致。
+
+        Args:
+            values: 可迭代的原始值（list、numpy 数组或 pandas.Series）
+
+        Returns:
+            numpy.ndarray: float64 数组，空值或无法解析的值为 NaN
+        """
+        series = values if isinstance(values, pd.Series) else pd.Series(list(values), dtype=object)
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            return series.to_numpy(dtype=float, na_value=np.nan, copy=True)
+
+        # 缺失值的编码为 -1，对应追加在末尾的 NaN
+        codes, uniques = pd.factorize(series)
+        uniques = pd.Series(uniques, dtype=object)
+        parsed = pd.to_numeric(uniques, errors='coerce').to_numpy(dtype=float, na_value=np.nan, copy=True)
+        for i in np.flatnonzero(~np.isfinite(parsed)):
+            value = cls.parse_value(uniques.iat[i])
+            parsed[i] = np.nan if value is None else value
+        return np.append(parsed, np.nan)[codes]
+
     @classmethod
     def format_value(cls, value, target_unit=None, use_binary=True):
         """格式化数值，将数值转换为人类可读的单位显示
@@ -193,15 +273,345 @@ class UnitConverter:
 
         return f"{value:.2f}"
 
+    @classmethod
+    def format_array(cls, values, target_unit=None, use_binary=True):
+        """批量格式化一列数值，目标单位只解析一次
+
+        Args:
+            values: 可迭代的数值（list、numpy 数组或 pandas.Series）
+            target_unit: 目标单位，含义同 format_value
+            use_binary: 自动选择单位时是否使用二进制单位
+
+        Returns:
+            list: 与 format_value 逐个格式化的结果一致，None 或 NaN 对应 None
+        """
+        array = pd.to_numeric(pd.Series(list(values), dtype=object), errors='coerce').to_numpy(dtype=float)
+        missing = np.isnan(array)
+
+        if target_unit and target_unit not in cls.SPECIAL_UNITS:
+            unit_info, factor, is_binary = cls._parse_unit_prefix(target_unit)
+            if unit_info is None:
+                formatted = [f"{value:.2f} {target_unit}" for value in array.tolist()]
+            else:
+                formatted = [f"{value:.2f} {unit_info}" for value in (array / factor).tolist()]
+        else:
+            formatted = [cls.format_value(value, target_unit, use_binary) for value in array.tolist()]
+
+        return [None if skip else text for text, skip in zip(formatted, missing.tolist())]
+
+
+def default_cache_dir():
+    """默认的公式缓存目录：$XDG_CACHE_HOME（未设置时为 ~/.cache）下的 storage_calculator/formulas"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'storage_calculator', 'formulas')
+
+
+def _is_private(st):
+    """文件或目录属于当前用户，且同组和其他用户不可写"""
+    if not hasattr(os, 'getuid'):
+        return True
+    return st.st_uid == os.getuid() and not st.st_mode & 0o022
+
+
+class FormulaCache:
+    """公式配置的磁盘缓存
+
+    以每个 YAML 文件的内容哈希为键，缓存解析后的配置和公式的 sympy 表达式。
+    文件内容未变化时直接复用，不再调用 yaml 解析和 parse_expr；修改一个文件
+    只会重新解析该文件。
+
+    缓存文件为 JSON，表达式以 srepr 形式保存，读取时在只包含 sympy 名称的
+    命名空间中重建；数值函数只在进程内缓存，每个进程重新 lambdify。
+    缓存目录以 0700 权限创建，目录或缓存文件不属于当前用户、或可被其他用户
+    写入时不使用磁盘缓存。
+    """
+
+    # 缓存格式版本，格式变化时递增使旧缓存失效
+    VERSION = 2
+    # 缓存目录中最多保留的文件数，超出时删除最旧的
+    MAX_FILES = 64
+
+    _sympy_namespace = None
+
+    def __init__(self, cache_dir=None):
+        """
+        Args:
+            cache_dir: 缓存目录，None 表示只在内存中缓存
+        """
+        self.cache_dir = self._prepare_dir(cache_dir) if cache_dir else None
+        self._entries = {}  # YAML 文件路径 -> 缓存条目
+        self.stats = {'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _prepare_dir(cache_dir):
+        """创建缓存目录并检查权限，不安全时返回 None（只在内存中缓存）"""
+        try:
+            os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            if _is_private(os.stat(cache_dir)):
+                return cache_dir
+            logger.warning(f"公式缓存目录不属于当前用户或可被其他用户写入，不使用磁盘缓存: {cache_dir}")
+        except OSError as e:
+            logger.warning(f"无法创建公式缓存目录，不使用磁盘缓存: {cache_dir}: {str(e)}")
+        return None
+
+    def _file_key(self, content):
+        """缓存键：格式版本、sympy 版本和文件内容的哈希"""
+        digest = hashlib.sha256(f"{self.VERSION}:{sympy.__version__}:".encode())
+        digest.update(content)
+        return digest.hexdigest()
+
+    def _cache_path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def load(self, file_path):
+        """读取 YAML 文件对应的缓存条目，未命中时解析文件并新建条目
+
+        Returns:
+            dict: {'key', 'config', 'expressions', 'compiled'}，config 为 yaml.safe_load 的结果
+        """
+        with open(file_path, 'rb') as f:
+            content = f.read()
+        key = self._file_key(content)
+
+        entry = self._entries.get(file_path)
+        if entry is not None and entry['key'] == key:
+            return entry
+
+        entry = self._read(key)
+        if entry is None:
+            self.stats['misses'] += 1
+            entry = {
+                'key': key,
+                'config': yaml.safe_load(content.decode('utf-8')),
+                'expressions': {},  # 表达式字符串 -> sympy 表达式
+                'compiled': {},     # 公式名 -> (表达式字符串, 参数, 函数)，只在进程内缓存
+                'dirty': True,
+            }
+        else:
+            self.stats['hits'] += 1
+            if entry['config'] is None:
+                # 配置无法无损保存为 JSON 时只缓存了表达式
+                entry['config'] = yaml.safe_load(content.decode('utf-8'))
+        self._entries[file_path] = entry
+        return entry
+
+    def _read(self, key):
+        """从磁盘读取缓存条目，不存在、损坏或权限不安全时返回 None"""
+        if not self.cache_dir:
+            return None
+        path = self._cache_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'rb') as f:
+                if not _is_private(os.fstat(f.fileno())):
+                    logger.warning(f"公式缓存文件权限不安全，忽略: {path}")
+                    return None
+                data = json.load(f)
+            if data.get('key') != key:
+                return None
+            namespace = self._get_sympy_namespace()
+            expressions = {
+                expr_str: eval(text, {'__builtins__': {}}, namespace)
+                for expr_str, text in data['expressions'].items()
+            }
+            # 更新修改时间，清理时优先保留最近使用的缓存
+            os.utime(path)
+            return {
+                'key': key,
+                'config': data['config'],
+                'expressions': expressions,
+                'compiled': {},
+                'dirty': False,
+            }
+        except Exception as e:
+            logger.warning(f"读取公式缓存失败，重新解析: {path}: {str(e)}")
+            return None
+
+    @classmethod
+    def _get_sympy_namespace(cls):
+        """重建 srepr 表达式所用的命名空间，只包含 sympy 的公开名称"""
+        if cls._sympy_namespace is None:
+            cls._sympy_namespace = {
+                name: value for name, value in vars(sympy).items() if not name.startswith('_')
+            }
+        return cls._sympy_namespace
+
+    def parse_expression(self, entry, expr_str):
+        """解析表达式字符串，结果缓存在文件条目中"""
+        expr = entry['expressions'].get(expr_str)
+        if expr is None:
+            expr = parse_expr(expr_str)
+            entry['expressions'][expr_str] = expr
+            entry['dirty'] = True
+        return expr
+
+    def get_compiled(self, entry, name, expr_str):
+        """获取本进程内缓存的编译结果
+
+        Returns:
+            tuple | None: (args, func)，未缓存或表达式已变化时返回 None
+        """
+        cached = entry['compiled'].get(name)
+        if cached is None or cached[0] != expr_str:
+            return None
+        return cached[1], cached[2]
+
+    def put_compiled(self, entry, name, expr_str, args, func):
+        """记录编译结果（不写入磁盘）"""
+        entry['compiled'][name] = (expr_str, args, func)
+
+    @staticmethod
+    def _encode(entry):
+        """把条目转换为可写入 JSON 的数据"""
+        config = entry['config']
+        try:
+            if json.loads(json.dumps(config)) != config:
+                config = None
+        except (TypeError, ValueError):
+            config = None
+        return {
+            'key': entry['key'],
+            'config': config,
+            'expressions': {expr_str: sympy.srepr(expr) for expr_str, expr in entry['expressions'].items()},
+        }
+
+    def flush(self):
+        """把新增或变化的条目写入磁盘，并清理多余的旧缓存文件"""
+        if not self.cache_dir:
+            return
+        dirty = [entry for entry in self._entries.values() if entry.get('dirty')]
+        if not dirty:
+            return
+        try:
+            for entry in dirty:
+                # mkstemp 创建的文件权限为 0600
+                fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(self._encode(entry), f, ensure_ascii=False)
+                os.replace(tmp_path, self._cache_path(entry['key']))
+                entry['dirty'] = False
+            self._prune()
+        except Exception as e:
+            logger.warning(f"写入公式缓存失败: {str(e)}")
+
+    def _prune(self):
+        """只保留最近使用的 MAX_FILES 个缓存文件"""
+        files = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir) if name.endswith('.json')
+        ]
+        if len(files) <= self.MAX_FILES:
+            return
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[self.MAX_FILES:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class CalculationTrace:
+    """单行计算过程的结构化记录
+
+    calculate_with_columns 只记录变量名和数值，方程代入后的表达式等文本
+    在 render() 时才生成，需要查看时（日志级别为 INFO 或在界面中展开）再渲染。
+    """
+
+    def __init__(self, row_index=None):
+        self.row_index = row_index
+        self.inputs = []        # (变量名, 解析后的值, 原始值)
+        self.defaults = []      # (变量名, 默认值)
+        self.known = {}
+        self.dependencies = []  # (方程名, 依赖变量)
+        self.plan = []
+        self.steps = []         # 每个方程的求解记录
+        self.unsolved = []
+        self.results = {}
+
+    def add_step(self, name, equation, values, value=None, error=None):
+        """记录一个方程的求解，values 为代入的变量值"""
+        self.steps.append({
+            'name': name,
+            'equation': equation,
+            'values': values,
+            'value': value,
+            'error': error,
+        })
+
+    def render(self):
+        """渲染为日志文本行"""
+        row_info = f" (data_editor 第 {self.row_index} 行)" if self.row_index is not None else ""
+        lines = ["=" * 80, f"开始新的计算过程{row_info}", "=" * 80]
+
+        lines.append(f"\n【步骤1: 读取输入数据{row_info}】")
+        for var_name, parsed_value, value in self.inputs:
+            lines.append(f"  从输入列读取{row_info}: {var_name} = {parsed_value} (原始值: {value})")
+
+        lines.append("\n【步骤2: 应用默认值】")
+        for var_name, value in self.defaults:
+            lines.append(f"  使用默认值: {var_name} = {value}")
+
+        lines.append("\n【已知值汇总】")
+        for var, val in self.known.items():
+            lines.append(f"  {var} = {val}")
+
+        lines.append("\n【步骤3: 获取求值计划】")
+        for name, variables in self.dependencies:
+            lines.append(f"  方程 {name} 依赖变量: {variables}")
+        lines.append(f"  求值顺序: {list(self.plan)}")
+
+        lines.append("\n【步骤4: 按计划求解方程】")
+        for step in self.steps:
+            eq = step['equation']
+            lines.append(f"\n  求解方程: {step['name']}")
+            lines.append(f"    原始方程: {eq}")
+            lines.append(f"    代入步骤:")
+            subs_dict = {Symbol(var): val for var, val in step['values'].items()}
+            for var, val in subs_dict.items():
+                lines.append(f"      {var} = {val}")
+            try:
+                lines.append(f"    代入后的方程: {eq.subs(subs_dict)}")
+            except Exception as e:
+                lines.append(f"    代入失败: {str(e)}")
+            if step['error'] is not None:
+                lines.append(f"    ✗ 求解方程 {step['name']} 失败: {step['error']}")
+            elif step['value'] is not None:
+                lines.append(f"    ✓ 求解成功: {step['name']} = {step['value']}")
+            else:
+                lines.append(f"    ✗ 无解: {step['name']}")
+
+        if self.unsolved:
+            lines.append(f"\n【警告】以下方程无法求解: {self.unsolved}")
+
+        lines.append("\n【步骤5: 计算结果汇总】")
+        for name, value in self.results.items():
+            lines.append(f"  {name} = {value}")
+
+        lines.append("\n" + "=" * 80)
+        lines.append("计算过程结束")
+        lines.append("=" * 80 + "\n")
+        return lines
+
+    def __str__(self):
+        return "\n".join(self.render())
+
 
 class StorageCalculator:
     """存储计算器核心类"""
+
+    # 求值计划缓存的最大条目数（按已知变量集合缓存）
+    PLAN_CACHE_SIZE = 1024
     
-    def __init__(self, formula_dir='formulas'):
+    def __init__(self, formula_dir='formulas', cache_dir=None, trace=None):
         """初始化计算器
         
         Args:
             formula_dir: 配置目录路径（相对于脚本目录或绝对路径）
+            cache_dir: 公式缓存目录，None 使用 default_cache_dir()（用户缓存目录），
+                False 表示不使用磁盘缓存
+            trace: 是否记录逐行计算过程（CalculationTrace）。None 表示日志级别
+                为 INFO 时记录并输出；False 为高吞吐的静默模式，不构造任何过程信息
         """
         self.script_dir = os.path.dirname(os.path.abspath(__file__))
         
@@ -216,12 +626,26 @@ class StorageCalculator:
         self._calculated_values = {}
         self._last_config = None
         self.unit_converter = UnitConverter()
+        self.trace = trace
+        self.last_trace = None  # 最近一次 calculate_with_columns 记录的计算过程
+
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self.formula_cache = FormulaCache(cache_dir or None)
+        self._formula_entries = {}  # 公式名 -> 定义该公式的 YAML 文件的缓存条目
 
         self.variables = {}
         self.formulas = {}
         self.config = {}
         self.display_columns = {}
 
+        # 公式依赖图，由 load_formulas 构建
+        self.formula_order = []
+        self.formula_dependents = {}
+        self.formula_cycles = []
+        self.unreachable_outputs = []
+        self._plan_cache = {}
+
         self.load_config()
 
     def _config_has_changed(self, new_config):
@@ -232,7 +656,7 @@ class StorageCalculator:
             return True
 
         try:
-            sections = ['global', 'variables', 'formulas']
+            sections = ['global', 'variables', 'formulas', 'excel']
             for section in sections:
                 if (section in new_config) != (section in self._last_config):
                     return True
@@ -253,6 +677,7 @@ class StorageCalculator:
                 'global': {},
                 'variables': {},
                 'formulas': {},
+                'excel': {},
             }
 
             yaml_files = [f for f in os.listdir(self.formula_dir) if f.endswith('.yaml')]
@@ -261,18 +686,22 @@ class StorageCalculator:
                 return False
 
             yaml_files.sort()
+            formula_entries = {}
 
             for yaml_file in yaml_files:
                 file_path = os.path.join(self.formula_dir, yaml_file)
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        config = yaml.safe_load(f)
-                        if not config:
-                            continue
+                    # 文件内容未变化时直接使用缓存的解析结果
+                    entry = self.formula_cache.load(file_path)
+                    config = entry['config']
+                    if not config:
+                        continue
 
-                        for section in ['global', 'variables', 'formulas']:
-                            if section in config:
-                                merged_config[section].update(config[section])
+                    for section in ['global', 'variables', 'formulas', 'excel']:
+                        if section in config:
+                            merged_config[section].update(config[section])
+                    for name in config.get('formulas') or {}:
+                        formula_entries[name] = entry
 
                     logger.debug(f"已加载配置文件: {yaml_file}")
 
@@ -289,6 +718,7 @@ class StorageCalculator:
 
             self.config = merged_config
             self._last_config = merged_config.copy()
+            self._formula_entries = formula_entries
 
             self.load_defaults()
             self.load_variables()
@@ -334,14 +764,28 @@ class StorageCalculator:
             try:
                 expr_str = formula_data['expression']
                 expr_str = expr_str.split('=')[1].strip()
-                expr = parse_expr(expr_str)
-                variables = [str(symbol) for symbol in expr.free_symbols]
+                entry = self._formula_entries.get(name)
+                if entry is not None:
+                    expr = self.formula_cache.parse_expression(entry, expr_str)
+                    compiled = self.formula_cache.get_compiled(entry, name, expr_str)
+                else:
+                    expr = parse_expr(expr_str)
+                    compiled = None
+                # 输出变量出现在右侧时属于隐式方程，不作为输入依赖
+                variables = [str(symbol) for symbol in expr.free_symbols if str(symbol) != name]
+                if compiled is None:
+                    compiled = self._compile_formula(name, expr)
+                    if entry is not None:
+                        self.formula_cache.put_compiled(entry, name, expr_str, *compiled)
+                args, func = compiled
 
                 display_name = formula_data.get('excel_column', name)
                 
                 self.formulas[name] = {
                     'equation': Eq(Symbol(name), expr),
                     'variables': set(variables),
+                    'args': args,
+                    'func': func,
                     'display_name': display_name,
                     'unit': formula_data.get('unit', ''),
                     'expression': formula_data['expression']
@@ -354,6 +798,151 @@ class StorageCalculator:
             except Exception as e:
                 logger.error(f"解析公式 {name} 时出错: {str(e)}")
 
+        self.formula_cache.flush()
+        self._build_dependency_graph()
+
+    def _build_dependency_graph(self):
+        """根据公式的依赖变量构建依赖图，并检查环和不可达的输出
+
+        - formula_order: 公式的拓扑顺序，依赖总是排在被依赖者之前（环内按定义顺序）
+        - formula_dependents: 变量/公式名 -> 直接依赖它的公式集合
+        - formula_cycles: 存在循环依赖的公式组
+        - unreachable_outputs: 无论输入如何都无法求解的公式
+        """
+        definition_index = {name: i for i, name in enumerate(self.formulas)}
+        graph = {
+            name: sorted(data['variables'] & self.formulas.keys(), key=definition_index.get)
+            for name, data in self.formulas.items()
+        }
+
+        self.formula_order = []
+        self.formula_cycles = []
+        for component in strongly_connected_components(graph):
+            component.sort(key=definition_index.get)
+            self.formula_order.extend(component)
+            if len(component) > 1:
+                self.formula_cycles.append(component)
+
+        self.formula_dependents = {}
+        for name, data in self.formulas.items():
+            for var in data['variables']:
+                self.formula_dependents.setdefault(var, set()).add(name)
+
+        # 可输入变量、有默认值的变量以及同名可输入的公式都可作为求解起点
+        defaults = self.config.get('global', {}).get('defaults', {})
+        available = {
+            name for name, info in self.variables.items()
+            if info.get('can_be_input', False) or name in defaults
+        }
+        made_progress = True
+        while made_progress:
+            made_progress = False
+            for name in self.formula_order:
+                if name not in available and self.formulas[name]['variables'] <= available:
+                    available.add(name)
+                    made_progress = True
+        self.unreachable_outputs = [name for name in self.formula_order if name not in available]
+
+        self._plan_cache = {}
+
+        for cycle in self.formula_cycles:
+            logger.warning(f"公式存在循环依赖: {' -> '.join(cycle)}")
+        if self.unreachable_outputs:
+            logger.warning(f"以下公式缺少可输入的依赖，无法求解: {self.unreachable_outputs}")
+
+    def get_evaluation_plan(self, known_names):
+        """获取求值计划：在给定已知变量下可求解的公式及其求值顺序
+
+        计划按已知变量集合缓存，同一组输入的行只需计算一次。
+
+        Args:
+            known_names: 已知变量名集合
+
+        Returns:
+            tuple: 按依赖顺序排列的公式名，依赖全部满足时逐个求值即可
+        """
+        key = frozenset(known_names)
+        plan = self._plan_cache.get(key)
+        if plan is None:
+            if len(self._plan_cache) >= self.PLAN_CACHE_SIZE:
+                self._plan_cache.clear()
+            plan = self._build_evaluation_plan(key)
+            self._plan_cache[key] = plan
+        return plan
+
+    def _build_evaluation_plan(self, known_names):
+        """按拓扑顺序筛选可求解的公式，环内公式需要重复扫描直至无进展"""
+        available = set(known_names)
+        plan = []
+        made_progress = True
+        while made_progress:
+            made_progress = False
+            for name in self.formula_order:
+                if name in available:
+                    continue
+                if self.formulas[name]['variables'] <= available:
+                    plan.append(name)
+                    available.add(name)
+                    made_progress = True
+            if not self.formula_cycles:
+                break
+        return tuple(plan)
+
+    def _compile_formula(self, name, expr):
+        """将公式右侧表达式编译为数值函数
+
+        Returns:
+            tuple: (args, func)
+            - args: 函数参数对应的变量名（按名称排序）
+            - func: numpy 数值函数；隐式方程或编译失败时为 None，计算时回退到 sympy.solve
+        """
+        args = tuple(sorted(str(symbol) for symbol in expr.free_symbols))
+        if name in args:
+            logger.debug(f"公式 {name} 为隐式方程，使用 solve 求解")
+            return args, None
+        try:
+            func = lambdify([Symbol(arg) for arg in args], expr, modules='numpy')
+            return args, func
+        except Exception as e:
+            logger.warning(f"编译公式 {name} 失败，回退到 solve: {str(e)}")
+            return args, None
+
+    def _evaluate_formula(self, name, values):
+        """求解单个公式
+
+        Args:
+            name: 公式名称
+            values: 已知变量值字典，需包含公式的全部依赖变量
+
+        Returns:
+            float: 求解结果；无解（如除零、结果非有限值）时返回 None
+        """
+        formula_data = self.formulas[name]
+        func = formula_data.get('func')
+        if func is not None:
+            try:
+                value = float(func(*[values[arg] for arg in formula_data['args']]))
+            except (ZeroDivisionError, OverflowError, ValueError, TypeError):
+                return None
+            return value if math.isfinite(value) else None
+
+        subs_dict = {Symbol(var): values[var] for var in formula_data['variables']}
+        solution = solve(formula_data['equation'].subs(subs_dict), Symbol(name))
+        return float(solution[0]) if solution else None
+
+    def _default_values(self):
+        """获取配置中定义的全局默认值（已解析为数值的部分）"""
+        defaults = {}
+        for var_name, value in self.config.get('global', {}).get('defaults', {}).items():
+            parsed_value = self.unit_converter.parse_value(value)
+            if parsed_value is not None:
+                defaults[var_name] = parsed_value
+        return defaults
+
+    def get_excel_columns(self):
+        """获取Excel列配置"""
+        return self.config.get('excel', {})
+
     def get_input_variables(self):
         """获取所有可输入的变量"""
         return {
@@ -417,38 +1006,18 @@ class StorageCalculator:
             if not known_values:
                 return None
 
-            # 迭代求解
-            equation_deps = {}
-            for name, formula_data in self.formulas.items():
-                if name not in known_values:
-                    equation_deps[name] = {
-                        'equation': formula_data['equation'],
-                        'variables': set(formula_data['variables']),
-                        'solved': False
-                    }
-
+            # 按求值计划依次求解
             results = known_values.copy()
 
-            while True:
-                made_progress = False
-                for name, eq_data in equation_deps.items():
-                    if eq_data['solved']:
-                        continue
-
-                    if all(var in results for var in eq_data['variables']):
-                        try:
-                            eq = eq_data['equation']
-                            subs_dict = {Symbol(var): results[var] for var in eq_data['variables']}
-                            solution = solve(eq.subs(subs_dict))
-                            if solution:
-                                results[name] = float(solution[0])
-                                eq_data['solved'] = True
-                                made_progress = True
-                        except Exception as e:
-                            logger.warning(f"求解方程 {name} 失败: {str(e)}")
-
-                if not made_progress:
-                    break
+            for name in self.get_evaluation_plan(known_values):
+                if not self.formulas[name]['variables'] <= results.keys():
+                    continue
+                try:
+                    value = self._evaluate_formula(name, results)
+                    if value is not None:
+                        results[name] = value
+                except Exception as e:
+                    logger.warning(f"求解方程 {name} 失败: {str(e)}")
 
             self._calculated_values.update(results)
             return results
@@ -466,6 +1035,14 @@ class StorageCalculator:
                 return self.unit_converter.format_value(value, unit, use_binary)
         return f"{value:.4f}" if isinstance(value, float) else str(value)
 
+    def format_result_array(self, name, values):
+        """批量格式化同一公式的一列结果，与逐个调用 format_result 一致"""
+        if name in self.formulas:
+            unit = self.formulas[name].get('unit', '')
+            if unit:
+                return self.unit_converter.format_array(values, unit, 'i' in unit.lower())
+        return [f"{float(value):.4f}" for value in values]
+
     def format_results(self, results):
         """格式化所有结果"""
         if not results:
@@ -506,13 +1083,15 @@ class StorageCalculator:
         
         return var_map
 
-    def calculate_with_columns(self, row_data, column_map=None, row_index=None):
+    def calculate_with_columns(self, row_data, column_map=None, row_index=None, trace=None):
         """根据列名进行计算，自动识别公式
 
         Args:
             row_data: 行数据字典，键为列名（显示名）
             column_map: 列名到变量名的映射，如果为None则自动生成
             row_index: data_editor中的行索引（用于日志记录）
+            trace: 是否记录计算过程，None 使用 self.trace 的设置；
+                记录的过程保存在 self.last_trace
 
         Returns:
             tuple: (results, unsolved_outputs)
@@ -525,12 +1104,14 @@ class StorageCalculator:
         if column_map is None:
             column_map = self.get_column_to_variable_map()
 
-        try:
-            row_info = f" (data_editor 第 {row_index} 行)" if row_index is not None else ""
-            logger.info("=" * 80)
-            logger.info(f"开始新的计算过程{row_info}")
-            logger.info("=" * 80)
+        if trace is None:
+            trace = self.trace
+        log_trace = logger.isEnabledFor(logging.INFO) and trace is not False
+        # 静默模式下不构造任何过程信息（包括方程的字符串和代入结果）
+        record = CalculationTrace(row_index) if (trace or log_trace) else None
+        self.last_trace = record
 
+        try:
             # 【关键修复】清除之前行的计算结果，只保留全局默认值
             # 获取配置中定义的默认值
             config_defaults = self.config.get('global', {}).get('defaults', {})
@@ -541,12 +1122,12 @@ class StorageCalculator:
                     preserved_defaults[var_name] = self._calculated_values[var_name]
             # 重置 _calculated_values 为仅包含默认值
             self._calculated_values = preserved_defaults.copy()
-            logger.debug(f"已重置计算状态，保留的默认值: {list(preserved_defaults.keys())}")
 
             known_values = {}
+            # 有值（不论能否解析）的输入变量；空单元格的判断与 calculate_frame 一致
+            filled_inputs = set()
 
             # 只处理输入变量，不处理输出公式列
-            logger.info(f"\n【步骤1: 读取输入数据{row_info}】")
             for var_name, var_info in self.variables.items():
                 if var_info.get('can_be_input', False):
                     # 获取该变量的显示名
@@ -554,38 +1135,30 @@ class StorageCalculator:
 
                     # 尝试从row_data中获取值（显示名优先，然后是变量名）
                     value = None
-                    if display_name in row_data and row_data[display_name] not in (None, '', 'nan'):
-                        value = row_data[display_name]
-                    elif var_name in row_data and row_data[var_name] not in (None, '', 'nan'):
-                        value = row_data[var_name]
+                    for col_name in (display_name, var_name):
+                        if col_name in row_data and not self._is_blank_cell(row_data[col_name]):
+                            value = row_data[col_name]
+                            break
 
-                    if value is not None and not (isinstance(value, str) and not value.strip()):
+                    if value is not None:
+                        filled_inputs.add(var_name)
                         parsed_value = self.unit_converter.parse_value(value)
                         if parsed_value is not None:
                             known_values[var_name] = float(parsed_value)
-                            logger.info(f"  从输入列读取{row_info}: {var_name} = {parsed_value} (原始值: {value})")
+                            if record is not None:
+                                record.inputs.append((var_name, parsed_value, value))
 
             # 使用默认值填充
-            logger.info("\n【步骤2: 应用默认值】")
             for var_name in self.variables:
-                # 对于输入变量，如果当前行数据为空，则不应用之前的计算值
-                var_info = self.variables[var_name]
-                if var_info.get('can_be_input', False):
-                    display_name = var_info.get('display_name', var_name)
-                    # 检查当前行数据中该列是否为空
-                    row_value = None
-                    if display_name in row_data:
-                        row_value = row_data[display_name]
-                    elif var_name in row_data:
-                        row_value = row_data[var_name]
-                    # 如果当前行为空（None, '', 'nan'），则跳过使用之前的值
-                    if row_value in (None, '', 'nan'):
-                        logger.debug(f"  跳过输入变量 {var_name}，当前行为空")
-                        continue
+                # 对于输入变量，如果当前行数据为空，则不应用之前的计算值；
+                # 有值但无法解析时回退到默认值
+                if self.variables[var_name].get('can_be_input', False) and var_name not in filled_inputs:
+                    continue
 
                 if var_name not in known_values and var_name in self._calculated_values:
                     known_values[var_name] = self._calculated_values[var_name]
-                    logger.info(f"  使用默认值: {var_name} = {self._calculated_values[var_name]}")
+                    if record is not None:
+                        record.defaults.append((var_name, self._calculated_values[var_name]))
 
             if not known_values:
                 logger.warning("没有有效的已知值，跳过计算")
@@ -593,12 +1166,6 @@ class StorageCalculator:
                 all_outputs = list(self.formulas.keys())
                 return None, all_outputs
 
-            logger.info(f"\n【已知值汇总】")
-            for var, val in known_values.items():
-                logger.info(f"  {var} = {val}")
-
-            # 迭代求解（与原calculate方法相同）
-            logger.info("\n【步骤3: 构建方程依赖关系】")
             equation_deps = {}
             for name, formula_data in self.formulas.items():
                 if name not in known_values:
@@ -607,70 +1174,45 @@ class StorageCalculator:
                         'variables': set(formula_data['variables']),
                         'solved': False
                     }
-                    logger.info(f"  方程 {name} 依赖变量: {formula_data['variables']}")
+                    if record is not None:
+                        record.dependencies.append((name, formula_data['variables']))
 
-            results = known_values.copy()
+            plan = self.get_evaluation_plan(known_values)
+            if record is not None:
+                record.known = dict(known_values)
+                record.plan = list(plan)
 
-            logger.info("\n【步骤4: 迭代求解方程】")
-            iteration = 0
-            while True:
-                iteration += 1
-                logger.info(f"\n  --- 第 {iteration} 轮迭代 ---")
-                made_progress = False
+            results = known_values.copy()
 
-                for name, eq_data in equation_deps.items():
-                    if eq_data['solved']:
-                        continue
+            for name in plan:
+                eq_data = equation_deps[name]
+                missing_vars = [var for var in eq_data['variables'] if var not in results]
+                if missing_vars:
+                    continue
 
-                    if all(var in results for var in eq_data['variables']):
-                        try:
-                            eq = eq_data['equation']
-                            logger.info(f"\n  求解方程: {name}")
-                            logger.info(f"    原始方程: {eq}")
-
-                            # 打印代入步骤
-                            logger.info(f"    代入步骤:")
-                            subs_dict = {Symbol(var): results[var] for var in eq_data['variables']}
-                            for var, val in subs_dict.items():
-                                logger.info(f"      {var} = {val}")
-
-                            # 打印代入后的表达式
-                            substituted_eq = eq.subs(subs_dict)
-                            logger.info(f"    代入后的方程: {substituted_eq}")
-
-                            # 求解
-                            solution = solve(substituted_eq)
-                            if solution:
-                                float_value = float(solution[0])
-                                results[name] = float_value
-                                eq_data['solved'] = True
-                                made_progress = True
-                                logger.info(f"    ✓ 求解成功: {name} = {float_value}")
-                            else:
-                                logger.warning(f"    ✗ 无解: {name}")
-                        except Exception as e:
-                            logger.warning(f"    ✗ 求解方程 {name} 失败: {str(e)}")
-                    else:
-                        missing_vars = [var for var in eq_data['variables'] if var not in results]
-                        logger.debug(f"  方程 {name} 缺少变量: {missing_vars}，暂时跳过")
-
-                if not made_progress:
-                    logger.info(f"\n  第 {iteration} 轮迭代无进展，终止求解")
-                    break
+                try:
+                    float_value = self._evaluate_formula(name, results)
+                    if float_value is not None:
+                        results[name] = float_value
+                        eq_data['solved'] = True
+                    if record is not None:
+                        values = {var: results[var] for var in eq_data['variables']}
+                        record.add_step(name, eq_data['equation'], values, value=float_value)
+                except Exception as e:
+                    logger.warning(f"求解方程 {name} 失败: {str(e)}")
+                    if record is not None:
+                        values = {var: results[var] for var in eq_data['variables']}
+                        record.add_step(name, eq_data['equation'], values, error=str(e))
 
             # 报告未能求解的方程
             unsolved = [name for name, data in equation_deps.items() if not data['solved']]
-            if unsolved:
-                logger.warning(f"\n【警告】以下方程无法求解: {unsolved}")
-
-            logger.info("\n【步骤5: 计算结果汇总】")
-            for name in self.formulas.keys():
-                if name in results:
-                    logger.info(f"  {name} = {results[name]}")
 
-            logger.info("\n" + "=" * 80)
-            logger.info("计算过程结束")
-            logger.info("=" * 80 + "\n")
+            if record is not None:
+                record.unsolved = unsolved
+                record.results = {name: results[name] for name in self.formulas if name in results}
+                if log_trace:
+                    for line in record.render():
+                        logger.info(line)
 
             self._calculated_values.update(results)
             return results, unsolved
@@ -681,6 +1223,234 @@ class StorageCalculator:
             logger.error(traceback.format_exc())
             return None, []
 
+    def calculate_frame(self, df, defaults=None):
+        """按列批量计算整张表
+
+        与逐行调用 calculate_with_columns 的结果一致（包括空单元格：None、NaN、
+        空白字符串和 'nan' 都视为空，不使用配置默认值），但单位解析和公式求值
+        都在整列数组上完成，每个公式每次调用只求值一次。
+
+        Args:
+            df: pandas.DataFrame，列名为显示名或变量名
+            defaults: 变量名到默认值的映射，输入单元格为空时使用
+                （与 app.py 中把侧边栏默认值合并进行数据的方式一致）
+
+        Returns:
+            tuple: (results, unsolved)
+            - results: DataFrame，列为变量名和公式名，未知或无法求解的值为 NaN
+            - unsolved: DataFrame，列为公式名，True 表示该行该公式无法求解
+        """
+        known = self.parse_frame_inputs(df, defaults)
+        results, unsolved = self.solve_frame(known, len(df))
+
+        logger.debug(f"批量计算完成: {len(df)} 行, {len(self.formulas)} 个公式")
+        return (
+            pd.DataFrame(results, index=df.index),
+            pd.DataFrame(unsolved, index=df.index, columns=list(self.formulas)),
+        )
+
+    def parse_frame_inputs(self, df, defaults=None):
+        """解析表格中的输入列
+
+        Args:
+            df: pandas.DataFrame，列名为显示名或变量名
+            defaults: 变量名到默认值的映射，输入单元格为空时使用
+
+        Returns:
+            dict: 变量名 -> float64 数组，未知值为 NaN
+        """
+        n_rows = len(df)
+        defaults = defaults or {}
+
+        def present(column):
+            """单元格是否有值（None、NaN、空白和 'nan' 视为空）"""
+            codes, uniques = pd.factorize(df[column])
+            stripped = pd.Series(uniques, dtype=object).astype(str).str.strip()
+            valid = ((stripped != '') & (stripped != 'nan')).to_numpy()
+            return np.append(valid, False)[codes]
+
+        config_defaults = self._default_values()
+        known = {}
+        for var_name, var_info in self.variables.items():
+            column = np.full(n_rows, np.nan)
+            if not var_info.get('can_be_input', False):
+                if var_name in config_defaults:
+                    column[:] = config_defaults[var_name]
+                known[var_name] = column
+                continue
+
+            filled = np.zeros(n_rows, dtype=bool)
+            if var_name in defaults:
+                default = self.unit_converter.parse_value(defaults[var_name])
+                if default is not None:
+                    column[:] = default
+                    filled[:] = True
+            # 显示名优先，其次变量名
+            for col_name in (var_name, var_info.get('display_name', var_name)):
+                if col_name in df.columns:
+                    mask = present(col_name)
+                    column[mask] = self.unit_converter.parse_array(df[col_name])[mask]
+                    filled |= mask
+            # 有值但无法解析时回退到配置默认值，与逐行计算一致
+            if var_name in config_defaults:
+                column[filled & np.isnan(column)] = config_defaults[var_name]
+            known[var_name] = column
+        return known
+
+    @staticmethod
+    def _is_blank_cell(value):
+        """单元格是否为空，与 parse_frame_inputs 的判断一致（None、NaN、空白和 'nan' 视为空）"""
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return True
+        text = str(value).strip()
+        return text == '' or text == 'nan'
+
+    def parse_frame_rows(self, df, positions, defaults=None):
+        """只解析表格中指定行的输入列
+
+        结果与 parse_frame_inputs(df.iloc[positions], defaults) 一致，但逐个单元格
+        调用 UnitConverter.parse_value，没有整列解析的准备开销，适合增量计算中少量变化的行。
+
+        Args:
+            df: pandas.DataFrame，列名为显示名或变量名
+            positions: 行位置（不是行标签）
+            defaults: 变量名到默认值的映射，输入单元格为空时使用
+
+        Returns:
+            dict: 变量名 -> float64 数组（与 positions 一一对应），未知值为 NaN
+        """
+        positions = np.asarray(positions, dtype=int)
+        n_rows = len(positions)
+        defaults = defaults or {}
+
+        config_defaults = self._default_values()
+        known = {}
+        for var_name, var_info in self.variables.items():
+            column = np.full(n_rows, np.nan)
+            if not var_info.get('can_be_input', False):
+                if var_name in config_defaults:
+                    column[:] = config_defaults[var_name]
+                known[var_name] = column
+                continue
+
+            filled = np.zeros(n_rows, dtype=bool)
+            if var_name in defaults:
+                default = self.unit_converter.parse_value(defaults[var_name])
+                if default is not None:
+                    column[:] = default
+                    filled[:] = True
+            for col_name in (var_name, var_info.get('display_name', var_name)):
+                if col_name in df.columns:
+                    col_index = df.columns.get_loc(col_name)
+                    for i, row in enumerate(positions):
+                        value = df.iat[row, col_index]
+                        if self._is_blank_cell(value):
+                            continue
+                        parsed = self.unit_converter.parse_value(value)
+                        column[i] = np.nan if parsed is None else parsed
+                        filled[i] = True
+            if var_name in config_defaults:
+                column[filled & np.isnan(column)] = config_defaults[var_name]
+            known[var_name] = column
+        return known
+
+    def solve_frame(self, known, n_rows, targets=None, cached=None):
+        """在整列数组上按拓扑顺序求解公式
+
+        Args:
+            known: parse_frame_inputs 返回的已知值数组，不会被修改
+            n_rows: 行数
+            targets: 需要求解的公式集合，None 表示全部公式
+            cached: (results, unsolved)，targets 之外的公式直接沿用其中的数组
+
+        Returns:
+            tuple: (results, unsolved)
+            - results: 变量名/公式名 -> 数组，无法求解的值为 NaN
+            - unsolved: 公式名 -> 布尔数组，True 表示该行无法求解
+        """
+        results = dict(known)
+        unsolved = {}
+        for name in self.formulas:
+            if targets is None or name in targets:
+                # 已知的输出不参与求解
+                results[name] = known[name].copy() if name in known else np.full(n_rows, np.nan)
+                unsolved[name] = np.isnan(results[name])
+            else:
+                results[name] = cached[0][name]
+                unsolved[name] = cached[1][name]
+
+        # 没有任何已知值的行不做计算，所有输出视为无法求解
+        has_known = np.zeros(n_rows, dtype=bool)
+        for values in known.values():
+            has_known |= ~np.isnan(values)
+        order = [name for name in self.formula_order if targets is None or name in targets]
+        attempted = {name: ~has_known for name in order}
+
+        made_progress = True
+        with np.errstate(all='ignore'):
+            while made_progress:
+                made_progress = False
+                for name in order:
+                    formula_data = self.formulas[name]
+                    eligible = unsolved[name] & ~attempted[name]
+                    for var in formula_data['variables']:
+                        if var not in results:
+                            eligible[:] = False
+                            break
+                        eligible &= ~np.isnan(results[var])
+                    if not eligible.any():
+                        continue
+                    attempted[name] |= eligible
+
+                    values = self._evaluate_formula_array(name, results, eligible)
+                    solved = eligible & np.isfinite(values)
+                    if solved.any():
+                        results[name][solved] = values[solved]
+                        unsolved[name] &= ~solved
+                        made_progress = True
+                # 无环时按拓扑顺序扫描一遍即可
+                if not self.formula_cycles:
+                    break
+
+        return results, unsolved
+
+    def get_affected_formulas(self, names):
+        """沿依赖图获取受指定变量影响的全部公式（含同名公式本身）"""
+        affected = {name for name in names if name in self.formulas}
+        pending = list(names)
+        while pending:
+            for dependent in self.formula_dependents.get(pending.pop(), ()):
+                if dependent not in affected:
+                    affected.add(dependent)
+                    pending.append(dependent)
+        return affected
+
+    def _evaluate_formula_array(self, name, results, mask):
+        """对整列求值单个公式，只有 mask 为 True 的行结果有效"""
+        formula_data = self.formulas[name]
+        n_rows = len(mask)
+        func = formula_data.get('func')
+        if func is not None:
+            try:
+                values = func(*[results[arg] for arg in formula_data['args']])
+                return np.broadcast_to(np.asarray(values, dtype=float), (n_rows,))
+            except Exception as e:
+                logger.warning(f"批量求值公式 {name} 失败: {str(e)}")
+                return np.full(n_rows, np.nan)
+
+        # 隐式方程逐行回退到 solve
+        values = np.full(n_rows, np.nan)
+        for row in np.flatnonzero(mask):
+            row_values = {var: results[var][row] for var in formula_data['variables']}
+            try:
+                value = self._evaluate_formula(name, row_values)
+            except Exception as e:
+                logger.warning(f"求解方程 {name} 失败: {str(e)}")
+                continue
+            if value is not None:
+                values[row] = value
+        return values
+
     def get_all_known_columns(self):
         """获取所有已知的列名（变量和公式的显示名）"""
         columns = set()
@@ -716,3 +1486,546 @@ class StorageCalculator:
         
         return ('unknown', None)
 
+
+
+def _changed_positions(old, new):
+    """两个对象数组中不相等的位置（两侧都为空视为相等），只对不相等的位置判断空值"""
+    positions = np.flatnonzero(old != new)
+    if len(positions):
+        both_missing = pd.isna(old[positions]) & pd.isna(new[positions])
+        positions = positions[~both_missing]
+    return positions
+
+
+def _same_cell(old, new):
+    if old is new:
+        return True
+    old_missing = old is None or (not isinstance(old, str) and pd.isna(old))
+    new_missing = new is None or (not isinstance(new, str) and pd.isna(new))
+    if old_missing or new_missing:
+        return old_missing and new_missing
+    return bool(old == new)
+
+
+class IncrementalCalculator:
+    """增量计算引擎
+
+    保存上一次计算的数据、解析后的输入和每行结果。再次计算时找出发生变化的输入单元格，
+    只对这些行、沿公式依赖图重算受影响的公式。调用方知道改动了哪些单元格时
+    （如 Web 表格编辑器的编辑记录）通过 changed 传入，只检查这些单元格；
+    否则逐列对比输入列。行按索引对齐，新增的行全量计算，删除的行直接丢弃；
+    配置重新加载、默认值或输入列变化时退回全量计算。
+    """
+
+    # 变化的行不超过该数目时逐个单元格解析，否则对这些行整列解析
+    CELL_PARSE_ROWS = 64
+
+    def __init__(self, calculator):
+        """
+        Args:
+            calculator: StorageCalculator 实例
+        """
+        self.calculator = calculator
+        self.last_stats = {}
+        self.reset()
+
+    def reset(self):
+        """清空缓存，下一次计算为全量计算"""
+        self._frame = None
+        self._known = None
+        self._results = None
+        self._unsolved = None
+        self._defaults = None
+        self._input_columns = None
+        self._formulas = None
+        self._affected = {}
+
+    def _get_input_columns(self, df):
+        """获取数据中的输入列，返回 列名 -> 变量名"""
+        columns = {}
+        for var_name, var_info in self.calculator.variables.items():
+            if var_info.get('can_be_input', False):
+                for col_name in (var_name, var_info.get('display_name', var_name)):
+                    if col_name in df.columns:
+                        columns[col_name] = var_name
+        return columns
+
+    def _needs_full_recompute(self, df, defaults, input_columns):
+        """判断缓存是否可用"""
+        return (
+            self._frame is None
+            or self._formulas is not self.calculator.formulas
+            or self._defaults != defaults
+            or self._input_columns != input_columns
+            or not df.index.is_unique
+        )
+
+    def _get_affected_formulas(self, names):
+        """受一组变量影响的公式，按变量集合缓存（配置重新加载时清空）"""
+        names = frozenset(names)
+        affected = self._affected.get(names)
+        if affected is None:
+            affected = frozenset(self.calculator.get_affected_formulas(names))
+            self._affected[names] = affected
+        return affected
+
+    def update(self, df, defaults=None, changed=None):
+        """计算整张表，只重算发生变化的部分
+
+        Args:
+            df: pandas.DataFrame，列名为显示名或变量名，索引需唯一
+            defaults: 变量名到默认值的映射，输入单元格为空时使用
+            changed: 调用方已知的发生变化的单元格，(行标签, 列名) 的可迭代对象；
+                None 表示逐列对比全部输入列。新增和删除的行按索引自动识别，不需要列出
+
+        Returns:
+            tuple: (results, unsolved, recomputed)
+            - results: DataFrame，列为变量名和公式名，未知或无法求解的值为 NaN
+            - unsolved: DataFrame，列为公式名，True 表示该行该公式无法求解
+            - recomputed: DataFrame，列为公式名，True 表示该单元格本次重新计算过
+        """
+        recomputed = self._compute(df, defaults, changed)
+        self._frame = df.copy()
+
+        index = df.index
+        formula_names = list(self.calculator.formulas)
+        return (
+            pd.DataFrame(self._results, index=index),
+            pd.DataFrame(self._unsolved, index=index, columns=formula_names),
+            pd.DataFrame(recomputed, index=index, columns=formula_names),
+        )
+
+    def _compute(self, df, defaults, changed):
+        """更新缓存的解析结果和计算结果，返回 公式名 -> 本次是否重算的布尔数组"""
+        calculator = self.calculator
+        defaults = dict(defaults or {})
+        input_columns = self._get_input_columns(df)
+        n_rows = len(df)
+
+        if self._needs_full_recompute(df, defaults, input_columns):
+            self._known = calculator.parse_frame_inputs(df, defaults)
+            self._results, self._unsolved = calculator.solve_frame(self._known, n_rows)
+            self._affected = {}
+            recomputed = {name: np.ones(n_rows, dtype=bool) for name in calculator.formulas}
+            self.last_stats = {'full': True, 'rows': n_rows, 'formulas': len(calculator.formulas)}
+        else:
+            recomputed = self._update_changed(df, defaults, input_columns, changed)
+
+        self._defaults = defaults
+        self._input_columns = input_columns
+        self._formulas = calculator.formulas
+        return recomputed
+
+    def _aligned_previous(self, df):
+        """按 df 的行索引对齐的上一次数据，以及新增行的标记"""
+        if df.index.equals(self._frame.index):
+            return self._frame, np.zeros(len(df), dtype=bool)
+        positions = self._frame.index.get_indexer(df.index)
+
+        # 按新索引对齐缓存，新增行先填充为未知
+        def align(values, fill):
+            return np.append(values, fill)[positions]
+
+        self._known = {name: align(values, np.nan) for name, values in self._known.items()}
+        self._results = {name: align(values, np.nan) for name, values in self._results.items()}
+        self._unsolved = {name: align(values, True) for name, values in self._unsolved.items()}
+        return self._frame.reindex(df.index), positions < 0
+
+    def _update_changed(self, df, defaults, input_columns, changed):
+        """对齐行索引并只重算变化的行和公式"""
+        calculator = self.calculator
+        n_rows = len(df)
+        old_frame, new_rows = self._aligned_previous(df)
+
+        # 找出发生变化的输入单元格，记录每行发生变化的变量
+        dirty_vars = {}
+        if changed is None:
+            for col_name, var_name in input_columns.items():
+                positions = _changed_positions(old_frame[col_name].to_numpy(dtype=object),
+                                               df[col_name].to_numpy(dtype=object))
+                for row in positions:
+                    if not new_rows[row]:
+                        dirty_vars.setdefault(row, set()).add(var_name)
+        else:
+            for label, col_name in changed:
+                var_name = input_columns.get(col_name)
+                if var_name is None or label not in df.index:
+                    continue
+                row = df.index.get_loc(label)
+                if new_rows[row]:
+                    continue
+                col_index = df.columns.get_loc(col_name)
+                if not _same_cell(old_frame.iat[row, old_frame.columns.get_loc(col_name)],
+                                  df.iat[row, col_index]):
+                    dirty_vars.setdefault(row, set()).add(var_name)
+
+        dirty_rows = np.flatnonzero(new_rows)
+        if dirty_vars:
+            dirty_rows = np.union1d(dirty_rows, np.fromiter(dirty_vars, dtype=int))
+
+        recomputed = {name: np.zeros(n_rows, dtype=bool) for name in calculator.formulas}
+        if len(dirty_rows) == 0:
+            self.last_stats = {'full': False, 'rows': 0, 'formulas': 0}
+            return recomputed
+
+        old_has_known = np.zeros(len(dirty_rows), dtype=bool)
+        for values in self._known.values():
+            old_has_known |= ~np.isnan(values[dirty_rows])
+        if len(dirty_rows) <= self.CELL_PARSE_ROWS:
+            sub_known = calculator.parse_frame_rows(df, dirty_rows, defaults)
+        else:
+            sub_known = calculator.parse_frame_inputs(df.iloc[dirty_rows], defaults)
+        new_has_known = np.zeros(len(dirty_rows), dtype=bool)
+        for name, values in sub_known.items():
+            self._known[name][dirty_rows] = values
+            new_has_known |= ~np.isnan(values)
+
+        # 按受影响的公式集合对行分组，每组只求解一次
+        all_formulas = frozenset(calculator.formulas)
+        groups = {}
+        for i, row in enumerate(dirty_rows):
+            if new_rows[row] or old_has_known[i] != new_has_known[i]:
+                targets = all_formulas
+            else:
+                targets = self._get_affected_formulas(dirty_vars[row])
+            if targets:
+                groups.setdefault(targets, []).append(i)
+
+        formula_count = 0
+        for targets, members in groups.items():
+            rows = dirty_rows[members]
+            known = {name: sub_known[name][members] for name in sub_known}
+            cached = (
+                {name: self._results[name][rows] for name in calculator.formulas},
+                {name: self._unsolved[name][rows] for name in calculator.formulas},
+            )
+            results, unsolved = calculator.solve_frame(known, len(rows), targets=targets, cached=cached)
+            for name in targets:
+                self._results[name][rows] = results[name]
+                self._unsolved[name][rows] = unsolved[name]
+                recomputed[name][rows] = True
+            formula_count = max(formula_count, len(targets))
+
+        for name, values in sub_known.items():
+            if name not in calculator.formulas:
+                self._results[name][dirty_rows] = values
+
+        self.last_stats = {'full': False, 'rows': len(dirty_rows), 'formulas': formula_count}
+        logger.debug(f"增量计算: {len(dirty_rows)} 行, 最多 {formula_count} 个公式")
+        return recomputed
+
+    def apply(self, df, defaults=None, changed=None):
+        """计算并把格式化后的结果写回输出列
+
+        只重新格式化重算过的单元格，以及与上一次输出不同（被手动改动）的输出单元格，
+        无法求解的输出置空。
+
+        Args:
+            df: pandas.DataFrame，列名为显示名或变量名
+            defaults: 变量名到默认值的映射
+            changed: 调用方已知的发生变化的单元格（见 update），
+                给出时只检查其中的输出单元格是否被手动改动
+
+        Returns:
+            DataFrame: 输出列已更新的数据（新对象）
+        """
+        calculator = self.calculator
+        previous = None
+        if self._frame is not None:
+            previous = self._frame if df.index.equals(self._frame.index) else self._frame.reindex(df.index)
+        recomputed = self._compute(df, defaults, changed)
+
+        output = df.copy()
+        var_to_col = calculator.get_variable_to_column_map()
+        edited = {}
+        if previous is not None and changed is not None:
+            for label, col_name in changed:
+                if col_name in output.columns and col_name in previous.columns and label in output.index:
+                    edited.setdefault(col_name, []).append(output.index.get_loc(label))
+
+        for name in calculator.formulas:
+            col_name = var_to_col.get(name, name)
+            if col_name not in output.columns:
+                continue
+            rows = recomputed[name]
+            if previous is not None and col_name in previous.columns:
+                if changed is None:
+                    manual = _changed_positions(previous[col_name].to_numpy(dtype=object),
+                                                output[col_name].to_numpy(dtype=object))
+                else:
+                    manual = edited.get(col_name, [])
+                if len(manual):
+                    rows = rows.copy()
+                    rows[manual] = True
+            positions = np.flatnonzero(rows)
+            if not len(positions):
+                continue
+
+            values = self._results[name][positions]
+            solved = ~self._unsolved[name][positions] & ~np.isnan(values)
+            formatted = iter(calculator.format_result_array(name, values[solved]))
+            col_index = output.columns.get_loc(col_name)
+            if output[col_name].dtype != object:
+                output[col_name] = output[col_name].astype(object)
+            output.iloc[positions, col_index] = [next(formatted) if ok else '' for ok in solved]
+
+        self._frame = output.copy()
+        return output
+
+
+class GoalSeeker:
+    """数值反向求解（goal seek）
+
+    给定一个输出的目标值，求某个输入变量的取值，例如“可用容量达到 2 PiB 需要多少块盘”。
+    把公式依赖图看作输入变量的数值函数，先在对数网格上整列求值找到变号区间，
+    再用 Brent 方法在区间内求根，不调用 sympy.solve。
+
+    - 结果按 (公式定义, 目标, 求解变量, 目标值, 固定输入) 做 LRU 缓存，重复的查询直接返回
+    - 同一 (目标, 求解变量) 的上一次解作为下一次搜索的起点（warm start），
+      交互式修改目标值或其他输入时只需在附近搜索
+    """
+
+    # 结果缓存的最大条目数
+    CACHE_SIZE = 256
+    # 对数网格：起点的 2^-SCAN_OCTAVES 到 2^SCAN_OCTAVES 倍，每倍 SCAN_STEPS 个点
+    SCAN_OCTAVES = 40
+    SCAN_STEPS = 4
+    MAX_ITERATIONS = 100
+
+    def __init__(self, calculator):
+        """
+        Args:
+            calculator: StorageCalculator 实例
+        """
+        self.calculator = calculator
+        self._cache = OrderedDict()  # 按最近使用排序，超出 CACHE_SIZE 时淘汰最久未用的
+        self._warm = {}
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def _formula_key(self):
+        return tuple((name, data['expression']) for name, data in self.calculator.formulas.items())
+
+    def _needed_formulas(self, target):
+        """目标公式及其依赖的全部公式"""
+        formulas = self.calculator.formulas
+        needed = set()
+        pending = [target]
+        while pending:
+            name = pending.pop()
+            if name in needed or name not in formulas:
+                continue
+            needed.add(name)
+            pending.extend(formulas[name]['variables'])
+        return needed
+
+    def _make_function(self, target, variable, fixed):
+        """构造 x 数组 -> 目标公式值数组 的函数"""
+        calculator = self.calculator
+        known_names = set(fixed) | {variable}
+        needed = self._needed_formulas(target)
+        if not any(variable in calculator.formulas[name]['variables'] for name in needed):
+            raise ValueError(f"{target} 不依赖 {variable}")
+        plan = [name for name in calculator.get_evaluation_plan(known_names) if name in needed]
+        if target not in plan:
+            raise ValueError(f"在给定的输入下无法求解 {target}")
+
+        def evaluate(x):
+            x = np.atleast_1d(np.asarray(x, dtype=float))
+            n_rows = len(x)
+            results = {name: np.full(n_rows, value) for name, value in fixed.items()}
+            results[variable] = x
+            mask = np.ones(n_rows, dtype=bool)
+            with np.errstate(all='ignore'):
+                for name in plan:
+                    values = calculator._evaluate_formula_array(name, results, mask)
+                    results[name] = np.where(np.isfinite(values), values, np.nan)
+            return results[target], results
+
+        return evaluate
+
+    def seek(self, target, goal, variable, fixed=None, bounds=None, integer=False, tol=1e-10):
+        """求解使 target 等于 goal 的 variable 取值
+
+        Args:
+            target: 目标公式名（或显示名）
+            goal: 目标值，可带单位（如 '2PiB'）
+            variable: 求解的输入变量名（或显示名）
+            fixed: 其他输入 变量名 -> 值（可带单位），未给出的使用配置默认值
+            bounds: (下界, 上界)，None 表示从起点向两侧按倍数搜索正数区间
+            integer: 是否要求整数解，为 True 时取不小于解的最小整数
+                （适用于“至少需要多少块盘”这类问题，假设目标随变量递增）
+            tol: 相对容差
+
+        Returns:
+            dict: value 解（无解为 None），converged 是否收敛，iterations 迭代次数，
+            evaluations 求值的点数，residual 目标值残差，bracket 变号区间，
+            warm_start 是否使用了上一次的解作为起点，cached 是否命中缓存，
+            achieved 解对应的目标值，results 解对应的全部变量值，message 说明
+        """
+        calculator = self.calculator
+        column_map = calculator.get_column_to_variable_map()
+        target = column_map.get(target, target)
+        variable = column_map.get(variable, variable)
+        if target not in calculator.formulas:
+            raise ValueError(f"未知的目标公式: {target}")
+
+        goal_value = calculator.unit_converter.parse_value(goal)
+        if goal_value is None:
+            raise ValueError(f"无法解析的目标值: {goal}")
+
+        values = calculator._default_values()
+        for name, value in (fixed or {}).items():
+            parsed = calculator.unit_converter.parse_value(value)
+            if parsed is not None:
+                values[column_map.get(name, name)] = parsed
+        # 求解变量和目标不能作为已知值
+        values.pop(variable, None)
+        values.pop(target, None)
+        if bounds is not None:
+            bounds = tuple(float(calculator.unit_converter.parse_value(bound)) for bound in bounds)
+
+        key = (
+            self._formula_key(), target, variable, goal_value,
+            tuple(sorted(values.items())), bounds, integer, tol,
+        )
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.stats['hits'] += 1
+            self._cache.move_to_end(key)
+            return {**cached, 'results': dict(cached['results']), 'cached': True}
+        self.stats['misses'] += 1
+
+        evaluate = self._make_function(target, variable, values)
+        warm_key = (target, variable)
+        start = self._warm.get(warm_key)
+        report = self._solve(evaluate, goal_value, bounds, start, tol)
+        report['warm_start'] = start is not None
+        report['cached'] = False
+
+        if report['value'] is not None and integer:
+            report['value'] = float(math.ceil(report['value'] - tol * max(abs(report['value']), 1.0)))
+        if report['value'] is not None:
+            achieved, results = evaluate(report['value'])
+            report['achieved'] = float(achieved[0])
+            report['results'] = {name: float(array[0]) for name, array in results.items()}
+            self._warm[warm_key] = report['value']
+        else:
+            report['achieved'] = None
+            report['results'] = {}
+
+        self._cache[key] = report
+        if len(self._cache) > self.CACHE_SIZE:
+            self._cache.popitem(last=False)
+        logger.debug(f"反向求解 {target}={goal} -> {variable}: {report['message']}")
+        # 返回副本，调用方修改结果不影响缓存
+        return {**report, 'results': dict(report['results'])}
+
+    def _solve(self, evaluate, goal, bounds, start, tol):
+        """找变号区间后用 Brent 方法求根"""
+        def residual(x):
+            return evaluate(x)[0] - goal
+
+        evaluations = 0
+        if bounds is not None:
+            low, high = bounds
+            grid = np.linspace(low, high, self.SCAN_STEPS * 16 + 1)
+        else:
+            center = start if start is not None and start > 0 else 1.0
+            exponents = np.arange(-self.SCAN_OCTAVES * self.SCAN_STEPS, self.SCAN_OCTAVES * self.SCAN_STEPS + 1)
+            grid = center * np.power(2.0, exponents / self.SCAN_STEPS)
+            center_index = self.SCAN_OCTAVES * self.SCAN_STEPS
+
+        # 整列求值一次得到所有网格点的残差
+        f_grid = residual(grid)
+        evaluations += len(grid)
+
+        exact = np.flatnonzero(f_grid == 0)
+        candidates = np.flatnonzero(np.sign(f_grid[:-1]) * np.sign(f_grid[1:]) < 0)
+        if len(exact):
+            index = exact[0]
+            return self._report(grid[index], True, 0, evaluations, 0.0, (float(grid[index]),) * 2, "网格点恰好为解")
+        if not len(candidates):
+            return self._report(None, False, 0, evaluations, None, None, "在搜索范围内找不到变号区间")
+
+        # 多个区间时取最靠近起点的
+        if bounds is None:
+            index = candidates[np.argmin(np.abs(candidates - center_index))]
+        else:
+            index = candidates[0]
+        a, b = grid[index], grid[index + 1]
+        fa, fb = f_grid[index], f_grid[index + 1]
+
+        value, iterations, calls, converged = self._brent(residual, a, b, fa, fb, tol, abs(goal))
+        evaluations += calls
+        final = float(residual(value)[0])
+        evaluations += 1
+        message = f"收敛: {iterations} 次迭代" if converged else f"未在 {self.MAX_ITERATIONS} 次迭代内收敛"
+        return self._report(value, converged, iterations, evaluations, final, (float(a), float(b)), message)
+
+    @staticmethod
+    def _report(value, converged, iterations, evaluations, residual, bracket, message):
+        return {
+            'value': None if value is None else float(value),
+            'converged': converged,
+            'iterations': iterations,
+            'evaluations': evaluations,
+            'residual': residual,
+            'bracket': bracket,
+            'message': message,
+        }
+
+    def _brent(self, residual, a, b, fa, fb, tol, scale):
+        """Brent 方法：区间 [a, b] 内 fa、fb 异号
+
+        Returns:
+            tuple: (根, 迭代次数, 求值次数, 是否收敛)
+        """
+        def f(x):
+            return float(residual(x)[0])
+
+        ftol = tol * max(scale, 1.0)
+        if abs(fa) < abs(fb):
+            a, b, fa, fb = b, a, fb, fa
+        c, fc = a, fa
+        d = e = b - a
+        calls = 0
+        for iteration in range(1, self.MAX_ITERATIONS + 1):
+            xtol = 2 * tol * max(abs(b), 1e-300) + 1e-300
+            m = 0.5 * (c - b)
+            if abs(fb) <= ftol or abs(m) <= xtol:
+                return b, iteration, calls, True
+
+            if abs(e) >= xtol and abs(fa) > abs(fb):
+                # 逆二次插值，退化时用割线法
+                s = fb / fa
+                if a == c:
+                    p = 2 * m * s
+                    q = 1 - s
+                else:
+                    q_ = fa / fc
+                    r = fb / fc
+                    p = s * (2 * m * q_ * (q_ - r) - (b - a) * (r - 1))
+                    q = (q_ - 1) * (r - 1) * (s - 1)
+                if p > 0:
+                    q = -q
+                p = abs(p)
+                if 2 * p < min(3 * m * q - abs(xtol * q), abs(e * q)):
+                    e, d = d, p / q
+                else:
+                    d = e = m
+            else:
+                d = e = m
+
+            a, fa = b, fb
+            b = b + d if abs(d) > xtol else b + math.copysign(xtol, m)
+            fb = f(b)
+            calls += 1
+            if not math.isfinite(fb):
+                return b, iteration, calls, False
+            if (fb > 0) == (fc > 0):
+                c, fc = a, fa
+                d = e = b - a
+            if abs(fc) < abs(fb):
+                a, b, c = b, c, b
+                fa, fb, fc = fb, fc, fb
+        return b, self.MAX_ITERATIONS, calls, False
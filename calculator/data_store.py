@@ -0,0 +1,331 @@
+"""
+数据持久化：追加写的变更日志 + 列式快照
+
+每次保存只把与上一次保存相比变化的单元格追加到日志文件（journal.jsonl，
+一行一条记录），不再复制和重写整个工作簿。日志积累到一定大小后压缩为
+列式快照（snapshot.npz，按列保存的数组），并清空日志。
+启动时加载最新的快照，再重放快照之后的日志。
+
+快照用 numpy 的 npz 格式：数值、布尔、时间列按原 dtype 保存为数组，
+其他列（字符串等）的值和全部元数据以 JSON 保存，读取时 allow_pickle=False，
+打开快照文件不会执行任何代码。各列的 dtype 在加载后恢复。
+
+目录结构：
+    store_dir/
+        snapshot.npz      列式快照，包含已合并的最后一条日志序号
+        journal.jsonl     快照之后的变更记录
+
+日志记录格式（JSON）：
+    {"seq": 12, "ts": 1700000000.0,
+     "columns": [...],          # 列发生变化（增删、重命名、调整顺序）时的新列名
+     "index": [...],            # 行发生变化（增删、调整顺序）时的新行标签
+     "dtypes": [...],           # 列的 dtype 发生变化时各列的新 dtype
+     "set": [[行标签, 列名, 值], ...]}
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger('StorageCalculator')
+
+
+def _to_json_value(value):
+    """单元格值转为可写入 JSON 的值，空值为 None"""
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, (str, int, float, bool)):
+        return value
+    if pd.isna(value):
+        return None
+    return str(value)
+
+
+def _to_json_label(label):
+    return label.item() if isinstance(label, np.generic) else label
+
+
+def _dtype_names(frame):
+    return [str(dtype) for dtype in frame.dtypes]
+
+
+def _is_array_dtype(dtype):
+    """可以不经 pickle 直接保存到 npz 的 dtype（数值、布尔、时间）"""
+    return isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+
+
+def _restore_dtype(series, dtype):
+    """把列转换回保存时的 dtype，无法转换时（如新增的值类型不同）推断 dtype"""
+    if str(series.dtype) == dtype:
+        return series
+    try:
+        return series.astype(dtype)
+    except (TypeError, ValueError):
+        return series.infer_objects()
+
+
+class DataStore:
+    """表格数据的追加写存储
+
+    线程安全：Streamlit 的多个会话共享同一个实例时，保存操作串行执行。
+    """
+
+    SNAPSHOT_FILE = 'snapshot.npz'
+    JOURNAL_FILE = 'journal.jsonl'
+    SNAPSHOT_VERSION = 2
+    # 日志记录数或大小超过阈值时压缩为快照
+    COMPACT_RECORDS = 200
+    COMPACT_BYTES = 4 * 1024 * 1024
+
+    def __init__(self, store_dir):
+        """
+        Args:
+            store_dir: 存储目录，不存在时在第一次保存时创建
+        """
+        self.store_dir = store_dir
+        self.snapshot_path = os.path.join(store_dir, self.SNAPSHOT_FILE)
+        self.journal_path = os.path.join(store_dir, self.JOURNAL_FILE)
+        self._lock = threading.Lock()
+        self._frame = None      # 最后一次持久化的数据，用于计算差异
+        self._seq = 0           # 最后一条日志的序号
+        self._records = 0       # 快照之后的日志记录数
+        self.stats = {'saves': 0, 'cells': 0, 'compactions': 0}
+
+    def exists(self):
+        """是否有已保存的数据"""
+        return os.path.exists(self.snapshot_path) or os.path.exists(self.journal_path)
+
+    def load(self):
+        """加载快照并重放日志
+
+        Returns:
+            DataFrame: 最后一次保存的数据；没有数据时返回 None
+        """
+        with self._lock:
+            if not self.exists():
+                return None
+            self._load()
+            return self._frame.copy()
+
+    def _load(self):
+        frame, seq = self._read_snapshot()
+        self._records = 0
+        for record in self._read_journal():
+            if record['seq'] <= seq:
+                # 压缩快照后、清空日志前中断时残留的记录
+                continue
+            frame = self._apply(frame, record)
+            seq = record['seq']
+            self._records += 1
+        self._frame = frame
+        self._seq = seq
+        logger.debug(f"已加载数据: {len(frame)} 行, 快照之后 {self._records} 条日志")
+
+    def save(self, df):
+        """保存数据：只追加与上一次保存相比变化的部分
+
+        Args:
+            df: 要保存的 DataFrame
+
+        Returns:
+            int: 本次写入的单元格数（列或行的结构变化不计入），无变化时为 0
+        """
+        with self._lock:
+            if self._frame is None and self.exists():
+                self._load()
+
+            # 首次保存或大部分单元格都变化时，直接写快照比逐个记录单元格更省
+            max_cells = df.size // 2 if self._frame is not None and len(self._frame) else 0
+            record = self._diff(self._frame, df, max_cells)
+            if record is None:
+                return 0
+            if record is False:
+                self._frame = df.copy()
+                self._seq += 1
+                self._compact()
+                self.stats['saves'] += 1
+                self.stats['cells'] += df.size
+                return df.size
+
+            os.makedirs(self.store_dir, exist_ok=True)
+            self._seq += 1
+            record = dict(seq=self._seq, ts=time.time(), **record)
+            line = json.dumps(record, ensure_ascii=False, separators=(',', ':'))
+            with open(self.journal_path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+            self._frame = df.copy()
+            self._records += 1
+            cells = len(record.get('set', []))
+            self.stats['saves'] += 1
+            self.stats['cells'] += cells
+            logger.debug(f"已追加变更记录 {self._seq}: {cells} 个单元格")
+
+            if self._records >= self.COMPACT_RECORDS or os.path.getsize(self.journal_path) >= self.COMPACT_BYTES:
+                self._compact()
+            return cells
+
+    def compact(self):
+        """把当前数据写为快照并清空日志"""
+        with self._lock:
+            if self._frame is None:
+                return
+            self._compact()
+
+    def export_excel(self, file_path, sheet_name='计算数据'):
+        """把最后一次保存的数据导出为 Excel 文件"""
+        frame = self.load()
+        if frame is None:
+            raise FileNotFoundError(f"没有已保存的数据: {self.store_dir}")
+        frame.to_excel(file_path, index=False, sheet_name=sheet_name)
+        return len(frame)
+
+    def _compact(self):
+        """写快照（先写临时文件再替换，保证原子性），然后清空日志"""
+        frame = self._frame
+        arrays = {}
+        values = {}
+        for i in range(frame.shape[1]):
+            column = frame.iloc[:, i]
+            if _is_array_dtype(column.dtype):
+                arrays[f'column_{i}'] = column.to_numpy()
+            else:
+                values[str(i)] = [_to_json_value(value) for value in column.to_numpy(dtype=object)]
+        meta = {
+            'version': self.SNAPSHOT_VERSION,
+            'seq': self._seq,
+            'columns': [_to_json_label(label) for label in frame.columns],
+            'index': [_to_json_label(label) for label in frame.index],
+            'dtypes': _dtype_names(frame),
+            'values': values,
+        }
+        arrays['meta'] = np.frombuffer(json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+
+        os.makedirs(self.store_dir, exist_ok=True)
+        temp_path = self.snapshot_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        # 快照已包含全部日志，此时中断也只会留下会被跳过的旧记录
+        open(self.journal_path, 'w').close()
+        self._records = 0
+        self.stats['compactions'] += 1
+        logger.debug(f"已压缩为快照: {len(frame)} 行, 序号 {self._seq}")
+
+    def _read_snapshot(self):
+        if not os.path.exists(self.snapshot_path):
+            return pd.DataFrame(), 0
+        with np.load(self.snapshot_path, allow_pickle=False) as snapshot:
+            meta = json.loads(snapshot['meta'].tobytes().decode('utf-8'))
+            if meta.get('version') != self.SNAPSHOT_VERSION:
+                raise ValueError(f"不支持的快照版本: {meta.get('version')}")
+            index = pd.Index(meta['index']) if meta['index'] else None
+            data = {}
+            for i, dtype in enumerate(meta['dtypes']):
+                if f'column_{i}' in snapshot:
+                    data[i] = pd.Series(snapshot[f'column_{i}'], index=index)
+                else:
+                    data[i] = _restore_dtype(pd.Series(meta['values'][str(i)], index=index, dtype=object), dtype)
+        frame = pd.DataFrame(data, index=index)
+        frame.columns = meta['columns']
+        return frame, meta['seq']
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    # 最后一条记录写到一半时中断
+                    logger.warning(f"忽略损坏的变更记录: {self.journal_path} 第 {line_number} 行")
+                    return
+
+    @staticmethod
+    def _apply(frame, record):
+        """把一条日志记录应用到数据上，各列保持原来（或记录中）的 dtype"""
+        previous = dict(zip(frame.columns, _dtype_names(frame)))
+        if 'columns' in record:
+            frame = frame.reindex(columns=record['columns'])
+        if 'index' in record:
+            frame = frame.reindex(index=pd.Index(record['index']))
+        updates = {}
+        for row, column, value in record.get('set', []):
+            updates.setdefault(column, ([], []))
+            updates[column][0].append(row)
+            updates[column][1].append(value)
+        if updates:
+            frame = frame.copy()
+            for column, (rows, values) in updates.items():
+                column_values = frame[column].to_numpy(dtype=object, copy=True)
+                column_values[frame.index.get_indexer(rows)] = values
+                frame[column] = column_values
+
+        dtypes = record.get('dtypes') or [previous.get(column, 'object') for column in frame.columns]
+        for i, dtype in enumerate(dtypes):
+            column = frame.iloc[:, i]
+            if str(column.dtype) != dtype:
+                frame.isetitem(i, _restore_dtype(column, dtype))
+        return frame
+
+    @staticmethod
+    def _diff(old, new, max_cells=None):
+        """计算从 old 到 new 的日志记录
+
+        Returns:
+            dict: 日志记录；无变化时返回 None；
+            变化的单元格数超过 max_cells 时返回 False（应直接写快照）
+        """
+        record = {}
+        if old is None:
+            old = pd.DataFrame()
+        if list(new.columns) != list(old.columns):
+            record['columns'] = list(new.columns)
+        if not new.index.equals(old.index):
+            record['index'] = [_to_json_label(label) for label in new.index]
+        if 'columns' in record or _dtype_names(new) != _dtype_names(old):
+            record['dtypes'] = _dtype_names(new)
+
+        # 按新的行列对齐后逐列比较，新增的行列与空值比较
+        reshaped = 'columns' in record or 'index' in record
+        aligned = old.reindex(index=new.index, columns=new.columns) if reshaped else old
+        changed = []
+        total = 0
+        for i in range(new.shape[1]):
+            new_values = new.iloc[:, i].to_numpy(dtype=object)
+            old_values = aligned.iloc[:, i].to_numpy(dtype=object)
+            positions = np.flatnonzero(old_values != new_values)
+            if len(positions):
+                # 只对不相等的位置判断空值（NaN != NaN）
+                both_missing = pd.isna(old_values[positions]) & pd.isna(new_values[positions])
+                positions = positions[~both_missing]
+            if len(positions):
+                changed.append((i, positions, new_values))
+                total += len(positions)
+                if max_cells is not None and total > max_cells:
+                    return False
+
+        if changed:
+            labels = new.index
+            record['set'] = [
+                [_to_json_label(labels[position]), new.columns[i], _to_json_value(values[position])]
+                for i, positions, values in changed
+                for position in positions
+            ]
+        return record or None
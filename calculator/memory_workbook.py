@@ -0,0 +1,155 @@
+"""
+内存工作簿
+
+模拟 ExcelHandler 用到的 xlwings 接口子集（sheets.active、sheet.range、
+used_range、options(ndim=2)），数据保存在内存中，用于在没有 Excel 的
+环境（如 Linux）下测试和压测 Excel 处理流程。
+
+每次读写 .value 记为一次往返（对应一次 COM/AppleScript 调用），
+可通过 round_trips 统计访问次数。
+"""
+
+
+class MemoryRange:
+    """单元格区域，行列号从 1 开始"""
+
+    def __init__(self, sheet, top, left, bottom, right, ndim=None):
+        self.sheet = sheet
+        self.top = top
+        self.left = left
+        self.bottom = bottom
+        self.right = right
+        self.ndim = ndim
+
+    @property
+    def row(self):
+        return self.top
+
+    @property
+    def column(self):
+        return self.left
+
+    @property
+    def last_cell(self):
+        return MemoryRange(self.sheet, self.bottom, self.right, self.bottom, self.right)
+
+    def options(self, ndim=None, **kwargs):
+        """只支持 ndim=2，其余选项忽略"""
+        return MemoryRange(self.sheet, self.top, self.left, self.bottom, self.right, ndim=ndim)
+
+    @property
+    def value(self):
+        """与 xlwings 一致：单个单元格返回标量，单行/单列返回列表，否则返回二维列表"""
+        self.sheet.round_trips += 1
+        data = [
+            [self.sheet.cells.get((row, col)) for col in range(self.left, self.right + 1)]
+            for row in range(self.top, self.bottom + 1)
+        ]
+        if self.ndim == 2:
+            return data
+        if len(data) == 1 and len(data[0]) == 1:
+            return data[0][0]
+        if len(data) == 1:
+            return data[0]
+        if self.left == self.right:
+            return [line[0] for line in data]
+        return data
+
+    @value.setter
+    def value(self, data):
+        """写入标量或二维列表（从区域左上角开始展开），一维列表按行写入"""
+        self.sheet.round_trips += 1
+        if not isinstance(data, (list, tuple)):
+            data = [[data]]
+        elif data and not isinstance(data[0], (list, tuple)):
+            data = [data]
+        for i, line in enumerate(data):
+            for j, value in enumerate(line):
+                self.sheet.set_cell(self.top + i, self.left + j, value)
+
+
+class MemorySheet:
+    """内存工作表"""
+
+    def __init__(self, name='Sheet1', rows=None):
+        """
+        Args:
+            name: 工作表名称
+            rows: 二维列表，从 A1 开始填充（通常第一行为标题行）
+        """
+        self.name = name
+        self.cells = {}
+        self.round_trips = 0
+        # 已用区域的 (最后一行, 最后一列)，清空单元格后为 None，下次访问时重新计算
+        self._bounds = (0, 0)
+        for i, line in enumerate(rows or [], 1):
+            for j, value in enumerate(line, 1):
+                self.set_cell(i, j, value)
+
+    def set_cell(self, row, col, value):
+        """设置单元格，None 表示清空"""
+        if value is None:
+            if self.cells.pop((row, col), None) is not None:
+                self._bounds = None
+        else:
+            self.cells[(row, col)] = value
+            if self._bounds is not None:
+                self._bounds = (max(self._bounds[0], row), max(self._bounds[1], col))
+
+    def range(self, cell1, cell2=None):
+        """支持 (row, col)、两个 (row, col) 以及 '1:1' 形式的整行地址"""
+        if isinstance(cell1, str):
+            first, _, last = cell1.partition(':')
+            top, bottom = int(first), int(last or first)
+            return MemoryRange(self, top, 1, bottom, max(self.used_range.right, 1))
+        top, left = cell1
+        bottom, right = cell2 if cell2 is not None else cell1
+        return MemoryRange(self, top, left, bottom, right)
+
+    @property
+    def used_range(self):
+        """与 Excel 一致：从 A1 到最后一个非空单元格所在的行列"""
+        if not self.cells:
+            return MemoryRange(self, 1, 1, 1, 1)
+        if self._bounds is None:
+            self._bounds = (max(row for row, _ in self.cells), max(col for _, col in self.cells))
+        return MemoryRange(self, 1, 1, *self._bounds)
+
+
+class MemorySheets:
+    """工作表集合"""
+
+    def __init__(self, sheets):
+        self._sheets = list(sheets)
+        self.active = self._sheets[0]
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return self._sheets[key]
+        for sheet in self._sheets:
+            if sheet.name == key:
+                return sheet
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._sheets)
+
+    def __len__(self):
+        return len(self._sheets)
+
+
+class MemoryWorkbook:
+    """内存工作簿，可替代 xlwings.Book 传给 ExcelHandler"""
+
+    def __init__(self, rows=None, name='Sheet1'):
+        """
+        Args:
+            rows: 活动工作表的初始内容（二维列表，第一行为标题行）
+            name: 活动工作表名称
+        """
+        self.sheets = MemorySheets([MemorySheet(name, rows)])
+        self.saved = 0
+
+    def save(self, path=None):
+        """只记录保存次数"""
+        self.saved += 1
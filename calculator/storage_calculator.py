@@ -2,10 +2,13 @@ import time
 import os
 import sys
 import logging
-import re
 import importlib
+import threading
 from pathlib import Path
 
+# 模块开始加载的时间，用于 --startup-profile 统计启动总耗时
+_startup_start = time.time()
+
 class TimingStats:
     """用于记录和统计时间的工具类"""
     def __init__(self):
@@ -61,6 +64,30 @@ class TimingStats:
 
         return result
 
+    def get_import_profile(self):
+        """按耗时从高到低返回各模块导入耗时
+
+        Returns:
+            list: [(模块名, 耗时秒数, 占总导入时间的比例)]
+        """
+        total = sum(duration for _, duration in self.import_times)
+        profile = sorted(self.import_times, key=lambda item: item[1], reverse=True)
+        return [(name, duration, duration / total if total else 0.0) for name, duration in profile]
+
+    def print_import_profile(self, startup_time=None):
+        """打印启动阶段的模块导入耗时报告
+
+        Args:
+            startup_time: 从进程启动到报告时的总耗时（秒），为 None 时不打印
+        """
+        print("\n启动耗时分析:")
+        print(f"  {'模块':<36}{'耗时':>10}{'占比':>8}")
+        for name, duration, share in self.get_import_profile():
+            print(f"  {name:<36}{duration:>9.3f}秒{share:>8.1%}")
+        print(f"  总导入时间: {sum(duration for _, duration in self.import_times):.3f}秒")
+        if startup_time is not None:
+            print(f"  启动总耗时: {startup_time:.3f}秒")
+
     def print_stats(self):
         """打印统计信息"""
         stats = self.get_stats()
@@ -97,30 +124,42 @@ def time_import(module_name):
     timing.add_import_time(module_name, duration)
     return module
 
+class LazyModule:
+    """延迟导入的模块代理，首次访问属性时才通过 time_import 导入并计时"""
+
+    def __init__(self, module_name):
+        self._module_name = module_name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = time_import(self._module_name)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __repr__(self):
+        state = '已导入' if self._module is not None else '未导入'
+        return f"<LazyModule {self._module_name} ({state})>"
+
 # 记录主要依赖库的导入时间
 timing.start('total_imports')
 
-# 导入基础库
+# 类定义需要 FileSystemEventHandler 作为基类，只能直接导入
 watchdog_events = time_import('watchdog.events')
-watchdog_observers = time_import('watchdog.observers')
 FileSystemEventHandler = watchdog_events.FileSystemEventHandler
-Observer = watchdog_observers.Observer
-
-# 导入计算相关库
-np = time_import('numpy')
-sympy_module = time_import('sympy')
-symbols = sympy_module.symbols
-Eq = sympy_module.Eq
-solve = sympy_module.solve
-Symbol = sympy_module.Symbol
-pretty_print = sympy_module.pretty_print
-sympify = sympy_module.sympify
-parse_expr = time_import('sympy.parsing.sympy_parser').parse_expr
-
-# 导入数据处理库
-# pd = time_import('pandas')
-yaml = time_import('yaml')
-xw = time_import('xlwings')
+
+# 其余依赖在代码路径真正用到时才导入
+watchdog_observers = LazyModule('watchdog.observers')
+np = LazyModule('numpy')
+sympy = LazyModule('sympy')
+sympy_parser = LazyModule('sympy.parsing.sympy_parser')
+pd = LazyModule('pandas')
+yaml = LazyModule('yaml')
+xw = LazyModule('xlwings')
+# 增量计算引擎与单位转换（依赖 numpy/pandas/sympy）
+calculator_core = LazyModule('calculator_core')
 
 timing.end('total_imports')
 
@@ -192,8 +231,141 @@ def setup_logging(config_path='config.yaml'):
 # 创建全局logger
 logger = setup_logging()
 
+
+# 文件变更事件的默认防抖窗口（秒）
+DEFAULT_DEBOUNCE_WINDOW = 0.5
+
+class ChangeDebouncer:
+    """文件变更事件的防抖与合并
+
+    submit() 记录发生变更的文件，window 秒内没有新事件后把累计的文件合并为
+    一次处理，由单个工作线程执行（start() 启动的后台线程，或循环调用
+    run_pending() 的线程，例如必须在主线程操作 Excel 的监听循环）。
+    处理过程中又有新事件到达时，传给回调的 cancel 会被置位，回调应尽早放弃
+    过期的结果；被取消的文件并入下一次处理。
+    """
+
+    def __init__(self, callback, window=DEFAULT_DEBOUNCE_WINDOW, max_delay=None, name='ChangeDebouncer'):
+        """
+        Args:
+            callback: 处理函数 callback(paths, cancel)，paths 为排序后的文件列表，
+                cancel 为 threading.Event
+            window: 防抖窗口（秒），窗口内的新事件会顺延处理时间
+            max_delay: 第一个事件到处理开始的最长等待（秒），默认为 window 的 10 倍，
+                避免持续不断的事件一直推迟处理
+            name: 日志和工作线程使用的名称
+        """
+        self.callback = callback
+        self.window = window
+        self.max_delay = window * 10 if max_delay is None else max_delay
+        self.name = name
+        self._cond = threading.Condition()
+        self._pending = set()
+        self._pending_events = 0
+        self._first_event = None
+        self._deadline = None
+        self._cancel = None  # 正在执行的处理的取消标记
+        self._thread = None
+        self._stopped = False
+        self.stats = {'events': 0, 'coalesced': 0, 'runs': 0, 'cancelled': 0, 'failed': 0}
+
+    def submit(self, path):
+        """记录一次文件变更事件（可在任意线程调用）"""
+        with self._cond:
+            now = time.monotonic()
+            if not self._pending:
+                self._first_event = now
+            self._pending.add(path)
+            self._pending_events += 1
+            self.stats['events'] += 1
+            self._deadline = min(now + self.window, self._first_event + self.max_delay)
+            # 正在执行的处理已经过期
+            if self._cancel is not None:
+                self._cancel.set()
+            self._cond.notify_all()
+
+    def get_stats(self):
+        """获取事件计数：收到的事件、被合并的事件、处理次数、被取消和失败的处理次数"""
+        with self._cond:
+            return dict(self.stats, pending=self._pending_events)
+
+    def run_pending(self, timeout=None):
+        """等待防抖窗口结束后执行一次处理
+
+        Args:
+            timeout: 最长等待时间（秒），None 表示一直等待
+
+        Returns:
+            bool: 是否执行了处理
+        """
+        end = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while True:
+                if self._stopped:
+                    return False
+                now = time.monotonic()
+                if self._pending and now >= self._deadline:
+                    break
+                wait = self._deadline - now if self._pending else None
+                if end is not None:
+                    if now >= end:
+                        return False
+                    wait = end - now if wait is None else min(wait, end - now)
+                self._cond.wait(wait)
+
+            paths = self._pending
+            events = self._pending_events
+            self._pending = set()
+            self._pending_events = 0
+            self.stats['runs'] += 1
+            self.stats['coalesced'] += max(events - 1, 0)
+            cancel = self._cancel = threading.Event()
+
+        logger.debug(f"{self.name}: 合并 {events} 个事件，处理 {len(paths)} 个文件")
+        try:
+            self.callback(sorted(paths), cancel)
+        except Exception as e:
+            with self._cond:
+                self.stats['failed'] += 1
+            logger.error(f"{self.name}: 处理文件变更失败: {str(e)}", exc_info=True)
+        finally:
+            with self._cond:
+                self._cancel = None
+                if cancel.is_set() and not self._stopped:
+                    # 过期的处理被取消，文件并入下一次处理
+                    self.stats['cancelled'] += 1
+                    if not self._pending:
+                        self._first_event = time.monotonic()
+                        self._deadline = self._first_event + self.window
+                    self._pending |= paths
+                    self._cond.notify_all()
+        return True
+
+    def start(self):
+        """启动后台工作线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped:
+            self.run_pending(timeout=0.5)
+
+    def stop(self, timeout=2):
+        """停止工作线程，并通知正在执行的处理取消"""
+        with self._cond:
+            self._stopped = True
+            if self._cancel is not None:
+                self._cancel.set()
+            self._cond.notify_all()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=timeout)
+        self._thread = None
+
 class FormulaWatcher(FileSystemEventHandler):
-    def __init__(self, calculator):
+    def __init__(self, calculator, debounce_window=DEFAULT_DEBOUNCE_WINDOW):
         self.calculator = calculator
         self.last_modified = 0
         self.retry_count = 3
@@ -201,207 +373,29 @@ class FormulaWatcher(FileSystemEventHandler):
         # 改为监听整个配置目录
         self.watch_dir = os.path.abspath(calculator.formula_dir)
         logger.debug(f"监听配置目录: {self.watch_dir}")
+        # 一次保存产生的多个事件、同时修改的多个文件合并为一次重新加载
+        self.debouncer = ChangeDebouncer(self._reload, window=debounce_window, name='FormulaWatcher')
 
     def on_modified(self, event):
         # 检查是否是yaml文件修改
         if event.src_path.endswith('.yaml') and os.path.dirname(event.src_path) == self.watch_dir:
-            current_time = time.time()
-            if current_time - self.last_modified < 1:
-                return
-            self.last_modified = current_time
-            logger.info(f"检测到配置文件 {os.path.basename(event.src_path)} 更改，准备重新加载")
-            self.calculator.load_config()
-
-class UnitConverter:
-    """单位转换工具类"""
-
-    # 定义单位换算基数
-    BINARY_BASE = 1024  # 二进制单位(Ki, Mi, Gi, Ti, Pi)
-    DECIMAL_BASE = 1000  # 十进制单位(K, M, G, T, P)
-
-    # 单位定义
-    BINARY_UNITS = [
-        (1024**4, 'TiB'),
-        (1024**3, 'GiB'),
-        (1024**2, 'MiB'),
-        (1024**1, 'KiB'),
-        (1, 'B')
-    ]
-
-    DECIMAL_UNITS = [
-        (1000**4, 'TB'),
-        (1000**3, 'GB'),
-        (1000**2, 'MB'),
-        (1000**1, 'KB'),
-        (1, 'B')
-    ]
-
-    # 特殊单位映射（非1024/1000倍数关系的单位）
-    SPECIAL_UNITS = {
-        '%': {'base': 0.01, 'format': lambda x: f"{x*100:.2f}%"},
-        '个': {'base': 1, 'format': lambda x: f"{x:.0f}个"},
-        # 'MiB/s': {'base': 1, 'format': lambda x: f"{x:.2f}MiB/s"}
-    }
+            self.last_modified = time.time()
+            logger.debug(f"检测到配置文件 {os.path.basename(event.src_path)} 更改")
+            self.debouncer.submit(event.src_path)
 
-    @classmethod
-    def _parse_unit_prefix(cls, unit):
-        """增强单位前缀解析能力"""
-        # 统一处理单位格式
-        unit = unit.strip().lower()
-        if unit.endswith('/s'):  # 保留速率单位特征
-            base_unit = unit[:-2]
-            suffix = '/s'
-        else:
-            base_unit = unit
-            suffix = ''
-
-        # 扩展单位别名映射
-        unit_aliases = {
-            'mib': 'mebibytes',
-            'mb': 'megabytes',
-            'gib': 'gibibytes',
-            'gb': 'gigabytes',
-            'tib': 'tebibytes',
-            'tb': 'terabytes'
-        }
-
-        # 处理带/的复合单位
-        if '/' in base_unit:
-            numerator, denominator = base_unit.split('/', 1)
-            return unit, 1, False  # 暂不处理复杂单位
-
-        # 处理二进制单位
-        binary_units = {
-            'kib': 1024**1, 'mib': 1024**2,
-            'gib': 1024**3, 'tib': 1024**4,
-            'pib': 1024**5
-        }
-        if base_unit in binary_units:
-            # 修正大小写：首字母大写，i保持小写，B大写 (e.g. MiB)
-            formatted = f"{base_unit[0].upper()}{base_unit[1]}B{suffix}"
-            return formatted, binary_units[base_unit], True
-
-        # 处理十进制单位
-        decimal_units = {
-            'kb': 1000**1, 'mb': 1000**2,
-            'gb': 1000**3, 'tb': 1000**4,
-            'pb': 1000**5
-        }
-        if base_unit in decimal_units:
-            # 修正大小写：首字母大写，B大写 (e.g. MB)
-            formatted = f"{base_unit[0].upper()}B{suffix}"
-            return formatted, decimal_units[base_unit], False
-
-        # 处理无前缀单位
-        if base_unit in ['b', 'bytes']:
-            return f"B{suffix}", 1, True
-
-        return None, 1, False
-
-    @classmethod
-    def parse_value(cls, value):
-        """增强带复杂单位的解析能力"""
-        try:
-            # 增强科学计数法处理
-            if isinstance(value, str) and 'e' in value.lower():
-                match = re.match(r'^([\d\.e+-]+)\s*([a-z%]*)$', value, re.I)
-                if match:
-                    number_part, unit_part = match.groups()
-                    return float(number_part) * cls._parse_unit_prefix(unit_part)[1]
-
-            # 处理特殊单位
-            if isinstance(value, str) and '%' in value:
-                return float(value.replace('%', '')) * 0.01
-
-            # 其余保持原有逻辑...
-            if value is None:
-                return None
-
-            try:
-                # 如果是数字，直接返回
-                if isinstance(value, (int, float)):
-                    return float(value)
-
-                # 转换为字符串并清理
-                value_str = str(value).strip()
-                if not value_str:
-                    return None
-
-                # 分离数值和单位
-                import re
-                match = re.match(r'^([-+]?\d*\.?\d+)\s*(.*)$', value_str)
-                if not match:
-                    return float(value_str) if value_str.replace('.','',1).isdigit() else None
-
-                number, unit = match.groups()
-                number = float(number)
-                unit = unit.strip()
-
-                if not unit:
-                    return number
-
-                # 获取单位信息
-                unit_info, factor, is_binary = cls._parse_unit_prefix(unit)
-                if unit_info is None:
-                    return number
-
-                # 特殊单位处理
-                if unit_info in cls.SPECIAL_UNITS:
-                    return number * cls.SPECIAL_UNITS[unit_info]['base']
-
-                # 转换为基本单位
-                logger.debug(f"解析值: {value_str} -> 数值: {number} 单位: {unit}")
-                parsed = number * factor
-                logger.debug(f"解析结果: {parsed} 基本单位")
-                return parsed
-
-            except (ValueError, TypeError):
-                return None
-
-        except Exception as e:
-            logger.error(f"解析错误: {value} -> {str(e)}")
-            return None
-
-    @classmethod
-    def format_value(cls, value, target_unit=None, use_binary=True):
-        """格式化数值，自动选择合适的单位"""
-        if value is None:
-            return None
-
-        try:
-            value = float(value)
-        except (ValueError, TypeError):
-            return str(value)
-
-        # 优先处理用户明确指定的单位
-        if target_unit:
-            # 检查是否是特殊单位
-            if target_unit in cls.SPECIAL_UNITS:
-                return cls.SPECIAL_UNITS[target_unit]['format'](value)
-
-            # 尝试解析标准单位
-            unit_info, factor, is_binary = cls._parse_unit_prefix(target_unit)
-
-            # 如果无法识别单位，直接附加原单位
-            if unit_info is None or factor == 1:
-                return f"{value:.2f} {target_unit}"
-
-            # 标准单位转换
-            converted_value = value / factor
-            return f"{converted_value:.2f} {unit_info}"
-
-        # 选择单位系统
-        units = cls.BINARY_UNITS if use_binary else cls.DECIMAL_UNITS
-        base = cls.BINARY_BASE if use_binary else cls.DECIMAL_BASE
-
-        # 自动选择最合适的单位
-        abs_value = abs(value)
-        for factor, unit in units:
-            if abs_value >= factor:
-                converted_value = value / factor
-                return f"{converted_value:.2f} {unit}"
+    def _reload(self, paths, cancel):
+        """重新加载配置（在防抖工作线程中执行）"""
+        if cancel.is_set():
+            return
+        names = ', '.join(os.path.basename(path) for path in paths)
+        logger.info(f"检测到配置文件 {names} 更改，重新加载")
+        self.calculator.load_config()
 
-        return f"{value:.2f} "
+def __getattr__(name):
+    """延迟导出 calculator_core 中的单位转换器（与 Web 界面共用同一实现）"""
+    if name == 'UnitConverter':
+        return calculator_core.UnitConverter
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 class StorageCalculator:
     def __init__(self, excel_mode=False, formula_dir='formulas'):
@@ -424,7 +418,9 @@ class StorageCalculator:
         self.excel_mode = excel_mode
         self._calculated_values = {}  # 存储计算结果
         self._last_config = None  # 存储上一次的配置用于比较
-        self.unit_converter = UnitConverter()
+        self.unit_converter = calculator_core.UnitConverter()
+        self._formula_cache = None
+        self._formula_entries = {}  # 公式名 -> 定义该公式的 YAML 文件的缓存条目
 
         # 初始化配置相关属性
         self.variables = {}  # 变量定义
@@ -445,6 +441,13 @@ class StorageCalculator:
 
         timing.end('calculator_init')
 
+    @property
+    def formula_cache(self):
+        """公式解析缓存，与 Web 界面共用磁盘缓存目录，未变化的 YAML 文件不再重新解析"""
+        if getattr(self, '_formula_cache', None) is None:
+            self._formula_cache = calculator_core.FormulaCache(calculator_core.default_cache_dir())
+        return self._formula_cache
+
     def _config_has_changed(self, new_config):
         """检查配置是否发生实质性变化"""
         # 处理空配置的情况
@@ -495,22 +498,26 @@ class StorageCalculator:
 
             # 按文件名排序，确保加载顺序一致
             yaml_files.sort()
+            formula_entries = {}
 
             for yaml_file in yaml_files:
                 file_path = os.path.join(formulas_dir, yaml_file)
                 try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        config = yaml.safe_load(f)
-                        if not config:
-                            logger.warning(f"配置文件为空: {yaml_file}")
-                            continue
+                    # 文件内容未变化时直接使用缓存的解析结果
+                    entry = self.formula_cache.load(file_path)
+                    config = entry['config']
+                    if not config:
+                        logger.warning(f"配置文件为空: {yaml_file}")
+                        continue
 
-                        # 合并各个部分的配置
-                        for section in ['global', 'variables', 'formulas', 'excel']:
-                            if section in config:
-                                if section not in merged_config:
-                                    merged_config[section] = {}
-                                merged_config[section].update(config[section])
+                    # 合并各个部分的配置
+                    for section in ['global', 'variables', 'formulas', 'excel']:
+                        if section in config:
+                            if section not in merged_config:
+                                merged_config[section] = {}
+                            merged_config[section].update(config[section])
+                    for name in config.get('formulas') or {}:
+                        formula_entries[name] = entry
 
                     logger.debug(f"已加载配置文件: {yaml_file}")
 
@@ -541,6 +548,7 @@ class StorageCalculator:
             # 更新配置
             self.config = merged_config
             self._last_config = merged_config.copy()
+            self._formula_entries = formula_entries
 
             # 加载默认值
             self.load_defaults()
@@ -658,7 +666,7 @@ class StorageCalculator:
         """设置公式目录监听"""
         try:
             self.formula_watcher = FormulaWatcher(self)
-            self.formula_observer = Observer()
+            self.formula_observer = watchdog_observers.Observer()
             self.formula_observer.schedule(
                 self.formula_watcher,
                 path=self.formula_dir,  # 修正为使用配置目录路径
@@ -666,6 +674,7 @@ class StorageCalculator:
             )
             logger.debug(f"监听路径: {self.formula_dir}")
             self.formula_observer.start()
+            self.formula_watcher.debouncer.start()
             logger.debug("公式目录监听已启动")
         except Exception as e:
             logger.error(f"设置公式目录监听失败: {str(e)}")
@@ -709,15 +718,19 @@ class StorageCalculator:
                 # 移除等号左边的变量定义，只保留等式右边
                 expr_str = expr_str.split('=')[1].strip()
 
-                # 解析公式表达式
-                expr = parse_expr(expr_str)
+                # 解析公式表达式（优先使用缓存）
+                entry = getattr(self, '_formula_entries', {}).get(name)
+                if entry is not None:
+                    expr = self.formula_cache.parse_expression(entry, expr_str)
+                else:
+                    expr = sympy_parser.parse_expr(expr_str)
 
                 # 自动提取公式中的变量
                 variables = [str(symbol) for symbol in expr.free_symbols]
 
                 # 存储公式信息
                 self.formulas[name] = {
-                    'equation': Eq(Symbol(name), expr),  # 使用formula的key作为输出变量
+                    'equation': sympy.Eq(sympy.Symbol(name), expr),  # 使用formula的key作为输出变量
                     'variables': set(variables),  # 使用自动提取的变量
                     'excel_column': formula_data['excel_column'],
                     'unit': formula_data.get('unit', '')
@@ -731,6 +744,8 @@ class StorageCalculator:
             except Exception as e:
                 logger.error(f"解析公式 {name} 时出错: {str(e)}")
 
+        self.formula_cache.flush()
+
     def calculate_with_formula(self, formula_name):
         """使用预定义公式进行计算"""
         if formula_name not in self.formulas:
@@ -748,7 +763,7 @@ class StorageCalculator:
                 raise ValueError(f"缺少变量 {var} 的值")
 
         # 打印原始公式
-        logger.debug(f"使用公式: {pretty_print(formula, use_unicode=True)}")
+        logger.debug(f"使用公式: {sympy.pretty_print(formula, use_unicode=True)}")
 
         # 创建代入步骤的字符串表示
         substitution_expr = []
@@ -796,6 +811,8 @@ class StorageCalculator:
         if hasattr(self, 'formula_observer'):
             self.formula_observer.stop()
             self.formula_observer.join()
+        if hasattr(self, 'formula_watcher'):
+            self.formula_watcher.debouncer.stop()
 
     def calculate_all_formulas(self, row_data):
         """入口添加防御性检查"""
@@ -864,10 +881,10 @@ class StorageCalculator:
                             # 准备方程求解
                             eq = eq_data['equation']
                             # 替换已知变量
-                            subs_dict = {Symbol(var): results[var] for var in eq_data['variables']}
+                            subs_dict = {sympy.Symbol(var): results[var] for var in eq_data['variables']}
 
                             # 求解方程
-                            solution = solve(eq.subs(subs_dict))
+                            solution = sympy.solve(eq.subs(subs_dict))
                             if solution:
                                 # 获取第一个解
                                 float_value = float(solution[0])
@@ -921,16 +938,32 @@ class StorageCalculator:
             return value  # 返回原始值作为后备
 
 class ExcelHandler(FileSystemEventHandler):
-    def __init__(self, excel_path):
+    def __init__(self, excel_path, workbook=None, debounce_window=DEFAULT_DEBOUNCE_WINDOW):
+        """
+        Args:
+            excel_path: Excel文件路径
+            workbook: 已打开的工作簿对象（如 memory_workbook.MemoryWorkbook），
+                传入时不启动Excel
+            debounce_window: 文件修改事件的防抖窗口（秒）
+        """
         self.excel_path = os.path.abspath(excel_path)
-        self.calculator = StorageCalculator(excel_mode=True)
+        # 只加载一份公式配置；每次处理前 load_config 按文件内容检查配置变化
+        self.calculator = calculator_core.StorageCalculator()
+        # 保存上一次的每行结果，文件修改时只重算变化的行和受影响的公式
+        self.engine = calculator_core.IncrementalCalculator(self.calculator)
         self.last_modified = 0
         self.last_size = 0
         self.app = None
         self.wb = None
         self._thread_id = None
         self.processing = False
-        self.setup_excel_connection()
+        # 合并一次保存产生的多个修改事件；Excel操作必须在创建它的线程中执行，
+        # 因此不启动后台线程，由 watch_excel 的主循环调用 run_pending
+        self.debouncer = ChangeDebouncer(self._process_changes, window=debounce_window, name='ExcelHandler')
+        if workbook is not None:
+            self.wb = workbook
+        else:
+            self.setup_excel_connection()
 
     def _ensure_excel_thread(self):
         """确保Excel操作在正确的线程中执行"""
@@ -999,65 +1032,82 @@ class ExcelHandler(FileSystemEventHandler):
             raise
 
     def on_modified(self, event):
-        """处理文件修改事件"""
+        """处理文件修改事件：只记录事件，防抖窗口结束后合并为一次处理"""
         if event.src_path != self.excel_path:
             return
 
         try:
-            # 获取文件当前大小
-            current_size = os.path.getsize(self.excel_path)
-            current_time = time.time()
-
-            # 防抖动：检查时间间隔和文件大小变化
-            if (current_time - self.last_modified < 1 or
-                current_size == self.last_size or
-                self.processing):
-                return
+            self.last_modified = time.time()
+            self.last_size = os.path.getsize(self.excel_path)
+        except OSError as e:
+            logger.debug(f"获取文件大小失败: {str(e)}")
+        self.debouncer.submit(event.src_path)
+
+    def _process_changes(self, paths, cancel):
+        """防抖后的处理回调"""
+        if cancel.is_set():
+            return
+        self.process_excel(cancel=cancel)
 
-            # 更新状态
-            self.last_modified = current_time
-            self.last_size = current_size
-            self.processing = True
+    def _write_column(self, sheet, col_index, changes):
+        """把一列中变化的单元格按连续行分段整块写回
+
+        Args:
+            sheet: 工作表
+            col_index: 列号（从1开始）
+            changes: 行号 -> 新值
 
+        Returns:
+            bool: 是否有单元格写入成功
+        """
+        written = False
+        rows = sorted(changes)
+        start = 0
+        for i in range(1, len(rows) + 1):
+            if i < len(rows) and rows[i] == rows[i - 1] + 1:
+                continue
+            first, last = rows[start], rows[i - 1]
             try:
-                # 将Excel操作放入主线程的队列中
-                if hasattr(self, '_main_thread_queue'):
-                    self._main_thread_queue.put(self.process_excel)
-                else:
-                    # 如果在主线程中，直接执行
-                    if threading.current_thread().ident == self._thread_id:
-                        self.process_excel()
-                    else:
-                        logger.warning("无法在非主线程执行Excel操作")
-            finally:
-                self.processing = False
+                sheet.range((first, col_index), (last, col_index)).value = [
+                    [changes[row]] for row in rows[start:i]
+                ]
+                written = True
+                logger.debug(f"已更新单元格({first}-{last}, {col_index})")
+            except Exception as e:
+                logger.error(f"更新单元格失败: {str(e)}")
+            start = i
+        return written
 
-        except Exception as e:
-            logger.error(f"处理文件修改事件时出错: {str(e)}", exc_info=True)
-            self.processing = False
+    def process_excel(self, cancel=None):
+        """处理Excel文件并更新计算结果
 
-    def process_excel(self):
-        """处理Excel文件并更新计算结果"""
+        Args:
+            cancel: threading.Event，处理期间文件再次被修改时置位，此时放弃写回过期的结果
+        """
         if not os.path.exists(self.excel_path):
             logger.error(f"Excel文件不存在: {self.excel_path}")
             return
 
         try:
             self._ensure_excel_thread()
+            self.processing = True
             app = self.app
 
-            # 冻结Excel界面
-            original_screen_updating = app.screen_updating
-            original_calculation = app.calculation
-            original_enable_events = app.enable_events
+            # 冻结Excel界面（内存工作簿没有app）
+            if app is not None:
+                original_screen_updating = app.screen_updating
+                original_calculation = app.calculation
+                original_enable_events = app.enable_events
 
             # app.screen_updating = False  # 禁用屏幕刷新
             # app.calculation = 'manual'  # 暂停自动计算
             # app.enable_events = False  # 禁用事件处理
             # app.interactive = False  # 禁止用户交互
 
-            # 获取Excel配置
-            excel_config = self.calculator.get_excel_columns()
+            # 配置变化时引擎会自动全量重算
+            calculator = self.calculator
+            calculator.load_config()
+            excel_config = calculator.get_excel_columns()
             start_row = excel_config.get('start_row', 2)
             header_row = excel_config.get('header_row', 1)
 
@@ -1065,59 +1115,58 @@ class ExcelHandler(FileSystemEventHandler):
             sheet = self.wb.sheets.active  # 修改为获取当前活动sheet
             logger.debug(f"当前活动工作表: {sheet.name}")
 
-            # 获取标题行
-            headers = sheet.range(f'{header_row}:{header_row}').value
-
             # 获取数据范围
-            used_range = sheet.used_range
-            row_count = used_range.last_cell.row
+            last_cell = sheet.used_range.last_cell
+            row_count = last_cell.row
+            col_count = last_cell.column
+
+            # 整块读取标题行和数据区域，每个区域只有一次跨进程调用
+            headers = sheet.range((header_row, 1), (header_row, col_count)).options(ndim=2).value[0]
+            data = []
+            if row_count >= start_row:
+                data = sheet.range((start_row, 1), (row_count, col_count)).options(ndim=2).value
+
+            # 收集有数据的行，以Excel行号为索引；保留所有标题列，空的输出列也参与对比
+            positions = [i for i, header in enumerate(headers) if header]
+            index, rows = [], []
+            for offset, line in enumerate(data):
+                row_data = [line[i] for i in positions]
+                if any(raw_value is not None for raw_value in row_data):
+                    index.append(start_row + offset)
+                    rows.append(row_data)
+
+            # 增量计算：只重新格式化重算过的单元格和被手动改动的输出单元格
+            df = pd.DataFrame(rows, index=index, columns=[headers[i] for i in positions], dtype=object)
+            output = self.engine.apply(df, defaults=calculator.get_defaults())
+            logger.debug(f"增量计算统计: {self.engine.last_stats}")
+
+            if cancel is not None and cancel.is_set():
+                # 结果没有写回，下一次需要全量计算
+                self.engine.reset()
+                logger.info("Excel在计算期间再次被修改，放弃本次结果")
+                return
 
-            # 处理每一行
+            # 在内存中对比所有输出单元格，只收集与表格中的值不同的单元格
             updated = False  # 跟踪是否有更新
-            for row in range(start_row, row_count + 1):
-                row_data = {}
-                has_valid_data = False
-
-                # 收集行数据
-                for col, header in enumerate(headers, 1):
-                    if header:
-                        raw_value = sheet.range((row, col)).value
-                        if raw_value is not None:
-                            has_valid_data = True
-                            row_data[header] = raw_value
-
-                if not has_valid_data:
+            var_to_col = calculator.get_variable_to_column_map()
+            for name in calculator.formulas:
+                output_col = var_to_col.get(name, name)
+                if output_col not in output.columns:
                     continue
+                col_index = headers.index(output_col) + 1
 
-                # 执行计算
-                results = self.calculator.calculate_all_formulas(row_data)
+                changes = {}
+                for row, value in output[output_col].items():
+                    current = data[row - start_row][col_index - 1]
+                    # 无法求解的输出为空字符串，与空单元格视为相同
+                    if current is None and (value is None or value == '' or pd.isna(value)):
+                        continue
+                    if current != value:
+                        changes[row] = value
 
-                if results:
-                    logger.debug(f"计算结果: {results}")
-                    # 更新Excel
-                    for name, formula_data in self.calculator.formulas.items():
-                        if name in results:
-                            output_col = formula_data['excel_column']
-                            if output_col in headers:
-                                col_index = headers.index(output_col) + 1
-
-                                # 格式化输出值
-                                output_unit = formula_data.get('unit', '')
-                                formatted_value = self.calculator.unit_converter.format_value(
-                                    results[name],
-                                    target_unit=output_unit,
-                                    use_binary='i' in output_unit.lower() if output_unit else True
-                                )
-
-                                # 更新单元格（不管是否为空）
-                                current_value = sheet.range((row, col_index)).value
-                                if current_value != formatted_value:
-                                    try:
-                                        sheet.range((row, col_index)).value = formatted_value
-                                        updated = True
-                                        logger.info(f"已更新单元格({row}, {col_index}) {output_col}: {formatted_value}")
-                                    except Exception as e:
-                                        logger.error(f"更新单元格失败: {str(e)}")
+                if changes and self._write_column(sheet, col_index, changes):
+                    updated = True
+                    logger.info(f"已更新 {output_col} 列 {len(changes)} 个单元格")
 
             # 只在有更新时保存
             if updated:
@@ -1148,8 +1197,13 @@ class ExcelHandler(FileSystemEventHandler):
         """析构函数"""
         self.cleanup()
 
-def watch_excel(excel_path):
-    """启动Excel文件监听"""
+def watch_excel(excel_path, debounce_window=DEFAULT_DEBOUNCE_WINDOW):
+    """启动Excel文件监听
+
+    Args:
+        excel_path: Excel文件路径
+        debounce_window: 文件修改事件的防抖窗口（秒）
+    """
     excel_path = os.path.abspath(excel_path)
 
     if not os.path.exists(excel_path):
@@ -1157,17 +1211,12 @@ def watch_excel(excel_path):
 
     directory = os.path.dirname(excel_path)
 
-    # 创建一个队列用于主线程处理Excel操作
-    import queue
-    main_thread_queue = queue.Queue()
-
-    # 在主线程中创建Excel处理器
-    event_handler = ExcelHandler(excel_path)
-    event_handler._main_thread_queue = main_thread_queue
+    # 在主线程中创建Excel处理器，防抖后的处理也在主线程执行
+    event_handler = ExcelHandler(excel_path, debounce_window=debounce_window)
 
     observer = None  # 显式声明为局部变量
     try:
-        observer = Observer()
+        observer = watchdog_observers.Observer()
         logger.debug(f"监听路径: {directory}")
         observer.schedule(event_handler, directory, recursive=False)
         observer.start()
@@ -1176,14 +1225,9 @@ def watch_excel(excel_path):
         print("提示: 您可以保持Excel文件打开并编辑，程序会自动检测更改并更新计算结果")
         print("按Ctrl+C退出监听")
 
-        # 使用带超时的阻塞队列
         while observer.is_alive():
             try:
-                func = main_thread_queue.get(timeout=0.5)
-                func()
-            except queue.Empty:
-                if not observer.is_alive():
-                    break
+                event_handler.debouncer.run_pending(timeout=0.5)
             except KeyboardInterrupt:
                 logger.info("\n接收到终止信号")
                 break
@@ -1197,6 +1241,7 @@ def watch_excel(excel_path):
             if observer.is_alive():
                 logger.warning("Observer线程未正常退出")
         event_handler.cleanup()
+        logger.info(f"文件事件统计: {event_handler.debouncer.get_stats()}")
         logger.info("监听资源已释放")
 
 def _log_error(message, error=None, include_traceback=True):
@@ -1228,6 +1273,34 @@ def calc_excel_cli(excel_path):
         if app:
             app.quit()
 
+def sweep_cli(axes, output, fixed=None, outputs=None, chunk_size=None, workers=1):
+    """CLI参数扫描：对输入变量取值的笛卡尔积批量计算，结果逐块写入 CSV/Parquet
+
+    Args:
+        axes: 'name=spec' 列表，spec 为 'start:stop:step' 或 'a,b,c'（可带单位）
+        output: 输出文件路径（.csv 或 .parquet）
+        fixed: 'name=value' 列表，固定取值的变量
+        outputs: 输出的公式名列表，None 表示全部公式
+        chunk_size: 每块的扫描点数
+        workers: 工作进程数，0 表示CPU核数
+    """
+    try:
+        import sweep
+        stats = sweep.run_sweep(
+            sweep.parse_assignments(axes),
+            output,
+            fixed=sweep.parse_assignments(fixed),
+            outputs=outputs,
+            chunk_size=chunk_size or sweep.DEFAULT_CHUNK_SIZE,
+            workers=workers or None,
+        )
+        print(f"参数扫描完成: {stats['points']} 个点, 耗时 {stats['seconds']:.2f}s "
+              f"({stats['points_per_second']:.0f} 点/秒), 结果已写入 {output}")
+        return 0
+    except Exception as e:
+        _log_error("参数扫描出错", e)
+        return 1
+
 def calc_excel():
     """供Excel VBA调用的计算函数"""
     app = None
@@ -1268,24 +1341,56 @@ def main():
     group = parser.add_mutually_exclusive_group()
     group.add_argument('--excel', help='Excel文件路径，直接进行一次性计算')
     group.add_argument('--watch', help='Excel文件路径，监听文件变化并实时计算')
+    group.add_argument('--sweep', nargs='+', metavar='变量=取值',
+                       help="参数扫描，取值为 start:stop:step 或 a,b,c（可带单位），如 hdd_count=12:36:12 data_blocks=4,8")
+    parser.add_argument('--set', nargs='+', metavar='变量=值', help='参数扫描时固定取值的变量')
+    parser.add_argument('--outputs', nargs='+', metavar='公式', help='参数扫描时输出的公式，默认全部')
+    parser.add_argument('--output', default='sweep.csv', help='参数扫描结果文件（.csv 或 .parquet），默认 sweep.csv')
+    parser.add_argument('--chunk-size', type=int, default=None, help='参数扫描每块的点数')
+    parser.add_argument('--workers', type=int, default=1, help='参数扫描的工作进程数，0 表示CPU核数，默认 1')
+    parser.add_argument('--debounce', type=float, default=DEFAULT_DEBOUNCE_WINDOW,
+                        help=f'监听模式下文件修改事件的防抖窗口（秒），默认 {DEFAULT_DEBOUNCE_WINDOW}')
+    parser.add_argument('--startup-profile', action='store_true',
+                        help='打印各模块导入耗时；单独使用时只加载计算器配置后退出')
 
     args = parser.parse_args()
 
     try:
-        if args.excel:
+        if args.startup_profile and not (args.excel or args.watch or args.sweep):
+            # 只走一遍计算器的启动路径（加载配置、解析公式）
+            timing.start('calculator_startup')
+            StorageCalculator()
+            timing.end('calculator_startup')
+            timing.print_import_profile(time.time() - _startup_start)
+            sys.exit(0)
+        elif args.excel:
             logger.info(f"开始计算Excel文件: {args.excel}")
             timing.start('excel_calculation')
             exit_code = calc_excel_cli(args.excel)
             timing.end('excel_calculation')
             timing.print_stats()  # 打印性能统计
+            if args.startup_profile:
+                timing.print_import_profile(time.time() - _startup_start)
+            sys.exit(exit_code)
+        elif args.sweep:
+            logger.info(f"开始参数扫描: {args.sweep}")
+            timing.start('sweep')
+            exit_code = sweep_cli(args.sweep, args.output, fixed=args.set, outputs=args.outputs,
+                                  chunk_size=args.chunk_size, workers=args.workers)
+            timing.end('sweep')
+            timing.print_stats()  # 打印性能统计
+            if args.startup_profile:
+                timing.print_import_profile(time.time() - _startup_start)
             sys.exit(exit_code)
         elif args.watch:
             logger.info(f"开始监听Excel文件: {args.watch}")
             try:
                 timing.start('excel_watch')
-                watch_excel(args.watch)
+                watch_excel(args.watch, debounce_window=args.debounce)
                 timing.end('excel_watch')
                 timing.print_stats()  # 打印性能统计
+                if args.startup_profile:
+                    timing.print_import_profile(time.time() - _startup_start)
                 sys.exit(0)
             except FileNotFoundError as e:
                 logger.error(f"文件不存在: {args.watch}", exc_info=True)
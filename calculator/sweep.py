@@ -0,0 +1,328 @@
+"""
+参数扫描（what-if）
+
+对若干输入变量的取值做笛卡尔积，按块在整列数组上批量求解全部公式，
+结果逐块写入 CSV / Parquet 文件。任意时刻只有正在计算和等待写出的
+几个块在内存中，百万级的扫描点也不需要把整张表放进内存。
+
+用法示例：
+
+    from sweep import run_sweep
+    run_sweep({'hdd_count': '12:36:12', 'data_blocks': [4, 8], 'parity_blocks': '1,2'},
+              'sweep.csv')
+"""
+
+import os
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from calculator_core import StorageCalculator, UnitConverter
+
+logger = logging.getLogger('StorageCalculator')
+
+# 每块的扫描点数
+DEFAULT_CHUNK_SIZE = 50000
+
+
+def parse_axis(spec):
+    """解析一个变量的取值
+
+    Args:
+        spec: 取值列表，或字符串：
+            - 'start:stop:step' 等差序列，包含 stop（如 '4:16:4'、'1TB:4TB:1TB'）
+            - 'start:stop' 步长为 1
+            - 'a,b,c' 逗号分隔的取值
+            取值可以带单位，按 UnitConverter 解析为基本单位
+
+    Returns:
+        list: 解析后的数值
+    """
+    if isinstance(spec, (list, tuple, np.ndarray)):
+        parts = list(spec)
+    elif isinstance(spec, str) and ':' in spec:
+        bounds = [UnitConverter.parse_value(part) for part in spec.split(':')]
+        if len(bounds) not in (2, 3) or any(bound is None for bound in bounds):
+            raise ValueError(f"无法解析的取值范围: {spec}")
+        start, stop = bounds[0], bounds[1]
+        step = bounds[2] if len(bounds) == 3 else 1.0
+        if step <= 0 or stop < start:
+            raise ValueError(f"取值范围为空: {spec}")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return list(start + step * np.arange(count))
+    elif isinstance(spec, str):
+        parts = [part for part in spec.split(',') if part.strip()]
+    else:
+        parts = [spec]
+
+    values = []
+    for part in parts:
+        value = UnitConverter.parse_value(part)
+        if value is None:
+            raise ValueError(f"无法解析的取值: {part}")
+        values.append(value)
+    if not values:
+        raise ValueError(f"取值为空: {spec}")
+    return values
+
+
+def parse_assignments(items):
+    """解析命令行中的 'name=spec' 列表为有序字典"""
+    result = {}
+    for item in items or []:
+        name, sep, spec = item.partition('=')
+        if not sep or not name.strip():
+            raise ValueError(f"参数格式应为 变量名=取值: {item}")
+        result[name.strip()] = spec.strip()
+    return result
+
+
+class SweepGrid:
+    """笛卡尔积网格，按扫描点编号切块，不展开整个网格
+
+    最后一个变量变化最快（与嵌套循环的顺序一致）。
+    """
+
+    def __init__(self, axes):
+        """
+        Args:
+            axes: 变量名 -> 数值列表（有序）
+        """
+        self.names = list(axes)
+        self.values = [np.asarray(axes[name], dtype=float) for name in self.names]
+        self.shape = tuple(len(values) for values in self.values)
+        self.size = int(np.prod(self.shape, dtype=np.int64)) if self.shape else 0
+
+    def chunk(self, start, stop):
+        """获取编号 [start, stop) 的扫描点，返回 变量名 -> 数组"""
+        index = np.arange(start, min(stop, self.size), dtype=np.int64)
+        coords = np.unravel_index(index, self.shape)
+        return {name: values[coord] for name, values, coord in zip(self.names, self.values, coords)}
+
+    def ranges(self, chunk_size):
+        """按块大小切分的 (start, stop) 列表"""
+        return [(start, min(start + chunk_size, self.size)) for start in range(0, self.size, chunk_size)]
+
+
+class SweepRunner:
+    """在一个计算器上求解扫描块"""
+
+    def __init__(self, calculator, axes, fixed=None, outputs=None):
+        """
+        Args:
+            calculator: calculator_core.StorageCalculator
+            axes: 变量名（或显示名） -> 取值（见 parse_axis），或已解析的 SweepGrid
+            fixed: 固定取值的变量 -> 值，覆盖配置中的默认值
+            outputs: 输出的公式名列表，None 表示全部公式
+
+        Raises:
+            ValueError: 变量名或公式名未知、取值无法解析
+        """
+        self.calculator = calculator
+        column_map = calculator.get_column_to_variable_map()
+
+        def resolve(name):
+            if name not in column_map:
+                raise ValueError(f"未知的变量: {name}")
+            return column_map[name]
+
+        if isinstance(axes, SweepGrid):
+            for name in axes.names:
+                resolve(name)
+            self.grid = axes
+        else:
+            self.grid = SweepGrid({resolve(name): parse_axis(spec) for name, spec in axes.items()})
+
+        # 未扫描的输入使用配置默认值，再用 fixed 覆盖
+        self.fixed = {resolve(name): value for name, value in (fixed or {}).items()}
+        defaults = dict(calculator.get_defaults())
+        defaults.update(self.fixed)
+        base = calculator.parse_frame_inputs(pd.DataFrame(index=range(1)), defaults)
+        self.base = {name: values[0] for name, values in base.items()}
+        for name in self.grid.names:
+            self.base.pop(name, None)
+
+        if outputs is None:
+            outputs = list(calculator.formulas)
+        self.outputs = [resolve(name) for name in outputs if resolve(name) not in self.grid.names]
+
+    def solve(self, start, stop):
+        """求解编号 [start, stop) 的扫描点
+
+        Returns:
+            DataFrame: 扫描变量列 + 输出公式列（基本单位数值，无法求解为 NaN）
+        """
+        known = self.grid.chunk(start, stop)
+        n_rows = len(next(iter(known.values())))
+        inputs = dict(known)
+        for name, value in self.base.items():
+            known[name] = np.full(n_rows, value)
+
+        results, _ = self.calculator.solve_frame(known, n_rows)
+
+        columns = dict(inputs)
+        for name in self.outputs:
+            columns[name] = results[name]
+        return pd.DataFrame(columns, index=pd.RangeIndex(start, start + n_rows))
+
+
+def encode_csv(df, header):
+    """把一块结果编码为 CSV 文本（CSV 格式化比求解慢得多，在工作进程中完成）"""
+    return df.to_csv(None, index=False, header=header)
+
+
+# 进程池中每个工作进程各自持有一个 SweepRunner，由 _init_worker 创建
+_worker_runner = None
+
+
+def _init_worker(formula_dir, cache_dir, grid, fixed, outputs):
+    """grid、fixed、outputs 已在主进程中解析和校验"""
+    global _worker_runner
+    # 工作进程只输出错误，避免每个进程重复打印加载日志
+    logger.setLevel(logging.ERROR)
+    calculator = StorageCalculator(formula_dir=formula_dir, cache_dir=cache_dir, trace=False)
+    _worker_runner = SweepRunner(calculator, grid, fixed, outputs)
+
+
+def _solve_chunk(bounds, encode):
+    df = _worker_runner.solve(*bounds)
+    return encode(df, bounds[0] == 0) if encode is not None else df
+
+
+def _prepare(axes, fixed, outputs, formula_dir, cache_dir):
+    """在当前进程中解析并校验扫描参数，名字或取值有误时在启动进程池之前抛出 ValueError"""
+    calculator = StorageCalculator(formula_dir=formula_dir, cache_dir=cache_dir, trace=False)
+    return SweepRunner(calculator, axes, fixed, outputs)
+
+
+def _iter_chunks(runner, formula_dir, cache_dir, chunk_size, workers, encode=None):
+    """按顺序逐块求解，生成 (start, stop, 结果)；encode 不为 None 时结果为 encode(df, header)"""
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    ranges = deque(runner.grid.ranges(chunk_size))
+    if workers <= 1:
+        for start, stop in ranges:
+            df = runner.solve(start, stop)
+            yield start, stop, encode(df, start == 0) if encode is not None else df
+        return
+
+    # 主进程只用来切块和写出，求解在工作进程中完成；工作进程直接使用解析好的网格
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(formula_dir, cache_dir, runner.grid, runner.fixed, runner.outputs),
+    ) as executor:
+        # 最多同时提交 2 * workers 个块，保证内存有界且结果按顺序输出
+        pending = deque()
+        while ranges or pending:
+            while ranges and len(pending) < 2 * workers:
+                bounds = ranges.popleft()
+                pending.append((bounds, executor.submit(_solve_chunk, bounds, encode)))
+            (start, stop), future = pending.popleft()
+            yield start, stop, future.result()
+
+
+def iter_sweep(axes, fixed=None, outputs=None, formula_dir='formulas', cache_dir=None,
+               chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """按顺序逐块生成扫描结果
+
+    Args:
+        axes: 变量名（或显示名） -> 取值（见 parse_axis）
+        fixed: 固定取值的变量 -> 值
+        outputs: 输出的公式名列表，None 表示全部公式
+        formula_dir: 配置目录
+        cache_dir: 公式缓存目录（见 StorageCalculator）
+        chunk_size: 每块的扫描点数
+        workers: 工作进程数，1 表示在当前进程中计算，None 表示 CPU 核数
+
+    Yields:
+        DataFrame: 每块的结果，见 SweepRunner.solve
+    """
+    runner = _prepare(axes, fixed, outputs, formula_dir, cache_dir)
+    for _, _, df in _iter_chunks(runner, formula_dir, cache_dir, chunk_size, workers):
+        yield df
+
+
+class SweepWriter:
+    """逐块写出扫描结果，格式由文件扩展名决定（.csv 或 .parquet）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.format = 'parquet' if path.endswith('.parquet') else 'csv'
+        self._file = None
+        self._writer = None
+        if self.format == 'parquet':
+            try:
+                import pyarrow  # noqa: F401
+                import pyarrow.parquet  # noqa: F401
+            except ImportError:
+                raise ImportError("写入 Parquet 需要安装 pyarrow: pip install pyarrow")
+        else:
+            self._file = open(path, 'w', newline='', encoding='utf-8')
+
+    @property
+    def encode(self):
+        """在工作进程中对每块结果做的预处理（CSV 为编码成文本）"""
+        return encode_csv if self.format == 'csv' else None
+
+    def write(self, chunk):
+        """写入一块结果：DataFrame，或 encode 处理后的结果"""
+        if self.format == 'parquet':
+            import pyarrow
+            import pyarrow.parquet as pq
+            table = pyarrow.Table.from_pandas(chunk, preserve_index=False)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        else:
+            if isinstance(chunk, pd.DataFrame):
+                chunk = encode_csv(chunk, self._file.tell() == 0)
+            self._file.write(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def run_sweep(axes, output, fixed=None, outputs=None, formula_dir='formulas', cache_dir=None,
+              chunk_size=DEFAULT_CHUNK_SIZE, workers=1):
+    """执行参数扫描并把结果写入文件
+
+    参数见 iter_sweep；output 为 .csv 或 .parquet 文件路径。
+
+    Returns:
+        dict: points 扫描点数, chunks 块数, seconds 耗时, points_per_second
+    """
+    started = time.perf_counter()
+    points = chunks = 0
+    runner = _prepare(axes, fixed, outputs, formula_dir, cache_dir)
+    writer = SweepWriter(output)
+    try:
+        chunk_iter = _iter_chunks(runner, formula_dir, cache_dir, chunk_size, workers,
+                                  encode=writer.encode)
+        for start_index, stop_index, chunk in chunk_iter:
+            writer.write(chunk)
+            points += stop_index - start_index
+            chunks += 1
+            logger.debug(f"参数扫描: 已完成 {points} 个点")
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - started
+    stats = {
+        'points': points,
+        'chunks': chunks,
+        'seconds': seconds,
+        'points_per_second': points / seconds if seconds > 0 else 0.0,
+    }
+    logger.info(f"参数扫描完成: {points} 个点, {chunks} 块, 耗时 {seconds:.2f}s, 输出 {output}")
+    return stats
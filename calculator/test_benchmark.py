@@ -0,0 +1,128 @@
+"""
+benchmark 性能基准单元测试
+
+测试覆盖范围：
+1. 合成数据表 - 按公式配置生成可解析的输入
+2. 基准结果 - 指标齐全、可序列化
+3. 基线比较 - 退化检测与退出码
+"""
+
+import json
+import os
+
+import pytest
+
+import benchmark
+from calculator_core import StorageCalculator
+
+
+@pytest.fixture(scope='module')
+def calculator():
+    return StorageCalculator(trace=False)
+
+
+@pytest.fixture(scope='module')
+def quick_results():
+    """100 行、每项执行一次的基准结果"""
+    return benchmark.run_benchmarks(sizes=[100], repeat=1).to_dict()
+
+
+def make_result(**metrics):
+    return {
+        'version': benchmark.BENCHMARK_VERSION,
+        'metrics': {
+            name: {'value': value, 'unit': unit, 'higher_is_better': higher}
+            for name, (value, unit, higher) in metrics.items()
+        },
+    }
+
+
+@pytest.fixture
+def temp_baseline(tmp_path):
+    """不可能达到的基线：每秒 1e15 行"""
+    path = os.path.join(tmp_path, 'baseline.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(make_result(**{'frame.calculate@100': (1e15, 'rows/s', True)}), f)
+    return path, os.path.join(tmp_path, 'result.json')
+
+
+class TestGenerateSheet:
+    """测试合成数据表"""
+
+    def test_columns_and_values(self, calculator):
+        sheet = benchmark.generate_sheet(calculator, 50)
+
+        assert len(sheet) == 50
+        for var_name, var_info in calculator.get_input_variables().items():
+            column = sheet[var_info['display_name']]
+            assert all(calculator.unit_converter.parse_value(value) is not None for value in column), var_name
+
+    def test_sheet_is_calculable(self, calculator):
+        """生成的数据可以批量计算出结果"""
+        sheet = benchmark.generate_sheet(calculator, 20)
+        results, unsolved = calculator.calculate_frame(sheet, defaults=calculator.get_defaults())
+
+        assert not unsolved['ec_ratio'].any()
+        assert results['total_hdd_capacity'].notna().all()
+
+    def test_deterministic(self, calculator):
+        a = benchmark.generate_sheet(calculator, 10, seed=1)
+        b = benchmark.generate_sheet(calculator, 10, seed=1)
+        assert a.equals(b)
+
+
+class TestRunBenchmarks:
+    """测试基准结果"""
+
+    def test_metrics(self, quick_results):
+        metrics = quick_results['metrics']
+        for name in (
+            'reload.load_config', 'reload.cold_start', 'units.parse_value',
+            'row.calculate_with_columns', 'frame.calculate@100', 'incremental.update_one_row@100',
+            'units.parse_array@100', 'excel.process_excel@100', 'excel.process_excel_incremental@100',
+        ):
+            assert metrics[name]['value'] > 0, name
+        assert quick_results['meta']['sizes'] == [100]
+        json.dumps(quick_results)
+
+    def test_incremental_update_speedup(self, calculator):
+        """10k 行时改动一个单元格的增量计算至少比整表计算快一个数量级（bench_frame 中断言）"""
+        sheet = benchmark.generate_sheet(calculator, benchmark.SPEEDUP_MIN_ROWS)
+        results = benchmark.BenchmarkResults([len(sheet)])
+        benchmark.bench_frame(results, calculator, sheet, repeat=3)
+        speedup = results.metrics[f'incremental.speedup@{len(sheet)}']['value']
+        assert speedup >= benchmark.MIN_INCREMENTAL_SPEEDUP
+
+    def test_baseline_has_same_metrics(self, quick_results):
+        """随附的基线包含本次测量的 100 行指标"""
+        with open(benchmark.DEFAULT_BASELINE, encoding='utf-8') as f:
+            baseline = json.load(f)
+        assert set(quick_results['metrics']) <= set(baseline['metrics'])
+
+
+class TestCompare:
+    """测试基线比较"""
+
+    def test_detects_regressions_in_both_directions(self):
+        baseline = make_result(rate=(100.0, 'rows/s', True), latency=(10.0, 'ms', False), other=(1.0, 'ms', False))
+        current = make_result(rate=(40.0, 'rows/s', True), latency=(20.0, 'ms', False))
+
+        regressions = benchmark.compare(current, baseline, tolerance=0.5)
+        assert [(name, change) for name, _, _, change in regressions] == [
+            ('rate', pytest.approx(0.6)), ('latency', pytest.approx(1.0)),
+        ]
+
+    def test_within_tolerance_and_improvements(self):
+        baseline = make_result(rate=(100.0, 'rows/s', True), latency=(10.0, 'ms', False))
+        current = make_result(rate=(80.0, 'rows/s', True), latency=(2.0, 'ms', False))
+
+        assert benchmark.compare(current, baseline, tolerance=0.3) == []
+
+    def test_main_exit_code(self, temp_baseline):
+        """退化超过阈值时返回 1"""
+        path, output = temp_baseline
+        assert benchmark.main(['--sizes', '100', '--repeat', '1', '--no-excel',
+                               '--output', output, '--baseline', path]) == 1
+        with open(output, encoding='utf-8') as f:
+            assert 'frame.calculate@100' in json.load(f)['metrics']
+
@@ -0,0 +1,912 @@
+"""
+calculator_core 单元测试
+
+测试覆盖范围：
+1. 公式编译 - lambdify 数值函数与 solve 回退
+2. 批量计算 - calculate_frame 与逐行计算结果一致
+3. 依赖图 - 拓扑求值计划、环与不可达输出检查
+4. 增量计算 - 只重算变化的行和受影响的公式
+5. 单位转换 - 单位表、解析缓存与整列格式化
+6. 公式缓存 - 按 YAML 内容哈希缓存解析和编译结果
+7. 计算过程记录 - 静默模式与按需渲染的逐行 trace
+8. 反向求解 - 变号区间 + Brent 求根、缓存与 warm start
+"""
+
+import logging
+import os
+import json
+import shutil
+import time
+from unittest.mock import patch
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+import calculator_core
+from calculator_core import (
+    StorageCalculator,
+    CalculationTrace,
+    FormulaCache,
+    UnitConverter,
+    IncrementalCalculator,
+    GoalSeeker,
+    strongly_connected_components,
+)
+
+# ============================================================================
+# Fixtures - 测试夹具
+# ============================================================================
+
+@pytest.fixture
+def temp_dir():
+    """创建临时目录，使用固定的测试目录避免 macOS TCC 权限问题"""
+    test_temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_temp')
+    os.makedirs(test_temp_dir, exist_ok=True)
+
+    yield test_temp_dir
+
+    shutil.rmtree(test_temp_dir, ignore_errors=True)
+
+
+def write_formulas(formulas_dir, config):
+    """写入单个公式配置文件"""
+    os.makedirs(formulas_dir, exist_ok=True)
+    with open(os.path.join(formulas_dir, 'formulas.yaml'), 'w') as f:
+        yaml.dump(config, f, allow_unicode=True)
+
+
+@pytest.fixture
+def core_formulas_dir(temp_dir):
+    """创建包含依赖链的公式配置目录"""
+    formulas_dir = os.path.join(temp_dir, 'core_formulas')
+    write_formulas(formulas_dir, {
+        'global': {
+            'defaults': {
+                'data_blocks': 8,
+                'parity_blocks': 2,
+            }
+        },
+        'variables': {
+            'nvme_capacity': {'unit': 'TB', 'excel_column': 'nvme容量', 'can_be_input': True},
+            'nvme_count': {'unit': '个', 'excel_column': 'nvme数量', 'can_be_input': True},
+            'data_blocks': {'unit': '个', 'excel_column': 'K', 'can_be_input': True},
+            'parity_blocks': {'unit': '个', 'excel_column': 'M', 'can_be_input': True},
+        },
+        'formulas': {
+            'total_nvme': {
+                'expression': 'total_nvme = nvme_capacity * nvme_count',
+                'excel_column': 'nvme总容量',
+                'unit': 'TB',
+            },
+            'ec_ratio': {
+                'expression': 'ec_ratio = (data_blocks + parity_blocks) / data_blocks',
+                'excel_column': 'EC开销率',
+                'unit': '%',
+            },
+            'effective_nvme': {
+                'expression': 'effective_nvme = total_nvme / ec_ratio',
+                'excel_column': 'nvme实际可用容量',
+                'unit': 'TiB',
+            },
+            'stripe_count': {
+                'expression': 'stripe_count = ceiling(nvme_capacity / data_blocks)',
+                'excel_column': '条带数',
+            },
+        },
+    })
+    yield formulas_dir
+
+
+@pytest.fixture
+def core_calculator(core_formulas_dir):
+    """创建使用临时配置的核心计算器"""
+    return StorageCalculator(formula_dir=core_formulas_dir)
+
+
+# ============================================================================
+# TestFormulaCompilation - 公式编译测试
+# ============================================================================
+
+class TestFormulaCompilation:
+    """测试公式编译为数值函数"""
+
+    def test_formulas_are_compiled(self, core_calculator):
+        """显式公式在加载时编译为数值函数"""
+        for name, formula_data in core_calculator.formulas.items():
+            assert formula_data['func'] is not None, name
+        assert core_calculator.formulas['total_nvme']['args'] == ('nvme_capacity', 'nvme_count')
+
+    def test_calculate_does_not_call_solve(self, core_calculator):
+        """热路径使用编译后的函数，不调用 sympy.solve"""
+        row = {'nvme容量': '10TB', 'nvme数量': '4', 'K': '8', 'M': '2'}
+        with patch.object(calculator_core, 'solve') as mock_solve:
+            results, unsolved = core_calculator.calculate_with_columns(row)
+        mock_solve.assert_not_called()
+
+        assert unsolved == []
+        assert results['total_nvme'] == pytest.approx(40e12)
+        assert results['ec_ratio'] == pytest.approx(1.25)
+        assert results['effective_nvme'] == pytest.approx(32e12)
+        assert results['stripe_count'] == pytest.approx(1.25e12)
+
+    def test_calculate_matches_calculate_with_columns(self, core_calculator):
+        """calculate 与 calculate_with_columns 结果一致"""
+        row = {'nvme_capacity': '3.84TB', 'nvme_count': 2, 'data_blocks': 4, 'parity_blocks': 2}
+        results = core_calculator.calculate(row)
+        column_results, _ = core_calculator.calculate_with_columns(row)
+        for name in core_calculator.formulas:
+            assert results[name] == pytest.approx(column_results[name])
+
+    def test_division_by_zero_is_unsolved(self, core_calculator):
+        """除零等非有限结果视为无解"""
+        row = {'nvme容量': '10TB', 'nvme数量': '4', 'K': '0', 'M': '2'}
+        results, unsolved = core_calculator.calculate_with_columns(row)
+
+        assert 'ec_ratio' in unsolved
+        assert 'effective_nvme' in unsolved
+        assert results['total_nvme'] == pytest.approx(40e12)
+
+    def test_implicit_formula_falls_back_to_solve(self, temp_dir):
+        """输出变量出现在右侧的隐式方程回退到 solve 求解"""
+        formulas_dir = os.path.join(temp_dir, 'implicit_formulas')
+        write_formulas(formulas_dir, {
+            'global': {'defaults': {}},
+            'variables': {
+                'rate': {'excel_column': 'rate', 'can_be_input': True},
+            },
+            'formulas': {
+                'level': {
+                    'expression': 'level = level * rate + 10',
+                    'excel_column': 'level',
+                },
+            },
+        })
+        calculator = StorageCalculator(formula_dir=formulas_dir)
+
+        assert calculator.formulas['level']['func'] is None
+        assert calculator.formulas['level']['variables'] == {'rate'}
+
+        results, unsolved = calculator.calculate_with_columns({'rate': '0.5'})
+        assert unsolved == []
+        assert results['level'] == pytest.approx(20.0)
+
+
+# ============================================================================
+# TestCalculateFrame - 批量计算测试
+# ============================================================================
+
+class TestCalculateFrame:
+    """测试按列批量计算"""
+
+    def test_parse_array_matches_parse_value(self):
+        """批量解析与逐个解析结果一致"""
+        raw = ['4KiB', '10GB', 3, '50%', '', None, 'nan', 'abc', '1e3', 2.5, '4KiB']
+        parsed = UnitConverter.parse_array(raw)
+        for value, result in zip(raw, parsed):
+            expected = UnitConverter.parse_value(value)
+            if expected is None:
+                assert np.isnan(result), value
+            else:
+                assert result == pytest.approx(expected), value
+
+    def test_frame_matches_row_calculation(self, core_calculator):
+        """批量计算结果与逐行 calculate_with_columns 一致"""
+        df = pd.DataFrame({
+            'nvme容量': ['10TB', '3.84TB', '', 'bad'],
+            'nvme数量': ['4', '2', '1', '3'],
+            'K': ['8', '0', '', '4'],
+            'M': ['2', '2', '', '1'],
+        })
+        defaults = {'data_blocks': 4, 'parity_blocks': 1}
+        results, unsolved = core_calculator.calculate_frame(df, defaults=defaults)
+
+        for idx, row in df.iterrows():
+            input_data = dict(defaults)
+            input_data.update({k: v for k, v in row.items() if v != ''})
+            row_results, row_unsolved = core_calculator.calculate_with_columns(input_data)
+            for name in core_calculator.formulas:
+                assert unsolved.at[idx, name] == (name in row_unsolved), (idx, name)
+                if name in row_results:
+                    assert results.at[idx, name] == pytest.approx(row_results[name]), (idx, name)
+
+    @pytest.mark.parametrize('blank', ['', '   ', None, np.nan, 'nan', ' nan '])
+    def test_frame_matches_row_calculation_with_blank_cells(self, core_calculator, blank):
+        """defaults=None 时空单元格（含空白字符串、NaN）两条路径处理一致"""
+        df = pd.DataFrame({
+            'nvme容量': ['10TB', blank, '2TB', 'bad', blank],
+            'nvme数量': ['4', '2', blank, '3', blank],
+            'K': [blank, '4', '8', 'bad', blank],
+            'M': ['2', blank, blank, '1', blank],
+        }, dtype=object)
+        results, unsolved = core_calculator.calculate_frame(df)
+
+        for idx, row in df.iterrows():
+            row_results, row_unsolved = core_calculator.calculate_with_columns(row.to_dict())
+            if row_results is None:
+                assert unsolved.loc[idx].all(), idx
+                continue
+            for name in core_calculator.formulas:
+                assert unsolved.at[idx, name] == (name in row_unsolved), (idx, name)
+                if name in row_results:
+                    assert results.at[idx, name] == pytest.approx(row_results[name]), (idx, name)
+
+    def test_frame_unsolved_mask(self, core_calculator):
+        """缺少依赖的行对应的输出标记为无法求解"""
+        df = pd.DataFrame({'nvme容量': ['10TB', ''], 'nvme数量': ['4', '']})
+        results, unsolved = core_calculator.calculate_frame(df)
+
+        assert results.at[0, 'total_nvme'] == pytest.approx(40e12)
+        assert not unsolved.at[0, 'total_nvme']
+        assert unsolved.at[0, 'ec_ratio']
+        assert unsolved.loc[1].all()
+        assert np.isnan(results.at[1, 'total_nvme'])
+
+    def test_frame_evaluates_each_formula_once(self, core_calculator):
+        """每个公式对整列只求值一次"""
+        df = pd.DataFrame({
+            'nvme容量': ['10TB'] * 100,
+            'nvme数量': [str(i) for i in range(100)],
+            'K': ['8'] * 100,
+            'M': ['2'] * 100,
+        })
+        formula_data = core_calculator.formulas['total_nvme']
+        calls = []
+        func = formula_data['func']
+        formula_data['func'] = lambda *args: calls.append(args) or func(*args)
+
+        results, unsolved = core_calculator.calculate_frame(df)
+
+        assert len(calls) == 1
+        assert not unsolved['total_nvme'].any()
+        assert results['total_nvme'].iloc[-1] == pytest.approx(990e12)
+
+
+# ============================================================================
+# TestDependencyGraph - 依赖图测试
+# ============================================================================
+
+class TestDependencyGraph:
+    """测试公式依赖图与求值计划"""
+
+    def test_strongly_connected_components(self):
+        """强连通分量按依赖顺序输出"""
+        graph = {'a': ['b'], 'b': ['c'], 'c': ['b'], 'd': ['a', 'x']}
+        components = strongly_connected_components(graph)
+        assert [sorted(c) for c in components] == [['b', 'c'], ['a'], ['d']]
+
+    def test_long_chain_does_not_recurse(self):
+        """长依赖链不会触发递归深度限制"""
+        graph = {i: [i + 1] for i in range(5000)}
+        components = strongly_connected_components(graph)
+        assert len(components) == 5000
+        assert components[0] == [4999]
+
+    def test_formula_order_is_topological(self, core_calculator):
+        """依赖总是排在被依赖者之前"""
+        order = core_calculator.formula_order
+        assert order.index('total_nvme') < order.index('effective_nvme')
+        assert order.index('ec_ratio') < order.index('effective_nvme')
+        assert core_calculator.formula_dependents['total_nvme'] == {'effective_nvme'}
+        assert core_calculator.formula_cycles == []
+        assert core_calculator.unreachable_outputs == []
+
+    def test_evaluation_plan_is_cached(self, core_calculator):
+        """同一组已知变量复用求值计划"""
+        known = {'nvme_capacity', 'nvme_count'}
+        plan = core_calculator.get_evaluation_plan(known)
+        assert plan == ('total_nvme',)
+        assert core_calculator.get_evaluation_plan(set(known)) is plan
+
+        full_plan = core_calculator.get_evaluation_plan(known | {'data_blocks', 'parity_blocks'})
+        assert set(full_plan) == set(core_calculator.formulas)
+        assert full_plan.index('ec_ratio') < full_plan.index('effective_nvme')
+
+    def test_known_output_is_not_planned(self, core_calculator):
+        """已知的输出不会重新计算"""
+        plan = core_calculator.get_evaluation_plan({'total_nvme', 'data_blocks', 'parity_blocks'})
+        assert 'total_nvme' not in plan
+        assert 'effective_nvme' in plan
+
+    def test_cycles_and_unreachable_reported_on_load(self, temp_dir):
+        """加载配置时报告循环依赖和不可达的输出"""
+        formulas_dir = os.path.join(temp_dir, 'cyclic_formulas')
+        write_formulas(formulas_dir, {
+            'global': {'defaults': {}},
+            'variables': {
+                'a_input': {'excel_column': 'A', 'can_be_input': True},
+                'loop_a': {'excel_column': 'loop_a', 'can_be_input': True},
+            },
+            'formulas': {
+                'loop_a': {'expression': 'loop_a = loop_b + 1', 'excel_column': 'loop_a'},
+                'loop_b': {'expression': 'loop_b = loop_a * 2', 'excel_column': 'loop_b'},
+                'orphan': {'expression': 'orphan = a_input * undefined_var', 'excel_column': 'orphan'},
+                'child': {'expression': 'child = orphan + 1', 'excel_column': 'child'},
+            },
+        })
+        with patch.object(calculator_core.logger, 'warning') as mock_warning:
+            calculator = StorageCalculator(formula_dir=formulas_dir)
+
+        assert calculator.formula_cycles == [['loop_a', 'loop_b']]
+        assert calculator.unreachable_outputs == ['orphan', 'child']
+        messages = ' '.join(str(call.args[0]) for call in mock_warning.call_args_list)
+        assert '循环依赖' in messages
+        assert 'orphan' in messages
+
+        # 环可以被已知输入打破
+        results, unsolved = calculator.calculate_with_columns({'loop_a': '3', 'A': '1'})
+        assert results['loop_b'] == pytest.approx(6.0)
+        assert set(unsolved) == {'orphan', 'child'}
+
+
+# ============================================================================
+# TestIncrementalCalculator - 增量计算测试
+# ============================================================================
+
+@pytest.fixture
+def sample_frame():
+    """增量计算使用的示例数据"""
+    return pd.DataFrame({
+        'nvme容量': ['10TB', '3.84TB', '1TB'],
+        'nvme数量': ['4', '2', '1'],
+        'K': ['8', '4', '8'],
+        'M': ['2', '1', '2'],
+    })
+
+
+def assert_frame_results_equal(results, unsolved, expected_results, expected_unsolved, names):
+    """比较两次计算的公式结果"""
+    for name in names:
+        assert (unsolved[name] == expected_unsolved[name]).all(), name
+        np.testing.assert_allclose(
+            results[name].to_numpy(), expected_results[name].to_numpy(), equal_nan=True, err_msg=name
+        )
+
+
+class TestIncrementalCalculator:
+    """测试增量计算引擎"""
+
+    def test_first_update_is_full(self, core_calculator, sample_frame):
+        """首次计算为全量计算，结果与 calculate_frame 一致"""
+        engine = IncrementalCalculator(core_calculator)
+        results, unsolved, recomputed = engine.update(sample_frame)
+        expected_results, expected_unsolved = core_calculator.calculate_frame(sample_frame)
+
+        assert engine.last_stats['full']
+        assert recomputed.all().all()
+        assert_frame_results_equal(results, unsolved, expected_results, expected_unsolved,
+                                   core_calculator.formulas)
+
+    def test_unchanged_frame_recomputes_nothing(self, core_calculator, sample_frame):
+        """输入未变化时不重算任何公式"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+
+        with patch.object(core_calculator, '_evaluate_formula_array') as mock_evaluate:
+            _, _, recomputed = engine.update(sample_frame.copy())
+
+        mock_evaluate.assert_not_called()
+        assert not recomputed.any().any()
+        assert engine.last_stats == {'full': False, 'rows': 0, 'formulas': 0}
+
+    def test_changed_cell_recomputes_dependents_only(self, core_calculator, sample_frame):
+        """修改单元格只重算该行中依赖它的公式"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+
+        df = sample_frame.copy()
+        df.at[1, 'nvme数量'] = '8'
+        results, unsolved, recomputed = engine.update(df)
+
+        assert set(recomputed.columns[recomputed.loc[1]]) == {'total_nvme', 'effective_nvme'}
+        assert not recomputed.loc[[0, 2]].any().any()
+        expected_results, expected_unsolved = core_calculator.calculate_frame(df)
+        assert_frame_results_equal(results, unsolved, expected_results, expected_unsolved,
+                                   core_calculator.formulas)
+
+    def test_rows_added_and_removed(self, core_calculator, sample_frame):
+        """新增行全量计算，删除的行被丢弃，其余行沿用缓存"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+
+        df = sample_frame.drop(index=0)
+        df.loc[5] = ['2TB', '3', '4', '2']
+        results, unsolved, recomputed = engine.update(df)
+
+        assert list(results.index) == [1, 2, 5]
+        assert recomputed.loc[5].all()
+        assert not recomputed.loc[[1, 2]].any().any()
+        assert results.at[5, 'total_nvme'] == pytest.approx(6e12)
+        expected_results, expected_unsolved = core_calculator.calculate_frame(df)
+        assert_frame_results_equal(results, unsolved, expected_results, expected_unsolved,
+                                   core_calculator.formulas)
+
+    def test_cleared_row_becomes_unsolved(self, core_calculator, sample_frame):
+        """清空一行的全部输入后该行输出全部无法求解"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+
+        df = sample_frame.copy()
+        df.loc[2] = ['', '', '', '']
+        results, unsolved, _ = engine.update(df)
+
+        assert unsolved.loc[2].all()
+        assert np.isnan(results.at[2, 'total_nvme'])
+
+    def test_defaults_change_forces_full_recompute(self, core_calculator, sample_frame):
+        """默认值变化时全量重算"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+        engine.update(sample_frame, defaults={'data_blocks': 4})
+
+        assert engine.last_stats['full']
+
+    def test_config_reload_forces_full_recompute(self, core_calculator, sample_frame):
+        """配置重新加载后全量重算"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+        core_calculator.formulas = dict(core_calculator.formulas)
+        engine.update(sample_frame)
+
+        assert engine.last_stats['full']
+
+    def test_apply_formats_output_columns(self, core_calculator, sample_frame):
+        """apply 回填格式化后的输出，被手动修改的输出单元格会被恢复"""
+        engine = IncrementalCalculator(core_calculator)
+        df = sample_frame.copy()
+        df['nvme总容量'] = ''
+        output = engine.apply(df)
+        assert output.at[0, 'nvme总容量'] == core_calculator.format_result('total_nvme', 40e12)
+
+        edited = output.copy()
+        edited.at[0, 'nvme总容量'] = 'manual'
+        output = engine.apply(edited)
+        assert output.at[0, 'nvme总容量'] == core_calculator.format_result('total_nvme', 40e12)
+
+    def test_reported_changes_match_full_diff(self, core_calculator, sample_frame):
+        """调用方给出改动的单元格时只检查这些单元格，结果与逐列对比一致"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+
+        df = sample_frame.copy()
+        df.at[1, 'nvme数量'] = '8'
+        df.at[2, 'K'] = ''
+        changed = [(1, 'nvme数量'), (2, 'K'), (0, 'M')]  # (0, 'M') 未变化，被忽略
+        results, unsolved, recomputed = engine.update(df, changed=changed)
+
+        assert engine.last_stats['rows'] == 2
+        assert not recomputed.loc[0].any()
+        expected_results, expected_unsolved = core_calculator.calculate_frame(df)
+        assert_frame_results_equal(results, unsolved, expected_results, expected_unsolved,
+                                   core_calculator.formulas)
+
+    def test_reported_changes_skip_column_diff(self, core_calculator, sample_frame):
+        """给出改动的单元格时不再逐列对比，未列出的改动不会被发现"""
+        engine = IncrementalCalculator(core_calculator)
+        engine.update(sample_frame)
+
+        df = sample_frame.copy()
+        df.at[0, 'nvme数量'] = '9'
+        _, _, recomputed = engine.update(df, changed=[])
+        assert not recomputed.any().any()
+
+    def test_apply_with_reported_output_edit(self, core_calculator, sample_frame):
+        engine = IncrementalCalculator(core_calculator)
+        df = sample_frame.copy()
+        df['nvme总容量'] = ''
+        output = engine.apply(df)
+
+        edited = output.copy()
+        edited.at[0, 'nvme总容量'] = 'manual'
+        edited.at[1, 'nvme数量'] = '8'
+        output = engine.apply(edited, changed=[(0, 'nvme总容量'), (1, 'nvme数量')])
+        assert output.at[0, 'nvme总容量'] == core_calculator.format_result('total_nvme', 40e12)
+        assert output.at[1, 'nvme总容量'] == core_calculator.format_result('total_nvme', 3.84e12 * 8)
+
+    def test_parse_frame_rows_matches_parse_frame_inputs(self, core_calculator):
+        df = pd.DataFrame({
+            'nvme容量': ['10TB', '  ', None, 'nan', 'bad', 3.5, '1e3'],
+            'nvme数量': ['4', '', '2', np.nan, '1', '2', ' 3 '],
+            'K': ['8', '4', '8', '8', '', '4', '8'],
+        })
+        defaults = {'M': '2'}
+        positions = [0, 1, 2, 3, 4, 5, 6]
+        expected = core_calculator.parse_frame_inputs(df, defaults)
+        actual = core_calculator.parse_frame_rows(df, positions, defaults)
+        assert set(actual) == set(expected)
+        for name in expected:
+            np.testing.assert_array_equal(actual[name], expected[name], err_msg=name)
+
+
+# ============================================================================
+# TestUnitConverter - 单位转换测试
+# ============================================================================
+
+class TestUnitConverter:
+    """测试共享的单位转换器"""
+
+    def test_storage_calculator_shares_converter(self):
+        """Excel 模式与 Web 界面使用同一个单位转换器"""
+        import storage_calculator
+        assert storage_calculator.UnitConverter is UnitConverter
+
+    def test_repeated_strings_hit_cache(self):
+        """重复的原始字符串只解析一次"""
+        UnitConverter._parse_string.cache_clear()
+        for _ in range(3):
+            assert UnitConverter.parse_value('4KiB') == 4096
+            assert UnitConverter.parse_value('10GB/s') == 10 * 1000**3
+        info = UnitConverter._parse_string.cache_info()
+        assert info.misses == 2
+        assert info.hits == 4
+
+    @pytest.mark.parametrize("unit, expected", [
+        ('kib', ('KiB', 1024, True)),
+        ('MiB/s', ('MiB/s', 1024**2, True)),
+        ('g', ('GB', 1000**3, False)),
+        ('bytes', ('B', 1, True)),
+        ('io/op', ('io/op', 1, False)),
+        ('IOPS', (None, 1, False)),
+    ])
+    def test_unit_table(self, unit, expected):
+        """单位表覆盖二进制、十进制、速率和复合单位"""
+        assert UnitConverter._parse_unit_prefix(unit) == expected
+
+    @pytest.mark.parametrize("unit, use_binary", [
+        ('TB', False), ('TiB', True), ('MiB/s', True), ('%', False),
+        ('个', False), ('IOPS', False), ('', True), (None, False),
+    ])
+    def test_format_array_matches_format_value(self, unit, use_binary):
+        """整列格式化与逐个格式化结果一致，缺失值为 None"""
+        values = [0.0, 0.5, 1234.5, 3 * 1024**4, -2e9, None, float('nan')]
+        expected = [
+            None if value is None or value != value else UnitConverter.format_value(value, unit, use_binary)
+            for value in values
+        ]
+        assert UnitConverter.format_array(values, unit, use_binary) == expected
+
+
+# ============================================================================
+# TestFormulaCache - 公式缓存测试
+# ============================================================================
+
+@pytest.fixture
+def split_formulas_dir(temp_dir):
+    """公式分布在两个 YAML 文件中的配置目录"""
+    formulas_dir = os.path.join(temp_dir, 'split_formulas')
+    os.makedirs(formulas_dir, exist_ok=True)
+    configs = {
+        'capacity.yaml': {
+            'variables': {
+                'nvme_capacity': {'excel_column': 'nvme容量', 'can_be_input': True},
+                'nvme_count': {'excel_column': 'nvme数量', 'can_be_input': True},
+            },
+            'formulas': {
+                'total_nvme': {'expression': 'total_nvme = nvme_capacity * nvme_count', 'unit': 'TB'},
+                'stripe_count': {'expression': 'stripe_count = ceiling(nvme_capacity / 3)'},
+            },
+        },
+        'ratio.yaml': {
+            'global': {'defaults': {'data_blocks': 8}},
+            'variables': {'data_blocks': {'excel_column': 'K', 'can_be_input': True}},
+            'formulas': {
+                'half_nvme': {'expression': 'half_nvme = total_nvme / 2'},
+                'per_block': {'expression': 'per_block = total_nvme / data_blocks'},
+            },
+        },
+    }
+    for file_name, config in configs.items():
+        with open(os.path.join(formulas_dir, file_name), 'w') as f:
+            yaml.dump(config, f, allow_unicode=True)
+    yield formulas_dir
+
+
+class TestFormulaCache:
+    """测试公式解析与编译结果的磁盘缓存"""
+
+    def test_cold_start_skips_parsing(self, split_formulas_dir, temp_dir):
+        """公式未变化时，新进程启动不再调用 yaml 解析和 parse_expr"""
+        cache_dir = os.path.join(temp_dir, 'formula_cache')
+        first = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+        assert len(os.listdir(cache_dir)) == 2
+
+        with patch.object(calculator_core, 'parse_expr', side_effect=AssertionError), \
+                patch.object(calculator_core.yaml, 'safe_load', side_effect=AssertionError):
+            second = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+
+        assert second.formula_cache.stats == {'hits': 2, 'misses': 0}
+        assert set(second.formulas) == set(first.formulas)
+        row = {'nvme容量': '10', 'nvme数量': '4'}
+        assert second.calculate_with_columns(row)[0] == first.calculate_with_columns(row)[0]
+
+    def test_reload_reparses_only_changed_file(self, split_formulas_dir, temp_dir):
+        """修改一个文件后重新加载，只重新解析该文件中的公式"""
+        cache_dir = os.path.join(temp_dir, 'formula_cache')
+        calculator = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+
+        ratio_path = os.path.join(split_formulas_dir, 'ratio.yaml')
+        with open(ratio_path) as f:
+            config = yaml.safe_load(f)
+        config['formulas']['half_nvme']['expression'] = 'half_nvme = total_nvme / 4'
+        with open(ratio_path, 'w') as f:
+            yaml.dump(config, f, allow_unicode=True)
+
+        with patch.object(calculator_core, 'parse_expr', wraps=calculator_core.parse_expr) as mock_parse:
+            assert calculator.load_config()
+
+        parsed = sorted(call.args[0] for call in mock_parse.call_args_list)
+        assert parsed == ['total_nvme / 4', 'total_nvme / data_blocks']
+        results, _ = calculator.calculate_with_columns({'nvme容量': '10', 'nvme数量': '4'})
+        assert results['half_nvme'] == pytest.approx(10.0)
+
+    def test_cached_expressions_match_parsed(self, split_formulas_dir, temp_dir):
+        """从缓存重建的表达式和数值函数与直接解析的结果一致，缓存中不保存函数源码"""
+        cache_dir = os.path.join(temp_dir, 'formula_cache')
+        first = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+        second = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), encoding='utf-8') as f:
+                assert set(json.load(f)) == {'key', 'config', 'expressions'}
+        for name in first.formulas:
+            assert second.formulas[name]['equation'] == first.formulas[name]['equation']
+
+        values = np.array([1.0, 4.0, 7.5])
+        for name in ('stripe_count', 'total_nvme'):
+            args = second.formulas[name]['args']
+            assert args == first.formulas[name]['args']
+            np.testing.assert_allclose(
+                second.formulas[name]['func'](*[values] * len(args)),
+                first.formulas[name]['func'](*[values] * len(args)),
+            )
+
+    def test_corrupt_cache_file_is_ignored(self, split_formulas_dir, temp_dir):
+        """缓存文件损坏时重新解析"""
+        cache_dir = os.path.join(temp_dir, 'formula_cache')
+        StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+        for name in os.listdir(cache_dir):
+            with open(os.path.join(cache_dir, name), 'wb') as f:
+                f.write(b'not json')
+
+        calculator = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+
+        assert calculator.formula_cache.stats == {'hits': 0, 'misses': 2}
+        assert 'total_nvme' in calculator.formulas
+
+    def test_prune_keeps_recent_files(self, temp_dir):
+        """缓存文件超过上限时删除最旧的"""
+        cache_dir = os.path.join(temp_dir, 'formula_cache')
+        cache = FormulaCache(cache_dir)
+        cache.MAX_FILES = 2
+        keys = []
+        for i in range(3):
+            path = os.path.join(temp_dir, f'f{i}.yaml')
+            with open(path, 'w') as f:
+                f.write(f'global: {{defaults: {{x: {i}}}}}')
+            keys.append(cache.load(path)['key'])
+            cache.flush()
+            # 依次设置更晚的修改时间
+            os.utime(os.path.join(cache_dir, f'{keys[-1]}.json'), (1000 + i, 1000 + i))
+
+        cache._prune()
+        assert sorted(os.listdir(cache_dir)) == sorted(f'{key}.json' for key in keys[1:])
+
+    def test_default_cache_dir_is_per_user(self, temp_dir, monkeypatch):
+        """默认缓存目录在用户缓存目录下，以 0700 权限创建"""
+        monkeypatch.setenv('XDG_CACHE_HOME', temp_dir)
+        cache_dir = calculator_core.default_cache_dir()
+        assert cache_dir.startswith(temp_dir)
+
+        cache = FormulaCache(cache_dir)
+        assert cache.cache_dir == cache_dir
+        if os.name == 'posix':
+            assert os.stat(cache_dir).st_mode & 0o777 == 0o700
+
+    @pytest.mark.skipif(os.name != 'posix', reason="需要 POSIX 权限")
+    def test_insecure_cache_is_not_used(self, split_formulas_dir, temp_dir):
+        """缓存目录或缓存文件可被其他用户写入时不读取"""
+        cache_dir = os.path.join(temp_dir, 'formula_cache')
+        StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+        for name in os.listdir(cache_dir):
+            os.chmod(os.path.join(cache_dir, name), 0o666)
+        calculator = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+        assert calculator.formula_cache.stats == {'hits': 0, 'misses': 2}
+
+        os.chmod(cache_dir, 0o777)
+        calculator = StorageCalculator(formula_dir=split_formulas_dir, cache_dir=cache_dir)
+        assert calculator.formula_cache.cache_dir is None
+        assert 'total_nvme' in calculator.formulas
+
+
+# ============================================================================
+# TestCalculationTrace - 计算过程记录测试
+# ============================================================================
+
+class TestCalculationTrace:
+    """测试逐行计算过程的记录与静默模式"""
+
+    ROW = {'nvme容量': '10TB', 'nvme数量': '4', 'K': '8', 'M': '2'}
+
+    def test_quiet_mode_skips_trace(self, core_calculator):
+        """静默模式不构造过程信息，也不输出 INFO 日志"""
+        core_calculator.trace = False
+        with patch.object(calculator_core.logger, 'info') as mock_info, \
+                patch.object(CalculationTrace, 'render') as mock_render:
+            results, unsolved = core_calculator.calculate_with_columns(self.ROW)
+
+        mock_info.assert_not_called()
+        mock_render.assert_not_called()
+        assert core_calculator.last_trace is None
+        assert unsolved == []
+        assert results['effective_nvme'] == pytest.approx(32e12)
+
+    def test_log_level_controls_default_mode(self, core_calculator):
+        """默认跟随日志级别：高于 INFO 时不记录"""
+        level = calculator_core.logger.level
+        calculator_core.logger.setLevel(logging.WARNING)
+        try:
+            core_calculator.calculate_with_columns(self.ROW)
+            assert core_calculator.last_trace is None
+        finally:
+            calculator_core.logger.setLevel(level)
+
+        core_calculator.calculate_with_columns(self.ROW)
+        assert core_calculator.last_trace is not None
+
+    def test_trace_is_structured(self, core_calculator):
+        """记录的过程包含输入、求值顺序和每个方程的结果"""
+        core_calculator.trace = False
+        results, _ = core_calculator.calculate_with_columns(self.ROW, row_index=3, trace=True)
+        trace = core_calculator.last_trace
+
+        assert trace.row_index == 3
+        assert ('nvme_count', 4.0, '4') in trace.inputs
+        assert trace.plan.index('total_nvme') < trace.plan.index('effective_nvme')
+        steps = {step['name']: step for step in trace.steps}
+        assert steps['total_nvme']['values'] == {'nvme_capacity': 10e12, 'nvme_count': 4.0}
+        assert steps['effective_nvme']['value'] == pytest.approx(32e12)
+        assert trace.results == {name: results[name] for name in core_calculator.formulas}
+
+    def test_render_matches_log_output(self, core_calculator):
+        """渲染结果包含方程代入过程"""
+        core_calculator.calculate_with_columns(self.ROW, row_index=0, trace=True)
+        text = str(core_calculator.last_trace)
+
+        assert '开始新的计算过程 (data_editor 第 0 行)' in text
+        assert '求解方程: total_nvme' in text
+        assert '代入后的方程' in text
+        assert '✓ 求解成功: stripe_count' in text
+
+    def test_quiet_mode_throughput(self, core_calculator):
+        """基准：静默模式与记录过程模式的每秒行数"""
+        rows = [dict(self.ROW, **{'nvme数量': str(i + 1)}) for i in range(200)]
+
+        def rows_per_second(trace):
+            core_calculator.trace = trace
+            start = time.perf_counter()
+            for i, row in enumerate(rows):
+                core_calculator.calculate_with_columns(row, row_index=i)
+            return len(rows) / (time.perf_counter() - start)
+
+        # 记录过程但不输出到终端，只比较构造和渲染的开销
+        with patch.object(calculator_core.logger, 'info'):
+            traced = rows_per_second(None)
+        quiet = rows_per_second(False)
+        print(f"\n逐行计算: 记录过程 {traced:.0f} 行/秒, 静默模式 {quiet:.0f} 行/秒")
+
+        assert quiet > traced
+
+
+# ============================================================================
+# TestGoalSeeker - 反向求解测试
+# ============================================================================
+
+class TestGoalSeeker:
+    """测试数值反向求解"""
+
+    def test_linear_target(self, core_calculator):
+        """可用容量达到 2 PiB 需要的 nvme 数量"""
+        seeker = GoalSeeker(core_calculator)
+        report = seeker.seek('effective_nvme', '2PiB', 'nvme数量', fixed={'nvme_capacity': '10TB'})
+
+        assert report['converged']
+        expected = 2 * 2 ** 50 * 1.25 / 10e12
+        assert report['value'] == pytest.approx(expected, rel=1e-9)
+        assert report['achieved'] == pytest.approx(2 * 2 ** 50, rel=1e-9)
+        assert report['results']['total_nvme'] == pytest.approx(report['value'] * 10e12)
+
+    def test_integer_solution(self, core_calculator):
+        """取整数时取不小于解的最小整数"""
+        report = GoalSeeker(core_calculator).seek(
+            'effective_nvme', '2PiB', 'nvme_count', fixed={'nvme_capacity': '10TB'}, integer=True
+        )
+
+        assert report['value'] == 282
+        assert report['achieved'] >= 2 * 2 ** 50
+
+    def test_nonlinear_without_solve(self, core_calculator):
+        """非线性公式用数值求根，不调用 sympy.solve"""
+        seeker = GoalSeeker(core_calculator)
+        with patch.object(calculator_core, 'solve') as mock_solve:
+            report = seeker.seek('ec_ratio', 1.2, 'data_blocks', fixed={'parity_blocks': 2})
+        mock_solve.assert_not_called()
+
+        assert report['converged']
+        assert report['value'] == pytest.approx(10)
+        assert abs(report['residual']) < 1e-9
+
+    def test_cache_and_warm_start(self, core_calculator):
+        """相同查询命中缓存，修改目标值后从上一次的解开始搜索"""
+        seeker = GoalSeeker(core_calculator)
+        first = seeker.seek('ec_ratio', 1.2, 'data_blocks', fixed={'parity_blocks': 2})
+        assert not first['warm_start']
+
+        again = seeker.seek('ec_ratio', 1.2, 'data_blocks', fixed={'parity_blocks': 2})
+        assert again['cached']
+        assert again['value'] == first['value']
+        assert seeker.stats == {'hits': 1, 'misses': 1}
+
+        moved = seeker.seek('ec_ratio', 1.25, 'data_blocks', fixed={'parity_blocks': 2})
+        assert moved['warm_start'] and not moved['cached']
+        assert moved['value'] == pytest.approx(8)
+
+    def test_cached_results_are_copied(self, core_calculator):
+        """调用方修改返回的结果不影响之后命中缓存的结果"""
+        seeker = GoalSeeker(core_calculator)
+        first = seeker.seek('ec_ratio', 1.2, 'data_blocks', fixed={'parity_blocks': 2})
+        first['results']['ec_ratio'] = -1.0
+        first['value'] = None
+
+        again = seeker.seek('ec_ratio', 1.2, 'data_blocks', fixed={'parity_blocks': 2})
+        assert again['cached']
+        assert again['value'] == pytest.approx(10)
+        assert again['results']['ec_ratio'] == pytest.approx(1.2)
+        again['results'].clear()
+        assert seeker.seek('ec_ratio', 1.2, 'data_blocks', fixed={'parity_blocks': 2})['results']
+
+    def test_cache_evicts_least_recently_used(self, core_calculator):
+        """缓存满时只淘汰最久未使用的条目"""
+        seeker = GoalSeeker(core_calculator)
+        seeker.CACHE_SIZE = 2
+        query = dict(variable='data_blocks', fixed={'parity_blocks': 2})
+        seeker.seek('ec_ratio', 1.2, **query)
+        seeker.seek('ec_ratio', 1.25, **query)
+        seeker.seek('ec_ratio', 1.2, **query)
+        seeker.seek('ec_ratio', 1.5, **query)
+
+        assert seeker.seek('ec_ratio', 1.2, **query)['cached']
+        assert not seeker.seek('ec_ratio', 1.25, **query)['cached']
+
+    def test_cache_key_includes_fixed_inputs(self, core_calculator):
+        seeker = GoalSeeker(core_calculator)
+        a = seeker.seek('ec_ratio', 1.5, 'data_blocks', fixed={'parity_blocks': 2})
+        b = seeker.seek('ec_ratio', 1.5, 'data_blocks', fixed={'parity_blocks': 4})
+
+        assert not b['cached']
+        assert a['value'] == pytest.approx(4)
+        assert b['value'] == pytest.approx(8)
+
+    def test_no_bracket(self, core_calculator):
+        """找不到变号区间时报告未收敛"""
+        report = GoalSeeker(core_calculator).seek('ec_ratio', 0.5, 'data_blocks', fixed={'parity_blocks': 2})
+
+        assert report['value'] is None
+        assert not report['converged']
+        assert report['message'] == '在搜索范围内找不到变号区间'
+
+    def test_bounds(self, core_calculator):
+        report = GoalSeeker(core_calculator).seek(
+            'ec_ratio', 1.5, 'data_blocks', fixed={'parity_blocks': 2}, bounds=(1, 100)
+        )
+
+        assert report['converged']
+        assert report['value'] == pytest.approx(4)
+        assert 1 <= report['bracket'][0] <= report['bracket'][1] <= 100
+
+    def test_invalid_arguments(self, core_calculator):
+        seeker = GoalSeeker(core_calculator)
+        with pytest.raises(ValueError):
+            seeker.seek('missing', 1, 'data_blocks')
+        with pytest.raises(ValueError):
+            seeker.seek('ec_ratio', 1.5, 'nvme_count')
@@ -0,0 +1,267 @@
+"""
+data_store 数据持久化单元测试
+
+测试覆盖范围：
+1. 保存与加载 - 往返一致、无变化时不写入
+2. 增量记录 - 单元格修改、行列增删与重命名
+3. 快照压缩 - 自动压缩、压缩后重放
+4. 异常恢复 - 写到一半的日志、快照之前的残留记录
+5. Excel 导出
+"""
+
+import os
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_store import DataStore
+
+# ============================================================================
+# Fixtures - 测试夹具
+# ============================================================================
+
+@pytest.fixture
+def temp_dir():
+    """创建临时目录，使用固定的测试目录避免 macOS TCC 权限问题"""
+    test_temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_temp_store')
+    os.makedirs(test_temp_dir, exist_ok=True)
+
+    yield test_temp_dir
+
+    shutil.rmtree(test_temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def store_dir(temp_dir):
+    return os.path.join(temp_dir, 'store')
+
+
+@pytest.fixture
+def sample_df():
+    """与 Web 界面一致：所有列为字符串，空单元格为空字符串"""
+    return pd.DataFrame({
+        'HDD容量': ['20TB', '16TB', ''],
+        'HDD数量': ['12', '24', '36'],
+        '备注': ['', 'a', 'b'],
+    })
+
+
+def reopen(store_dir):
+    """模拟进程重启后重新加载"""
+    return DataStore(store_dir).load()
+
+
+def journal_records(store):
+    with open(store.journal_path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ============================================================================
+# 保存与加载
+# ============================================================================
+
+class TestSaveLoad:
+    """测试保存与加载"""
+
+    def test_empty_store(self, store_dir):
+        store = DataStore(store_dir)
+        assert not store.exists()
+        assert store.load() is None
+
+    def test_round_trip(self, store_dir, sample_df):
+        """首次保存直接写快照，重新加载后一致"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        assert os.path.exists(store.snapshot_path)
+        pd.testing.assert_frame_equal(reopen(store_dir), sample_df, check_dtype=False)
+
+    @pytest.mark.parametrize('frame', [
+        pd.DataFrame({'a': [1.0, 2.0, np.nan], 'c': [1, 2, 3]}),
+        pd.DataFrame({
+            'n': [1, 2, 3],
+            'flag': [True, False, True],
+            't': pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03']),
+            's': ['x', 'y', 'z'],
+            'mixed': ['20TB', 12.5, None],
+        }, index=[10, 20, 30]),
+    ])
+    def test_round_trip_keeps_dtypes(self, store_dir, frame):
+        """快照和日志重放后各列 dtype 不变"""
+        store = DataStore(store_dir)
+        store.save(frame)
+        assert reopen(store_dir).equals(frame)
+
+        edited = frame.copy()
+        edited.iloc[1, 0] = edited.iloc[0, 0]
+        store.save(edited)
+        loaded = reopen(store_dir)
+        assert list(loaded.dtypes) == list(edited.dtypes)
+        assert loaded.equals(edited)
+
+        store.compact()
+        assert reopen(store_dir).equals(edited)
+
+    def test_snapshot_loads_without_pickle(self, store_dir, sample_df):
+        """快照是 npz，读取时不允许 pickle"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        with np.load(store.snapshot_path, allow_pickle=False) as snapshot:
+            assert all(snapshot[name].dtype != object for name in snapshot.files)
+
+    def test_no_change_writes_nothing(self, store_dir, sample_df):
+        store = DataStore(store_dir)
+        store.save(sample_df)
+        size = os.path.getsize(store.journal_path)
+
+        assert store.save(sample_df.copy()) == 0
+        assert os.path.getsize(store.journal_path) == size
+
+
+# ============================================================================
+# 增量记录
+# ============================================================================
+
+class TestJournal:
+    """测试增量变更记录"""
+
+    def test_cell_change_appends_one_record(self, store_dir, sample_df):
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        changed = sample_df.copy()
+        changed.loc[1, 'HDD数量'] = '48'
+        assert store.save(changed) == 1
+
+        records = journal_records(store)
+        assert len(records) == 1
+        assert records[0]['set'] == [[1, 'HDD数量', '48']]
+        assert 'columns' not in records[0] and 'index' not in records[0]
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+    def test_column_changes(self, store_dir, sample_df):
+        """列重命名、新增与删除"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        changed = sample_df.rename(columns={'备注': '说明'}).drop(columns=['HDD容量'])
+        changed['K'] = ['8', '8', '4']
+        store.save(changed)
+
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+    def test_row_changes(self, store_dir, sample_df):
+        """删除行与追加行"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        changed = sample_df.drop(index=0)
+        changed.loc[5] = ['4TB', '6', 'new']
+        store.save(changed)
+        changed = changed.drop(index=2)
+        store.save(changed)
+
+        assert len(journal_records(store)) == 2
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+    def test_large_change_writes_snapshot(self, store_dir, sample_df):
+        """大部分单元格都变化时直接写快照"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        changed = sample_df.map(lambda value: value + 'x')
+        store.save(changed)
+
+        assert journal_records(store) == []
+        assert store.stats['compactions'] == 2
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+
+# ============================================================================
+# 快照压缩与异常恢复
+# ============================================================================
+
+class TestCompaction:
+    """测试快照压缩与异常恢复"""
+
+    def test_auto_compaction(self, store_dir, sample_df, monkeypatch):
+        monkeypatch.setattr(DataStore, 'COMPACT_RECORDS', 3)
+        store = DataStore(store_dir)
+        store.save(sample_df)
+
+        df = sample_df.copy()
+        for i in range(5):
+            df.loc[0, '备注'] = f'v{i}'
+            store.save(df)
+
+        # 第 3 次修改后压缩，之后只剩 2 条日志
+        assert len(journal_records(store)) == 2
+        pd.testing.assert_frame_equal(reopen(store_dir), df, check_dtype=False)
+
+    def test_replay_after_compact(self, store_dir, sample_df):
+        store = DataStore(store_dir)
+        store.save(sample_df)
+        changed = sample_df.copy()
+        changed.loc[2, 'HDD容量'] = '8TB'
+        store.save(changed)
+        store.compact()
+
+        assert journal_records(store) == []
+        changed.loc[0, '备注'] = 'after'
+        store.save(changed)
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+    def test_torn_last_record_ignored(self, store_dir, sample_df):
+        """最后一条日志写到一半时中断，加载到上一条为止"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+        changed = sample_df.copy()
+        changed.loc[0, 'HDD数量'] = '99'
+        store.save(changed)
+        with open(store.journal_path, 'a', encoding='utf-8') as f:
+            f.write('{"seq": 9, "set": [[0, "HDD')
+
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+    def test_stale_records_skipped(self, store_dir, sample_df):
+        """压缩快照后、清空日志前中断时，残留的旧记录不会重复应用"""
+        store = DataStore(store_dir)
+        store.save(sample_df)
+        changed = sample_df.copy()
+        changed.loc[0, 'HDD数量'] = '99'
+        store.save(changed)
+        with open(store.journal_path, encoding='utf-8') as f:
+            stale = f.read()
+        changed.loc[0, 'HDD数量'] = '100'
+        store.save(changed)
+        store.compact()
+        with open(store.journal_path, 'w', encoding='utf-8') as f:
+            f.write(stale)
+
+        pd.testing.assert_frame_equal(reopen(store_dir), changed, check_dtype=False)
+
+
+# ============================================================================
+# Excel 导出
+# ============================================================================
+
+class TestExport:
+    """测试 Excel 导出"""
+
+    def test_export_excel(self, store_dir, temp_dir, sample_df):
+        pytest.importorskip('openpyxl')
+        store = DataStore(store_dir)
+        store.save(sample_df)
+        path = os.path.join(temp_dir, 'export.xlsx')
+
+        assert store.export_excel(path) == 3
+        exported = pd.read_excel(path, keep_default_na=False, dtype=str)
+        assert list(exported.columns) == list(sample_df.columns)
+
+    def test_export_without_data(self, store_dir, temp_dir):
+        with pytest.raises(FileNotFoundError):
+            DataStore(store_dir).export_excel(os.path.join(temp_dir, 'export.xlsx'))
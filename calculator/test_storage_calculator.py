@@ -7,7 +7,7 @@ Storage Calculator 完整单元测试套件
 3. 配置文件加载和热重载测试
 4. macOS 文件系统事件监听测试 (watchdog)
 5. Excel 集成测试 (xlwings)
-6. TimingStats 性能统计测试
+6. TimingStats 性能统计与延迟导入测试
 """
 
 import pytest
@@ -26,10 +26,13 @@ from storage_calculator import (
     StorageCalculator,
     TimingStats,
     FormulaWatcher,
+    ChangeDebouncer,
     ExcelHandler,
     setup_logging,
-    timing
+    timing,
+    LazyModule
 )
+from memory_workbook import MemoryWorkbook
 
 # ============================================================================
 # Fixtures - 测试夹具
@@ -229,6 +232,52 @@ class TestTimingStats:
         assert result['test']['min'] == pytest.approx(0.1)
         assert result['test']['max'] == pytest.approx(0.3)
 
+    def test_import_profile_sorted_by_cost(self, capsys):
+        """测试启动耗时报告按耗时排序"""
+        stats = TimingStats()
+        stats.add_import_time('yaml', 0.1)
+        stats.add_import_time('sympy', 0.3)
+
+        profile = stats.get_import_profile()
+        assert [name for name, _, _ in profile] == ['sympy', 'yaml']
+        assert profile[0][2] == pytest.approx(0.75)
+
+        stats.print_import_profile(startup_time=0.5)
+        output = capsys.readouterr().out
+        assert output.index('sympy') < output.index('yaml')
+        assert '启动总耗时: 0.500秒' in output
+
+
+class TestLazyModule:
+    """测试延迟导入"""
+
+    def test_import_on_first_attribute_access(self):
+        """首次访问属性时才导入并记录导入时间"""
+        module = LazyModule('json')
+        recorded = len(timing.import_times)
+        assert '未导入' in repr(module)
+
+        assert module.dumps([1]) == '[1]'
+        assert '已导入' in repr(module)
+        assert timing.import_times[recorded][0] == 'json'
+
+        module.loads('[]')
+        assert len(timing.import_times) == recorded + 1
+
+    def test_heavy_modules_not_imported_at_module_load(self):
+        """模块加载时不导入 sympy、xlwings 等重量级依赖"""
+        import subprocess
+        code = (
+            "import sys, storage_calculator; "
+            "print(any(m in sys.modules for m in ('sympy', 'xlwings', 'pandas', 'calculator_core')))"
+        )
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip().splitlines()[-1] == 'False'
+
 
 # ============================================================================
 # TestUnitConverter - 单位转换器测试
@@ -280,30 +329,18 @@ class TestUnitConverter:
         assert result == pytest.approx(expected, rel=1e-6)
 
     # 科学计数法测试
-    # 注意：原代码中科学计数法解析有 bug（局部变量 re 遮蔽问题）
-    # 这些测试用例记录了当前的实际行为，待修复后可更新
     @pytest.mark.parametrize("input_value, expected", [
-        # 纯数字的科学计数法 - 当前实现有 bug，返回 None
-        # 修复后应该返回正确值
-        # ("1e3", 1000),
-        # ("2.5e6", 2500000),
-        # ("1.2e-1", 0.12),
-        # 带单位的科学计数法 - 同样有 bug
-        # ("1.5E3MB", 1.5e3 * 1000**2),
-        # ("2e2GiB", 200 * 1024**3),
+        ("1e3", 1000),
+        ("2.5e6", 2500000),
+        ("1.2e-1", 0.12),
+        ("1.5E3MB", 1.5e3 * 1000**2),
+        ("2e2GiB", 200 * 1024**3),
+        ("1e3MiB/s", 1000 * 1024**2),
     ])
     def test_parse_scientific_notation(self, input_value, expected):
-        """测试科学计数法解析 - 跳过，等待代码修复"""
-        pytest.skip("科学计数法解析功能存在 bug，待修复")
-
-    # 测试科学计数法解析的当前行为（用于验证 bug 是否存在）
-    def test_scientific_notation_known_issue(self):
-        """记录科学计数法解析的已知问题"""
-        # 当前实现中，纯科学计数法会因为 re 模块局部变量问题返回 None
-        result = UnitConverter.parse_value("1e3")
-        # 这是一个已知的 bug，记录当前行为
-        # 如果 bug 被修复，这个测试会失败，提示需要更新测试
-        assert result is None or result == pytest.approx(1000)
+        """测试科学计数法解析"""
+        result = UnitConverter.parse_value(input_value)
+        assert result == pytest.approx(expected, rel=1e-6)
 
     # 特殊单位测试
     @pytest.mark.parametrize("input_value, expected", [
@@ -716,7 +753,7 @@ class TestFormulaWatcher:
 
     def test_formula_watcher_on_modified_yaml(self, calculator_with_temp_config, temp_formulas_dir):
         """测试 YAML 文件修改事件处理"""
-        watcher = FormulaWatcher(calculator_with_temp_config)
+        watcher = FormulaWatcher(calculator_with_temp_config, debounce_window=0.01)
 
         # 创建模拟事件
         mock_event = Mock()
@@ -725,23 +762,30 @@ class TestFormulaWatcher:
         # 模拟 load_config 方法
         with patch.object(calculator_with_temp_config, 'load_config') as mock_load:
             watcher.on_modified(mock_event)
+            # 事件只被记录，防抖窗口结束后才重新加载
+            mock_load.assert_not_called()
 
-            # 验证 load_config 被调用
+            assert watcher.debouncer.run_pending(timeout=2)
             mock_load.assert_called_once()
 
     def test_formula_watcher_debounce(self, calculator_with_temp_config, temp_formulas_dir):
-        """测试事件防抖动"""
-        watcher = FormulaWatcher(calculator_with_temp_config)
-        watcher.last_modified = time.time()  # 设置最近修改时间
-
-        mock_event = Mock()
-        mock_event.src_path = os.path.join(temp_formulas_dir, 'test.yaml')
+        """测试事件防抖动：窗口内的多个事件、多个文件合并为一次重新加载"""
+        watcher = FormulaWatcher(calculator_with_temp_config, debounce_window=0.05)
 
         with patch.object(calculator_with_temp_config, 'load_config') as mock_load:
-            watcher.on_modified(mock_event)
+            for name in ('test.yaml', 'test.yaml', 'other.yaml'):
+                mock_event = Mock()
+                mock_event.src_path = os.path.join(temp_formulas_dir, name)
+                watcher.on_modified(mock_event)
 
-            # 由于防抖动，load_config 不应该被调用
-            mock_load.assert_not_called()
+            assert watcher.debouncer.run_pending(timeout=2)
+            mock_load.assert_called_once()
+
+        stats = watcher.debouncer.get_stats()
+        assert stats['events'] == 3
+        assert stats['coalesced'] == 2
+        assert stats['runs'] == 1
+        assert stats['pending'] == 0
 
     def test_formula_watcher_ignores_non_yaml(self, calculator_with_temp_config, temp_formulas_dir):
         """测试忽略非 YAML 文件"""
@@ -770,6 +814,96 @@ class TestFormulaWatcher:
             mock_load.assert_not_called()
 
 
+class TestChangeDebouncer:
+    """测试文件变更事件的防抖与合并"""
+
+    def test_burst_is_coalesced(self):
+        """窗口内的连续事件合并为一次处理"""
+        calls = []
+        debouncer = ChangeDebouncer(lambda paths, cancel: calls.append(paths), window=0.05)
+
+        for path in ('b.yaml', 'a.yaml', 'b.yaml', 'a.yaml'):
+            debouncer.submit(path)
+
+        assert debouncer.run_pending(timeout=2)
+        assert calls == [['a.yaml', 'b.yaml']]
+        # 没有新事件时不处理
+        assert not debouncer.run_pending(timeout=0.05)
+        assert debouncer.get_stats() == {
+            'events': 4, 'coalesced': 3, 'runs': 1, 'cancelled': 0, 'failed': 0, 'pending': 0,
+        }
+
+    def test_window_is_extended_by_new_events(self):
+        """窗口内的新事件顺延处理时间"""
+        debouncer = ChangeDebouncer(lambda paths, cancel: None, window=0.2)
+        debouncer.submit('a.yaml')
+
+        assert not debouncer.run_pending(timeout=0.1)
+        debouncer.submit('a.yaml')
+        assert not debouncer.run_pending(timeout=0.1)
+        assert debouncer.run_pending(timeout=2)
+        assert debouncer.get_stats()['coalesced'] == 1
+
+    def test_max_delay_bounds_waiting(self):
+        """持续不断的事件不会无限推迟处理"""
+        debouncer = ChangeDebouncer(lambda paths, cancel: None, window=10, max_delay=0.05)
+        debouncer.submit('a.yaml')
+        time.sleep(0.06)
+        debouncer.submit('a.yaml')
+
+        start = time.monotonic()
+        assert debouncer.run_pending(timeout=2)
+        assert time.monotonic() - start < 1
+
+    def test_stale_run_is_cancelled_and_rerun(self):
+        """处理期间到达的新事件取消正在执行的处理，文件并入下一次处理"""
+        started = threading.Event()
+        calls = []
+
+        def callback(paths, cancel):
+            calls.append(paths)
+            if len(calls) == 1:
+                started.set()
+                assert cancel.wait(2)
+
+        debouncer = ChangeDebouncer(callback, window=0.01)
+        debouncer.submit('a.yaml')
+        worker = threading.Thread(target=debouncer.run_pending, kwargs={'timeout': 2})
+        worker.start()
+        assert started.wait(2)
+        debouncer.submit('b.yaml')
+        worker.join(2)
+
+        assert debouncer.run_pending(timeout=2)
+        assert calls == [['a.yaml'], ['a.yaml', 'b.yaml']]
+        stats = debouncer.get_stats()
+        assert stats['cancelled'] == 1
+        assert stats['runs'] == 2
+
+    def test_callback_errors_are_counted(self):
+        """处理失败只记录，不影响后续处理"""
+        def callback(paths, cancel):
+            raise ValueError('boom')
+
+        debouncer = ChangeDebouncer(callback, window=0.01)
+        debouncer.submit('a.yaml')
+
+        assert debouncer.run_pending(timeout=2)
+        assert debouncer.get_stats()['failed'] == 1
+
+    def test_background_worker(self):
+        """start() 启动的工作线程自动处理，stop() 后退出"""
+        done = threading.Event()
+        debouncer = ChangeDebouncer(lambda paths, cancel: done.set(), window=0.01)
+        debouncer.start()
+        try:
+            debouncer.submit('a.yaml')
+            assert done.wait(2)
+        finally:
+            debouncer.stop()
+        assert debouncer._thread is None
+
+
 # ============================================================================
 # TestFileSystemWatching - 文件系统监听集成测试 (macOS)
 # ============================================================================
@@ -913,6 +1047,8 @@ class TestExcelHandler:
 
             assert handler.excel_path == excel_path
             assert handler.calculator is not None
+            # 增量引擎与处理器共用同一个计算器，公式配置只加载一次
+            assert handler.engine.calculator is handler.calculator
             assert handler.last_modified == 0
 
     def test_excel_handler_thread_safety(self, temp_dir, mock_xlwings):
@@ -942,24 +1078,29 @@ class TestExcelHandler:
             assert handler.wb is None or handler.app is None
 
     def test_excel_handler_on_modified_debounce(self, temp_dir, mock_xlwings):
-        """测试文件修改事件防抖动"""
+        """测试文件修改事件防抖动：一次保存的多个事件只处理一次"""
         excel_path = os.path.join(temp_dir, 'test.xlsx')
         Path(excel_path).touch()
 
         with patch('storage_calculator.xw', mock_xlwings['xw']):
-            handler = ExcelHandler(excel_path)
-            handler.last_modified = time.time()
-            handler.last_size = os.path.getsize(excel_path)
+            handler = ExcelHandler(excel_path, debounce_window=0.05)
 
             mock_event = Mock()
             mock_event.src_path = excel_path
 
             with patch.object(handler, 'process_excel') as mock_process:
-                handler.on_modified(mock_event)
+                for _ in range(3):
+                    handler.on_modified(mock_event)
 
-                # 由于防抖动，process_excel 不应该被调用
+                # 事件只被记录，不在监听线程中操作Excel
                 mock_process.assert_not_called()
 
+                assert handler.debouncer.run_pending(timeout=2)
+                mock_process.assert_called_once()
+
+            assert handler.last_modified > 0
+            assert handler.debouncer.get_stats()['coalesced'] == 2
+
     def test_excel_handler_ignores_other_files(self, temp_dir, mock_xlwings):
         """测试忽略其他文件"""
         excel_path = os.path.join(temp_dir, 'test.xlsx')
@@ -980,6 +1121,82 @@ class TestExcelHandler:
                 mock_process.assert_not_called()
 
 
+class TestExcelHandlerBulkIO:
+    """测试 ExcelHandler 使用内存工作簿的整块读写"""
+
+    @pytest.fixture
+    def excel_path(self, temp_dir):
+        excel_path = os.path.join(temp_dir, 'test.xlsx')
+        Path(excel_path).touch()
+        return excel_path
+
+    @pytest.fixture
+    def workbook(self):
+        return MemoryWorkbook([
+            ['nvme容量', 'nvme数量', 'nvme总容量', '备注'],
+            ['10TB', 4, None, 'a'],
+            [None, None, None, None],
+            ['2TB', 3, None, None],
+            ['1TB', 1, None, None],
+        ])
+
+    def test_process_excel_bulk_read_and_write(self, excel_path, workbook):
+        """整块读取后计算，变化的输出按连续行分段写回"""
+        handler = ExcelHandler(excel_path, workbook=workbook)
+        sheet = workbook.sheets.active
+
+        handler.process_excel()
+
+        assert sheet.cells[(2, 3)] == '40.00 TB'
+        assert (3, 3) not in sheet.cells
+        assert sheet.cells[(4, 3)] == '6.00 TB'
+        assert sheet.cells[(5, 3)] == '1.00 TB'
+        # 标题行、数据区域各读一次，第2行和第4-5行各写一次
+        assert sheet.round_trips == 4
+
+    def test_process_excel_writes_only_changed_cells(self, excel_path, workbook):
+        """再次处理时只写回输入变化的行"""
+        handler = ExcelHandler(excel_path, workbook=workbook)
+        sheet = workbook.sheets.active
+        handler.process_excel()
+
+        sheet.set_cell(4, 2, 5)
+        sheet.round_trips = 0
+        handler.process_excel()
+
+        assert sheet.cells[(4, 3)] == '10.00 TB'
+        assert sheet.cells[(2, 3)] == '40.00 TB'
+        assert sheet.round_trips == 3
+        assert handler.engine.last_stats['rows'] == 1
+
+    def test_process_excel_corrects_edited_output(self, excel_path, workbook):
+        """手动改动的输出单元格在下一次处理时被改回计算值"""
+        handler = ExcelHandler(excel_path, workbook=workbook)
+        sheet = workbook.sheets.active
+        handler.process_excel()
+
+        sheet.set_cell(2, 3, '999')
+        sheet.round_trips = 0
+        handler.process_excel()
+
+        assert sheet.cells[(2, 3)] == '40.00 TB'
+        assert sheet.cells[(4, 3)] == '6.00 TB'
+        assert sheet.round_trips == 3
+        assert handler.engine.last_stats['rows'] == 0
+
+    def test_process_excel_cancelled_skips_write(self, excel_path, workbook):
+        """计算期间文件再次被修改时不写回过期的结果"""
+        handler = ExcelHandler(excel_path, workbook=workbook)
+        sheet = workbook.sheets.active
+        cancel = threading.Event()
+        cancel.set()
+
+        handler.process_excel(cancel=cancel)
+
+        assert (2, 3) not in sheet.cells
+        assert handler.engine._results is None
+
+
 # ============================================================================
 # TestLogging - 日志配置测试
 # ============================================================================
@@ -0,0 +1,185 @@
+"""
+sweep 参数扫描单元测试
+
+测试覆盖范围：
+1. 取值解析 - 范围、列表与单位
+2. 网格切块 - 笛卡尔积顺序与块边界
+3. 扫描求解 - 与 calculate_frame 结果一致
+4. 结果写出 - 分块 CSV、进程池、Parquet
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+import yaml
+
+from calculator_core import StorageCalculator
+from sweep import SweepGrid, SweepRunner, iter_sweep, parse_assignments, parse_axis, run_sweep
+
+# ============================================================================
+# Fixtures - 测试夹具
+# ============================================================================
+
+@pytest.fixture
+def temp_dir():
+    """创建临时目录，使用固定的测试目录避免 macOS TCC 权限问题"""
+    test_temp_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_temp_sweep')
+    os.makedirs(test_temp_dir, exist_ok=True)
+
+    yield test_temp_dir
+
+    shutil.rmtree(test_temp_dir, ignore_errors=True)
+
+
+@pytest.fixture
+def sweep_formulas_dir(temp_dir):
+    """创建EC容量规划的公式配置目录"""
+    formulas_dir = os.path.join(temp_dir, 'formulas')
+    os.makedirs(formulas_dir, exist_ok=True)
+    with open(os.path.join(formulas_dir, 'formulas.yaml'), 'w') as f:
+        yaml.dump({
+            'global': {'defaults': {'hdd_capacity': '20TB', 'data_blocks': 8, 'parity_blocks': 2}},
+            'variables': {
+                'hdd_capacity': {'excel_column': 'HDD容量', 'can_be_input': True},
+                'hdd_count': {'excel_column': 'HDD数量', 'can_be_input': True},
+                'data_blocks': {'excel_column': 'K', 'can_be_input': True},
+                'parity_blocks': {'excel_column': 'M', 'can_be_input': True},
+            },
+            'formulas': {
+                'raw_capacity': {'expression': 'raw_capacity = hdd_capacity * hdd_count'},
+                'ec_ratio': {'expression': 'ec_ratio = (data_blocks + parity_blocks) / data_blocks'},
+                'usable_capacity': {'expression': 'usable_capacity = raw_capacity / ec_ratio'},
+            },
+        }, f, allow_unicode=True)
+    return formulas_dir
+
+
+@pytest.fixture
+def sweep_kwargs(sweep_formulas_dir, temp_dir):
+    return {'formula_dir': sweep_formulas_dir, 'cache_dir': os.path.join(temp_dir, 'cache')}
+
+
+AXES = {'HDD数量': '12:36:12', 'data_blocks': '4,8,16', 'parity_blocks': [1, 2]}
+
+
+# ============================================================================
+# 取值解析与网格
+# ============================================================================
+
+class TestParse:
+    """测试取值解析"""
+
+    def test_range_includes_stop(self):
+        assert parse_axis('4:16:4') == [4, 8, 12, 16]
+        assert parse_axis('1:3') == [1, 2, 3]
+
+    def test_range_with_units(self):
+        assert parse_axis('1TB:3TB:1TB') == pytest.approx([1e12, 2e12, 3e12])
+
+    def test_list(self):
+        assert parse_axis('2TB, 4TB') == [2e12, 4e12]
+        assert parse_axis([1, '2']) == [1.0, 2.0]
+
+    def test_invalid(self):
+        with pytest.raises(ValueError):
+            parse_axis('4:1')
+        with pytest.raises(ValueError):
+            parse_axis('abc')
+
+    def test_assignments(self):
+        assert parse_assignments(['a=1:3', ' b = 4,5 ']) == {'a': '1:3', 'b': '4,5'}
+        with pytest.raises(ValueError):
+            parse_assignments(['a'])
+
+
+class TestSweepGrid:
+    """测试网格切块"""
+
+    def test_chunks_follow_nested_loop_order(self):
+        grid = SweepGrid({'a': [1, 2], 'b': [10, 20, 30]})
+        assert grid.size == 6
+
+        chunks = [grid.chunk(start, stop) for start, stop in grid.ranges(4)]
+        assert [len(chunk['a']) for chunk in chunks] == [4, 2]
+        a = np.concatenate([chunk['a'] for chunk in chunks])
+        b = np.concatenate([chunk['b'] for chunk in chunks])
+        assert list(zip(a, b)) == [(a_, b_) for a_ in (1, 2) for b_ in (10, 20, 30)]
+
+
+# ============================================================================
+# 扫描求解与写出
+# ============================================================================
+
+class TestSweep:
+    """测试扫描求解与结果写出"""
+
+    def test_matches_calculate_frame(self, sweep_kwargs):
+        """扫描结果与对展开后的表格批量计算一致，未扫描的输入使用配置默认值"""
+        result = pd.concat(iter_sweep(AXES, chunk_size=5, **sweep_kwargs))
+        assert len(result) == 18
+        assert list(result.columns[:3]) == ['hdd_count', 'data_blocks', 'parity_blocks']
+        assert set(result.columns[3:]) == {'raw_capacity', 'ec_ratio', 'usable_capacity'}
+
+        calculator = StorageCalculator(**sweep_kwargs)
+        expected, _ = calculator.calculate_frame(
+            result[['hdd_count', 'data_blocks', 'parity_blocks']].reset_index(drop=True),
+            defaults=calculator.get_defaults(),
+        )
+        for name in ('raw_capacity', 'ec_ratio', 'usable_capacity'):
+            np.testing.assert_allclose(result[name].to_numpy(), expected[name].to_numpy())
+        assert result['raw_capacity'].iloc[0] == pytest.approx(12 * 20e12)
+
+    def test_fixed_and_outputs(self, sweep_kwargs):
+        """固定取值覆盖默认值，只输出指定公式"""
+        calculator = StorageCalculator(**sweep_kwargs)
+        runner = SweepRunner(calculator, {'hdd_count': [10]}, fixed={'HDD容量': '4TB'}, outputs=['raw_capacity'])
+
+        result = runner.solve(0, 1)
+        assert list(result.columns) == ['hdd_count', 'raw_capacity']
+        assert result['raw_capacity'].iloc[0] == pytest.approx(40e12)
+
+    def test_unknown_variable(self, sweep_kwargs):
+        calculator = StorageCalculator(**sweep_kwargs)
+        with pytest.raises(ValueError):
+            SweepRunner(calculator, {'missing': [1]})
+
+    def test_run_sweep_csv(self, sweep_kwargs, temp_dir):
+        """分块写出的 CSV 与一次性计算的结果一致"""
+        output = os.path.join(temp_dir, 'sweep.csv')
+        stats = run_sweep(AXES, output, chunk_size=4, **sweep_kwargs)
+
+        assert stats['points'] == 18
+        assert stats['chunks'] == 5
+        written = pd.read_csv(output)
+        expected = pd.concat(iter_sweep(AXES, **sweep_kwargs)).reset_index(drop=True)
+        pd.testing.assert_frame_equal(written, expected, check_dtype=False)
+
+    def test_run_sweep_process_pool(self, sweep_kwargs, temp_dir):
+        """进程池的结果与单进程一致且按顺序写出"""
+        single = os.path.join(temp_dir, 'single.csv')
+        pooled = os.path.join(temp_dir, 'pooled.csv')
+        run_sweep(AXES, single, chunk_size=4, **sweep_kwargs)
+        stats = run_sweep(AXES, pooled, chunk_size=4, workers=2, **sweep_kwargs)
+
+        assert stats['points'] == 18
+        pd.testing.assert_frame_equal(pd.read_csv(pooled), pd.read_csv(single))
+
+    def test_run_sweep_unknown_name_fails_before_pool(self, sweep_kwargs, temp_dir):
+        """未知的变量名在主进程中报 ValueError，不启动进程池、不创建输出文件"""
+        output = os.path.join(temp_dir, 'typo.csv')
+        for kwargs in ({'fixed': {'HDD容量x': '4TB'}}, {'outputs': ['missing']}):
+            with pytest.raises(ValueError, match='未知的变量'):
+                run_sweep(AXES, output, chunk_size=4, workers=2, **kwargs, **sweep_kwargs)
+        with pytest.raises(ValueError, match='未知的变量'):
+            run_sweep({'missing': [1]}, output, workers=2, **sweep_kwargs)
+        assert not os.path.exists(output)
+
+    def test_run_sweep_parquet(self, sweep_kwargs, temp_dir):
+        pytest.importorskip('pyarrow')
+        output = os.path.join(temp_dir, 'sweep.parquet')
+        run_sweep(AXES, output, chunk_size=4, **sweep_kwargs)
+
+        assert len(pd.read_parquet(output)) == 18
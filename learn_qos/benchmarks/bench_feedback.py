@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+负载反馈生成与解析开销测试
+
+- 服务端：每个响应生成一次反馈（同一采样周期内命中缓存）
+- 编码：JSON（to_json）与二进制格式（to_bytes / to_header_value）的耗时和大小
+- 客户端：各种格式的解析耗时
+
+用法:
+    python benchmarks/bench_feedback.py [--rounds 100000]
+"""
+
+import sys
+import os
+import time
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from algorithms.adaptive_qos import (
+    LoadMonitor, FeedbackGenerator, FeedbackReceiver, LoadFeedback, FEEDBACK_HEADER
+)
+
+
+def time_call(func, rounds):
+    """返回 func 的平均耗时（微秒）"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='负载反馈生成与解析开销测试')
+    parser.add_argument('--rounds', type=int, default=100000, help='每项测试的调用次数')
+    args = parser.parse_args()
+    rounds = args.rounds
+
+    # 监控线程发布一次状态快照后，采样周期足够长，测试期间不再更新
+    monitor = LoadMonitor(sample_interval=3600)
+    monitor.start_monitoring()
+    while not monitor.get_load_status()['available']:
+        time.sleep(0.01)
+    generator = FeedbackGenerator("bench-server", monitor)
+    receiver = FeedbackReceiver("bench-client")
+    feedback = generator.generate_feedback()
+
+    json_text = feedback.to_json()
+    binary = feedback.to_bytes()
+    header = {FEEDBACK_HEADER: feedback.to_header_value()}
+    body = generator.get_feedback_for_http_body()
+
+    print(f"📦 编码大小: JSON {len(json_text.encode('utf-8'))} 字节, "
+          f"二进制 {len(binary)} 字节, 响应头值 {len(header[FEEDBACK_HEADER])} 字节")
+
+    print(f"\n🖥️  服务端每次调用耗时（微秒）")
+    rows = [
+        ("generate_feedback（缓存）", lambda: generator.generate_feedback()),
+        ("get_feedback_for_http_headers（缓存）", lambda: generator.get_feedback_for_http_headers()),
+        ("get_feedback_for_binary_header（缓存）", lambda: generator.get_feedback_for_binary_header()),
+        ("LoadFeedback.to_json", feedback.to_json),
+        ("LoadFeedback.to_bytes", feedback.to_bytes),
+    ]
+    for name, func in rows:
+        print(f"   {name:<40} {time_call(func, rounds):>8.2f}")
+
+    print(f"\n📥 客户端解析耗时（微秒）")
+    view = memoryview(binary)
+    rows = [
+        ("JSON（from_json）", lambda: LoadFeedback.from_json(json_text)),
+        ("响应体（_parse_http_body）", lambda: receiver._parse_http_body(body)),
+        ("二进制（_parse_binary，memoryview）", lambda: receiver._parse_binary(view)),
+        ("二进制响应头（_parse_http_headers）", lambda: receiver._parse_http_headers(header)),
+    ]
+    for name, func in rows:
+        print(f"   {name:<40} {time_call(func, rounds):>8.2f}")
+
+    monitor.stop_monitoring()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+共享调度器驱动大量漏桶的开销测试
+
+启动 N 个漏桶（共享一个调度线程），让其中一部分收到数据包，测量：
+- 活跃线程数
+- 空闲期间的 CPU 时间（空闲漏桶应当不产生任何开销）
+- 数据包实际漏出时刻相对理论时刻的延迟
+
+用法:
+    python benchmarks/bench_leaky_bucket.py [--buckets 5000] [--active 500] [--packets 4]
+"""
+
+import sys
+import os
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from algorithms.leaky_bucket import LeakyBucket, LeakyBucketConfig, LeakyBucketScheduler
+from common.base import Packet
+
+PACKET_SIZE = 1000
+LEAK_RATE = 20000.0  # 每个数据包 50ms 漏完
+
+
+def main():
+    parser = argparse.ArgumentParser(description='共享调度器驱动大量漏桶的开销测试')
+    parser.add_argument('--buckets', type=int, default=5000, help='漏桶数')
+    parser.add_argument('--active', type=int, default=500, help='收到数据包的漏桶数')
+    parser.add_argument('--packets', type=int, default=4, help='每个活跃漏桶的数据包数')
+    args = parser.parse_args()
+    
+    scheduler = LeakyBucketScheduler()
+    lateness = []
+    
+    def make_callback(start_time):
+        def on_output(packet):
+            # 第 k 个数据包理论上在 (k+1) * 包大小 / 速率 之后漏完
+            expected = start_time + (packet.id + 1) * PACKET_SIZE / LEAK_RATE
+            lateness.append(time.time() - expected)
+        return on_output
+    
+    config = LeakyBucketConfig(leak_rate=LEAK_RATE, bucket_size=PACKET_SIZE * args.packets)
+    buckets = [LeakyBucket(config, scheduler=scheduler) for _ in range(args.buckets)]
+    started = time.perf_counter()
+    for bucket in buckets:
+        bucket.start()
+    print(f"📊 {args.buckets} 个漏桶, {args.active} 个活跃, 每个 {args.packets} 个包")
+    print("=" * 60)
+    print(f"   启动耗时:         {time.perf_counter() - started:.3f}s")
+    print(f"   活跃线程数:       {threading.active_count()}")
+    
+    cpu = time.process_time()
+    time.sleep(0.5)
+    print(f"   空闲 0.5s CPU:    {(time.process_time() - cpu) * 1000:.2f}ms")
+    
+    for bucket in buckets[:args.active]:
+        bucket.output_callback = make_callback(time.time())
+        for i in range(args.packets):
+            bucket.enqueue(Packet(id=i, size=PACKET_SIZE))
+    time.sleep(args.packets * PACKET_SIZE / LEAK_RATE + 0.3)
+    
+    scheduler.stop()
+    lateness.sort()
+    if lateness:
+        print(f"   输出数据包:       {len(lateness)}")
+        print(f"   漏出延迟 p50/p99: {lateness[len(lateness) // 2] * 1000:.2f}ms / "
+              f"{lateness[int(len(lateness) * 0.99)] * 1000:.2f}ms")
+    print(f"   调度器统计:       {scheduler.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
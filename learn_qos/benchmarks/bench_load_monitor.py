@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+负载监控记录与采样开销测试
+
+- 记录吞吐量：每秒能完成多少次 record_request_start + record_request_end
+- 多线程记录开销：1/8/32 个线程同时记录时每个请求的平均耗时，
+  比较所有线程共用一把锁（record_stripes=1）与按线程分段
+- 采样耗时：窗口内有大量请求时 _collect_metrics 的耗时（不含系统资源采样）
+- 分位数误差：LatencySketch（独立实例，写入同一批延迟）与精确分位数的相对误差
+- 系统资源采样：SystemSampler 读取 /proc 与 psutil 的单次采样耗时，
+  以及 FeedbackGenerator.generate_feedback 的单次耗时
+
+用法:
+    python benchmarks/bench_load_monitor.py [--requests 500000] [--threads 1,8,32] [--stripes 16]
+"""
+
+import sys
+import os
+import time
+import random
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import psutil
+
+from algorithms.adaptive_qos import LoadMonitor, LatencySketch, SystemSampler, FeedbackGenerator
+
+
+def bench_record(n_requests, latencies):
+    monitor = LoadMonitor()
+    start, end = monitor.record_request_start, monitor.record_request_end
+    started = time.perf_counter()
+    for latency in latencies[:n_requests]:
+        start()
+        end(latency)
+    return n_requests / (time.perf_counter() - started), monitor
+
+
+def bench_collect(monitor, rounds=100):
+    """只测窗口统计部分，排除系统资源采样；需在记录后 latency_window 秒内调用，否则窗口已空"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        monitor._collect_window(time.time())[1].quantiles((0.5, 0.95, 0.99))
+    return (time.perf_counter() - started) / rounds
+
+
+def bench_quantiles(latencies):
+    """把全部延迟写入一个独立的 LatencySketch，返回 (分位数, 精确值, 估计值) 列表"""
+    sketch = LatencySketch()
+    for latency in latencies:
+        sketch.add(latency)
+    exact = sorted(latencies)
+    return [(q, exact[int(q * (len(exact) - 1))], sketch.quantile(q)) for q in (0.5, 0.95, 0.99)]
+
+
+def bench_threads(n_threads, n_requests, stripes, latencies):
+    """n_threads 个线程共记录 n_requests 个请求，返回每个请求的平均耗时（纳秒）"""
+    monitor = LoadMonitor(record_stripes=stripes)
+    per_thread = n_requests // n_threads
+    barrier = threading.Barrier(n_threads + 1)
+
+    def worker():
+        start, end = monitor.record_request_start, monitor.record_request_end
+        barrier.wait()
+        for latency in latencies[:per_thread]:
+            start()
+            end(latency)
+
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    seconds = time.perf_counter() - started
+    assert monitor.total_requests == per_thread * n_threads
+    return seconds / (per_thread * n_threads) * 1e9
+
+
+def time_call(func, rounds):
+    """返回 func 的平均耗时（微秒）"""
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started) / rounds * 1e6
+
+
+def bench_system(rounds=2000):
+    sampler = SystemSampler()
+    rows = []
+    if sampler.uses_proc:
+        rows.append(("SystemSampler.sample (/proc)", time_call(sampler.sample, rounds)))
+    rows.append(("psutil.cpu_percent + virtual_memory",
+                 time_call(lambda: (psutil.cpu_percent(), psutil.virtual_memory()), rounds)))
+
+    monitor = LoadMonitor(sample_interval=0.1)
+    monitor.start_monitoring()
+    try:
+        time.sleep(0.2)
+        generator = FeedbackGenerator("bench", monitor)
+        rows.append(("FeedbackGenerator.generate_feedback", time_call(generator.generate_feedback, rounds)))
+    finally:
+        monitor.stop_monitoring()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='负载监控记录与采样开销测试')
+    parser.add_argument('--requests', type=int, default=500000, help='记录的请求数')
+    parser.add_argument('--threads', default='1,8,32', help='多线程测试的线程数列表')
+    parser.add_argument('--stripes', type=int, default=16, help='分段记录的分段数')
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    latencies = [rng.lognormvariate(3.0, 1.0) for _ in range(args.requests)]
+
+    rate, monitor = bench_record(args.requests, latencies)
+    # 窗口统计要在 latency_window 过期之前测，之后的多线程测试要运行很久
+    collect = bench_collect(monitor)
+    print(f"📊 记录吞吐量: {rate:,.0f} 请求/秒")
+    print(f"⏱️  窗口内 {args.requests} 个请求时的采样耗时: {collect * 1000:.2f} ms")
+
+    print(f"\n🧵 多线程记录开销（纳秒/请求，共 {args.requests} 个请求）")
+    print(f"   {'线程数':<8}{'单锁':>12}{f'{args.stripes} 段':>12}")
+    for n_threads in [int(part) for part in args.threads.split(',')]:
+        single = bench_threads(n_threads, args.requests, 1, latencies)
+        striped = bench_threads(n_threads, args.requests, args.stripes, latencies)
+        print(f"   {n_threads:<8}{single:>12.0f}{striped:>12.0f}")
+
+    print("\n🖥️  单次调用耗时（微秒）")
+    for name, micros in bench_system():
+        print(f"   {name:<40} {micros:>10.1f}")
+
+    print("\n🎯 分位数（ms）")
+    for q, true_value, estimate in bench_quantiles(latencies):
+        print(f"   p{int(q * 100):<3} 精确 {true_value:>9.2f}  估计 {estimate:>9.2f}  "
+              f"误差 {abs(estimate - true_value) / true_value:.2%}")
+
+
+if __name__ == "__main__":
+    main()
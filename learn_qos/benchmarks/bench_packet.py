@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+数据包表示的开销测试
+
+比较三种表示创建 n 个数据包的时间和内存，以及令牌桶处理它们的吞吐量：
+- Packet（dataclass，每个包一个带 __dict__ 的对象）
+- CompactPacket（__slots__）
+- PacketBatch（列式 NumPy 数组，TokenBucket.enqueue_batch 直接处理）
+
+用法:
+    python benchmarks/bench_packet.py [--packets 1000000] [--batch 1024]
+"""
+
+import sys
+import os
+import gc
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import numpy as np
+
+from algorithms.token_bucket import TokenBucket, TokenBucketConfig
+from common.base import Packet, CompactPacket, PacketBatch, PacketPriority
+
+PACKET_SIZE = 100
+
+
+def make_packets(kind, n):
+    if kind == 'Packet':
+        return [Packet(i, PACKET_SIZE, PacketPriority.NORMAL, 1.0) for i in range(n)]
+    if kind == 'CompactPacket':
+        return [CompactPacket(i, PACKET_SIZE, PacketPriority.NORMAL, 1.0) for i in range(n)]
+    return PacketBatch(np.full(n, PACKET_SIZE), ids=np.arange(n), arrival_times=1.0)
+
+
+def measure_creation(kind, n):
+    """返回 (创建耗时秒, 占用内存字节)；内存单独测量，避免 tracemalloc 影响计时"""
+    gc.collect()
+    started = time.perf_counter()
+    packets = make_packets(kind, n)
+    seconds = time.perf_counter() - started
+    del packets
+
+    gc.collect()
+    tracemalloc.start()
+    packets = make_packets(kind, n)
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del packets
+    return seconds, memory
+
+
+def make_bucket():
+    # 令牌足够多，测量的是准入路径本身的开销而不是丢包
+    return TokenBucket(TokenBucketConfig(token_rate=1e15, bucket_size=10 ** 15, retain_packets=False))
+
+
+def bench_enqueue(kind, n):
+    bucket = make_bucket()
+    packets = make_packets(kind, n)
+    enqueue = bucket.enqueue
+    started = time.perf_counter()
+    for packet in packets:
+        enqueue(packet)
+    return n / (time.perf_counter() - started)
+
+
+def bench_enqueue_batch(n, batch_size):
+    bucket = make_bucket()
+    batches = [make_packets('PacketBatch', batch_size) for _ in range(max(1, n // batch_size))]
+    started = time.perf_counter()
+    for batch in batches:
+        bucket.enqueue_batch(batch)
+    return len(batches) * batch_size / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据包表示的开销测试')
+    parser.add_argument('--packets', type=int, default=1000000, help='数据包数')
+    parser.add_argument('--batch', type=int, default=1024, help='enqueue_batch 的批大小')
+    args = parser.parse_args()
+    n = args.packets
+
+    print(f"📦 创建 {n} 个数据包")
+    print("=" * 60)
+    for kind in ('Packet', 'CompactPacket', 'PacketBatch'):
+        seconds, memory = measure_creation(kind, n)
+        print(f"   {kind:<16} {seconds * 1000:>10.1f} ms {memory / n:>10.1f} 字节/包")
+
+    print(f"\n📊 TokenBucket 准入吞吐量（数据包/秒）")
+    print("=" * 60)
+    rows = [
+        ("enqueue(Packet)", bench_enqueue('Packet', n)),
+        ("enqueue(CompactPacket)", bench_enqueue('CompactPacket', n)),
+        (f"enqueue_batch(PacketBatch[{args.batch}])", bench_enqueue_batch(n, args.batch)),
+    ]
+    for name, rate in rows:
+        print(f"   {name:<40} {rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
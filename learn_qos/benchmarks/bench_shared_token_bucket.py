@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+跨进程共享令牌桶测试
+
+- 单次准入耗时：TokenBucket.acquire_many(1) 与 SharedTokenBucket.acquire / acquire_many
+- 多进程：1/4/8 个进程同时准入，统计每次调用的耗时，
+  以及限速为 --rate 时整机实际准入的速率（应接近 rate，而不是 rate × 进程数）
+
+用法:
+    python benchmarks/bench_shared_token_bucket.py [--calls 200000] [--processes 1,4,8] [--rate 20000]
+"""
+
+import sys
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from algorithms.token_bucket import TokenBucket, TokenBucketConfig, SharedTokenBucket
+
+UNLIMITED = TokenBucketConfig(token_rate=1e15, bucket_size=10 ** 15, retain_packets=False)
+
+
+def time_call(func, calls):
+    """返回 func 的平均耗时（纳秒）"""
+    started = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - started) / calls * 1e9
+
+
+def bench_single(calls, directory):
+    local = TokenBucket(UNLIMITED)
+    shared = SharedTokenBucket(UNLIMITED, name='bench_single', directory=directory)
+    try:
+        return [
+            ("TokenBucket.acquire_many(1)", time_call(lambda: local.acquire_many(1, 1), calls)),
+            ("SharedTokenBucket.acquire", time_call(shared.acquire, calls)),
+            ("SharedTokenBucket.acquire_many(64)", time_call(lambda: shared.acquire_many(64, 64), calls // 64) / 64),
+        ]
+    finally:
+        shared.unlink()
+
+
+def worker(config, name, directory, duration, start_at, results):
+    bucket = SharedTokenBucket(config, name=name, directory=directory)
+    while time.time() < start_at:
+        time.sleep(0.001)
+    calls = admitted = 0
+    started = time.perf_counter()
+    deadline = start_at + duration
+    while time.time() < deadline:
+        admitted += bucket.acquire()
+        calls += 1
+    results.put((calls, admitted, time.perf_counter() - started))
+
+
+def bench_processes(n_processes, rate, duration, directory):
+    """返回 (每次调用的平均耗时纳秒, 整机准入速率)"""
+    # 桶容量很小，准入数基本由速率决定
+    config = TokenBucketConfig(token_rate=rate, bucket_size=max(1, int(rate // 100)), retain_packets=False)
+    name = f'bench_{n_processes}'
+    SharedTokenBucket(config, name=name, directory=directory).unlink()
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    start_at = time.time() + 0.5
+    processes = [
+        context.Process(target=worker, args=(config, name, directory, duration, start_at, results))
+        for _ in range(n_processes)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    SharedTokenBucket(config, name=name, directory=directory).unlink()
+
+    calls = sum(outcome[0] for outcome in outcomes)
+    admitted = sum(outcome[1] for outcome in outcomes)
+    busy = sum(outcome[2] for outcome in outcomes)
+    return busy / calls * 1e9, admitted / duration
+
+
+def main():
+    parser = argparse.ArgumentParser(description='跨进程共享令牌桶测试')
+    parser.add_argument('--calls', type=int, default=200000, help='单进程测试的调用次数')
+    parser.add_argument('--processes', default='1,4,8', help='多进程测试的进程数列表')
+    parser.add_argument('--rate', type=float, default=20000, help='多进程测试的整机限速（次/秒）')
+    parser.add_argument('--duration', type=float, default=2.0, help='多进程测试的时长（秒）')
+    args = parser.parse_args()
+
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+
+    print(f"📊 单次准入耗时（纳秒，{args.calls} 次）")
+    print("=" * 60)
+    for name, nanos in bench_single(args.calls, directory):
+        print(f"   {name:<40} {nanos:>10.0f}")
+
+    if not hasattr(os, 'fork'):
+        return
+    print(f"\n🧵 多进程准入（整机限速 {args.rate:,.0f} 次/秒，{args.duration} 秒）")
+    print("=" * 60)
+    print(f"   {'进程数':<8}{'纳秒/次':>12}{'实际准入速率':>16}")
+    for n_processes in [int(part) for part in args.processes.split(',')]:
+        nanos, admitted_rate = bench_processes(n_processes, args.rate, args.duration, directory)
+        print(f"   {n_processes:<8}{nanos:>12.0f}{admitted_rate:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+令牌桶准入吞吐量测试
+
+比较以下几种准入方式每秒能处理的数据包数：
+- TokenBucket.enqueue（保留 / 不保留准入的数据包）
+- TokenBucket.acquire_many 批量准入
+- ShardedTokenBucket.acquire / acquire_many，单线程与多线程
+
+用法:
+    python benchmarks/bench_token_bucket.py [--packets 1000000] [--batch 64] [--threads 1,4,8]
+"""
+
+import sys
+import os
+import time
+import argparse
+import threading
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from algorithms.token_bucket import TokenBucket, TokenBucketConfig, ShardedTokenBucket
+from common.base import Packet
+
+PACKET_SIZE = 100
+
+
+def make_config(retain_packets=True):
+    # 令牌足够多，测量的是准入路径本身的开销而不是丢包
+    return TokenBucketConfig(token_rate=1e15, bucket_size=10 ** 15, retain_packets=retain_packets)
+
+
+def run_threads(n_threads, work):
+    """n_threads 个线程同时执行 work()，返回总耗时"""
+    barrier = threading.Barrier(n_threads + 1)
+    
+    def worker():
+        barrier.wait()
+        work()
+    
+    threads = [threading.Thread(target=worker) for _ in range(n_threads)]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - started
+
+
+def bench_enqueue(n_packets, retain_packets):
+    bucket = TokenBucket(make_config(retain_packets))
+    packets = [Packet(id=i, size=PACKET_SIZE, arrival_time=1.0) for i in range(n_packets)]
+    enqueue = bucket.enqueue
+    started = time.perf_counter()
+    for packet in packets:
+        enqueue(packet)
+    return n_packets / (time.perf_counter() - started)
+
+
+def bench_acquire_many(bucket, n_packets, batch):
+    acquire_many = bucket.acquire_many
+    batch_bytes = batch * PACKET_SIZE
+    started = time.perf_counter()
+    for _ in range(n_packets // batch):
+        acquire_many(batch, batch_bytes)
+    return n_packets // batch * batch / (time.perf_counter() - started)
+
+
+def bench_sharded(n_threads, n_packets, batch):
+    """每个线程准入 n_packets 个包，返回总吞吐量"""
+    bucket = ShardedTokenBucket(make_config(retain_packets=False))
+    
+    if batch <= 1:
+        def work():
+            acquire = bucket.acquire
+            for _ in range(n_packets):
+                acquire(PACKET_SIZE)
+    else:
+        def work():
+            acquire_many = bucket.acquire_many
+            batch_bytes = batch * PACKET_SIZE
+            for _ in range(n_packets // batch):
+                acquire_many(batch, batch_bytes)
+    
+    seconds = run_threads(n_threads, work)
+    return n_threads * n_packets / seconds
+
+
+def bench_shared(n_threads, n_packets):
+    """多个线程共享一个 TokenBucket 逐包准入"""
+    bucket = TokenBucket(make_config(retain_packets=False))
+    packets = [Packet(id=i, size=PACKET_SIZE, arrival_time=1.0) for i in range(n_packets)]
+    
+    def work():
+        enqueue = bucket.enqueue
+        for packet in packets:
+            enqueue(packet)
+    
+    seconds = run_threads(n_threads, work)
+    return n_threads * n_packets / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='令牌桶准入吞吐量测试')
+    parser.add_argument('--packets', type=int, default=1000000, help='每项测试（每个线程）的数据包数')
+    parser.add_argument('--batch', type=int, default=64, help='批量准入的批大小')
+    parser.add_argument('--threads', default='1,4,8', help='多线程测试的线程数列表')
+    args = parser.parse_args()
+    
+    n = args.packets
+    thread_counts = [int(part) for part in args.threads.split(',')]
+    
+    print(f"📊 令牌桶准入吞吐量（数据包/秒，每项 {n} 个包，批大小 {args.batch}）")
+    print("=" * 60)
+    rows = [
+        ("TokenBucket.enqueue 保留数据包", bench_enqueue(n, True)),
+        ("TokenBucket.enqueue 不保留数据包", bench_enqueue(n, False)),
+        ("TokenBucket.acquire_many", bench_acquire_many(TokenBucket(make_config(False)), n, args.batch)),
+        ("ShardedTokenBucket.acquire", bench_sharded(1, n, 1)),
+        ("ShardedTokenBucket.acquire_many", bench_sharded(1, n, args.batch)),
+    ]
+    for n_threads in thread_counts:
+        rows.append((f"{n_threads} 线程共享 TokenBucket.enqueue", bench_shared(n_threads, n // n_threads)))
+        rows.append((f"{n_threads} 线程 ShardedTokenBucket.acquire", bench_sharded(n_threads, n // n_threads, 1)))
+    
+    for name, rate in rows:
+        print(f"   {name:<40} {rate:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
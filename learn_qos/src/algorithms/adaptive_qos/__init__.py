@@ -8,6 +8,8 @@
 """
 
 from .load_monitor import LoadMonitor, LoadMetrics, LoadLevel
+from .sliding_window import LatencySketch, RollingCounter, RollingSketch
+from .system_sampler import SystemSampler, SystemSnapshot
 from .adaptive_limiter import (
     AdaptiveRateLimiter, AIMDRateLimiter, PIDRateLimiter, 
     ExponentialBackoffRateLimiter, GradientDescentRateLimiter,
@@ -15,14 +17,16 @@ from .adaptive_limiter import (
 )
 from .feedback_system import (
     FeedbackGenerator, FeedbackReceiver, LoadFeedback, 
-    FeedbackSystem, FeedbackChannel
+    FeedbackSystem, FeedbackChannel, FEEDBACK_HEADER
 )
 
 __all__ = [
     'LoadMonitor', 'LoadMetrics', 'LoadLevel',
+    'LatencySketch', 'RollingCounter', 'RollingSketch',
+    'SystemSampler', 'SystemSnapshot',
     'AdaptiveRateLimiter', 'AIMDRateLimiter', 'PIDRateLimiter', 
     'ExponentialBackoffRateLimiter', 'GradientDescentRateLimiter',
     'HybridRateLimiter', 'AdaptiveStrategy', 'create_adaptive_limiter',
     'FeedbackGenerator', 'FeedbackReceiver', 'LoadFeedback',
-    'FeedbackSystem', 'FeedbackChannel'
+    'FeedbackSystem', 'FeedbackChannel', 'FEEDBACK_HEADER'
 ]
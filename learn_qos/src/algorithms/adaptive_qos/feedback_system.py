@@ -2,12 +2,19 @@
 反馈系统模块
 
 处理服务端到客户端的负载信息传递，支持多种传输方式
+
+反馈在每个监控采样周期只计算一次，所有调用方共享同一个 LoadFeedback
+以及它的响应头、响应体和二进制编码。随响应捎带的反馈可以使用固定布局的
+二进制格式（LoadFeedback.to_bytes），放在一个响应头（X-Load-Feedback）中，
+接收方用 struct.unpack_from 直接在缓冲区上解析。
 """
 
 import json
 import time
+import base64
+import struct
 import threading
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, Callable, List, Union
 from dataclasses import dataclass, asdict
 from enum import Enum
 from collections import deque
@@ -20,6 +27,25 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 from .load_monitor import LoadMonitor, LoadLevel
 
 
+# 二进制格式（小端）：
+#   版本 B, 负载等级 B, 趋势 B, 保留 B, 时间戳 d,
+#   负载评分 f, 建议速率 f, 速率调整系数 f, 以及 _WIRE_METRICS 中的指标各一个 f,
+#   其后是 UTF-8 编码的 server_id（到末尾）
+WIRE_VERSION = 1
+FEEDBACK_HEADER = 'X-Load-Feedback'
+_WIRE_METRICS = (
+    'cpu_usage', 'memory_usage', 'avg_response_time',
+    'p99_response_time', 'requests_per_second', 'error_rate',
+)
+_WIRE_FORMAT = struct.Struct('<BBBxdfff' + 'f' * len(_WIRE_METRICS))
+_WIRE_LEVELS = tuple(LoadLevel)
+_WIRE_LEVEL_INDEX = {level: index for index, level in enumerate(_WIRE_LEVELS)}
+_WIRE_TRENDS = ('STABLE', 'INCREASING', 'DECREASING', 'UNKNOWN')
+_WIRE_TREND_INDEX = {trend: index for index, trend in enumerate(_WIRE_TRENDS)}
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
 @dataclass
 class LoadFeedback:
     """负载反馈数据结构"""
@@ -40,7 +66,8 @@ class LoadFeedback:
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'LoadFeedback':
-        """从字典创建实例"""
+        """从字典创建实例（不修改传入的字典）"""
+        data = dict(data)
         data['load_level'] = LoadLevel(data['load_level'])
         return cls(**data)
     
@@ -52,12 +79,65 @@ class LoadFeedback:
     def from_json(cls, json_str: str) -> 'LoadFeedback':
         """从JSON字符串创建实例"""
         return cls.from_dict(json.loads(json_str))
+    
+    def to_bytes(self) -> bytes:
+        """
+        编码为固定布局的二进制格式
+        
+        只包含 _WIRE_METRICS 中的指标和建议中的速率调整系数，
+        不在其中的指标和建议动作不编码
+        """
+        metrics = self.metrics
+        return _WIRE_FORMAT.pack(
+            WIRE_VERSION,
+            _WIRE_LEVEL_INDEX[self.load_level],
+            _WIRE_TREND_INDEX.get(self.trend, _WIRE_TREND_INDEX['UNKNOWN']),
+            self.timestamp,
+            self.load_score,
+            self.suggested_rate,
+            self.suggestions.get('rate_adjustment', 1.0),
+            *(float(metrics.get(name, 0.0)) for name in _WIRE_METRICS)
+        ) + self.server_id.encode('utf-8')
+    
+    @classmethod
+    def from_bytes(cls, data: BytesLike) -> 'LoadFeedback':
+        """
+        从二进制格式解码
+        
+        直接在传入的缓冲区上解析（bytes、bytearray 或 memoryview 均可），
+        不复制数据；只有 server_id 需要解码为字符串
+        """
+        if len(data) < _WIRE_FORMAT.size:
+            raise ValueError(f"反馈数据长度不足: {len(data)} < {_WIRE_FORMAT.size}")
+        fields = _WIRE_FORMAT.unpack_from(data)
+        if fields[0] != WIRE_VERSION:
+            raise ValueError(f"不支持的反馈格式版本: {fields[0]}")
+        return cls(
+            timestamp=fields[3],
+            server_id=str(memoryview(data)[_WIRE_FORMAT.size:], 'utf-8'),
+            load_level=_WIRE_LEVELS[fields[1]],
+            load_score=fields[4],
+            suggested_rate=fields[5],
+            metrics=dict(zip(_WIRE_METRICS, fields[7:])),
+            trend=_WIRE_TRENDS[fields[2]],
+            suggestions={'rate_adjustment': fields[6], 'actions': []}
+        )
+    
+    def to_header_value(self) -> str:
+        """编码为一个响应头的值（二进制格式的 base64）"""
+        return base64.b64encode(self.to_bytes()).decode('ascii')
+    
+    @classmethod
+    def from_header_value(cls, value: Union[str, bytes]) -> 'LoadFeedback':
+        """从 to_header_value 的结果解码"""
+        return cls.from_bytes(base64.b64decode(value, validate=True))
 
 
 class FeedbackChannel(Enum):
     """反馈传输通道类型"""
     HTTP_HEADER = "HTTP_HEADER"        # HTTP响应头
     HTTP_BODY = "HTTP_BODY"            # HTTP响应体
+    BINARY = "BINARY"                  # 二进制格式（LoadFeedback.to_bytes）
     WEBSOCKET = "WEBSOCKET"            # WebSocket
     SSE = "SSE"                        # Server-Sent Events
     MQTT = "MQTT"                      # MQTT消息队列
@@ -65,6 +145,20 @@ class FeedbackChannel(Enum):
     CUSTOM = "CUSTOM"                  # 自定义通道
 
 
+class _FeedbackCache:
+    """一个采样周期的反馈及其各种编码（按需生成，所有调用方共享）"""
+    
+    __slots__ = ('key', 'feedback', 'headers', 'body', 'binary', 'binary_headers')
+    
+    def __init__(self, key, feedback: LoadFeedback):
+        self.key = key
+        self.feedback = feedback
+        self.headers: Optional[Dict[str, str]] = None
+        self.body: Optional[Dict[str, Any]] = None
+        self.binary: Optional[bytes] = None
+        self.binary_headers: Optional[Dict[str, str]] = None
+
+
 class FeedbackGenerator:
     """
     服务端反馈生成器
@@ -73,6 +167,9 @@ class FeedbackGenerator:
     - 收集负载监控数据
     - 生成客户端反馈信息
     - 计算建议的发送速率
+    
+    反馈按（监控采样时间, 客户端数）缓存，同一个采样周期内的调用直接返回
+    缓存的 LoadFeedback 和编码结果，调用方不要修改返回的对象。
     """
     
     def __init__(self, 
@@ -94,6 +191,11 @@ class FeedbackGenerator:
         # 客户端管理
         self.active_clients = set()
         self._lock = threading.RLock()
+        
+        # 当前采样周期的反馈
+        self._cache: Optional[_FeedbackCache] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
     
     def register_client(self, client_id: str):
         """注册客户端"""
@@ -113,11 +215,31 @@ class FeedbackGenerator:
             client_id: 客户端ID（用于个性化建议）
             
         Returns:
-            LoadFeedback: 反馈信息
+            LoadFeedback: 反馈信息（同一采样周期内共享，不要修改）
         """
-        # 获取当前负载状态
+        return self._get_cache(client_id).feedback
+    
+    def _get_cache(self, client_id: Optional[str] = None) -> _FeedbackCache:
+        """取当前采样周期的反馈缓存，采样或客户端数变化后重新计算"""
         load_status = self.load_monitor.get_load_status()
+        with self._lock:
+            client_count = len(self.active_clients)
+        
+        key = (load_status['timestamp'], client_count) if load_status['available'] else None
+        cache = self._cache
+        if key is not None and cache is not None and cache.key == key:
+            self.cache_hits += 1
+            return cache
         
+        self.cache_misses += 1
+        cache = _FeedbackCache(key, self._build_feedback(load_status, client_id))
+        if key is not None:
+            self._cache = cache
+        return cache
+    
+    def _build_feedback(self, load_status: Dict[str, Any],
+                        client_id: Optional[str] = None) -> LoadFeedback:
+        """根据负载状态计算反馈"""
         if not load_status['available']:
             # 负载信息不可用，返回保守建议
             return LoadFeedback(
@@ -182,23 +304,41 @@ class FeedbackGenerator:
     
     def get_feedback_for_http_headers(self, client_id: Optional[str] = None) -> Dict[str, str]:
         """生成用于HTTP响应头的反馈信息"""
-        feedback = self.generate_feedback(client_id)
-        
-        return {
-            'X-Load-Level': feedback.load_level.value,
-            'X-Load-Score': f"{feedback.load_score:.3f}",
-            'X-Suggested-Rate': f"{feedback.suggested_rate:.1f}",
-            'X-Server-Id': feedback.server_id,
-            'X-Timestamp': str(int(feedback.timestamp)),
-            'X-Trend': feedback.trend
-        }
+        cache = self._get_cache(client_id)
+        if cache.headers is None:
+            feedback = cache.feedback
+            cache.headers = {
+                'X-Load-Level': feedback.load_level.value,
+                'X-Load-Score': f"{feedback.load_score:.3f}",
+                'X-Suggested-Rate': f"{feedback.suggested_rate:.1f}",
+                'X-Server-Id': feedback.server_id,
+                'X-Timestamp': str(int(feedback.timestamp)),
+                'X-Trend': feedback.trend
+            }
+        return dict(cache.headers)
     
     def get_feedback_for_http_body(self, client_id: Optional[str] = None) -> Dict[str, Any]:
         """生成用于HTTP响应体的反馈信息"""
-        feedback = self.generate_feedback(client_id)
+        cache = self._get_cache(client_id)
+        if cache.body is None:
+            cache.body = cache.feedback.to_dict()
         return {
-            'load_feedback': feedback.to_dict()
+            'load_feedback': cache.body
         }
+    
+    def get_feedback_bytes(self, client_id: Optional[str] = None) -> bytes:
+        """生成二进制格式的反馈信息"""
+        cache = self._get_cache(client_id)
+        if cache.binary is None:
+            cache.binary = cache.feedback.to_bytes()
+        return cache.binary
+    
+    def get_feedback_for_binary_header(self, client_id: Optional[str] = None) -> Dict[str, str]:
+        """生成捎带在一个响应头中的二进制反馈信息"""
+        cache = self._get_cache(client_id)
+        if cache.binary_headers is None:
+            cache.binary_headers = {FEEDBACK_HEADER: cache.feedback.to_header_value()}
+        return dict(cache.binary_headers)
 
 
 class FeedbackReceiver:
@@ -258,6 +398,8 @@ class FeedbackReceiver:
             # 根据通道类型解析数据
             if channel == FeedbackChannel.HTTP_HEADER:
                 feedback = self._parse_http_headers(feedback_data)
+            elif channel == FeedbackChannel.BINARY:
+                feedback = self._parse_binary(feedback_data)
             elif channel == FeedbackChannel.HTTP_BODY:
                 feedback = self._parse_http_body(feedback_data)
             elif channel == FeedbackChannel.WEBSOCKET:
@@ -274,7 +416,14 @@ class FeedbackReceiver:
             print(f"解析反馈数据时出错: {e}")
     
     def _parse_http_headers(self, headers: Dict[str, str]) -> Optional[LoadFeedback]:
-        """解析HTTP响应头中的反馈信息"""
+        """解析HTTP响应头中的反馈信息（有 X-Load-Feedback 时优先使用二进制格式）"""
+        value = headers.get(FEEDBACK_HEADER)
+        if value is not None:
+            try:
+                return LoadFeedback.from_header_value(value)
+            except ValueError as e:
+                print(f"解析二进制反馈头失败: {e}")
+                return None
         try:
             return LoadFeedback(
                 timestamp=float(headers.get('X-Timestamp', time.time())),
@@ -300,8 +449,18 @@ class FeedbackReceiver:
             print(f"解析HTTP响应体反馈失败: {e}")
             return None
     
-    def _parse_websocket_message(self, message: str) -> Optional[LoadFeedback]:
-        """解析WebSocket消息中的反馈信息"""
+    def _parse_binary(self, data: BytesLike) -> Optional[LoadFeedback]:
+        """解析二进制格式的反馈信息（直接在缓冲区上解析，不复制）"""
+        try:
+            return LoadFeedback.from_bytes(data)
+        except (ValueError, IndexError, struct.error) as e:
+            print(f"解析二进制反馈失败: {e}")
+            return None
+    
+    def _parse_websocket_message(self, message: Union[str, BytesLike]) -> Optional[LoadFeedback]:
+        """解析WebSocket消息中的反馈信息（二进制帧使用二进制格式）"""
+        if not isinstance(message, str):
+            return self._parse_binary(message)
         try:
             return LoadFeedback.from_json(message)
         except (ValueError, json.JSONDecodeError) as e:
@@ -311,7 +470,9 @@ class FeedbackReceiver:
     def _parse_generic(self, data: Any) -> Optional[LoadFeedback]:
         """通用解析方法"""
         try:
-            if isinstance(data, str):
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                return LoadFeedback.from_bytes(data)
+            elif isinstance(data, str):
                 return LoadFeedback.from_json(data)
             elif isinstance(data, dict):
                 return LoadFeedback.from_dict(data)
@@ -434,6 +595,8 @@ class FeedbackSystem:
         elif channel == FeedbackChannel.HTTP_BODY:
             body = generator.get_feedback_for_http_body(client_id)
             receiver.receive_feedback(body, channel)
+        elif channel == FeedbackChannel.BINARY:
+            receiver.receive_feedback(generator.get_feedback_bytes(client_id), channel)
         else:
             receiver.receive_feedback(feedback.to_json(), channel)
     
@@ -2,21 +2,34 @@
 服务端负载监控模块
 
 提供系统负载监控、评估和分级功能
+
+请求的记录是 O(1) 的：每秒请求数用分桶环形计数器统计，响应时间记录到
+分桶环形的延迟直方图（sliding_window），采样时只合并窗口内的桶，
+与请求数无关，可以得到平均值和 p50/p95/p99。
+
+记录按线程分段：每个线程第一次记录时轮转分配到一个分段，分段有自己的锁、
+计数器和直方图，不同分段的线程互不等待；监控线程在每个采样周期合并所有分段。
+
+CPU 和内存由 SystemSampler 直接读取 /proc 得到。监控线程在每个采样周期算好
+负载评分、等级、趋势和建议并发布为状态快照，get_load_status 直接返回快照，
+不加锁也不重新计算，可以在每个响应上调用。
 """
 
 import time
-import psutil
+import itertools
 import threading
 from typing import Dict, Any, Optional, Callable, List
 from dataclasses import dataclass, asdict
 from enum import Enum
 from collections import deque
-import statistics
 
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
+from .sliding_window import LatencySketch, RollingCounter, RollingSketch
+from .system_sampler import SystemSampler
+
 
 class LoadLevel(Enum):
     """负载等级枚举"""
@@ -38,6 +51,9 @@ class LoadMetrics:
     requests_per_second: float # 每秒请求数
     error_rate: float       # 错误率 (0.0-1.0)
     active_connections: int # 活跃连接数
+    p50_response_time: float = 0.0  # 响应时间中位数(ms)
+    p95_response_time: float = 0.0  # 响应时间95分位(ms)
+    p99_response_time: float = 0.0  # 响应时间99分位(ms)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典格式"""
@@ -49,6 +65,20 @@ class LoadMetrics:
         return cls(**data)
 
 
+class _RecordStripe:
+    """一个记录分段：计数器和延迟直方图，由分段自己的锁保护"""
+    
+    __slots__ = ('lock', 'requests', 'response_times', 'started', 'ended', 'errors')
+    
+    def __init__(self, window_buckets: int, latency_window: float, latency_accuracy: float):
+        self.lock = threading.Lock()
+        self.requests = RollingCounter(1.0, window_buckets)  # 最近1秒的请求数
+        self.response_times = RollingSketch(latency_window, window_buckets, latency_accuracy)
+        self.started = 0
+        self.ended = 0
+        self.errors = 0
+
+
 class LoadMonitor:
     """
     系统负载监控器
@@ -64,7 +94,11 @@ class LoadMonitor:
                  sample_interval: float = 1.0,
                  history_size: int = 60,
                  max_queue_size: int = 1000,
-                 max_response_time: float = 1000.0):
+                 max_response_time: float = 1000.0,
+                 latency_window: float = 10.0,
+                 window_buckets: int = 10,
+                 latency_accuracy: float = 0.01,
+                 record_stripes: int = 16):
         """
         初始化负载监控器
         
@@ -73,23 +107,35 @@ class LoadMonitor:
             history_size: 历史数据保存数量
             max_queue_size: 最大队列长度(用于归一化)
             max_response_time: 最大响应时间(ms，用于归一化)
+            latency_window: 响应时间统计窗口(秒)
+            window_buckets: 每个统计窗口的桶数
+            latency_accuracy: 响应时间分位数的相对精度
+            record_stripes: 请求记录的分段数，1 表示所有线程共用一把锁
         """
+        if record_stripes <= 0:
+            raise ValueError("分段数必须大于0")
         self.sample_interval = sample_interval
         self.history_size = history_size
         self.max_queue_size = max_queue_size
         self.max_response_time = max_response_time
+        self.latency_accuracy = latency_accuracy
         
         # 历史数据存储
         self.metrics_history = deque(maxlen=history_size)
         
-        # 实时统计数据
-        self.current_queue_depth = 0
-        self.response_times = deque(maxlen=100)  # 最近100个响应时间
-        self.request_timestamps = deque(maxlen=1000)  # 最近1000个请求时间戳
-        self.error_count = 0
-        self.total_requests = 0
+        # 实时统计数据：按线程分段记录，采样时合并
+        self._stripes = [
+            _RecordStripe(window_buckets, latency_window, latency_accuracy)
+            for _ in range(record_stripes)
+        ]
+        self._local = threading.local()
+        self._stripe_counter = itertools.count()
         self.active_connections = 0
         
+        # 系统资源采样和每个采样周期发布的负载状态快照
+        self.system_sampler = SystemSampler()
+        self._status: Optional[Dict[str, Any]] = None
+        
         # 负载等级阈值配置
         self.load_thresholds = {
             LoadLevel.GREEN: 0.3,
@@ -114,6 +160,7 @@ class LoadMonitor:
         self._stop_monitoring = threading.Event()
         self._running = False
         self._lock = threading.RLock()
+        self._connections_lock = threading.Lock()
         
     def start_monitoring(self):
         """启动负载监控"""
@@ -132,6 +179,9 @@ class LoadMonitor:
         self._stop_monitoring.set()
         if self._monitor_thread and self._monitor_thread.is_alive():
             self._monitor_thread.join(timeout=2.0)
+        # 停止后计数仍会变化，不再返回过期的快照
+        with self._lock:
+            self._status = None
     
     def _monitoring_loop(self):
         """监控循环"""
@@ -140,75 +190,122 @@ class LoadMonitor:
                 metrics = self._collect_metrics()
                 with self._lock:
                     self.metrics_history.append(metrics)
+                    if not self._stop_monitoring.is_set():
+                        self._status = self._build_status(metrics)
                 
-                time.sleep(self.sample_interval)
+                self._stop_monitoring.wait(self.sample_interval)
             except Exception as e:
                 print(f"负载监控错误: {e}")
-                time.sleep(self.sample_interval)
+                self._stop_monitoring.wait(self.sample_interval)
     
     def _collect_metrics(self) -> LoadMetrics:
         """收集系统指标"""
         current_time = time.time()
         
         # 收集系统资源指标
-        cpu_usage = psutil.cpu_percent() / 100.0
-        memory_info = psutil.virtual_memory()
-        memory_usage = memory_info.percent / 100.0
+        system = self.system_sampler.sample()
+        cpu_usage = system.cpu_usage
+        memory_usage = system.memory_usage
         
-        # 计算平均响应时间
-        with self._lock:
-            avg_response_time = (
-                statistics.mean(self.response_times) 
-                if self.response_times else 0.0
-            )
-            
-            # 计算每秒请求数
-            recent_requests = [
-                t for t in self.request_timestamps
-                if current_time - t <= 1.0
-            ]
-            requests_per_second = len(recent_requests)
-            
-            # 计算错误率
-            error_rate = (
-                self.error_count / self.total_requests 
-                if self.total_requests > 0 else 0.0
-            )
-            
-            queue_depth = self.current_queue_depth
-            active_connections = self.active_connections
+        # 合并各分段的请求统计
+        requests_per_second, latency, started, ended, errors = self._collect_window(current_time)
+        p50, p95, p99 = latency.quantiles((0.5, 0.95, 0.99))
+        
+        # 计算错误率
+        error_rate = errors / started if started > 0 else 0.0
+        queue_depth = max(0, started - ended)
+        active_connections = self.active_connections
         
         return LoadMetrics(
             timestamp=current_time,
             cpu_usage=cpu_usage,
             memory_usage=memory_usage,
             queue_depth=queue_depth,
-            avg_response_time=avg_response_time,
+            avg_response_time=latency.mean,
             requests_per_second=requests_per_second,
             error_rate=error_rate,
-            active_connections=active_connections
+            active_connections=active_connections,
+            p50_response_time=p50,
+            p95_response_time=p95,
+            p99_response_time=p99
         )
     
+    def _collect_window(self, now: float):
+        """
+        合并各分段的窗口统计
+        
+        每个分段只在复制自己的计数和直方图时加锁，合并在锁外进行
+        
+        Returns:
+            tuple: (每秒请求数, 响应时间直方图, 开始的请求数, 结束的请求数, 错误数)
+        """
+        requests_per_second = 0.0
+        parts = []
+        started = ended = errors = 0
+        for stripe in self._stripes:
+            with stripe.lock:
+                requests_per_second += stripe.requests.rate(now)
+                parts.extend(stripe.response_times.live(now))
+                started += stripe.started
+                ended += stripe.ended
+                errors += stripe.errors
+        return (requests_per_second, LatencySketch.merged(parts, self.latency_accuracy),
+                started, ended, errors)
+    
+    def _get_stripe(self) -> _RecordStripe:
+        try:
+            return self._local.stripe
+        except AttributeError:
+            stripe = self._stripes[next(self._stripe_counter) % len(self._stripes)]
+            self._local.stripe = stripe
+            return stripe
+    
     def record_request_start(self):
         """记录请求开始"""
-        with self._lock:
-            self.request_timestamps.append(time.time())
-            self.current_queue_depth += 1
-            self.total_requests += 1
+        stripe = self._get_stripe()
+        now = time.time()
+        with stripe.lock:
+            stripe.requests.add(now)
+            stripe.started += 1
     
     def record_request_end(self, response_time_ms: float, is_error: bool = False):
-        """记录请求结束"""
-        with self._lock:
-            self.current_queue_depth = max(0, self.current_queue_depth - 1)
-            self.response_times.append(response_time_ms)
+        """记录请求结束（可以与开始不在同一个线程）"""
+        stripe = self._get_stripe()
+        now = time.time()
+        with stripe.lock:
+            stripe.response_times.add(now, response_time_ms)
+            stripe.ended += 1
             if is_error:
-                self.error_count += 1
+                stripe.errors += 1
     
     def record_connection_change(self, delta: int):
         """记录连接数变化"""
-        with self._lock:
+        with self._connections_lock:
             self.active_connections = max(0, self.active_connections + delta)
     
+    @property
+    def total_requests(self) -> int:
+        """已开始的请求总数"""
+        return sum(stripe.started for stripe in self._stripes)
+    
+    @property
+    def error_count(self) -> int:
+        """出错的请求总数"""
+        return sum(stripe.errors for stripe in self._stripes)
+    
+    @property
+    def current_queue_depth(self) -> int:
+        """正在处理的请求数"""
+        return max(0, self.total_requests - sum(stripe.ended for stripe in self._stripes))
+    
+    def get_latency_sketch(self) -> LatencySketch:
+        """
+        获取窗口内响应时间的直方图
+        
+        多个监控器（例如多个进程或实例）的直方图可以用 merge 合并后再求分位数
+        """
+        return self._collect_window(time.time())[1]
+    
     def calculate_load_score(self, metrics: Optional[LoadMetrics] = None) -> float:
         """
         计算综合负载评分
@@ -276,10 +373,21 @@ class LoadMonitor:
         """
         获取完整的负载状态信息
         
+        监控线程运行时返回最近一次采样发布的状态快照（顶层为副本，
+        metrics 和 suggestions 由各次调用共享，不要修改）
+        
         Returns:
             Dict: 包含指标、评分、等级等信息的状态字典
         """
-        metrics = self.get_current_metrics()
+        status = self._status
+        if status is not None:
+            return dict(status)
+        
+        with self._lock:
+            return self._build_status(self.get_current_metrics())
+    
+    def _build_status(self, metrics: Optional[LoadMetrics]) -> Dict[str, Any]:
+        """根据一次采样的指标计算负载状态"""
         if metrics is None:
             return {
                 'available': False,
@@ -365,10 +473,12 @@ class LoadMonitor:
     def update_thresholds(self, thresholds: Dict[LoadLevel, float]):
         """更新负载等级阈值"""
         self.load_thresholds.update(thresholds)
+        self._status = None
     
     def update_weights(self, weights: Dict[str, float]):
         """更新指标权重"""
         self.weights.update(weights)
+        self._status = None
     
     def __str__(self) -> str:
         status = self.get_load_status()
@@ -0,0 +1,129 @@
+"""
+系统资源采样
+
+在 Linux 上直接读取 /proc/stat 和 /proc/meminfo：文件只打开一次，每次采样用
+pread 从头读取，CPU 使用率由两次采样之间的计数差自己计算，一次采样只需要
+两次系统调用和几行文本解析，10Hz 采样的开销可以忽略。没有 /proc 的系统
+（macOS、Windows）回退到 psutil（可选依赖，只在这种情况下需要）。
+
+每次采样生成一个新的不可变 SystemSnapshot 并替换 snapshot 引用，
+读取方直接取 snapshot 属性，不需要加锁。
+"""
+
+import os
+import time
+import threading
+from typing import Optional, Tuple
+from dataclasses import dataclass
+
+try:
+    import psutil
+except ImportError:  # 有 /proc 时不需要
+    psutil = None
+
+
+@dataclass(frozen=True)
+class SystemSnapshot:
+    """一次系统资源采样的结果（不可变）"""
+    timestamp: float
+    cpu_usage: float        # 两次采样之间的CPU使用率 (0.0-1.0)
+    memory_usage: float     # 内存使用率 (0.0-1.0)，与 psutil.virtual_memory().percent 一致
+
+
+class SystemSampler:
+    """
+    系统资源采样器
+
+    示例：
+        sampler = SystemSampler()
+        sampler.sample()          # 由监控线程周期性调用
+        sampler.snapshot.cpu_usage  # 任何线程无锁读取
+    """
+
+    def __init__(self, proc_root: str = '/proc'):
+        """
+        Args:
+            proc_root: proc 文件系统的挂载点，不可用时回退到 psutil
+        """
+        self._stat_fd: Optional[int] = None
+        self._meminfo_fd: Optional[int] = None
+        if hasattr(os, 'pread'):
+            try:
+                self._stat_fd = os.open(os.path.join(proc_root, 'stat'), os.O_RDONLY)
+                self._meminfo_fd = os.open(os.path.join(proc_root, 'meminfo'), os.O_RDONLY)
+            except OSError:
+                self.close()
+        if self._stat_fd is None and psutil is None:
+            raise ImportError("没有可用的 /proc，系统资源采样需要安装 psutil: pip install psutil")
+        self._previous_cpu: Optional[Tuple[int, int]] = None  # (总时间, 空闲时间)
+        self._sample_lock = threading.Lock()
+        self.samples = 0
+        self.snapshot = SystemSnapshot(timestamp=0.0, cpu_usage=0.0, memory_usage=0.0)
+
+    @property
+    def uses_proc(self) -> bool:
+        """是否直接读取 /proc（否则使用 psutil）"""
+        return self._stat_fd is not None
+
+    def sample(self) -> SystemSnapshot:
+        """采样一次并发布新的快照"""
+        with self._sample_lock:
+            if self.uses_proc:
+                cpu_usage = self._read_cpu_usage()
+                memory_usage = self._read_memory_usage()
+            else:
+                cpu_usage = psutil.cpu_percent() / 100.0
+                memory_usage = psutil.virtual_memory().percent / 100.0
+            snapshot = SystemSnapshot(timestamp=time.time(), cpu_usage=cpu_usage,
+                                      memory_usage=memory_usage)
+            self.snapshot = snapshot
+            self.samples += 1
+            return snapshot
+
+    def _read_cpu_usage(self) -> float:
+        # 第一行: cpu user nice system idle iowait irq softirq steal guest guest_nice
+        data = os.pread(self._stat_fd, 512, 0)
+        fields = data[:data.index(b'\n')].split()[1:9]
+        times = [int(field) for field in fields]
+        total = sum(times)
+        idle = times[3] + (times[4] if len(times) > 4 else 0)
+
+        previous = self._previous_cpu
+        self._previous_cpu = (total, idle)
+        if previous is None:
+            # 第一次采样没有差值，使用开机以来的平均值
+            return (total - idle) / total if total else 0.0
+        delta_total = total - previous[0]
+        if delta_total <= 0:
+            return self.snapshot.cpu_usage
+        return min(1.0, max(0.0, 1.0 - (idle - previous[1]) / delta_total))
+
+    def _read_memory_usage(self) -> float:
+        data = os.pread(self._meminfo_fd, 4096, 0)
+        total = available = free = None
+        for line in data.split(b'\n'):
+            if line.startswith(b'MemTotal:'):
+                total = int(line.split()[1])
+            elif line.startswith(b'MemAvailable:'):
+                available = int(line.split()[1])
+                break
+            elif line.startswith(b'MemFree:'):
+                free = int(line.split()[1])
+        if available is None:
+            # 3.14 之前的内核没有 MemAvailable
+            available = free or 0
+        return (total - available) / total if total else 0.0
+
+    def close(self) -> None:
+        """关闭 /proc 文件"""
+        for name in ('_stat_fd', '_meminfo_fd'):
+            fd = getattr(self, name)
+            if fd is not None:
+                os.close(fd)
+                setattr(self, name, None)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
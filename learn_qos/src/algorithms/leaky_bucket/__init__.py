@@ -3,8 +3,10 @@
 
 实现了经典的漏桶算法，用于流量整形和平滑输出。
 通过固定的漏出速率消除流量突发，提供稳定的输出速率。
+所有漏桶由共享的 LeakyBucketScheduler 按漏完时刻驱动输出。
 """
 
 from .leaky_bucket import LeakyBucket, LeakyBucketConfig
+from .scheduler import LeakyBucketScheduler, get_default_scheduler
 
-__all__ = ['LeakyBucket', 'LeakyBucketConfig']
+__all__ = ['LeakyBucket', 'LeakyBucketConfig', 'LeakyBucketScheduler', 'get_default_scheduler']
@@ -2,20 +2,22 @@
 漏桶算法实现
 
 实现经典的漏桶算法，提供固定速率的平滑输出。
+
+漏桶不再各自启动输出线程，而是登记到共享的 LeakyBucketScheduler：
+每个漏桶按当前水位算出队首数据包漏完的时刻，由调度器在该时刻驱动输出。
 """
 
 import time
-import threading
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from dataclasses import dataclass
 from collections import deque
-import heapq
 
 import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from common.base import QoSAlgorithm, Packet, QoSMetrics
+from common.base import QoSAlgorithm, Packet
+from .scheduler import LeakyBucketScheduler, get_default_scheduler
 
 
 @dataclass
@@ -23,7 +25,7 @@ class LeakyBucketConfig:
     """漏桶算法配置"""
     leak_rate: float  # 漏出速率 (bytes/second)
     bucket_size: int  # 桶容量 (bytes)
-    output_interval: float = 0.01  # 输出检查间隔 (seconds)
+    output_interval: float = 0.01  # 输出检查间隔 (seconds)，调度器按漏完时刻输出后不再使用，保留以兼容
     
     def __post_init__(self):
         # 参数验证
@@ -46,18 +48,27 @@ class LeakyBucket(QoSAlgorithm):
     - 线程安全
     """
     
-    def __init__(self, config: LeakyBucketConfig):
+    def __init__(self, config: LeakyBucketConfig,
+                 scheduler: Optional[LeakyBucketScheduler] = None,
+                 output_callback: Optional[Callable[[Packet], None]] = None):
+        """
+        Args:
+            config: 漏桶配置
+            scheduler: 驱动输出的调度器，None 表示使用所有漏桶共享的默认调度器
+            output_callback: 数据包漏出时的回调（在漏桶锁之外调用）
+        """
         super().__init__("LeakyBucket")
         self.config = config
+        self.output_callback = output_callback
         
         # 算法状态
-        self._current_volume = 0  # 当前桶中的数据量 (bytes)
+        self._current_volume = 0  # 当前桶中的数据量 (bytes)，按漏出速率连续减少
         self._packet_queue = deque()  # 数据包队列
+        self._queued_bytes = 0  # 队列中数据包的总字节数
         self._last_leak_time = time.time()
         
         # 输出调度
-        self._output_scheduler = None
-        self._stop_scheduler = threading.Event()
+        self._scheduler = scheduler
         
         # 统计信息
         self._total_input_bytes = 0
@@ -65,13 +76,11 @@ class LeakyBucket(QoSAlgorithm):
         self._packets_dropped = 0
         self._packets_queued = 0
         self._packets_output = 0
-        
-        # 线程安全锁
-        self._lock = threading.RLock()
     
-    def _leak_data(self) -> None:
+    def _leak_data(self, current_time: Optional[float] = None) -> None:
         """执行漏出操作，更新桶状态"""
-        current_time = time.time()
+        if current_time is None:
+            current_time = time.time()
         time_elapsed = current_time - self._last_leak_time
         
         if time_elapsed > 0:
@@ -90,50 +99,54 @@ class LeakyBucket(QoSAlgorithm):
         """检查是否能接受新数据包"""
         return self._current_volume + packet.size <= self.config.bucket_size
     
-    def _schedule_output(self) -> None:
-        """输出调度器，定期处理数据包输出"""
-        while not self._stop_scheduler.is_set():
-            try:
-                with self._lock:
-                    self._leak_data()
-                    self._process_output_queue()
-                
-                # 等待下一个调度周期
-                self._stop_scheduler.wait(self.config.output_interval)
-                
-            except Exception as e:
-                # 记录错误但继续运行
-                print(f"输出调度器错误: {e}")
+    def _next_output_time(self, current_time: float) -> Optional[float]:
+        """队首数据包漏完的时刻：桶中剩余数据量降到队首之后的字节数时，队首已全部漏出"""
+        if not self._packet_queue:
+            return None
+        behind = self._queued_bytes - self._packet_queue[0].size
+        return current_time + max(0.0, self._current_volume - behind) / self.config.leak_rate
     
-    def _process_output_queue(self) -> None:
-        """处理输出队列，按漏出速率输出数据包"""
-        current_time = time.time()
-        
-        # 计算从上次处理到现在应该输出的字节数
-        time_since_last = current_time - getattr(self, '_last_output_time', current_time)
-        bytes_can_output = self.config.leak_rate * time_since_last
+    def _process_output_queue(self, current_time: Optional[float] = None) -> Tuple[List[Packet], Optional[float]]:
+        """
+        输出已经漏完的数据包（调用方持有锁并已执行 _leak_data）
         
-        bytes_output = 0
-        packets_to_output = []
+        Returns:
+            (输出的数据包列表, 下一个数据包漏完的时刻，队列为空时为 None)
+        """
+        if current_time is None:
+            current_time = time.time()
         
-        # 收集可以输出的数据包
-        while self._packet_queue and bytes_output < bytes_can_output:
+        packets_output = []
+        while self._packet_queue:
             packet = self._packet_queue[0]
-            if bytes_output + packet.size <= bytes_can_output:
-                packet = self._packet_queue.popleft()
-                packet.departure_time = current_time
-                packets_to_output.append(packet)
-                bytes_output += packet.size
-                self._packets_output += 1
-                
-                # 更新指标
-                self.metrics.update_with_packet(packet)
-            else:
+            behind = self._queued_bytes - packet.size
+            if behind < self._current_volume:
                 break
+            # 剩余数据量降到 behind 的时刻就是该数据包漏完的时刻
+            self._packet_queue.popleft()
+            self._queued_bytes = behind
+            packet.departure_time = current_time - (behind - self._current_volume) / self.config.leak_rate
+            packets_output.append(packet)
+            self._packets_output += 1
+            
+            # 更新指标（到达时已计数）
+            self.metrics.update_with_packet(packet, count=False)
         
-        # 更新桶状态
-        self._current_volume -= bytes_output
-        self._last_output_time = current_time
+        return packets_output, self._next_output_time(current_time)
+    
+    def _drain(self) -> Optional[float]:
+        """调度器回调：输出已漏完的数据包，返回下一次需要输出的时刻"""
+        with self._lock:
+            now = time.time()
+            self._leak_data(now)
+            packets_output, next_time = self._process_output_queue(now)
+        self._emit(packets_output)
+        return next_time
+    
+    def _emit(self, packets: List[Packet]) -> None:
+        if self.output_callback is not None:
+            for packet in packets:
+                self.output_callback(packet)
     
     def enqueue(self, packet: Packet) -> bool:
         """
@@ -147,12 +160,15 @@ class LeakyBucket(QoSAlgorithm):
         """
         with self._lock:
             # 先执行漏出操作
-            self._leak_data()
+            now = time.time()
+            self._leak_data(now)
             
             # 检查是否能接受新数据包
             if self._can_accept_packet(packet):
                 # 数据包入队
+                was_empty = not self._packet_queue
                 self._packet_queue.append(packet)
+                self._queued_bytes += packet.size
                 self._current_volume += packet.size
                 self._total_input_bytes += packet.size
                 self._packets_queued += 1
@@ -160,6 +176,10 @@ class LeakyBucket(QoSAlgorithm):
                 # 更新基类指标（入队时不设置departure_time，因为输出由调度器控制）
                 self.metrics.total_packets += 1
                 
+                # 队首变化时通知调度器；队列非空时新包不影响队首漏完的时刻
+                if was_empty and self._running:
+                    self._scheduler.schedule(self, self._next_output_time(now))
+                
                 return True
             else:
                 # 桶满，丢弃数据包
@@ -171,19 +191,17 @@ class LeakyBucket(QoSAlgorithm):
         """
         从输出队列中取出数据包
         
-        注意：在漏桶算法中，数据包的输出由内部调度器控制
-        此方法主要用于测试和兼容性
+        注意：在漏桶算法中，数据包的输出由调度器控制
+        此方法立即输出已漏完的数据包，主要用于测试和兼容性
         
         Returns:
             Optional[Packet]: 已处理完成的数据包，None表示无可用数据包
         """
-        with self._lock:
-            self._leak_data()
-            self._process_output_queue()
-            
-            # 这里我们返回None，因为输出由调度器控制
-            # 实际应用中应该通过回调或其他机制获取输出数据包
-            return None
+        self._drain()
+        
+        # 这里我们返回None，因为输出由调度器控制
+        # 实际应用中应该通过 output_callback 获取输出数据包
+        return None
     
     def is_empty(self) -> bool:
         """检查桶是否为空"""
@@ -222,23 +240,29 @@ class LeakyBucket(QoSAlgorithm):
                 return self._total_output_bytes / elapsed_time
             return 0.0
     
-    def start(self):
-        """启动漏桶算法（启动输出调度器）"""
-        if self._output_scheduler is None or not self._output_scheduler.is_alive():
-            self._running = True
-            self._stop_scheduler.clear()
-            self._output_scheduler = threading.Thread(
-                target=self._schedule_output,
-                daemon=True
-            )
-            self._output_scheduler.start()
+    def start(self, use_thread: bool = True):
+        """
+        启动漏桶算法（登记到输出调度器）
+        
+        Args:
+            use_thread: 是否由调度线程驱动；False 时由调用方调用调度器的 run_due
+        """
+        if self._scheduler is None:
+            self._scheduler = get_default_scheduler()
+        self._running = True
+        self._scheduler.register(self, use_thread=use_thread)
+        with self._lock:
+            now = time.time()
+            self._leak_data(now)
+            next_time = self._next_output_time(now)
+            if next_time is not None:
+                self._scheduler.schedule(self, next_time)
     
     def stop(self):
-        """停止漏桶算法"""
+        """停止漏桶算法（从输出调度器取消登记）"""
         self._running = False
-        self._stop_scheduler.set()
-        if self._output_scheduler and self._output_scheduler.is_alive():
-            self._output_scheduler.join(timeout=1.0)
+        if self._scheduler is not None:
+            self._scheduler.unregister(self)
     
     def reset_metrics(self):
         """重置性能指标和统计信息"""
@@ -0,0 +1,166 @@
+"""
+漏桶输出调度器
+
+一个线程驱动任意多个漏桶的输出。每个漏桶在队首数据包漏完的时刻
+（由当前水位和漏出速率直接算出）登记到最小堆中，调度线程睡到堆顶的
+时刻再让对应的漏桶输出；队列为空的漏桶不在堆中，不产生任何开销。
+
+不想使用调度线程时（例如在 asyncio 事件循环中），登记时传 use_thread=False，
+由调用方在 next_deadline() 的时刻调用 run_due()。
+"""
+
+import time
+import heapq
+import itertools
+import threading
+from typing import Optional, Dict, Any
+
+
+class LeakyBucketScheduler:
+    """基于最小堆的漏桶输出调度器"""
+
+    def __init__(self, name: str = "LeakyBucketScheduler"):
+        self.name = name
+        self._cond = threading.Condition()
+        self._heap = []            # (时刻, 序号, 漏桶)
+        self._deadlines = {}       # 漏桶 -> 堆中有效的时刻，其余条目已过期
+        self._buckets = set()      # 已登记的漏桶
+        self._counter = itertools.count()
+        self._thread = None
+        self.stats = {'wakeups': 0, 'drains': 0, 'stale': 0}
+
+    def register(self, bucket, use_thread: bool = True) -> None:
+        """
+        登记漏桶（由漏桶随后调用 schedule 安排输出时刻）
+
+        Args:
+            bucket: LeakyBucket
+            use_thread: 是否由调度线程驱动（没有线程时自动启动）
+        """
+        with self._cond:
+            self._buckets.add(bucket)
+            if use_thread and (self._thread is None or not self._thread.is_alive()):
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def unregister(self, bucket) -> None:
+        """取消登记，堆中残留的条目在弹出时丢弃"""
+        with self._cond:
+            self._buckets.discard(bucket)
+            self._deadlines.pop(bucket, None)
+            self._cond.notify()
+
+    def schedule(self, bucket, deadline: float) -> None:
+        """安排漏桶在 deadline 时刻输出（已安排了更早的时刻则忽略）"""
+        with self._cond:
+            if bucket in self._buckets:
+                self._push(bucket, deadline)
+
+    def _push(self, bucket, deadline: float) -> None:
+        current = self._deadlines.get(bucket)
+        if current is not None and current <= deadline:
+            return
+        self._deadlines[bucket] = deadline
+        heapq.heappush(self._heap, (deadline, next(self._counter), bucket))
+        if self._heap[0][2] is bucket:
+            self._cond.notify()
+
+    def __contains__(self, bucket) -> bool:
+        return bucket in self._buckets
+
+    def __len__(self) -> int:
+        """已登记的漏桶数"""
+        return len(self._buckets)
+
+    def is_running(self) -> bool:
+        """调度线程是否在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def next_deadline(self) -> Optional[float]:
+        """最近一次需要输出的时刻，没有待输出的漏桶时返回 None"""
+        with self._cond:
+            self._discard_stale()
+            return self._heap[0][0] if self._heap else None
+
+    def _discard_stale(self) -> None:
+        while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+            self.stats['stale'] += 1
+
+    def run_due(self, now: Optional[float] = None) -> int:
+        """
+        让所有到期的漏桶输出，并按它们返回的下一次时刻重新安排
+
+        Returns:
+            int: 输出的漏桶个数
+        """
+        if now is None:
+            now = time.time()
+        due = []
+        with self._cond:
+            self._discard_stale()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, bucket = heapq.heappop(self._heap)
+                del self._deadlines[bucket]
+                due.append(bucket)
+                self._discard_stale()
+
+        # 漏桶的输出在调度器锁之外进行，漏桶入队时可以安全地回调 schedule
+        for bucket in due:
+            next_time = bucket._drain()
+            self.stats['drains'] += 1
+            if next_time is not None:
+                self.schedule(bucket, next_time)
+        return len(due)
+
+    def _run(self) -> None:
+        """调度线程：睡到堆顶时刻，没有登记的漏桶时退出"""
+        while True:
+            with self._cond:
+                while True:
+                    if not self._buckets:
+                        self._thread = None
+                        return
+                    self._discard_stale()
+                    if self._heap:
+                        delay = self._heap[0][0] - time.time()
+                        if delay <= 0:
+                            break
+                        self._cond.wait(delay)
+                    else:
+                        self._cond.wait()
+                self.stats['wakeups'] += 1
+            try:
+                self.run_due()
+            except Exception as e:
+                # 记录错误但继续运行
+                print(f"输出调度器错误: {e}")
+
+    def stop(self) -> None:
+        """取消所有登记并等待调度线程退出"""
+        with self._cond:
+            self._buckets.clear()
+            self._deadlines.clear()
+            self._heap.clear()
+            self._cond.notify()
+            thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=1.0)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return dict(self.stats, buckets=len(self._buckets), pending=len(self._deadlines),
+                        running=self.is_running())
+
+
+_default_scheduler = None
+_default_scheduler_lock = threading.Lock()
+
+
+def get_default_scheduler() -> LeakyBucketScheduler:
+    """所有未指定调度器的漏桶共享的调度器"""
+    global _default_scheduler
+    with _default_scheduler_lock:
+        if _default_scheduler is None:
+            _default_scheduler = LeakyBucketScheduler()
+        return _default_scheduler
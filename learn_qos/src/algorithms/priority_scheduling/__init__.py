@@ -6,6 +6,7 @@
 - 加权轮转调度
 - 动态优先级调度
 - 防饥饿机制
+- 按流的缺额轮转调度（同一优先级内成千上万个流之间的公平）
 """
 
 from .priority_scheduler import (
@@ -14,10 +15,12 @@ from .priority_scheduler import (
     DeficitRoundRobinScheduler, HybridPriorityScheduler,
     SchedulingStrategy, PriorityConfig, create_priority_scheduler
 )
+from .flow_scheduler import FlowDRRScheduler, FlowSchedulerConfig, FlowState
 
 __all__ = [
     'PriorityScheduler', 'StrictPriorityScheduler',
     'WeightedRoundRobinScheduler', 'DynamicPriorityScheduler',
     'DeficitRoundRobinScheduler', 'HybridPriorityScheduler',
-    'SchedulingStrategy', 'PriorityConfig', 'create_priority_scheduler'
+    'SchedulingStrategy', 'PriorityConfig', 'create_priority_scheduler',
+    'FlowDRRScheduler', 'FlowSchedulerConfig', 'FlowState'
 ]
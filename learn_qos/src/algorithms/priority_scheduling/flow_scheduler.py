@@ -0,0 +1,296 @@
+"""
+按流公平调度（DRR）
+
+PacketPriority 只有四个级别，DeficitRoundRobinScheduler 只能在级别之间分配带宽。
+FlowDRRScheduler 在每个优先级内按分类函数把数据包分到任意多个流（租户、连接等），
+优先级之间按严格优先级服务，同一优先级的流之间做经典的缺额轮转（Shreedhar & Varghese）：
+
+- 每个优先级一个活跃链表，只有非空的流在链表中，每次出队只看最高非空优先级链表的头部，O(1)
+- 每个流每轮获得 quantum × weight 字节的额度，按字节公平而不是按包公平
+- 流在第一个数据包到达时创建，空闲的流超过 max_flows 或 idle_timeout 时被回收
+"""
+
+import time
+from typing import Optional, Dict, Any, Callable, Hashable, Deque, Tuple
+from dataclasses import dataclass
+from collections import deque, OrderedDict
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from common.base import QoSAlgorithm, Packet, PacketPriority
+
+
+def default_flow(packet: Packet) -> Hashable:
+    """默认的分类函数：数据包的 flow 属性，没有该属性的数据包在各自优先级内同属一个流"""
+    return getattr(packet, 'flow', None)
+
+
+@dataclass
+class FlowSchedulerConfig:
+    """按流调度配置"""
+    quantum: int = 1500                 # 每轮额度(字节)，不小于最大包长时每次出队 O(1)
+    max_flows: int = 100000             # 流的最大个数，超出时回收最久未活动的空闲流
+    max_queue_per_flow: int = 1000      # 每个流的队列长度上限
+    idle_timeout: Optional[float] = None  # 空闲超过该时间(秒)的流在创建新流时被回收
+
+    def __post_init__(self):
+        if self.quantum <= 0:
+            raise ValueError("额度必须大于0")
+        if self.max_flows <= 0:
+            raise ValueError("流的最大个数必须大于0")
+        if self.max_queue_per_flow <= 0:
+            raise ValueError("队列长度上限必须大于0")
+
+
+class FlowState:
+    """一个流的队列、额度和字节统计"""
+
+    __slots__ = (
+        'key', 'priority', 'weight', 'queue', 'deficit', 'in_turn', 'last_active',
+        'packets_in', 'packets_out', 'packets_dropped', 'bytes_in', 'bytes_out',
+    )
+
+    def __init__(self, key: Hashable, priority: PacketPriority, weight: float, now: float):
+        self.key = key
+        self.priority = priority
+        self.weight = weight
+        self.queue: Deque[Packet] = deque()
+        self.deficit = 0.0
+        self.in_turn = False  # 本轮是否已经获得额度
+        self.last_active = now
+        self.packets_in = 0
+        self.packets_out = 0
+        self.packets_dropped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'flow': self.key,
+            'priority': self.priority.name,
+            'weight': self.weight,
+            'queue_size': len(self.queue),
+            'deficit': self.deficit,
+            'packets_in': self.packets_in,
+            'packets_out': self.packets_out,
+            'packets_dropped': self.packets_dropped,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+        }
+
+
+class FlowDRRScheduler(QoSAlgorithm):
+    """
+    按优先级分层、按流缺额轮转的调度器
+
+    流由 (优先级, 分类函数的结果) 确定：高优先级有数据包排队时先服务高优先级，
+    同一优先级内的流之间按字节公平轮转。
+
+    示例：
+        scheduler = FlowDRRScheduler(classifier=lambda packet: packet.id % 100)
+        scheduler.set_weight(7, 2.0)   # 流 7 在其所在的优先级内获得两倍带宽
+        scheduler.enqueue(packet)
+        scheduler.dequeue()
+    """
+
+    def __init__(self, config: Optional[FlowSchedulerConfig] = None,
+                 classifier: Optional[Callable[[Packet], Hashable]] = None):
+        """
+        Args:
+            config: 调度配置
+            classifier: 数据包 -> 流标识，None 表示使用数据包的 flow 属性（见 default_flow）
+        """
+        super().__init__("FlowDRRScheduler")
+        self.config = config or FlowSchedulerConfig()
+        self.classifier = classifier or default_flow
+
+        # 流按 (优先级, 流标识) 存放
+        self._flows: Dict[Tuple[PacketPriority, Hashable], FlowState] = {}
+        # 每个优先级一个活跃链表（非空的流，按轮转顺序），从高到低排列
+        self._priorities = sorted(PacketPriority, key=lambda priority: priority.value, reverse=True)
+        self._active: Dict[PacketPriority, Deque[FlowState]] = {
+            priority: deque() for priority in self._priorities
+        }
+        self._rings = [self._active[priority] for priority in self._priorities]
+        self._idle: "OrderedDict[Tuple[PacketPriority, Hashable], FlowState]" = OrderedDict()  # 空闲的流，最久未活动的在前
+        # set_weight 设置的权重，流被回收后保留，直到 clear_weight；只随显式设置的个数增长
+        self._weights: Dict[Hashable, float] = {}
+        self._queued_packets = 0
+        self.flows_created = 0
+        self.flows_evicted = 0
+
+    def set_weight(self, key: Hashable, weight: float) -> None:
+        """设置流在各优先级内的权重（流不存在时在创建时生效，流被回收后重新创建时仍然生效）"""
+        if weight <= 0:
+            raise ValueError("权重必须大于0")
+        with self._lock:
+            self._weights[key] = weight
+            for priority in self._priorities:
+                flow = self._flows.get((priority, key))
+                if flow is not None:
+                    flow.weight = weight
+
+    def clear_weight(self, key: Hashable) -> None:
+        """删除流的权重，已存在的流恢复为默认权重 1.0"""
+        with self._lock:
+            self._weights.pop(key, None)
+            for priority in self._priorities:
+                flow = self._flows.get((priority, key))
+                if flow is not None:
+                    flow.weight = 1.0
+
+    def _get_flow(self, priority: PacketPriority, key: Hashable, now: float) -> Optional[FlowState]:
+        flow_id = (priority, key)
+        flow = self._flows.get(flow_id)
+        if flow is not None:
+            return flow
+        if self.config.idle_timeout is not None:
+            self.evict_idle(now - self.config.idle_timeout)
+        if len(self._flows) >= self.config.max_flows:
+            if not self._idle:
+                return None
+            self._evict(next(iter(self._idle)))
+        flow = FlowState(key, priority, self._weights.get(key, 1.0), now)
+        self._flows[flow_id] = flow
+        self._idle[flow_id] = flow
+        self.flows_created += 1
+        return flow
+
+    def _evict(self, flow_id: Tuple[PacketPriority, Hashable]) -> None:
+        del self._idle[flow_id]
+        del self._flows[flow_id]
+        self.flows_evicted += 1
+
+    def evict_idle(self, before: Optional[float] = None) -> int:
+        """
+        回收空闲的流
+
+        Args:
+            before: 只回收最后活动时间早于该时刻的流，None 表示全部空闲流
+
+        Returns:
+            int: 回收的流个数
+        """
+        with self._lock:
+            evicted = 0
+            while self._idle:
+                flow_id, flow = next(iter(self._idle.items()))
+                if before is not None and flow.last_active >= before:
+                    break
+                self._evict(flow_id)
+                evicted += 1
+            return evicted
+
+    def enqueue(self, packet: Packet) -> bool:
+        """
+        将数据包加入所属流的队列
+
+        Args:
+            packet: 要入队的数据包
+
+        Returns:
+            bool: True表示成功入队，False表示流的队列满或流个数达到上限被丢弃
+        """
+        with self._lock:
+            now = time.time()
+            flow = self._get_flow(packet.priority, self.classifier(packet), now)
+            if flow is None or len(flow.queue) >= self.config.max_queue_per_flow:
+                if flow is not None:
+                    flow.packets_dropped += 1
+                self.metrics.update_with_packet(packet, dropped=True)
+                return False
+
+            if not flow.queue:
+                # 空闲 -> 活跃，排到轮转的末尾
+                del self._idle[(flow.priority, flow.key)]
+                self._active[flow.priority].append(flow)
+            flow.queue.append(packet)
+            flow.last_active = now
+            flow.packets_in += 1
+            flow.bytes_in += packet.size
+            self._queued_packets += 1
+            return True
+
+    def dequeue(self) -> Optional[Packet]:
+        """取出最高非空优先级中按缺额轮转的下一个数据包"""
+        with self._lock:
+            for active in self._rings:
+                if active:
+                    break
+            else:
+                return None
+            while active:
+                flow = active[0]
+                if not flow.in_turn:
+                    flow.deficit += self.config.quantum * flow.weight
+                    flow.in_turn = True
+
+                packet = flow.queue[0]
+                if packet.size > flow.deficit:
+                    # 额度不足，本轮结束，排到末尾
+                    flow.in_turn = False
+                    active.rotate(-1)
+                    continue
+
+                flow.queue.popleft()
+                flow.deficit -= packet.size
+                flow.packets_out += 1
+                flow.bytes_out += packet.size
+                self._queued_packets -= 1
+                if not flow.queue:
+                    # 流变为空闲，额度清零，避免空闲期间积累额度
+                    flow.deficit = 0.0
+                    flow.in_turn = False
+                    active.popleft()
+                    flow.last_active = time.time()
+                    self._idle[(flow.priority, flow.key)] = flow
+
+                packet.departure_time = time.time()
+                self.metrics.update_with_packet(packet)
+                return packet
+            return None
+
+    def is_empty(self) -> bool:
+        """检查所有流是否为空"""
+        return self._queued_packets == 0
+
+    def get_queue_size(self) -> int:
+        """获取所有流的数据包总数"""
+        return self._queued_packets
+
+    def get_flow_count(self) -> int:
+        """当前流的个数（活跃 + 空闲）"""
+        return len(self._flows)
+
+    def get_active_flow_count(self) -> int:
+        """有数据包排队的流的个数"""
+        return sum(len(active) for active in self._rings)
+
+    def get_flow_stats(self, key: Hashable,
+                       priority: PacketPriority = PacketPriority.NORMAL) -> Dict[str, Any]:
+        """获取流在指定优先级上的队列和字节统计"""
+        with self._lock:
+            return self._flows[(priority, key)].get_stats()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取性能指标"""
+        base_metrics = super().get_metrics()
+        with self._lock:
+            base_metrics.update({
+                'config': {
+                    'quantum': self.config.quantum,
+                    'max_flows': self.config.max_flows,
+                    'max_queue_per_flow': self.config.max_queue_per_flow
+                },
+                'flows': len(self._flows),
+                'active_flows': sum(len(active) for active in self._rings),
+                'active_flows_by_priority': {
+                    priority.name: len(self._active[priority]) for priority in self._priorities
+                },
+                'flows_created': self.flows_created,
+                'flows_evicted': self.flows_evicted,
+                'queue_size': self._queued_packets
+            })
+        return base_metrics
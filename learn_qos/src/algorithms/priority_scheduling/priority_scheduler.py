@@ -18,6 +18,7 @@ import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from common.base import QoSAlgorithm, Packet, PacketPriority, QoSMetrics
+from .flow_scheduler import FlowDRRScheduler, FlowSchedulerConfig
 
 
 class SchedulingStrategy(Enum):
@@ -26,6 +27,7 @@ class SchedulingStrategy(Enum):
     WEIGHTED_ROUND_ROBIN = "WEIGHTED_ROUND_ROBIN" # 加权轮转
     DEFICIT_ROUND_ROBIN = "DEFICIT_ROUND_ROBIN"   # 缺额轮转
     DYNAMIC_PRIORITY = "DYNAMIC_PRIORITY"         # 动态优先级
+    FLOW_DRR = "FLOW_DRR"                         # 严格优先级 + 同一优先级内按流缺额轮转
 
 
 @dataclass
@@ -53,18 +55,17 @@ class PriorityConfig:
             }
 
 
-@dataclass
 class PacketInfo:
-    """数据包信息（用于调度）"""
-    packet: Packet
-    enqueue_time: float
-    dynamic_priority: float
+    """数据包信息（用于调度），每个排队的数据包一个，使用 __slots__ 减少内存"""
     
-    def __post_init__(self):
-        if not hasattr(self, 'enqueue_time'):
-            self.enqueue_time = time.time()
-        if not hasattr(self, 'dynamic_priority'):
-            self.dynamic_priority = float(self.packet.priority.value)
+    __slots__ = ('packet', 'enqueue_time', 'dynamic_priority')
+    
+    def __init__(self, packet: Packet, enqueue_time: Optional[float] = None,
+                 dynamic_priority: Optional[float] = None):
+        self.packet = packet
+        self.enqueue_time = enqueue_time if enqueue_time is not None else time.time()
+        self.dynamic_priority = (dynamic_priority if dynamic_priority is not None
+                                 else float(packet.priority.value))
 
 
 class PriorityScheduler(QoSAlgorithm):
@@ -92,6 +93,9 @@ class PriorityScheduler(QoSAlgorithm):
         # 饥饿检测
         self.last_service_time = defaultdict(float)
         
+        # 所有队列中的数据包总数，入队和出队时增量维护
+        self._queued_packets = 0
+        
         # 线程安全
         self._lock = threading.RLock()
     
@@ -125,6 +129,7 @@ class PriorityScheduler(QoSAlgorithm):
             # 入队
             queue.append(packet_info)
             self.enqueue_counts[priority] += 1
+            self._queued_packets += 1
             
             return True
     
@@ -140,13 +145,11 @@ class PriorityScheduler(QoSAlgorithm):
     
     def is_empty(self) -> bool:
         """检查所有队列是否为空"""
-        with self._lock:
-            return all(len(queue) == 0 for queue in self.priority_queues.values())
+        return self._queued_packets == 0
     
     def get_queue_size(self) -> int:
         """获取所有队列的总长度"""
-        with self._lock:
-            return sum(len(queue) for queue in self.priority_queues.values())
+        return self._queued_packets
     
     def get_priority_queue_sizes(self) -> Dict[PacketPriority, int]:
         """获取各优先级队列的长度"""
@@ -166,8 +169,9 @@ class PriorityScheduler(QoSAlgorithm):
         self.total_waiting_time[packet.priority] += waiting_time
         
         # 更新服务时间
-        self.last_service_time[packet.priority] = time.time()
+        self.last_service_time[packet.priority] = packet.departure_time
         self.dequeue_counts[packet.priority] += 1
+        self._queued_packets -= 1
         
         # 更新基类指标
         self.metrics.update_with_packet(packet)
@@ -304,53 +308,69 @@ class DynamicPriorityScheduler(PriorityScheduler):
     
     根据等待时间和系统负载动态调整数据包优先级，
     实现更智能的调度决策
+    
+    动态优先级 = (基础优先级 + 老化因子 × 等待时间) × 负载因子。
+    等待时间 = 当前时间 - 入队时间，其中"老化因子 × 当前时间"和负载因子对所有
+    数据包相同，不影响先后顺序，因此排序只需要与时间无关的键
+    基础优先级 - 老化因子 × 入队时间（老化以虚拟时间偏移的方式惰性体现）。
+    同一优先级队列内入队时间递增，队首的键最大，所以只需把各队首放入最大堆，
+    出队 O(log n)，不需要逐个重新计算和排序。
     """
     
     def __init__(self, config: Optional[PriorityConfig] = None):
         if config is None:
             config = PriorityConfig(strategy=SchedulingStrategy.DYNAMIC_PRIORITY)
         super().__init__(config)
+        
+        # 各非空队列队首的最大堆：(-排序键, 序号, 优先级)
+        self._heads = []
+        self._head_counter = 0
+        # 虚拟时间的起点，让排序键保持较小的数值，避免浮点精度损失
+        self._time_origin = time.time()
+    
+    def _aging_key(self, packet_info: PacketInfo) -> float:
+        """与当前时间无关的排序键，越大越先出队"""
+        return (float(packet_info.packet.priority.value)
+                - self.config.aging_factor * (packet_info.enqueue_time - self._time_origin))
+    
+    def _push_head(self, priority: PacketPriority) -> None:
+        packet_info = self.priority_queues[priority][0]
+        self._head_counter += 1
+        heapq.heappush(self._heads, (-self._aging_key(packet_info), self._head_counter, priority))
     
     def _calculate_dynamic_priority(self, packet_info: PacketInfo) -> float:
-        """计算动态优先级"""
-        base_priority = float(packet_info.packet.priority.value)
-        current_time = time.time()
-        waiting_time = current_time - packet_info.enqueue_time
-        
-        # 基于等待时间的优先级提升
-        aging_boost = self.config.aging_factor * waiting_time
+        """计算动态优先级（O(1)，负载使用增量维护的队列总长度）"""
+        aging_offset = self.config.aging_factor * (time.time() - self._time_origin)
         
         # 基于系统负载的调整
-        system_load = self.get_queue_size() / (self.config.max_queue_size * len(PacketPriority))
+        system_load = self._queued_packets / (self.config.max_queue_size * len(PacketPriority))
         load_factor = 1.0 + system_load * 0.5
         
-        dynamic_priority = (base_priority + aging_boost) * load_factor
-        
-        return dynamic_priority
+        return (self._aging_key(packet_info) + aging_offset) * load_factor
+    
+    def enqueue(self, packet: Packet) -> bool:
+        """入队，队列由空变为非空时把新的队首放入堆中"""
+        with self._lock:
+            if not super().enqueue(packet):
+                return False
+            if len(self.priority_queues[packet.priority]) == 1:
+                self._push_head(packet.priority)
+            return True
     
     def dequeue(self) -> Optional[Packet]:
         """基于动态优先级出队"""
         with self._lock:
-            # 收集所有非空队列中的候选数据包
-            candidates = []
-            
-            for priority, queue in self.priority_queues.items():
-                if queue:
-                    packet_info = queue[0]  # 队列头部的数据包
-                    dynamic_priority = self._calculate_dynamic_priority(packet_info)
-                    candidates.append((dynamic_priority, priority, packet_info))
-            
-            if not candidates:
+            if not self._heads:
                 return None
             
-            # 选择动态优先级最高的数据包
-            candidates.sort(key=lambda x: x[0], reverse=True)
-            _, selected_priority, selected_packet_info = candidates[0]
+            # 动态优先级最高的队首
+            _, _, selected_priority = heapq.heappop(self._heads)
+            queue = self.priority_queues[selected_priority]
+            selected_packet_info = queue.popleft()
+            if queue:
+                self._push_head(selected_priority)
             
-            # 从对应队列中移除并返回
-            self.priority_queues[selected_priority].popleft()
             self._update_packet_metrics(selected_packet_info)
-            
             return selected_packet_info.packet
 
 
@@ -410,7 +430,7 @@ class DeficitRoundRobinScheduler(PriorityScheduler):
 
 
 def create_priority_scheduler(strategy: SchedulingStrategy, 
-                            config: Optional[PriorityConfig] = None) -> PriorityScheduler:
+                            config: Optional[PriorityConfig] = None) -> QoSAlgorithm:
     """
     工厂函数：创建指定策略的优先级调度器
     
@@ -419,7 +439,9 @@ def create_priority_scheduler(strategy: SchedulingStrategy,
         config: 调度配置
         
     Returns:
-        PriorityScheduler: 调度器实例
+        QoSAlgorithm: 调度器实例；FLOW_DRR 为 FlowDRRScheduler，
+            额度取 quantum_size，每个流的队列上限取 max_queue_size，
+            数据包按 flow 属性分流，其余策略为 PriorityScheduler
     """
     if config is None:
         config = PriorityConfig(strategy=strategy)
@@ -432,6 +454,9 @@ def create_priority_scheduler(strategy: SchedulingStrategy,
         return DynamicPriorityScheduler(config)
     elif strategy == SchedulingStrategy.DEFICIT_ROUND_ROBIN:
         return DeficitRoundRobinScheduler(config)
+    elif strategy == SchedulingStrategy.FLOW_DRR:
+        return FlowDRRScheduler(FlowSchedulerConfig(quantum=config.quantum_size,
+                                                    max_queue_per_flow=config.max_queue_size))
     else:
         raise ValueError(f"不支持的调度策略: {strategy}")
 
@@ -2,9 +2,13 @@
 令牌桶算法模块
 
 实现了经典的令牌桶算法，用于流量整形和速率限制。
-支持突发流量处理和平均速率控制。
+支持突发流量处理和平均速率控制，以及按租户分层的层次化令牌桶（HTB）
+和同一台机器上多个进程共享的令牌桶。
 """
 
-from .token_bucket import TokenBucket, TokenBucketConfig
+from .token_bucket import TokenBucket, TokenBucketConfig, ShardedTokenBucket
+from .hierarchical_token_bucket import HierarchicalTokenBucket, HTBClass
+from .shared_token_bucket import SharedTokenBucket
 
-__all__ = ['TokenBucket', 'TokenBucketConfig']
+__all__ = ['TokenBucket', 'TokenBucketConfig', 'ShardedTokenBucket', 'HierarchicalTokenBucket', 'HTBClass',
+           'SharedTokenBucket']
@@ -0,0 +1,288 @@
+"""
+层次化令牌桶（HTB）实现
+
+按租户等分类组织成一棵树，每个分类有两个令牌桶：
+- rate 桶（TokenBucketConfig）：保证带宽，子分类的 rate 之和一般不超过父分类的 rate
+- ceil 桶（可选）：带宽上限，向祖先借用时也不能超过
+
+数据包从叶子分类开始沿父链向上找到第一个 rate 令牌充足的分类（出借者），
+出借者及其祖先扣 rate 令牌，路径上所有分类扣 ceil 令牌。
+叶子自己令牌不足时就借用了兄弟分类没用完、留在父分类里的带宽。
+
+令牌在访问分类时按经过的时间补充（惰性补充），不需要为每个分类启动定时器，
+十万级的分类也只占用每个分类几个字段的内存。
+"""
+
+import time
+from typing import Optional, Dict, Any, Callable, Hashable, List
+from collections import deque
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from common.base import QoSAlgorithm, Packet
+from .token_bucket import TokenBucketConfig
+
+
+class HTBClass:
+    """HTB 中的一个分类（树节点）"""
+
+    __slots__ = (
+        'class_id', 'parent', 'children', 'depth',
+        'rate', 'burst', 'ceil_rate', 'ceil_burst',
+        'tokens', 'ctokens', 'last_update',
+        'packets_passed', 'packets_borrowed', 'packets_dropped', 'tokens_consumed',
+    )
+
+    def __init__(self, class_id: Hashable, config: TokenBucketConfig,
+                 ceil: Optional[TokenBucketConfig], parent: Optional['HTBClass'], now: float):
+        self.class_id = class_id
+        self.parent = parent
+        self.children = 0
+        self.depth = parent.depth + 1 if parent is not None else 0
+
+        self.rate = config.token_rate
+        self.burst = float(config.bucket_size)
+        self.tokens = float(config.initial_tokens)
+        # 没有 ceil 时只受祖先的限制
+        self.ceil_rate = ceil.token_rate if ceil is not None else None
+        self.ceil_burst = float(ceil.bucket_size) if ceil is not None else None
+        self.ctokens = float(ceil.initial_tokens) if ceil is not None else 0.0
+        self.last_update = now
+
+        self.packets_passed = 0
+        self.packets_borrowed = 0
+        self.packets_dropped = 0
+        self.tokens_consumed = 0.0
+
+    def refill(self, now: float) -> None:
+        """按上次访问以来经过的时间补充令牌"""
+        elapsed = now - self.last_update
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + self.rate * elapsed)
+            if self.ceil_rate is not None:
+                self.ctokens = min(self.ceil_burst, self.ctokens + self.ceil_rate * elapsed)
+            self.last_update = now
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'class_id': self.class_id,
+            'parent': self.parent.class_id if self.parent is not None else None,
+            'depth': self.depth,
+            'children': self.children,
+            'rate': self.rate,
+            'burst': self.burst,
+            'ceil_rate': self.ceil_rate,
+            'ceil_burst': self.ceil_burst,
+            'tokens': self.tokens,
+            'ctokens': self.ctokens if self.ceil_rate is not None else None,
+            'packets_passed': self.packets_passed,
+            'packets_borrowed': self.packets_borrowed,
+            'packets_dropped': self.packets_dropped,
+            'tokens_consumed': self.tokens_consumed,
+        }
+
+
+class HierarchicalTokenBucket(QoSAlgorithm):
+    """
+    层次化令牌桶（HTB）
+
+    特性：
+    - 分类按 class_id 存放在字典中，查找 O(1)，准入 O(树深度)
+    - 惰性补充令牌，没有后台线程和定时器
+    - 兄弟分类之间通过父分类借用未使用的带宽，受 ceil 限制
+    - 线程安全
+
+    示例：
+        htb = HierarchicalTokenBucket(TokenBucketConfig(token_rate=1e6, bucket_size=100000))
+        htb.add_class('tenant-a', TokenBucketConfig(token_rate=3e5, bucket_size=30000),
+                      ceil=TokenBucketConfig(token_rate=8e5, bucket_size=80000))
+        htb.admit('tenant-a', 1500)
+    """
+
+    ROOT = None  # 根分类的 class_id
+
+    def __init__(self, config: TokenBucketConfig,
+                 classifier: Optional[Callable[[Packet], Hashable]] = None,
+                 default_class: Hashable = ROOT):
+        """
+        Args:
+            config: 根分类（全局限制）的令牌桶配置，token_size 和 retain_packets 对整棵树生效
+            classifier: enqueue 时把数据包映射到分类 class_id 的函数，
+                        None 或返回 None 表示只受根分类限制
+            default_class: classifier 返回不存在的分类时使用的分类，
+                           默认（或该分类也不存在时）只受根分类限制
+        """
+        super().__init__("HierarchicalTokenBucket")
+        self.config = config
+        self.classifier = classifier
+        self.default_class = default_class
+        self.packets_unclassified = 0
+        self._root = HTBClass(self.ROOT, config, config, None, time.time())
+        self._classes: Dict[Hashable, HTBClass] = {self.ROOT: self._root}
+        self._packet_queue = deque()
+
+    def add_class(self, class_id: Hashable, config: TokenBucketConfig,
+                  parent: Hashable = ROOT, ceil: Optional[TokenBucketConfig] = None) -> HTBClass:
+        """
+        添加分类
+
+        Args:
+            class_id: 分类标识，不能与已有分类重复
+            config: 保证带宽（rate 桶）
+            parent: 父分类标识，默认挂在根分类下
+            ceil: 带宽上限（ceil 桶），None 表示只受祖先的限制
+        """
+        with self._lock:
+            if class_id in self._classes:
+                raise ValueError(f"分类已存在: {class_id}")
+            if parent not in self._classes:
+                raise KeyError(f"父分类不存在: {parent}")
+            if ceil is not None and ceil.token_rate < config.token_rate:
+                raise ValueError("带宽上限不能小于保证带宽")
+            parent_class = self._classes[parent]
+            node = HTBClass(class_id, config, ceil, parent_class, time.time())
+            parent_class.children += 1
+            self._classes[class_id] = node
+            return node
+
+    def remove_class(self, class_id: Hashable) -> None:
+        """删除没有子分类的分类"""
+        with self._lock:
+            node = self._classes.get(class_id)
+            if node is None or node is self._root:
+                raise KeyError(f"分类不存在: {class_id}")
+            if node.children:
+                raise ValueError(f"分类还有 {node.children} 个子分类: {class_id}")
+            node.parent.children -= 1
+            del self._classes[class_id]
+
+    def get_class(self, class_id: Hashable) -> HTBClass:
+        return self._classes[class_id]
+
+    def __contains__(self, class_id: Hashable) -> bool:
+        return class_id in self._classes
+
+    def __len__(self) -> int:
+        """分类个数（不含根分类）"""
+        return len(self._classes) - 1
+
+    def admit(self, class_id: Hashable, size: int) -> bool:
+        """
+        准入一个大小为 size 字节的数据包
+
+        Args:
+            class_id: 数据包所属分类
+            size: 数据包大小（字节）
+
+        Returns:
+            bool: True表示准入，False表示超出限制被丢弃
+        """
+        required = max(1, size // self.config.token_size)
+        with self._lock:
+            leaf = self._classes[class_id]
+            now = time.time()
+
+            # 从叶子到根：补充令牌，检查 ceil，找出第一个 rate 令牌充足的分类
+            path: List[HTBClass] = []
+            lender = None
+            node = leaf
+            while node is not None:
+                node.refill(now)
+                if node.ceil_rate is not None and node.ctokens < required:
+                    lender = None
+                    break
+                if lender is None and node.tokens >= required:
+                    lender = len(path)
+                path.append(node)
+                node = node.parent
+
+            if lender is None:
+                leaf.packets_dropped += 1
+                self.metrics.total_packets += 1
+                self.metrics.dropped_packets += 1
+                return False
+
+            # 出借者及其祖先扣 rate 令牌（祖先最多欠一个桶的令牌），整条路径扣 ceil 令牌
+            for index, node in enumerate(path):
+                if index >= lender:
+                    node.tokens = max(node.tokens - required, -node.burst)
+                if node.ceil_rate is not None:
+                    node.ctokens -= required
+            leaf.packets_passed += 1
+            leaf.tokens_consumed += required
+            if lender > 0:
+                leaf.packets_borrowed += 1
+            self.metrics.total_packets += 1
+            return True
+
+    def enqueue(self, packet: Packet) -> bool:
+        """
+        按 classifier 找到分类并准入数据包
+
+        Args:
+            packet: 要处理的数据包
+
+        Returns:
+            bool: True表示成功处理，False表示被丢弃
+        """
+        class_id = self.classifier(packet) if self.classifier is not None else self.ROOT
+        with self._lock:
+            if class_id not in self._classes:
+                # 未知分类（如已被删除）计入 packets_unclassified，按默认分类准入
+                self.packets_unclassified += 1
+                class_id = self.default_class if self.default_class in self._classes else self.ROOT
+            admitted = self.admit(class_id, packet.size)
+        if not admitted:
+            return False
+        if self.config.retain_packets:
+            packet.departure_time = time.time()
+            self._packet_queue.append(packet)
+        return True
+
+    def dequeue(self) -> Optional[Packet]:
+        """从队列中取出数据包"""
+        with self._lock:
+            if self._packet_queue:
+                return self._packet_queue.popleft()
+            return None
+
+    def is_empty(self) -> bool:
+        """检查队列是否为空"""
+        return not self._packet_queue
+
+    def get_queue_size(self) -> int:
+        """获取当前队列长度"""
+        return len(self._packet_queue)
+
+    def get_class_stats(self, class_id: Hashable) -> Dict[str, Any]:
+        """获取分类的令牌和计数（先补充令牌）"""
+        with self._lock:
+            node = self._classes[class_id]
+            node.refill(time.time())
+            return node.get_stats()
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取性能指标"""
+        base_metrics = super().get_metrics()
+        with self._lock:
+            borrowed = sum(node.packets_borrowed for node in self._classes.values())
+            base_metrics.update({
+                'config': {
+                    'token_rate': self.config.token_rate,
+                    'bucket_size': self.config.bucket_size,
+                    'token_size': self.config.token_size
+                },
+                'classes': len(self),
+                'max_depth': max(node.depth for node in self._classes.values()),
+                'packets_passed': self.metrics.total_packets - self.metrics.dropped_packets,
+                'packets_borrowed': borrowed,
+                'packets_unclassified': self.packets_unclassified,
+                'queue_size': len(self._packet_queue)
+            })
+        return base_metrics
+
+    def __str__(self) -> str:
+        return (f"HierarchicalTokenBucket(rate={self.config.token_rate:.1f} tokens/s, "
+               f"size={self.config.bucket_size}, classes={len(self)})")
@@ -0,0 +1,295 @@
+"""
+跨进程共享的令牌桶
+
+gunicorn / multiprocessing 的每个工作进程各有一个 TokenBucket 时，整机的速率是
+单个限制乘以进程数。SharedTokenBucket 把令牌桶的状态放在一个 mmap 映射的文件中
+（Linux 上默认在 /dev/shm，即内存），同一台机器上打开同一个名字的所有进程共享一个桶：
+
+- 状态只有几个定长字段（struct 布局），每次准入读出、补充、扣减、写回
+- 进程之间用 flock 互斥，进程内的线程再用一把线程锁互斥（flock 属于打开的文件，
+  同一进程的线程之间不互斥）
+- fork 出的子进程与父进程共享打开的文件，flock 也就不再互斥；
+  检测到进程号变化时重新打开文件（gunicorn preload_app=True 时在 fork 之前创建也安全）
+
+Python 没有对 mmap 内存的原子 CAS，这里用文件锁保证一致性，每次准入是两次
+系统调用（加锁、解锁）加一次 struct 解包和打包。批量准入用 acquire_many。
+"""
+
+import os
+import mmap
+import time
+import struct
+import tempfile
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+from collections import deque
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import sys
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from common.base import QoSAlgorithm, Packet
+from .token_bucket import TokenBucketConfig
+
+# 共享区布局（小端）：
+#   头部: 魔数 I, 版本 I, 令牌生成速率 d, 桶容量 d, 每个令牌的字节数 d
+#   状态: 令牌数 d, 上次补充时间 d, 准入数 Q, 丢弃数 Q, 消耗令牌数 d
+_MAGIC = 0x51545342  # 'QTSB'
+_VERSION = 2
+_HEADER = struct.Struct('<IIddd')
+_STATE = struct.Struct('<ddQQd')
+_SIZE = _HEADER.size + _STATE.size
+
+
+def _default_directory() -> str:
+    """优先使用内存文件系统"""
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class SharedTokenBucket(QoSAlgorithm):
+    """
+    跨进程共享的令牌桶
+
+    同一台机器上用相同 name 和 directory 创建的实例共享令牌，整机共同遵守
+    config 中的速率和桶容量。第一个打开的进程按 config 初始化共享区，
+    之后打开的进程的 token_rate、bucket_size 和 token_size 必须与共享区一致。
+
+    示例（gunicorn 的每个工作进程）：
+        bucket = SharedTokenBucket(TokenBucketConfig(token_rate=1000, bucket_size=100),
+                                   name='api-limit')
+        if not bucket.acquire():
+            return 429
+    """
+
+    def __init__(self, config: TokenBucketConfig, name: str = 'qos_token_bucket',
+                 directory: Optional[str] = None):
+        """
+        Args:
+            config: 令牌桶配置，整机共享
+            name: 共享区名字（文件名）
+            directory: 共享区所在目录，None 表示 /dev/shm（不存在时为临时目录）
+        """
+        super().__init__("SharedTokenBucket")
+        if fcntl is None:
+            raise OSError("SharedTokenBucket 需要 fcntl，只支持类 Unix 系统")
+        self.config = config
+        self.name = name
+        self.directory = directory or _default_directory()
+        self.path = os.path.join(self.directory, name)
+
+        self._fd = -1
+        self._map: Optional[mmap.mmap] = None
+        self._pid = -1
+        self._closed = False
+        self._packet_queue = deque()
+        self._open()
+
+    def _open(self) -> None:
+        """打开（必要时创建并初始化）共享区"""
+        self._close_map()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < _SIZE:
+                    os.ftruncate(fd, _SIZE)
+                shared = mmap.mmap(fd, _SIZE)
+                magic, version, rate, capacity, token_size = _HEADER.unpack_from(shared, 0)
+                if magic == 0:
+                    _HEADER.pack_into(shared, 0, _MAGIC, _VERSION,
+                                      float(self.config.token_rate), float(self.config.bucket_size),
+                                      float(self.config.token_size))
+                    _STATE.pack_into(shared, _HEADER.size,
+                                     float(self.config.initial_tokens), time.time(), 0, 0, 0.0)
+                elif magic != _MAGIC or version != _VERSION:
+                    shared.close()
+                    raise ValueError(f"不是共享令牌桶文件或版本不支持: {self.path}")
+                elif (rate != self.config.token_rate or capacity != self.config.bucket_size
+                      or token_size != self.config.token_size):
+                    shared.close()
+                    raise ValueError(
+                        f"共享令牌桶配置不一致: 已有 rate={rate}, size={capacity}, token_size={token_size}，"
+                        f"当前 rate={self.config.token_rate}, size={self.config.bucket_size}, "
+                        f"token_size={self.config.token_size}"
+                    )
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._map = shared
+        self._pid = os.getpid()
+
+    def _close_map(self) -> None:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    @contextmanager
+    def _locked(self):
+        """线程锁 + 文件锁；fork 之后先重新打开共享区"""
+        with self._lock:
+            if self._closed:
+                raise ValueError(f"共享令牌桶已关闭: {self.path}")
+            if self._pid != os.getpid():
+                self._open()
+            fd = self._fd
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield self._map
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def _refill(self, shared: mmap.mmap, now: float):
+        """读出状态并按经过的时间补充令牌"""
+        tokens, last_update, passed, dropped, consumed = _STATE.unpack_from(shared, _HEADER.size)
+        elapsed = now - last_update
+        if elapsed > 0:
+            tokens = min(float(self.config.bucket_size), tokens + elapsed * self.config.token_rate)
+            last_update = now
+        return tokens, last_update, passed, dropped, consumed
+
+    def acquire(self, tokens: float = 1) -> bool:
+        """
+        从共享桶中取 tokens 个令牌
+
+        Returns:
+            bool: True表示令牌充足并已扣减，False表示不足
+        """
+        with self._locked() as shared:
+            now = time.time()
+            current, last_update, passed, dropped, consumed = self._refill(shared, now)
+            if current >= tokens:
+                _STATE.pack_into(shared, _HEADER.size, current - tokens, last_update,
+                                 passed + 1, dropped, consumed + tokens)
+                admitted = True
+            else:
+                _STATE.pack_into(shared, _HEADER.size, current, last_update,
+                                 passed, dropped + 1, consumed)
+                admitted = False
+            self.metrics.total_packets += 1
+            if not admitted:
+                self.metrics.dropped_packets += 1
+        return admitted
+
+    def acquire_many(self, n_packets: int, total_bytes: int) -> int:
+        """
+        批量准入：一次加锁处理 n_packets 个总大小为 total_bytes 的数据包
+
+        与 TokenBucket.acquire_many 相同，按平均包大小计算令牌，不足时只准入前面一部分
+
+        Returns:
+            int: 准入的数据包个数
+        """
+        if n_packets <= 0:
+            return 0
+        tokens_per_packet = max(1.0, total_bytes / n_packets / self.config.token_size)
+        with self._locked() as shared:
+            current, last_update, passed, dropped, consumed = self._refill(shared, time.time())
+            admitted = min(n_packets, int(current // tokens_per_packet))
+            used = admitted * tokens_per_packet
+            _STATE.pack_into(shared, _HEADER.size, current - used, last_update,
+                             passed + admitted, dropped + n_packets - admitted, consumed + used)
+            self.metrics.total_packets += n_packets
+            self.metrics.dropped_packets += n_packets - admitted
+        return admitted
+
+    def enqueue(self, packet: Packet) -> bool:
+        """
+        将数据包加入队列处理
+
+        Args:
+            packet: 要处理的数据包
+
+        Returns:
+            bool: True表示成功处理，False表示被丢弃
+        """
+        if not self.acquire(max(1, packet.size // self.config.token_size)):
+            return False
+        if self.config.retain_packets:
+            packet.departure_time = time.time()
+            self._packet_queue.append(packet)
+        return True
+
+    def dequeue(self) -> Optional[Packet]:
+        """从本进程的队列中取出数据包"""
+        try:
+            return self._packet_queue.popleft()
+        except IndexError:
+            return None
+
+    def is_empty(self) -> bool:
+        """检查本进程的队列是否为空"""
+        return not self._packet_queue
+
+    def get_queue_size(self) -> int:
+        """获取本进程的队列长度"""
+        return len(self._packet_queue)
+
+    def get_current_tokens(self) -> float:
+        """获取共享桶当前的令牌数"""
+        with self._locked() as shared:
+            return self._refill(shared, time.time())[0]
+
+    def get_shared_stats(self) -> Dict[str, Any]:
+        """所有进程合计的准入统计"""
+        with self._locked() as shared:
+            tokens, _, passed, dropped, consumed = self._refill(shared, time.time())
+        return {
+            'path': self.path,
+            'current_tokens': tokens,
+            'packets_passed': passed,
+            'packets_dropped': dropped,
+            'tokens_consumed': consumed,
+        }
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取性能指标（total_packets 等为本进程的统计，shared 为所有进程合计）"""
+        base_metrics = super().get_metrics()
+        base_metrics.update({
+            'config': {
+                'token_rate': self.config.token_rate,
+                'bucket_size': self.config.bucket_size,
+                'token_size': self.config.token_size
+            },
+            'shared': self.get_shared_stats(),
+            'queue_size': len(self._packet_queue)
+        })
+        return base_metrics
+
+    def close(self) -> None:
+        """关闭本进程对共享区的映射（不影响其他进程），之后再准入抛出 ValueError"""
+        with self._lock:
+            self._closed = True
+            self._close_map()
+
+    def unlink(self) -> None:
+        """删除共享区文件（已打开的进程仍可使用到关闭为止，新打开的进程重新初始化）"""
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __reduce__(self):
+        # 传给 spawn 方式启动的子进程时按名字重新打开
+        return (self.__class__, (self.config, self.name, self.directory))
+
+    def __del__(self):
+        try:
+            self._close_map()
+        except Exception:
+            pass
+
+    def __str__(self) -> str:
+        return (f"SharedTokenBucket(rate={self.config.token_rate:.1f} tokens/s, "
+                f"size={self.config.bucket_size}, path={self.path})")
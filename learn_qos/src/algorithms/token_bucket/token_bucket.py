@@ -2,9 +2,15 @@
 令牌桶算法实现
 
 实现经典的令牌桶算法，支持流量整形和速率限制。
+
+- TokenBucket: 单个令牌桶，所有线程共享一把锁；acquire_many 一次准入一批数据包，
+  enqueue_batch 直接在 PacketBatch 的数组上准入
+- ShardedTokenBucket: 每个线程从共享令牌池租借一批令牌到本地分片，
+  分片内准入不加锁，令牌不足或到了再平衡周期时才回到共享池
 """
 
 import time
+import weakref
 import threading
 from typing import Optional, Dict, Any
 from dataclasses import dataclass
@@ -14,7 +20,9 @@ import sys
 import os
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', '..'))
 
-from common.base import QoSAlgorithm, Packet, QoSMetrics
+import numpy as np
+
+from common.base import QoSAlgorithm, Packet, PacketBatch, QoSMetrics
 
 
 @dataclass
@@ -24,6 +32,7 @@ class TokenBucketConfig:
     bucket_size: int   # 桶容量 (tokens)
     initial_tokens: Optional[int] = None  # 初始令牌数，None表示满桶
     token_size: int = 1  # 每个令牌代表的字节数，1表示每字节一个令牌
+    retain_packets: bool = True  # 是否把准入的数据包放入队列供 dequeue 取出
     
     def __post_init__(self):
         if self.initial_tokens is None:
@@ -69,9 +78,10 @@ class TokenBucket(QoSAlgorithm):
         # 线程安全锁
         self._lock = threading.RLock()
     
-    def _update_tokens(self) -> None:
+    def _update_tokens(self, current_time: Optional[float] = None) -> None:
         """更新令牌数量"""
-        current_time = time.time()
+        if current_time is None:
+            current_time = time.time()
         time_elapsed = current_time - self._last_update_time
         
         if time_elapsed > 0:
@@ -87,26 +97,6 @@ class TokenBucket(QoSAlgorithm):
             
             self._last_update_time = current_time
     
-    def _consume_tokens(self, num_tokens: int) -> bool:
-        """
-        消耗令牌
-        
-        Args:
-            num_tokens: 需要消耗的令牌数
-            
-        Returns:
-            bool: True表示令牌充足并已消耗，False表示令牌不足
-        """
-        if self._current_tokens >= num_tokens:
-            self._current_tokens -= num_tokens
-            self._total_tokens_consumed += num_tokens
-            return True
-        return False
-    
-    def _calculate_required_tokens(self, packet: Packet) -> int:
-        """计算数据包需要的令牌数"""
-        return max(1, packet.size // self.config.token_size)
-    
     def enqueue(self, packet: Packet) -> bool:
         """
         将数据包加入队列处理
@@ -118,17 +108,21 @@ class TokenBucket(QoSAlgorithm):
             bool: True表示成功处理，False表示被丢弃
         """
         with self._lock:
-            # 更新令牌
-            self._update_tokens()
+            # 更新令牌（入队时间同时作为离开时间，只取一次时间）
+            now = time.time()
+            self._update_tokens(now)
             
             # 计算所需令牌数
-            required_tokens = self._calculate_required_tokens(packet)
+            required_tokens = max(1, packet.size // self.config.token_size)
             
             # 尝试消耗令牌
-            if self._consume_tokens(required_tokens):
+            if self._current_tokens >= required_tokens:
                 # 令牌充足，允许传输
-                packet.departure_time = time.time()
-                self._packet_queue.append(packet)
+                self._current_tokens -= required_tokens
+                self._total_tokens_consumed += required_tokens
+                packet.departure_time = now
+                if self.config.retain_packets:
+                    self._packet_queue.append(packet)
                 self._packets_passed += 1
                 
                 # 更新指标
@@ -140,6 +134,83 @@ class TokenBucket(QoSAlgorithm):
                 self.metrics.update_with_packet(packet, dropped=True)
                 return False
     
+    def acquire_many(self, n_packets: int, total_bytes: int) -> int:
+        """
+        批量准入：一次加锁处理 n_packets 个总大小为 total_bytes 的数据包
+        
+        按平均包大小计算每个包需要的令牌数，令牌不足时只准入前面的一部分，
+        其余计为丢弃。批量准入不产生 Packet 对象，也不进入队列。
+        
+        Args:
+            n_packets: 数据包个数
+            total_bytes: 数据包总大小（字节）
+            
+        Returns:
+            int: 准入的数据包个数
+        """
+        if n_packets <= 0:
+            return 0
+        tokens_per_packet = max(1.0, total_bytes / n_packets / self.config.token_size)
+        
+        with self._lock:
+            self._update_tokens()
+            admitted = min(n_packets, int(self._current_tokens // tokens_per_packet))
+            consumed = admitted * tokens_per_packet
+            self._current_tokens -= consumed
+            self._total_tokens_consumed += consumed
+            self._packets_passed += admitted
+            self._packets_dropped += n_packets - admitted
+            self.metrics.total_packets += n_packets
+            self.metrics.dropped_packets += n_packets - admitted
+            return admitted
+    
+    def enqueue_batch(self, batch: PacketBatch) -> np.ndarray:
+        """
+        批量入队：一次加锁、一次取时间，按顺序逐个准入，与逐个 enqueue 的结果相同
+        
+        只有 retain_packets 时才为准入的数据包创建 CompactPacket 放入队列。
+        
+        Args:
+            batch: 一批数据包，准入的数据包的离开时间写回 batch.departure_times
+            
+        Returns:
+            np.ndarray: 每个数据包是否准入（bool 数组）
+        """
+        required = np.maximum(batch.sizes // self.config.token_size, 1)
+        admitted = np.zeros(len(batch), dtype=bool)
+        
+        with self._lock:
+            now = time.time()
+            self._update_tokens(now)
+            tokens = self._current_tokens
+            
+            total = float(required.sum())
+            if total <= tokens:
+                # 令牌足够全部准入
+                admitted[:] = True
+                tokens -= total
+                consumed = total
+            else:
+                consumed = 0.0
+                for index, need in enumerate(required.tolist()):
+                    if tokens >= need:
+                        tokens -= need
+                        consumed += need
+                        admitted[index] = True
+            
+            self._current_tokens = tokens
+            self._total_tokens_consumed += consumed
+            passed = int(admitted.sum())
+            dropped = len(batch) - passed
+            self._packets_passed += passed
+            self._packets_dropped += dropped
+            
+            batch.departure_times[admitted] = now
+            self.metrics.update_with_delays(now - batch.arrival_times[admitted], dropped)
+            if self.config.retain_packets and passed:
+                self._packet_queue.extend(batch.iter_packets(np.flatnonzero(admitted).tolist()))
+        return admitted
+    
     def dequeue(self) -> Optional[Packet]:
         """
         从队列中取出数据包
@@ -235,3 +306,268 @@ class TokenBucket(QoSAlgorithm):
         return (f"TokenBucket(token_rate={self.config.token_rate}, "
                f"bucket_size={self.config.bucket_size}, "
                f"token_size={self.config.token_size})")
+
+
+class _TokenShard:
+    """线程本地的令牌分片，只由所属线程修改"""
+    
+    __slots__ = ('tokens', 'epoch', 'passed', 'dropped', 'consumed')
+    
+    def __init__(self):
+        self.tokens = 0.0
+        self.epoch = -1
+        self.passed = 0
+        self.dropped = 0
+        self.consumed = 0.0
+
+
+class _ShardOwner:
+    """放在线程本地存储中的占位对象，线程退出时随本地存储一起释放，触发分片回收"""
+    
+    __slots__ = ('shard', '__weakref__')
+    
+    def __init__(self, shard: _TokenShard):
+        self.shard = shard
+
+
+class ShardedTokenBucket(QoSAlgorithm):
+    """
+    分片令牌桶
+    
+    每个线程持有一个本地分片，从共享令牌池一次租借 lease_tokens 个令牌，
+    之后在本地扣减，不需要加锁。本地令牌不足时才加锁回到共享池，
+    归还剩余令牌并重新租借。共享池每隔 rebalance_interval 秒推进一次纪元，
+    分片下一次准入时发现纪元过期就把剩余令牌还给共享池，避免令牌长期
+    停留在个别线程手里。
+    
+    特性：
+    - 长期平均速率与 TokenBucket 相同（所有令牌都由共享池生成）
+    - 突发上限放宽为 bucket_size 加上各分片未用完的租借令牌
+      （每个分片最多 lease_tokens 个）
+    - 不统计延迟（准入即离开，没有排队）
+    - 线程退出时分片被回收：剩余令牌还给共享池，计数并入已退出线程的合计，
+      线程池反复创建线程时分片数不会无限增长
+    """
+    
+    def __init__(self, config: TokenBucketConfig, lease_tokens: Optional[float] = None,
+                 rebalance_interval: float = 0.05):
+        """
+        Args:
+            config: 令牌桶配置
+            lease_tokens: 每次租借到分片的令牌数，None 表示桶容量的 1/64
+            rebalance_interval: 再平衡周期（秒）
+        """
+        super().__init__("ShardedTokenBucket")
+        if lease_tokens is None:
+            lease_tokens = max(1, config.bucket_size // 64)
+        if lease_tokens <= 0:
+            raise ValueError("租借令牌数必须大于0")
+        if rebalance_interval <= 0:
+            raise ValueError("再平衡周期必须大于0")
+        self.config = config
+        self.lease_tokens = float(lease_tokens)
+        self.rebalance_interval = rebalance_interval
+        
+        # 共享令牌池，由 self._lock 保护
+        self._pool_tokens = float(config.initial_tokens)
+        self._last_update_time = time.time()
+        self._last_rebalance = self._last_update_time
+        self._epoch = 0
+        self._total_tokens_generated = 0.0
+        
+        self._local = threading.local()
+        self._shards = []
+        # 已退出线程的分片计数合计 (passed, dropped, consumed)
+        self._retired = (0, 0, 0.0)
+        self._packet_queue = deque()
+        # reset_metrics 时的计数，用于计算重置之后的增量（分片计数不能由其他线程清零）
+        self._metrics_base = (0, 0, 0.0)
+    
+    def _get_shard(self) -> _TokenShard:
+        try:
+            return self._local.owner.shard
+        except AttributeError:
+            shard = _TokenShard()
+            owner = _ShardOwner(shard)
+            with self._lock:
+                self._shards.append(shard)
+            # 线程退出时本地存储被释放，owner 随之回收；只持有桶的弱引用，不延长桶的生命周期
+            weakref.finalize(owner, ShardedTokenBucket._retire_shard, weakref.ref(self), shard)
+            self._local.owner = owner
+            return shard
+    
+    @staticmethod
+    def _retire_shard(bucket_ref, shard: _TokenShard) -> None:
+        """回收已退出线程的分片：归还剩余令牌，保留计数"""
+        bucket = bucket_ref()
+        if bucket is None:
+            return
+        with bucket._lock:
+            try:
+                bucket._shards.remove(shard)
+            except ValueError:
+                return
+            bucket._update_tokens(time.time())
+            bucket._pool_tokens = min(bucket.config.bucket_size, bucket._pool_tokens + shard.tokens)
+            shard.tokens = 0.0
+            passed, dropped, consumed = bucket._retired
+            bucket._retired = (passed + shard.passed, dropped + shard.dropped,
+                               consumed + shard.consumed)
+    
+    def _update_tokens(self, current_time: float) -> None:
+        """更新共享池令牌数量，调用方持有锁"""
+        time_elapsed = current_time - self._last_update_time
+        if time_elapsed > 0:
+            tokens_to_add = self.config.token_rate * time_elapsed
+            self._total_tokens_generated += tokens_to_add
+            self._pool_tokens = min(self.config.bucket_size, self._pool_tokens + tokens_to_add)
+            self._last_update_time = current_time
+    
+    def _acquire_slow(self, shard: _TokenShard, tokens_per_packet: float, n_packets: int) -> int:
+        """本地令牌不足或纪元过期：归还剩余令牌，从共享池准入并重新租借"""
+        with self._lock:
+            now = time.time()
+            self._update_tokens(now)
+            if now - self._last_rebalance >= self.rebalance_interval:
+                self._epoch += 1
+                self._last_rebalance = now
+            
+            available = min(self.config.bucket_size, self._pool_tokens + shard.tokens)
+            admitted = min(n_packets, int(available // tokens_per_packet))
+            consumed = admitted * tokens_per_packet
+            lease = min(available - consumed, self.lease_tokens)
+            self._pool_tokens = available - consumed - lease
+            shard.tokens = lease
+            shard.epoch = self._epoch
+        
+        shard.consumed += consumed
+        shard.passed += admitted
+        shard.dropped += n_packets - admitted
+        return admitted
+    
+    def acquire(self, tokens: float = 1) -> bool:
+        """
+        准入一个需要 tokens 个令牌的数据包
+        
+        Returns:
+            bool: True表示准入，False表示令牌不足
+        """
+        shard = self._get_shard()
+        if shard.epoch == self._epoch and shard.tokens >= tokens:
+            shard.tokens -= tokens
+            shard.consumed += tokens
+            shard.passed += 1
+            return True
+        return self._acquire_slow(shard, tokens, 1) == 1
+    
+    def acquire_many(self, n_packets: int, total_bytes: int) -> int:
+        """
+        批量准入，语义同 TokenBucket.acquire_many
+        
+        Returns:
+            int: 准入的数据包个数
+        """
+        if n_packets <= 0:
+            return 0
+        tokens_per_packet = max(1.0, total_bytes / n_packets / self.config.token_size)
+        required = tokens_per_packet * n_packets
+        shard = self._get_shard()
+        if shard.epoch == self._epoch and shard.tokens >= required:
+            shard.tokens -= required
+            shard.consumed += required
+            shard.passed += n_packets
+            return n_packets
+        return self._acquire_slow(shard, tokens_per_packet, n_packets)
+    
+    def rebalance(self) -> None:
+        """立即推进纪元，各分片下一次准入时归还剩余令牌"""
+        with self._lock:
+            self._epoch += 1
+            self._last_rebalance = time.time()
+    
+    def enqueue(self, packet: Packet) -> bool:
+        """
+        将数据包加入队列处理
+        
+        Args:
+            packet: 要处理的数据包
+            
+        Returns:
+            bool: True表示成功处理，False表示被丢弃
+        """
+        if not self.acquire(max(1, packet.size // self.config.token_size)):
+            return False
+        if self.config.retain_packets:
+            packet.departure_time = time.time()
+            self._packet_queue.append(packet)
+        return True
+    
+    def dequeue(self) -> Optional[Packet]:
+        """从队列中取出数据包"""
+        try:
+            return self._packet_queue.popleft()
+        except IndexError:
+            return None
+    
+    def is_empty(self) -> bool:
+        """检查队列是否为空"""
+        return not self._packet_queue
+    
+    def get_queue_size(self) -> int:
+        """获取当前队列长度"""
+        return len(self._packet_queue)
+    
+    def get_current_tokens(self) -> float:
+        """获取当前令牌数（共享池加上各分片未用完的令牌）"""
+        with self._lock:
+            self._update_tokens(time.time())
+            return self._pool_tokens + sum(shard.tokens for shard in list(self._shards))
+    
+    def _totals(self):
+        passed, dropped, consumed = self._retired
+        for shard in list(self._shards):
+            passed += shard.passed
+            dropped += shard.dropped
+            consumed += shard.consumed
+        return passed, dropped, consumed
+    
+    def reset_metrics(self):
+        """重置性能指标和统计信息"""
+        with self._lock:
+            super().reset_metrics()
+            self._metrics_base = self._totals()
+            self._total_tokens_generated = 0.0
+    
+    def get_metrics(self) -> Dict[str, Any]:
+        """获取性能指标（汇总各分片的计数）"""
+        with self._lock:
+            passed, dropped, consumed = self._totals()
+            base_passed, base_dropped, base_consumed = self._metrics_base
+            passed -= base_passed
+            dropped -= base_dropped
+            total = passed + dropped
+            base_metrics = super().get_metrics()
+            base_metrics.update({
+                'total_packets': total,
+                'dropped_packets': dropped,
+                'drop_rate': dropped / total if total else 0.0,
+                'config': {
+                    'token_rate': self.config.token_rate,
+                    'bucket_size': self.config.bucket_size,
+                    'token_size': self.config.token_size
+                },
+                'current_tokens': self.get_current_tokens(),
+                'lease_tokens': self.lease_tokens,
+                'shards': len(self._shards),
+                'epoch': self._epoch,
+                'total_tokens_generated': self._total_tokens_generated,
+                'total_tokens_consumed': consumed - base_consumed,
+                'packets_passed': passed,
+                'packets_dropped': dropped,
+                'queue_size': len(self._packet_queue)
+            })
+            return base_metrics
+    
+    def __str__(self) -> str:
+        return (f"ShardedTokenBucket(rate={self.config.token_rate:.1f} tokens/s, "
+               f"size={self.config.bucket_size}, shards={len(self._shards)})")
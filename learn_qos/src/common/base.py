@@ -5,10 +5,12 @@ QoS算法基础类和工具函数
 import time
 import threading
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Union
 from dataclasses import dataclass
 from enum import Enum
 
+import numpy as np
+
 
 class PacketPriority(Enum):
     """数据包优先级枚举"""
@@ -39,6 +41,139 @@ class Packet:
         return None
 
 
+_PRIORITY_BY_VALUE = {priority.value: priority for priority in PacketPriority}
+
+
+class CompactPacket:
+    """
+    使用 __slots__ 的数据包
+
+    属性和 delay 与 Packet 相同，可以传给任何 QoSAlgorithm；
+    没有 __dict__，创建和访问属性都比 dataclass 快，占用内存也更少。
+    """
+
+    __slots__ = ('id', 'size', 'priority', 'arrival_time', 'departure_time')
+
+    def __init__(self, id: int, size: int, priority: PacketPriority = PacketPriority.NORMAL,
+                 arrival_time: float = 0.0, departure_time: Optional[float] = None):
+        self.id = id
+        self.size = size
+        self.priority = priority
+        self.arrival_time = arrival_time if arrival_time != 0.0 else time.time()
+        self.departure_time = departure_time
+
+    @property
+    def delay(self) -> Optional[float]:
+        """计算数据包延迟"""
+        if self.departure_time is not None:
+            return self.departure_time - self.arrival_time
+        return None
+
+    def to_packet(self) -> Packet:
+        return Packet(id=self.id, size=self.size, priority=self.priority,
+                      arrival_time=self.arrival_time, departure_time=self.departure_time)
+
+    def __repr__(self) -> str:
+        return (f"CompactPacket(id={self.id}, size={self.size}, priority={self.priority}, "
+                f"arrival_time={self.arrival_time}, departure_time={self.departure_time})")
+
+
+class PacketBatch:
+    """
+    列式存储的一批数据包
+
+    每个字段是一个 NumPy 数组，百万级的数据包不需要创建任何 Python 对象。
+    支持 QoSAlgorithm.enqueue_batch 直接处理；需要对象时通过下标或迭代
+    得到 CompactPacket（复制当前值），to_packets 转为 Packet 列表。
+    """
+
+    __slots__ = ('ids', 'sizes', 'priorities', 'arrival_times', 'departure_times')
+
+    def __init__(self, sizes: Union[Sequence[int], np.ndarray],
+                 ids: Optional[Union[Sequence[int], np.ndarray]] = None,
+                 priorities: Union[PacketPriority, Sequence[int], np.ndarray] = PacketPriority.NORMAL,
+                 arrival_times: Optional[Union[float, Sequence[float], np.ndarray]] = None,
+                 departure_times: Optional[Union[Sequence[float], np.ndarray]] = None):
+        """
+        Args:
+            sizes: 数据包大小（字节）
+            ids: 数据包编号，None 表示 0..n-1
+            priorities: 优先级（PacketPriority 表示全部相同，或优先级数值的数组）
+            arrival_times: 到达时间（标量表示全部相同），None 表示当前时间
+            departure_times: 离开时间，None 表示尚未离开（NaN）
+        """
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        n = len(self.sizes)
+        self.ids = np.arange(n, dtype=np.int64) if ids is None else np.asarray(ids, dtype=np.int64)
+        if isinstance(priorities, PacketPriority):
+            self.priorities = np.full(n, priorities.value, dtype=np.int8)
+        else:
+            self.priorities = np.asarray(priorities, dtype=np.int8)
+        if arrival_times is None:
+            arrival_times = time.time()
+        self.arrival_times = np.broadcast_to(np.asarray(arrival_times, dtype=np.float64), (n,)).copy()
+        if departure_times is None:
+            self.departure_times = np.full(n, np.nan)
+        else:
+            self.departure_times = np.asarray(departure_times, dtype=np.float64)
+        for name in ('ids', 'priorities', 'departure_times'):
+            if len(getattr(self, name)) != n:
+                raise ValueError(f"{name} 的长度与 sizes 不一致")
+
+    @classmethod
+    def from_packets(cls, packets: Iterable[Any]) -> 'PacketBatch':
+        """由 Packet / CompactPacket 对象创建"""
+        packets = list(packets)
+        return cls(
+            sizes=[packet.size for packet in packets],
+            ids=[packet.id for packet in packets],
+            priorities=[packet.priority.value for packet in packets],
+            arrival_times=np.array([packet.arrival_time for packet in packets], dtype=np.float64),
+            departure_times=[np.nan if packet.departure_time is None else packet.departure_time
+                             for packet in packets],
+        )
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def __getitem__(self, index: int) -> CompactPacket:
+        departure = self.departure_times[index]
+        return CompactPacket(
+            int(self.ids[index]), int(self.sizes[index]), _PRIORITY_BY_VALUE[int(self.priorities[index])],
+            float(self.arrival_times[index]), None if np.isnan(departure) else float(departure),
+        )
+
+    def __iter__(self) -> Iterator[CompactPacket]:
+        return self.iter_packets()
+
+    def iter_packets(self, indices: Optional[Iterable[int]] = None) -> Iterator[CompactPacket]:
+        """逐个生成 CompactPacket（indices 为 None 表示全部）"""
+        ids = self.ids.tolist()
+        sizes = self.sizes.tolist()
+        priorities = self.priorities.tolist()
+        arrivals = self.arrival_times.tolist()
+        departures = self.departure_times.tolist()
+        if indices is None:
+            indices = range(len(sizes))
+        for i in indices:
+            departure = departures[i]
+            yield CompactPacket(ids[i], sizes[i], _PRIORITY_BY_VALUE[priorities[i]], arrivals[i],
+                                None if departure != departure else departure)
+
+    def to_packets(self) -> List[Packet]:
+        """转换为 Packet 对象列表（兼容原有的对象接口）"""
+        return [packet.to_packet() for packet in self.iter_packets()]
+
+    @property
+    def total_bytes(self) -> int:
+        return int(self.sizes.sum())
+
+    @property
+    def delays(self) -> np.ndarray:
+        """各数据包的延迟，未离开的为 NaN"""
+        return self.departure_times - self.arrival_times
+
+
 @dataclass
 class QoSMetrics:
     """QoS性能指标"""
@@ -73,9 +208,10 @@ class QoSMetrics:
             return 0.0
         return self.jitter_sum / (delivered_packets - 1)
     
-    def update_with_packet(self, packet: Packet, dropped: bool = False):
-        """用数据包信息更新指标"""
-        self.total_packets += 1
+    def update_with_packet(self, packet: Packet, dropped: bool = False, count: bool = True):
+        """用数据包信息更新指标，count=False 表示数据包到达时已经计数"""
+        if count:
+            self.total_packets += 1
         
         if dropped:
             self.dropped_packets += 1
@@ -93,6 +229,25 @@ class QoSMetrics:
                 self.jitter_sum += jitter
             
             self.last_delay = delay
+    
+    def update_with_delays(self, delays: np.ndarray, dropped: int = 0):
+        """用一批已离开数据包的延迟（按离开顺序）和丢弃数更新指标"""
+        count = len(delays)
+        self.total_packets += count + dropped
+        self.dropped_packets += dropped
+        if count == 0:
+            return
+        
+        self.total_delay += float(delays.sum())
+        self.max_delay = max(self.max_delay, float(delays.max()))
+        self.min_delay = min(self.min_delay, float(delays.min()))
+        
+        # 计算抖动
+        jitter = float(np.abs(np.diff(delays)).sum())
+        if self.last_delay is not None:
+            jitter += abs(float(delays[0]) - self.last_delay)
+        self.jitter_sum += jitter
+        self.last_delay = float(delays[-1])
 
 
 class QoSAlgorithm(ABC):
@@ -117,6 +272,27 @@ class QoSAlgorithm(ABC):
         """
         pass
     
+    def enqueue_batch(self, batch: PacketBatch) -> np.ndarray:
+        """
+        批量入队
+        
+        默认逐个转换为 CompactPacket 调用 enqueue，并把离开时间写回 batch；
+        子类可以直接在数组上处理。
+        
+        Args:
+            batch: 一批数据包
+            
+        Returns:
+            np.ndarray: 每个数据包是否成功入队（bool 数组）
+        """
+        admitted = np.zeros(len(batch), dtype=bool)
+        departures = batch.departure_times
+        for index, packet in enumerate(batch):
+            admitted[index] = self.enqueue(packet)
+            if packet.departure_time is not None:
+                departures[index] = packet.departure_time
+        return admitted
+    
     @abstractmethod
     def dequeue(self) -> Optional[Packet]:
         """
@@ -181,6 +357,18 @@ class TrafficGenerator:
             arrival_time=time.time()
         )
     
+    def generate_batch(
+        self,
+        num_packets: int,
+        packet_size: Union[int, Sequence[int], np.ndarray],
+        priority: PacketPriority = PacketPriority.NORMAL
+    ) -> PacketBatch:
+        """生成一批数据包（列式存储，编号接着已生成的数据包）"""
+        sizes = np.broadcast_to(np.asarray(packet_size, dtype=np.int64), (num_packets,))
+        ids = np.arange(self.packet_id + 1, self.packet_id + 1 + num_packets, dtype=np.int64)
+        self.packet_id += num_packets
+        return PacketBatch(sizes, ids=ids, priorities=priority, arrival_times=time.time())
+    
     def generate_burst_traffic(
         self,
         num_packets: int,
@@ -12,11 +12,14 @@ import os
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+from algorithms.adaptive_qos import system_sampler
 from algorithms.adaptive_qos import (
     LoadMonitor, LoadMetrics, LoadLevel,
     AIMDRateLimiter, PIDRateLimiter, ExponentialBackoffRateLimiter,
     FeedbackGenerator, FeedbackReceiver, LoadFeedback,
-    FeedbackSystem, AdaptiveStrategy, create_adaptive_limiter
+    FeedbackSystem, AdaptiveStrategy, create_adaptive_limiter,
+    LatencySketch, RollingCounter, RollingSketch,
+    SystemSampler, SystemSnapshot, FeedbackChannel
 )
 
 
@@ -100,6 +103,226 @@ class TestLoadMonitor:
         assert not monitor._running
 
 
+    def test_latency_percentiles(self):
+        """响应时间分位数和每秒请求数"""
+        monitor = LoadMonitor()
+        for i in range(1, 1001):
+            monitor.record_request_start()
+            monitor.record_request_end(float(i))
+        
+        metrics = monitor._collect_metrics()
+        assert metrics.avg_response_time == pytest.approx(500.5)
+        assert metrics.p50_response_time == pytest.approx(500, rel=0.02)
+        assert metrics.p95_response_time == pytest.approx(950, rel=0.02)
+        assert metrics.p99_response_time == pytest.approx(990, rel=0.02)
+        # 1000 个请求除以与桶边界对齐的窗口长度（0.9 到 1 秒）
+        assert 1000 <= metrics.requests_per_second <= 1000 / 0.9 + 1e-6
+        assert metrics.queue_depth == 0
+        assert 'p99_response_time' in metrics.to_dict()
+        assert monitor.get_latency_sketch().count == 1000
+    
+    def test_concurrent_recording(self):
+        """多线程记录按分段合并后计数准确"""
+        monitor = LoadMonitor(record_stripes=4)
+        n_threads, per_thread = 8, 500
+        
+        def worker(offset):
+            for i in range(per_thread):
+                monitor.record_request_start()
+                monitor.record_request_end(float(offset + i), is_error=(i % 10 == 0))
+        
+        threads = [threading.Thread(target=worker, args=(t * 1000,)) for t in range(n_threads)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert monitor.total_requests == n_threads * per_thread
+        assert monitor.error_count == n_threads * per_thread // 10
+        assert monitor.current_queue_depth == 0
+        assert monitor.get_latency_sketch().count == n_threads * per_thread
+        assert sum(stripe.started > 0 for stripe in monitor._stripes) == 4
+        
+        metrics = monitor._collect_metrics()
+        assert metrics.error_rate == pytest.approx(0.1)
+    
+    def test_end_in_other_thread(self):
+        """请求在一个线程开始、另一个线程结束"""
+        monitor = LoadMonitor(record_stripes=2)
+        monitor.record_request_start()
+        monitor.record_request_start()
+        assert monitor.current_queue_depth == 2
+        
+        thread = threading.Thread(target=monitor.record_request_end, args=(5.0,))
+        thread.start()
+        thread.join()
+        assert monitor.current_queue_depth == 1
+        
+        with pytest.raises(ValueError):
+            LoadMonitor(record_stripes=0)
+
+
+class TestSlidingWindow:
+    """滑动窗口统计测试"""
+    
+    def test_sketch_relative_accuracy(self):
+        sketch = LatencySketch(relative_accuracy=0.01)
+        values = [0.5 * 1.01 ** i for i in range(2000)]
+        for value in values:
+            sketch.add(value)
+        
+        for q in (0.0, 0.1, 0.5, 0.9, 0.99, 1.0):
+            exact = values[int(q * (len(values) - 1))]
+            assert sketch.quantile(q) == pytest.approx(exact, rel=0.01)
+        assert sketch.quantiles((0.5, 0.9, 0.99)) == [sketch.quantile(q) for q in (0.5, 0.9, 0.99)]
+        assert sketch.min == values[0] and sketch.max == values[-1]
+    
+    def test_sketch_zero_and_empty(self):
+        sketch = LatencySketch()
+        assert sketch.quantile(0.5) == 0.0 and sketch.mean == 0.0
+        sketch.add(0.0, count=3)
+        sketch.add(10.0)
+        assert sketch.quantile(0.5) == 0.0
+        assert sketch.quantile(1.0) == pytest.approx(10.0, rel=0.01)
+        with pytest.raises(ValueError):
+            sketch.quantile(1.5)
+    
+    def test_sketch_merge(self):
+        a, b = LatencySketch(), LatencySketch()
+        for i in range(1, 501):
+            a.add(float(i))
+            b.add(float(i + 500))
+        merged = LatencySketch.merged([a, b])
+        
+        assert merged.count == 1000
+        assert merged.quantile(0.5) == pytest.approx(500, rel=0.02)
+        assert a.count == 500  # 不修改输入
+        with pytest.raises(ValueError):
+            a.merge(LatencySketch(relative_accuracy=0.05))
+    
+    def test_rolling_counter(self):
+        counter = RollingCounter(window=1.0, buckets=10)
+        for i in range(100):
+            counter.add(100.005 + i * 0.01)  # 1秒内均匀的100个事件
+        
+        assert counter.total(100.995) == 100
+        assert counter.total(101.55) == 40  # 窗口从 100.6 开始
+        assert counter.total(102.5) == 0
+        assert counter.span(100.995) == pytest.approx(0.995)
+        assert counter.rate(100.995) == pytest.approx(100 / 0.995)
+    
+    def test_rolling_counter_exact_over_aligned_window(self):
+        """total 等于从 now - span 到 now 之间事件的精确计数"""
+        import random
+        rng = random.Random(3)
+        counter = RollingCounter(window=1.0, buckets=8)
+        events = sorted(rng.uniform(0.0, 20.0) for _ in range(5000))
+        index = 0
+        for now in [x / 7 for x in range(1, 140)]:
+            while index < len(events) and events[index] <= now:
+                counter.add(events[index])
+                index += 1
+            span = counter.span(now)
+            assert 1.0 - 1.0 / 8 - 1e-9 <= span <= 1.0 + 1e-9
+            expected = sum(1 for t in events[:index] if t >= now - span - 1e-9)
+            assert counter.total(now) == expected
+            assert counter.rate(now) == pytest.approx(expected / span)
+    
+    def test_rolling_counter_reuses_buckets(self):
+        counter = RollingCounter(window=1.0, buckets=4)
+        counter.add(10.0, count=5)
+        counter.add(11.0, count=2)  # 同一个槽位，旧计数被清零
+        assert counter.total(11.1) == 2
+    
+    def test_rolling_sketch_window(self):
+        window = RollingSketch(window=10.0, buckets=10)
+        window.add(100.5, 1000.0)
+        window.add(105.5, 10.0)
+        
+        assert window.snapshot(106.0).count == 2
+        assert window.snapshot(111.0).max == 10.0  # 100.5 的桶已滑出窗口
+        assert window.snapshot(200.0).count == 0
+
+
+class TestSystemSampler:
+    """系统资源采样测试"""
+    
+    @staticmethod
+    def write_proc(root, busy, idle, available):
+        (root / 'stat').write_text(
+            f"cpu  {busy} 0 0 {idle} 0 0 0 0 0 0\ncpu0 {busy} 0 0 {idle} 0 0 0 0 0 0\n")
+        (root / 'meminfo').write_text(
+            f"MemTotal:       1000 kB\nMemFree:         100 kB\nMemAvailable:    {available} kB\n")
+    
+    def test_proc_deltas(self, tmp_path):
+        self.write_proc(tmp_path, busy=100, idle=300, available=250)
+        sampler = SystemSampler(proc_root=str(tmp_path))
+        assert sampler.uses_proc
+        
+        first = sampler.sample()
+        assert first.cpu_usage == pytest.approx(0.25)  # 开机以来的平均值
+        assert first.memory_usage == pytest.approx(0.75)
+        
+        # 两次采样之间 busy +30, idle +10
+        self.write_proc(tmp_path, busy=130, idle=310, available=500)
+        second = sampler.sample()
+        assert second.cpu_usage == pytest.approx(0.75)
+        assert second.memory_usage == pytest.approx(0.5)
+        assert sampler.snapshot is second
+        assert sampler.samples == 2
+        sampler.close()
+    
+    def test_snapshot_immutable(self, tmp_path):
+        self.write_proc(tmp_path, busy=1, idle=1, available=1000)
+        snapshot = SystemSampler(proc_root=str(tmp_path)).sample()
+        assert isinstance(snapshot, SystemSnapshot)
+        with pytest.raises(AttributeError):
+            snapshot.cpu_usage = 1.0
+    
+    def test_fallback_to_psutil(self, tmp_path):
+        sampler = SystemSampler(proc_root=str(tmp_path / 'missing'))
+        assert not sampler.uses_proc
+        snapshot = sampler.sample()
+        assert 0.0 <= snapshot.cpu_usage <= 1.0
+        assert 0.0 < snapshot.memory_usage <= 1.0
+    
+    def test_proc_sampling_without_psutil(self, tmp_path, monkeypatch):
+        """有 /proc 时不需要 psutil，两者都没有时报错"""
+        monkeypatch.setattr(system_sampler, 'psutil', None)
+        self.write_proc(tmp_path, busy=1, idle=1, available=1000)
+        assert SystemSampler(proc_root=str(tmp_path)).sample().cpu_usage == pytest.approx(0.5)
+        with pytest.raises(ImportError):
+            SystemSampler(proc_root=str(tmp_path / 'missing'))
+    
+    def test_load_status_cleared_on_stop(self):
+        """停止监控后不再返回过期的快照"""
+        monitor = LoadMonitor(sample_interval=1.0)
+        monitor.start_monitoring()
+        time.sleep(0.1)
+        monitor.stop_monitoring()
+        
+        assert monitor._status is None
+        # 回到按最近一次指标即时计算
+        assert monitor.get_load_status()['available']
+    
+    def test_load_status_published_per_sample(self):
+        """监控线程发布状态快照，get_load_status 不重新计算"""
+        monitor = LoadMonitor(sample_interval=1.0)
+        monitor.start_monitoring()
+        try:
+            time.sleep(0.1)
+            first = monitor.get_load_status()
+            second = monitor.get_load_status()
+            assert first['available']
+            assert first is not second
+            assert first['metrics'] is second['metrics']
+            
+            monitor.update_weights({'cpu': 0.3})
+            assert monitor.get_load_status()['available']
+        finally:
+            monitor.stop_monitoring()
+
+
 class TestAIMDRateLimiter:
     """AIMD限流器测试"""
     
@@ -331,6 +554,106 @@ class TestFeedbackSystem:
             monitor.stop_monitoring()
 
 
+class TestFeedbackCaching:
+    """反馈缓存与二进制格式测试"""
+    
+    @staticmethod
+    def sample(monitor):
+        """不启动监控线程，手动采样一次"""
+        monitor.metrics_history.append(monitor._collect_metrics())
+    
+    @staticmethod
+    def make_feedback():
+        return LoadFeedback(
+            timestamp=1700000000.125,
+            server_id="服务器-1",
+            load_level=LoadLevel.ORANGE,
+            load_score=0.65,
+            suggested_rate=120.5,
+            metrics={'cpu_usage': 0.5, 'p99_response_time': 250.0, 'queue_depth': 3},
+            trend='INCREASING',
+            suggestions={'rate_adjustment': 0.8, 'actions': ['建议适当降低请求速率']}
+        )
+    
+    def test_feedback_cached_per_sample(self):
+        monitor = LoadMonitor()
+        generator = FeedbackGenerator("server", monitor)
+        self.sample(monitor)
+        
+        first = generator.generate_feedback()
+        assert generator.generate_feedback() is first
+        assert generator.get_feedback_bytes() is generator.get_feedback_bytes()
+        assert generator.cache_hits == 3 and generator.cache_misses == 1
+        
+        # 新的采样或客户端数变化后重新计算
+        time.sleep(0.001)
+        self.sample(monitor)
+        second = generator.generate_feedback()
+        assert second is not first
+        generator.register_client("client-1")
+        assert generator.generate_feedback() is not second
+    
+    def test_unavailable_not_cached(self):
+        generator = FeedbackGenerator("server", LoadMonitor())
+        assert generator.generate_feedback().trend == 'UNKNOWN'
+        generator.generate_feedback()
+        assert generator.cache_hits == 0
+    
+    def test_binary_round_trip(self):
+        feedback = self.make_feedback()
+        data = feedback.to_bytes()
+        restored = LoadFeedback.from_bytes(memoryview(bytearray(data)))
+        
+        assert restored.timestamp == feedback.timestamp
+        assert restored.server_id == "服务器-1"
+        assert restored.load_level == LoadLevel.ORANGE
+        assert restored.trend == 'INCREASING'
+        assert restored.load_score == pytest.approx(0.65)
+        assert restored.suggested_rate == pytest.approx(120.5)
+        assert restored.suggestions['rate_adjustment'] == pytest.approx(0.8)
+        assert restored.metrics['p99_response_time'] == pytest.approx(250.0)
+        assert 'queue_depth' not in restored.metrics  # 只编码固定的几项指标
+        
+        assert LoadFeedback.from_header_value(feedback.to_header_value()).server_id == "服务器-1"
+    
+    def test_binary_invalid(self):
+        data = bytearray(self.make_feedback().to_bytes())
+        with pytest.raises(ValueError):
+            LoadFeedback.from_bytes(data[:10])
+        data[0] = 99
+        with pytest.raises(ValueError):
+            LoadFeedback.from_bytes(data)
+    
+    def test_receiver_binary_channels(self):
+        receiver = FeedbackReceiver("client")
+        feedback = self.make_feedback()
+        
+        receiver.receive_feedback(feedback.to_bytes(), FeedbackChannel.BINARY)
+        assert receiver.get_latest_feedback().load_level == LoadLevel.ORANGE
+        
+        header = {'X-Load-Feedback': feedback.to_header_value()}
+        receiver.receive_feedback(header, FeedbackChannel.HTTP_HEADER)
+        receiver.receive_feedback(memoryview(feedback.to_bytes()), FeedbackChannel.WEBSOCKET)
+        assert receiver.total_feedbacks_received == 3
+        
+        receiver.receive_feedback(b'\x00' * 4, FeedbackChannel.BINARY)
+        assert receiver.total_feedbacks_received == 3
+    
+    def test_shared_body_not_mutated_by_receiver(self):
+        """接收方解析共享的响应体时不修改缓存"""
+        monitor = LoadMonitor()
+        self.sample(monitor)
+        system = FeedbackSystem()
+        generator = system.create_generator("server", monitor)
+        system.create_receiver("client")
+        
+        system.simulate_feedback_exchange("server", "client", FeedbackChannel.HTTP_BODY)
+        system.simulate_feedback_exchange("server", "client", FeedbackChannel.BINARY)
+        body = generator.get_feedback_for_http_body()
+        assert isinstance(body['load_feedback']['load_level'], str)
+        assert system.get_receiver("client").total_feedbacks_received == 2
+
+
 class TestAdaptiveLimiterFactory:
     """自适应限流器工厂测试"""
     
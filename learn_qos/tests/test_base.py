@@ -11,10 +11,13 @@ import os
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
+import numpy as np
+
 from common.base import (
     Packet, PacketPriority, QoSMetrics, 
     TrafficGenerator, current_time_ms, 
-    bytes_to_bits, bits_to_bytes
+    bytes_to_bits, bits_to_bytes,
+    CompactPacket, PacketBatch
 )
 
 
@@ -53,6 +56,64 @@ class TestPacket:
         assert packet_low.priority == PacketPriority.LOW
 
 
+class TestCompactPacket:
+    """紧凑数据包测试"""
+    
+    def test_same_fields_as_packet(self):
+        packet = CompactPacket(1, 1024, PacketPriority.HIGH)
+        assert packet.id == 1
+        assert packet.size == 1024
+        assert packet.priority == PacketPriority.HIGH
+        assert packet.arrival_time > 0
+        assert packet.delay is None
+        
+        packet.departure_time = packet.arrival_time + 0.01
+        assert packet.delay == pytest.approx(0.01, abs=1e-6)
+        assert packet.to_packet() == Packet(1, 1024, PacketPriority.HIGH,
+                                            packet.arrival_time, packet.departure_time)
+    
+    def test_no_dict(self):
+        packet = CompactPacket(1, 100)
+        assert not hasattr(packet, '__dict__')
+        with pytest.raises(AttributeError):
+            packet.flow = 1
+
+
+class TestPacketBatch:
+    """列式数据包批次测试"""
+    
+    def test_from_packets_round_trip(self):
+        packets = TrafficGenerator().generate_burst_traffic(3, 512, PacketPriority.LOW)
+        packets[1].departure_time = packets[1].arrival_time + 0.5
+        batch = PacketBatch.from_packets(packets)
+        
+        assert len(batch) == 3
+        assert batch.total_bytes == 1536
+        assert batch.to_packets() == packets
+        assert batch[1].priority == PacketPriority.LOW
+        assert np.isnan(batch.delays[0]) and batch.delays[1] == pytest.approx(0.5)
+    
+    def test_defaults(self):
+        batch = PacketBatch([100, 200])
+        assert batch.ids.tolist() == [0, 1]
+        assert [packet.priority for packet in batch] == [PacketPriority.NORMAL] * 2
+        assert all(packet.departure_time is None for packet in batch)
+        assert batch.arrival_times[0] > 0
+    
+    def test_length_mismatch(self):
+        with pytest.raises(ValueError):
+            PacketBatch([100, 200], ids=[1])
+    
+    def test_generate_batch(self):
+        generator = TrafficGenerator()
+        generator.generate_packet(100)
+        batch = generator.generate_batch(4, 256, PacketPriority.URGENT)
+        
+        assert batch.ids.tolist() == [2, 3, 4, 5]
+        assert batch.sizes.tolist() == [256] * 4
+        assert generator.generate_packet(100).id == 6
+
+
 class TestQoSMetrics:
     """QoS指标测试"""
     
@@ -103,6 +164,26 @@ class TestQoSMetrics:
         assert metrics.total_packets == 2
         assert metrics.dropped_packets == 1
         assert metrics.drop_rate == 0.5  # 50%丢包率
+    
+    def test_update_with_delays_matches_per_packet(self):
+        """批量更新与逐个更新的结果相同"""
+        delays = [0.01, 0.03, 0.02]
+        single = QoSMetrics()
+        for index, delay in enumerate(delays):
+            packet = Packet(id=index, size=100)
+            packet.departure_time = packet.arrival_time + delay
+            single.update_with_packet(packet)
+        single.update_with_packet(Packet(id=9, size=100), dropped=True)
+        
+        batch = QoSMetrics()
+        batch.update_with_delays(np.array(delays), dropped=1)
+        
+        assert batch.total_packets == single.total_packets == 4
+        assert batch.dropped_packets == 1
+        assert batch.average_delay == pytest.approx(single.average_delay)
+        assert batch.average_jitter == pytest.approx(single.average_jitter)
+        assert batch.max_delay == pytest.approx(single.max_delay)
+        assert batch.min_delay == pytest.approx(single.min_delay)
 
 
 class TestTrafficGenerator:
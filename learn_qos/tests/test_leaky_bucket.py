@@ -11,7 +11,7 @@ import os
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from algorithms.leaky_bucket import LeakyBucket, LeakyBucketConfig
+from algorithms.leaky_bucket import LeakyBucket, LeakyBucketConfig, LeakyBucketScheduler
 from common.base import Packet, PacketPriority, TrafficGenerator
 
 
@@ -346,25 +346,27 @@ class TestLeakyBucket:
     def test_start_stop_scheduler(self):
         """测试调度器启动和停止"""
         config = LeakyBucketConfig(leak_rate=1000.0, bucket_size=5000)
-        bucket = LeakyBucket(config)
+        scheduler = LeakyBucketScheduler()
+        bucket = LeakyBucket(config, scheduler=scheduler)
         
         # 初始状态应该是停止的
         assert not bucket._running
+        assert not scheduler.is_running()
         
-        # 启动调度器
+        # 启动：登记到调度器，调度线程随之启动
         bucket.start()
         assert bucket._running
-        assert bucket._output_scheduler is not None
-        assert bucket._output_scheduler.is_alive()
+        assert bucket in scheduler
+        assert scheduler.is_running()
         
-        # 停止调度器
+        # 停止：取消登记，没有漏桶后调度线程退出
         bucket.stop()
         assert not bucket._running
+        assert bucket not in scheduler
         
         # 等待线程结束
         time.sleep(0.1)
-        if bucket._output_scheduler:
-            assert not bucket._output_scheduler.is_alive()
+        assert not scheduler.is_running()
     
     def test_string_representations(self):
         """测试字符串表示"""
@@ -402,5 +404,81 @@ class TestLeakyBucket:
         # 这与令牌桶不同，令牌桶可能会立即处理（如果有足够令牌）
 
 
+class TestLeakyBucketScheduler:
+    """共享输出调度器测试"""
+    
+    def test_output_at_computed_time(self):
+        """数据包在按水位算出的时刻漏出，延迟与排在前面的数据量成正比"""
+        config = LeakyBucketConfig(leak_rate=10000.0, bucket_size=5000)
+        scheduler = LeakyBucketScheduler()
+        output = []
+        bucket = LeakyBucket(config, scheduler=scheduler, output_callback=output.append)
+        bucket.start()
+        
+        try:
+            for i in range(3):
+                bucket.enqueue(Packet(id=i + 1, size=1000))
+            time.sleep(0.5)
+        finally:
+            bucket.stop()
+        
+        assert [packet.id for packet in output] == [1, 2, 3]
+        delays = [packet.delay for packet in output]
+        for delay, expected in zip(delays, (0.1, 0.2, 0.3)):
+            assert delay == pytest.approx(expected, abs=0.02)
+        assert bucket.is_empty()
+        assert bucket.get_metrics()['packets_output'] == 3
+        assert bucket.get_metrics()['total_packets'] == 3
+    
+    def test_idle_buckets_not_scheduled(self):
+        """一个调度线程驱动多个漏桶，空闲漏桶不在堆中"""
+        config = LeakyBucketConfig(leak_rate=100000.0, bucket_size=5000)
+        scheduler = LeakyBucketScheduler()
+        buckets = [LeakyBucket(config, scheduler=scheduler) for _ in range(200)]
+        for bucket in buckets:
+            bucket.start()
+        
+        try:
+            time.sleep(0.05)
+            assert len(scheduler) == 200
+            assert scheduler.next_deadline() is None
+            
+            buckets[7].enqueue(Packet(id=1, size=1000))
+            assert scheduler.next_deadline() is not None
+            time.sleep(0.1)
+            assert buckets[7].is_empty()
+            assert scheduler.next_deadline() is None
+        finally:
+            scheduler.stop()
+    
+    def test_manual_driving(self):
+        """不使用调度线程时由调用方驱动，例如在事件循环中"""
+        config = LeakyBucketConfig(leak_rate=10000.0, bucket_size=5000)
+        scheduler = LeakyBucketScheduler()
+        bucket = LeakyBucket(config, scheduler=scheduler)
+        bucket.start(use_thread=False)
+        assert not scheduler.is_running()
+        assert scheduler.next_deadline() is None
+        
+        bucket.enqueue(Packet(id=1, size=1000))
+        deadline = scheduler.next_deadline()
+        assert deadline == pytest.approx(time.time() + 0.1, abs=0.02)
+        
+        time.sleep(max(0.0, deadline - time.time()) + 0.01)
+        assert scheduler.run_due() == 1
+        assert bucket.is_empty()
+    
+    def test_dequeue_drives_output(self):
+        """未启动调度器时 dequeue 立即输出已漏完的数据包"""
+        config = LeakyBucketConfig(leak_rate=10000.0, bucket_size=5000)
+        output = []
+        bucket = LeakyBucket(config, output_callback=output.append)
+        bucket.enqueue(Packet(id=1, size=500))
+        
+        time.sleep(0.1)
+        assert bucket.dequeue() is None
+        assert [packet.id for packet in output] == [1]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
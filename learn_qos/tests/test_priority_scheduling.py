@@ -14,7 +14,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 from algorithms.priority_scheduling import (
     PriorityScheduler, StrictPriorityScheduler, WeightedRoundRobinScheduler,
     DynamicPriorityScheduler, DeficitRoundRobinScheduler,
-    SchedulingStrategy, PriorityConfig, create_priority_scheduler
+    SchedulingStrategy, PriorityConfig, create_priority_scheduler,
+    FlowDRRScheduler, FlowSchedulerConfig
 )
 from common.base import Packet, PacketPriority, TrafficGenerator
 
@@ -251,6 +252,54 @@ class TestDynamicPriorityScheduler:
         # 在高负载下，动态优先级应该有所调整
         packet = scheduler.dequeue()
         assert packet is not None
+    
+    def test_aging_overtakes_higher_priority(self):
+        """等待足够久的低优先级数据包排到新到的高优先级数据包之前"""
+        config = PriorityConfig(strategy=SchedulingStrategy.DYNAMIC_PRIORITY, aging_factor=100.0)
+        scheduler = DynamicPriorityScheduler(config)
+        generator = TrafficGenerator()
+        
+        low_packet = generator.generate_packet(100, PacketPriority.LOW)
+        scheduler.enqueue(low_packet)
+        time.sleep(0.05)  # 老化 100 × 0.05 = 5 > URGENT 与 LOW 的差 3
+        urgent_packet = generator.generate_packet(100, PacketPriority.URGENT)
+        scheduler.enqueue(urgent_packet)
+        
+        assert scheduler.dequeue() is low_packet
+        assert scheduler.dequeue() is urgent_packet
+        assert scheduler.dequeue() is None
+    
+    def test_matches_full_recomputation(self):
+        """出队顺序与每次重新计算所有队首动态优先级的结果一致"""
+        import random
+        
+        config = PriorityConfig(strategy=SchedulingStrategy.DYNAMIC_PRIORITY, aging_factor=50.0)
+        scheduler = DynamicPriorityScheduler(config)
+        generator = TrafficGenerator()
+        priorities = list(PacketPriority)
+        random.seed(7)
+        for _ in range(40):
+            scheduler.enqueue(generator.generate_packet(100, random.choice(priorities)))
+            time.sleep(0.001)
+        
+        while not scheduler.is_empty():
+            heads = [queue[0] for queue in scheduler.priority_queues.values() if queue]
+            expected = max(heads, key=scheduler._calculate_dynamic_priority).packet
+            assert scheduler.dequeue() is expected
+    
+    def test_incremental_queue_size(self):
+        scheduler = DynamicPriorityScheduler()
+        generator = TrafficGenerator()
+        for priority in PacketPriority:
+            scheduler.enqueue(generator.generate_packet(100, priority))
+        assert scheduler.get_queue_size() == 4
+        
+        scheduler.dequeue()
+        assert scheduler.get_queue_size() == 3
+        assert sum(scheduler.get_priority_queue_sizes().values()) == 3
+        while scheduler.dequeue() is not None:
+            pass
+        assert scheduler.is_empty()
 
 
 class TestDeficitRoundRobinScheduler:
@@ -484,5 +533,159 @@ class TestPerformance:
         print(f"处理{num_packets}个数据包: 入队{enqueue_time:.3f}s, 出队{dequeue_time:.3f}s")
 
 
+class TestFlowDRRScheduler:
+    """按流缺额轮转调度器测试"""
+    
+    @staticmethod
+    def flow_packet(flow, size, packet_id=0, priority=PacketPriority.NORMAL):
+        packet = Packet(id=packet_id, size=size, priority=priority)
+        packet.flow = flow
+        return packet
+    
+    def make_scheduler(self, **kwargs):
+        return FlowDRRScheduler(FlowSchedulerConfig(**kwargs), classifier=lambda packet: packet.flow)
+    
+    def drain_bytes(self, scheduler, n_packets):
+        served = {}
+        for _ in range(n_packets):
+            packet = scheduler.dequeue()
+            served[packet.flow] = served.get(packet.flow, 0) + packet.size
+        return served
+    
+    def test_byte_fairness(self):
+        """大包流和小包流获得相同的字节数"""
+        scheduler = self.make_scheduler(quantum=1500)
+        for i in range(100):
+            scheduler.enqueue(self.flow_packet('big', 1500, i))
+            for _ in range(10):
+                scheduler.enqueue(self.flow_packet('small', 150, i))
+        
+        served = self.drain_bytes(scheduler, 20 + 200)
+        assert served['big'] == served['small'] == 30000
+    
+    def test_weights(self):
+        scheduler = self.make_scheduler(quantum=1000)
+        scheduler.set_weight('gold', 3.0)
+        for i in range(100):
+            scheduler.enqueue(self.flow_packet('gold', 1000, i))
+            scheduler.enqueue(self.flow_packet('bronze', 1000, i))
+        
+        served = self.drain_bytes(scheduler, 40)
+        assert served['gold'] == 3 * served['bronze']
+    
+    def test_many_flows_round_robin(self):
+        """包长等于额度时每个流每轮服务一个包"""
+        scheduler = self.make_scheduler(quantum=1500)
+        for flow in range(1000):
+            for i in range(2):
+                scheduler.enqueue(self.flow_packet(flow, 1500, i))
+        
+        first_round = [scheduler.dequeue().flow for _ in range(1000)]
+        assert first_round == list(range(1000))
+        assert scheduler.get_active_flow_count() == 1000
+    
+    def test_flow_stats(self):
+        scheduler = self.make_scheduler(max_queue_per_flow=2)
+        for i in range(3):
+            scheduler.enqueue(self.flow_packet('a', 500, i))
+        scheduler.dequeue()
+        
+        stats = scheduler.get_flow_stats('a')
+        assert stats['packets_in'] == 2
+        assert stats['packets_dropped'] == 1
+        assert stats['bytes_in'] == 1000
+        assert stats['bytes_out'] == 500
+        assert stats['queue_size'] == 1
+    
+    def test_eviction(self):
+        """流个数达到上限时回收最久未活动的空闲流，没有空闲流时丢弃"""
+        scheduler = self.make_scheduler(max_flows=2)
+        scheduler.enqueue(self.flow_packet('a', 100))
+        scheduler.enqueue(self.flow_packet('b', 100))
+        assert scheduler.enqueue(self.flow_packet('c', 100)) is False
+        
+        assert scheduler.dequeue().flow == 'a'  # a 变为空闲
+        assert scheduler.enqueue(self.flow_packet('c', 100)) is True
+        assert scheduler.get_flow_count() == 2
+        with pytest.raises(KeyError):
+            scheduler.get_flow_stats('a')
+        assert scheduler.get_metrics()['flows_evicted'] == 1
+    
+    def test_evict_idle(self):
+        scheduler = self.make_scheduler(idle_timeout=0.05)
+        scheduler.enqueue(self.flow_packet('a', 100))
+        scheduler.dequeue()
+        time.sleep(0.1)
+        
+        scheduler.enqueue(self.flow_packet('b', 100))
+        assert scheduler.get_flow_count() == 1
+        assert scheduler.evict_idle() == 0  # b 仍有数据包排队
+    
+    def test_strict_priority_between_levels(self):
+        """高优先级有数据包时先服务高优先级，同一优先级内的流之间轮转"""
+        scheduler = self.make_scheduler(quantum=1000)
+        for i in range(2):
+            scheduler.enqueue(self.flow_packet('a', 1000, i, PacketPriority.LOW))
+            scheduler.enqueue(self.flow_packet('a', 1000, i, PacketPriority.HIGH))
+            scheduler.enqueue(self.flow_packet('b', 1000, i, PacketPriority.HIGH))
+        
+        order = [(packet.priority, packet.flow) for packet in iter(scheduler.dequeue, None)]
+        assert order == [
+            (PacketPriority.HIGH, 'a'), (PacketPriority.HIGH, 'b'),
+            (PacketPriority.HIGH, 'a'), (PacketPriority.HIGH, 'b'),
+            (PacketPriority.LOW, 'a'), (PacketPriority.LOW, 'a'),
+        ]
+        assert scheduler.get_flow_stats('a', PacketPriority.LOW)['packets_out'] == 2
+        assert scheduler.get_flow_count() == 3
+    
+    def test_higher_priority_preempts_round(self):
+        """低优先级的轮转进行中到达的高优先级数据包下一次出队即被服务"""
+        scheduler = self.make_scheduler(quantum=3000)
+        for i in range(3):
+            scheduler.enqueue(self.flow_packet('bulk', 1000, i, PacketPriority.LOW))
+        assert scheduler.dequeue().flow == 'bulk'
+        scheduler.enqueue(self.flow_packet('voice', 100, 0, PacketPriority.URGENT))
+        assert scheduler.dequeue().flow == 'voice'
+        assert scheduler.dequeue().flow == 'bulk'
+    
+    def test_weights_survive_eviction(self):
+        """流被回收后权重保留，重新创建的流仍使用该权重，直到 clear_weight"""
+        scheduler = self.make_scheduler(max_flows=1)
+        scheduler.set_weight('a', 2.0)
+        scheduler.enqueue(self.flow_packet('a', 100))
+        scheduler.dequeue()
+        scheduler.enqueue(self.flow_packet('b', 100))  # 回收空闲的 a
+        scheduler.dequeue()
+        scheduler.enqueue(self.flow_packet('a', 100))  # 回收空闲的 b，重新创建 a
+        assert scheduler.get_flow_stats('a')['weight'] == 2.0
+        
+        scheduler.clear_weight('a')
+        assert scheduler.get_flow_stats('a')['weight'] == 1.0
+        scheduler.clear_weight('missing')
+    
+    def test_default_classifier_and_empty(self):
+        """默认按 flow 属性分流，没有 flow 属性的数据包在各自优先级内同属一个流"""
+        scheduler = FlowDRRScheduler()
+        assert scheduler.dequeue() is None
+        scheduler.enqueue(Packet(id=1, size=100, priority=PacketPriority.HIGH))
+        scheduler.enqueue(Packet(id=2, size=100, priority=PacketPriority.HIGH))
+        scheduler.enqueue(self.flow_packet('a', 100, 3, PacketPriority.HIGH))
+        assert scheduler.get_flow_count() == 2
+        assert scheduler.get_flow_stats(None, PacketPriority.HIGH)['packets_in'] == 2
+        assert [scheduler.dequeue().id for _ in range(3)] == [1, 2, 3]
+        assert scheduler.is_empty()
+    
+    def test_factory(self):
+        config = PriorityConfig(strategy=SchedulingStrategy.FLOW_DRR,
+                                max_queue_size=1, quantum_size=500)
+        scheduler = create_priority_scheduler(SchedulingStrategy.FLOW_DRR, config)
+        assert isinstance(scheduler, FlowDRRScheduler)
+        assert scheduler.config.quantum == 500
+        assert scheduler.enqueue(self.flow_packet('a', 100)) is True
+        assert scheduler.enqueue(self.flow_packet('a', 100)) is False
+        assert scheduler.enqueue(self.flow_packet('b', 100)) is True
+        assert create_priority_scheduler(SchedulingStrategy.FLOW_DRR).dequeue() is None
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -7,12 +7,19 @@ import pytest
 import time
 import sys
 import os
+import pickle
+import multiprocessing
+
+import numpy as np
 
 # 添加src目录到Python路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
 
-from algorithms.token_bucket import TokenBucket, TokenBucketConfig
-from common.base import Packet, PacketPriority, TrafficGenerator
+from algorithms.token_bucket import (
+    TokenBucket, TokenBucketConfig, ShardedTokenBucket, HierarchicalTokenBucket,
+    SharedTokenBucket
+)
+from common.base import Packet, PacketPriority, TrafficGenerator, PacketBatch
 
 
 class TestTokenBucketConfig:
@@ -315,5 +322,422 @@ class TestTokenBucket:
         assert "bucket_size=5000" in repr_str
 
 
+class TestBatchAdmission:
+    """批量准入与不保留数据包测试"""
+    
+    def test_acquire_many(self):
+        """令牌不足时只准入前面一部分"""
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=1000)
+        bucket = TokenBucket(config)
+        
+        assert bucket.acquire_many(5, 500) == 5
+        assert bucket.acquire_many(10, 1000) == 5  # 只剩约500个令牌
+        assert bucket.acquire_many(0, 0) == 0
+        
+        metrics = bucket.get_metrics()
+        assert metrics['total_packets'] == 15
+        assert metrics['dropped_packets'] == 5
+        assert metrics['packets_passed'] == 10
+        assert bucket.is_empty()  # 批量准入不进入队列
+    
+    def test_acquire_many_minimum_one_token(self):
+        """小包每个至少消耗一个令牌"""
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=10, token_size=100)
+        bucket = TokenBucket(config)
+        
+        assert bucket.acquire_many(20, 200) == 10
+    
+    def test_no_retain_packets(self):
+        config = TokenBucketConfig(token_rate=1000.0, bucket_size=5000, retain_packets=False)
+        bucket = TokenBucket(config)
+        
+        assert bucket.enqueue(Packet(id=1, size=100)) is True
+        assert bucket.is_empty()
+        assert bucket.get_metrics()['packets_passed'] == 1
+    
+    def test_enqueue_batch_matches_enqueue(self):
+        """批量入队与逐个入队的准入结果相同"""
+        sizes = [400, 100, 600, 100, 200]
+        config = TokenBucketConfig(token_rate=0.001, bucket_size=800)
+        single = TokenBucket(config)
+        expected = [single.enqueue(Packet(id=i, size=size)) for i, size in enumerate(sizes)]
+        
+        bucket = TokenBucket(config)
+        batch = PacketBatch(sizes)
+        admitted = bucket.enqueue_batch(batch)
+        
+        assert admitted.tolist() == expected == [True, True, False, True, True]
+        assert not np.isnan(batch.departure_times[0]) and np.isnan(batch.departure_times[2])
+        assert bucket.get_metrics()['total_packets'] == 5
+        assert bucket.get_metrics()['dropped_packets'] == 1
+        assert [packet.size for packet in bucket._packet_queue] == [400, 100, 100, 200]
+        assert bucket.dequeue().departure_time is not None
+    
+    def test_enqueue_batch_all_admitted(self):
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=10000, retain_packets=False)
+        bucket = TokenBucket(config)
+        
+        assert bucket.enqueue_batch(TrafficGenerator().generate_batch(10, 500)).all()
+        assert bucket.is_empty()
+        assert bucket.get_current_tokens() == pytest.approx(5000, abs=1)
+    
+    def test_default_enqueue_batch(self):
+        """未覆盖 enqueue_batch 的算法逐个处理 CompactPacket"""
+        bucket = ShardedTokenBucket(TokenBucketConfig(token_rate=0.001, bucket_size=500))
+        admitted = bucket.enqueue_batch(PacketBatch([300, 300, 100]))
+        
+        assert admitted.tolist() == [True, False, True]
+
+
+class TestShardedTokenBucket:
+    """分片令牌桶测试"""
+    
+    def test_admission_limited_by_bucket(self):
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=1000)
+        bucket = ShardedTokenBucket(config, lease_tokens=100)
+        
+        admitted = sum(bucket.acquire(10) for _ in range(200))
+        assert admitted == 100
+        
+        metrics = bucket.get_metrics()
+        assert metrics['packets_passed'] == 100
+        assert metrics['packets_dropped'] == 100
+        assert metrics['shards'] == 1
+    
+    def test_enqueue_and_dequeue(self):
+        config = TokenBucketConfig(token_rate=1000.0, bucket_size=5000)
+        bucket = ShardedTokenBucket(config)
+        
+        packet = Packet(id=1, size=1000)
+        assert bucket.enqueue(packet) is True
+        assert bucket.enqueue(Packet(id=2, size=10000)) is False
+        assert bucket.get_queue_size() == 1
+        assert bucket.dequeue() is packet
+        assert bucket.dequeue() is None
+    
+    def test_acquire_many(self):
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=1000)
+        bucket = ShardedTokenBucket(config, lease_tokens=50)
+        
+        assert bucket.acquire_many(4, 400) == 4
+        assert bucket.acquire_many(10, 1000) == 6
+    
+    def test_rebalance_returns_leased_tokens(self):
+        """纪元推进后，分片下一次准入时把剩余令牌还给共享池"""
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=1000)
+        bucket = ShardedTokenBucket(config, lease_tokens=500)
+        
+        assert bucket.acquire(100)
+        assert bucket._pool_tokens == pytest.approx(400, abs=1)
+        
+        bucket.rebalance()
+        assert bucket.acquire(100)
+        assert bucket.get_current_tokens() == pytest.approx(800, abs=1)
+    
+    def test_threads_share_tokens(self):
+        """多线程准入总量不超过桶容量加上各分片的租借令牌"""
+        import threading
+        
+        config = TokenBucketConfig(token_rate=1.0, bucket_size=10000)
+        bucket = ShardedTokenBucket(config, lease_tokens=100)
+        counts = []
+        
+        def worker():
+            counts.append(sum(bucket.acquire(1) for _ in range(5000)))
+        
+        threads = [threading.Thread(target=worker) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        assert 9900 <= sum(counts) <= 10000 + 4 * 100
+        metrics = bucket.get_metrics()
+        assert metrics['total_packets'] == 20000
+        assert metrics['packets_passed'] == sum(counts)
+        # 线程退出后分片被回收
+        assert metrics['shards'] == 0
+    
+    def test_exited_threads_return_leases(self):
+        """短生命周期线程退出后分片被移除，租借的令牌回到共享池，计数保留"""
+        import threading
+        
+        config = TokenBucketConfig(token_rate=0.001, bucket_size=1000)
+        bucket = ShardedTokenBucket(config, lease_tokens=100)
+        for _ in range(50):
+            t = threading.Thread(target=bucket.acquire, args=(1,))
+            t.start()
+            t.join()
+        
+        metrics = bucket.get_metrics()
+        assert metrics['shards'] == 0
+        assert metrics['packets_passed'] == 50
+        assert metrics['total_tokens_consumed'] == pytest.approx(50)
+        assert bucket.get_current_tokens() == pytest.approx(950, abs=1)
+        
+        bucket.acquire(1)
+        assert bucket.get_metrics()['shards'] == 1
+    
+    def test_metrics_include_base_fields(self):
+        config = TokenBucketConfig(token_rate=1000.0, bucket_size=5000)
+        metrics = ShardedTokenBucket(config).get_metrics()
+        for key in ('average_delay', 'max_delay', 'min_delay', 'average_jitter', 'algorithm'):
+            assert key in metrics
+    
+    def test_reset_metrics(self):
+        config = TokenBucketConfig(token_rate=1000.0, bucket_size=5000)
+        bucket = ShardedTokenBucket(config)
+        bucket.acquire_many(10, 1000)
+        
+        bucket.reset_metrics()
+        assert bucket.get_metrics()['total_packets'] == 0
+        bucket.acquire(1)
+        assert bucket.get_metrics()['packets_passed'] == 1
+    
+    def test_invalid_lease(self):
+        config = TokenBucketConfig(token_rate=1000.0, bucket_size=5000)
+        with pytest.raises(ValueError):
+            ShardedTokenBucket(config, lease_tokens=0)
+
+
+class TestHierarchicalTokenBucket:
+    """层次化令牌桶测试（令牌速率很低，测试期间的补充可以忽略）"""
+    
+    @staticmethod
+    def cfg(bucket_size, token_rate=0.001):
+        return TokenBucketConfig(token_rate=token_rate, bucket_size=bucket_size)
+    
+    def make_htb(self, tenant_ceil=None, group_ceil=None):
+        """根 10000，父分类 group 6000，两个租户各保证 2000"""
+        htb = HierarchicalTokenBucket(self.cfg(10000))
+        htb.add_class('group', self.cfg(6000), ceil=self.cfg(group_ceil) if group_ceil else None)
+        for name in ('a', 'b'):
+            htb.add_class(name, self.cfg(2000), parent='group',
+                          ceil=self.cfg(tenant_ceil) if tenant_ceil else None)
+        return htb
+    
+    def test_own_rate(self):
+        htb = self.make_htb()
+        
+        assert htb.admit('a', 1000) is True
+        stats = htb.get_class_stats('a')
+        assert stats['tokens'] == pytest.approx(1000, abs=1)
+        assert stats['packets_borrowed'] == 0
+        # 祖先同样记账
+        assert htb.get_class_stats('group')['tokens'] == pytest.approx(5000, abs=1)
+    
+    def test_borrow_from_idle_sibling(self):
+        """b 空闲时 a 可以借用父分类的令牌，直到父分类的上限"""
+        htb = self.make_htb(group_ceil=6000)
+        
+        admitted = sum(htb.admit('a', 1000) for _ in range(10))
+        assert admitted == 6
+        stats = htb.get_class_stats('a')
+        assert stats['packets_passed'] == 6
+        assert stats['packets_borrowed'] == 4
+        assert stats['packets_dropped'] == 4
+        # b 没用的带宽已经借给了 a
+        assert htb.admit('b', 1000) is False
+    
+    def test_borrow_up_to_root(self):
+        """父分类没有上限时继续向根分类借用"""
+        htb = self.make_htb()
+        
+        admitted = sum(htb.admit('a', 1000) for _ in range(12))
+        assert admitted == 10
+    
+    def test_ceil_limits_borrowing(self):
+        htb = self.make_htb(tenant_ceil=3000)
+        
+        admitted = sum(htb.admit('a', 1000) for _ in range(10))
+        assert admitted == 3
+        assert htb.admit('b', 1000) is True
+    
+    def test_root_limits_all(self):
+        htb = HierarchicalTokenBucket(self.cfg(3000))
+        for i in range(5):
+            htb.add_class(i, self.cfg(1000))
+        
+        admitted = sum(htb.admit(i, 1000) for i in range(5))
+        assert admitted == 3
+    
+    def test_token_refill(self):
+        htb = HierarchicalTokenBucket(self.cfg(1000, token_rate=10000.0))
+        htb.add_class('a', self.cfg(1000, token_rate=10000.0))
+        
+        assert htb.admit('a', 1000) is True
+        assert htb.admit('a', 1000) is False
+        time.sleep(0.15)
+        assert htb.admit('a', 1000) is True
+    
+    def test_class_management(self):
+        htb = self.make_htb()
+        assert len(htb) == 3
+        assert 'a' in htb
+        
+        with pytest.raises(ValueError):
+            htb.add_class('a', self.cfg(100))
+        with pytest.raises(KeyError):
+            htb.add_class('c', self.cfg(100), parent='missing')
+        with pytest.raises(ValueError):
+            htb.add_class('c', self.cfg(100, token_rate=10.0), ceil=self.cfg(100, token_rate=1.0))
+        with pytest.raises(ValueError):
+            htb.remove_class('group')
+        
+        htb.remove_class('a')
+        htb.remove_class('b')
+        htb.remove_class('group')
+        assert len(htb) == 0
+        with pytest.raises(KeyError):
+            htb.remove_class(HierarchicalTokenBucket.ROOT)
+    
+    def test_enqueue_with_classifier(self):
+        htb = HierarchicalTokenBucket(self.cfg(10000), classifier=lambda packet: packet.id % 2)
+        htb.add_class(0, self.cfg(1000))
+        htb.add_class(1, self.cfg(1000))
+        
+        assert htb.enqueue(Packet(id=2, size=500)) is True
+        assert htb.enqueue(Packet(id=3, size=500)) is True
+        assert htb.get_queue_size() == 2
+        assert htb.get_class_stats(0)['packets_passed'] == 1
+        metrics = htb.get_metrics()
+        assert metrics['classes'] == 2
+        assert metrics['packets_passed'] == 2
+    
+    def test_enqueue_unknown_class(self):
+        """classifier 返回不存在的分类时按默认分类准入，不抛出 KeyError"""
+        htb = HierarchicalTokenBucket(self.cfg(10000), classifier=lambda packet: packet.id)
+        assert htb.enqueue(Packet(id=7, size=500)) is True
+        assert htb.get_metrics()['packets_unclassified'] == 1
+        
+        htb = HierarchicalTokenBucket(self.cfg(10000), classifier=lambda packet: packet.id,
+                                      default_class='guest')
+        htb.add_class('guest', self.cfg(1000), ceil=self.cfg(1000))
+        assert htb.enqueue(Packet(id=7, size=800)) is True
+        assert htb.enqueue(Packet(id=8, size=800)) is False  # 受默认分类的限制
+        assert htb.get_class_stats('guest')['packets_passed'] == 1
+        htb.remove_class('guest')
+        assert htb.enqueue(Packet(id=9, size=800)) is True  # 默认分类也不存在时只受根分类限制
+        assert htb.get_metrics()['packets_unclassified'] == 3
+    
+    def test_many_classes(self):
+        """十万个租户分类，没有定时器，按需补充令牌"""
+        htb = HierarchicalTokenBucket(self.cfg(10 ** 9, token_rate=1e9))
+        for group in range(100):
+            htb.add_class(('group', group), self.cfg(10 ** 7, token_rate=1e7))
+        for tenant in range(100000):
+            htb.add_class(tenant, self.cfg(10 ** 4, token_rate=1e4), parent=('group', tenant % 100))
+        
+        assert len(htb) == 100100
+        assert all(htb.admit(tenant, 1500) for tenant in range(0, 100000, 997))
+        assert htb.get_metrics()['max_depth'] == 2
+
+
+
+def _acquire_in_child(bucket, attempts, results):
+    """子进程中尽量多地准入，返回准入数"""
+    results.put(sum(bucket.acquire() for _ in range(attempts)))
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason="需要类 Unix 系统")
+class TestSharedTokenBucket:
+    """跨进程共享令牌桶测试"""
+    
+    @staticmethod
+    def cfg(bucket_size, token_rate=0.001):
+        return TokenBucketConfig(token_rate=token_rate, bucket_size=bucket_size)
+    
+    def test_acquire_and_refill(self, tmp_path):
+        bucket = SharedTokenBucket(self.cfg(5, token_rate=100.0), name='refill', directory=str(tmp_path))
+        assert all(bucket.acquire() for _ in range(5))
+        assert not bucket.acquire()
+        time.sleep(0.05)
+        assert bucket.acquire()
+        
+        stats = bucket.get_shared_stats()
+        assert stats['packets_passed'] == 6
+        assert stats['packets_dropped'] == 1
+        assert bucket.get_metrics()['total_packets'] == 7
+    
+    def test_instances_share_tokens(self, tmp_path):
+        first = SharedTokenBucket(self.cfg(10), name='shared', directory=str(tmp_path))
+        second = SharedTokenBucket(self.cfg(10), name='shared', directory=str(tmp_path))
+        
+        assert first.acquire_many(6, 6) == 6
+        assert second.acquire_many(6, 6) == 4
+        assert first.get_current_tokens() < 1
+        assert SharedTokenBucket(self.cfg(10), name='other', directory=str(tmp_path)).acquire()
+    
+    def test_config_mismatch(self, tmp_path):
+        SharedTokenBucket(self.cfg(10), name='cfg', directory=str(tmp_path))
+        with pytest.raises(ValueError):
+            SharedTokenBucket(self.cfg(20), name='cfg', directory=str(tmp_path))
+    
+    def test_token_size_mismatch(self, tmp_path):
+        """token_size 也存放在共享区中，各进程按相同的字节数换算令牌"""
+        SharedTokenBucket(self.cfg(10), name='token_size', directory=str(tmp_path))
+        config = TokenBucketConfig(token_rate=0.001, bucket_size=10, token_size=1500)
+        with pytest.raises(ValueError, match='token_size'):
+            SharedTokenBucket(config, name='token_size', directory=str(tmp_path))
+    
+    def test_acquire_after_close(self, tmp_path):
+        bucket = SharedTokenBucket(self.cfg(10), name='closed', directory=str(tmp_path))
+        bucket.close()
+        with pytest.raises(ValueError, match='已关闭'):
+            bucket.acquire()
+        with pytest.raises(ValueError):
+            bucket.acquire_many(2, 2)
+        bucket.close()
+    
+    def test_metrics_consistent_across_threads(self, tmp_path):
+        import threading
+        bucket = SharedTokenBucket(self.cfg(1000), name='threads', directory=str(tmp_path))
+        threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(500)])
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        metrics = bucket.get_metrics()
+        assert metrics['total_packets'] == 2000
+        assert metrics['dropped_packets'] == metrics['shared']['packets_dropped'] == 1000
+    
+    def test_enqueue_local_queue(self, tmp_path):
+        bucket = SharedTokenBucket(self.cfg(1000), name='queue', directory=str(tmp_path))
+        assert bucket.enqueue(Packet(id=1, size=600))
+        assert not bucket.enqueue(Packet(id=2, size=600))
+        assert bucket.dequeue().id == 1
+        assert bucket.is_empty()
+    
+    def test_global_limit_across_processes(self, tmp_path):
+        """多个进程共同遵守一个桶容量（fork 之前创建的实例在子进程中重新打开）"""
+        context = multiprocessing.get_context('fork')
+        bucket = SharedTokenBucket(self.cfg(100), name='global', directory=str(tmp_path))
+        results = context.Queue()
+        processes = [context.Process(target=_acquire_in_child, args=(bucket, 60, results))
+                     for _ in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(timeout=30)
+        
+        admitted = [results.get(timeout=5) for _ in processes]
+        assert sum(admitted) == 100
+        stats = bucket.get_shared_stats()
+        assert stats['packets_passed'] == 100
+        assert stats['packets_dropped'] == 140
+    
+    def test_pickle_reopens_by_name(self, tmp_path):
+        bucket = SharedTokenBucket(self.cfg(3), name='pickle', directory=str(tmp_path))
+        bucket.acquire_many(2, 2)
+        restored = pickle.loads(pickle.dumps(bucket))
+        
+        assert restored.path == bucket.path
+        assert restored.acquire() and not restored.acquire()
+        bucket.unlink()
+        assert not os.path.exists(bucket.path)
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])